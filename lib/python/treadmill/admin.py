@@ -15,6 +15,8 @@ import hashlib
 import itertools
 import logging
 import shlex
+import threading
+import time
 
 import ldap3
 from ldap3.core import exceptions as ldap_exceptions
@@ -63,6 +65,12 @@ _TREADMILL_OBJCLS_OID_PREFIX = '1.3.6.1.4.1.360.10.6.2.'
 DEFAULT_PARTITION = '_default'
 DEFAULT_TENANT = '_default'
 
+# Default number of entries per page of paged searches.
+DEFAULT_PAGE_SIZE = 50
+
+# Default maximum number of cached LDAP object reads.
+_DEFAULT_CACHE_SIZE = 10000
+
 
 def _to_bool(value):
     """Fuzzy converion of string/int to bool."""
@@ -440,6 +448,102 @@ def _diff_entries(old_entry, new_entry):
     return diff
 
 
+class LdapCache(object):
+    """Per-process TTL cache of LDAP object reads.
+
+    Cached reads are keyed by the dn they were read from (the object dn or
+    the search base). A write through :class:`Admin` invalidates the cached
+    reads of the written dn and of all its ancestors and descendants.
+
+    The cache is disabled while the TTL is 0.
+    """
+
+    def __init__(self, ttl=0, max_size=_DEFAULT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Get a cached read.
+
+        :param ``tuple`` key:
+            Cache key, the first element being the dn read from.
+        :returns:
+            ``(found, value)``.
+        """
+        if not self.ttl:
+            return False, None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.time():
+                self.hits += 1
+                # Callers modify the objects they read.
+                return True, copy.deepcopy(entry[1])
+
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        """Cache a read."""
+        if not self.ttl:
+            return
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + self.ttl, copy.deepcopy(value))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, dn):
+        """Invalidate the cached reads related to a dn."""
+        if not self._entries:
+            return
+
+        dn = dn.lower()
+        with self._lock:
+            for key in list(self._entries):
+                base = key[0].lower()
+                if (base == dn or
+                        dn.endswith(',' + base) or
+                        base.endswith(',' + dn)):
+                    del self._entries[key]
+
+    def clear(self):
+        """Invalidate all cached reads."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Cache statistics."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+        }
+
+
+#: LDAP object read cache of the process.
+CACHE = LdapCache()
+
+
+def configure(page_size=None, cache_ttl=None, cache_size=None):
+    """Configure the paged search page size and the read cache."""
+    # W0603: Using the global statement
+    global DEFAULT_PAGE_SIZE  # pylint: disable=W0603
+
+    if page_size is not None:
+        DEFAULT_PAGE_SIZE = page_size
+    if cache_size is not None:
+        CACHE.max_size = cache_size
+    if cache_ttl is not None:
+        CACHE.ttl = cache_ttl
+        CACHE.clear()
+
+
 class AndQuery(object):
     """And query helper."""
 
@@ -469,7 +573,8 @@ class Admin(object):
     # pylint: disable=invalid-name
 
     def __init__(self, uri, ldap_suffix,
-                 user=None, password=None, connect_timeout=5, write_uri=None):
+                 user=None, password=None, connect_timeout=5, write_uri=None,
+                 page_size=None):
         self.uri = uri
         if isinstance(uri, six.string_types):
             self.uri = uri.split(',')
@@ -483,6 +588,7 @@ class Admin(object):
         self.user = user
         self.password = password
         self._connect_timeout = connect_timeout
+        self.page_size = page_size
 
         self.ldap = None
         self.write_ldap = None
@@ -621,7 +727,7 @@ class Admin(object):
             search_scope=search_scope,
             attributes=attributes,
             dereference_aliases=ldap3.DEREF_NEVER,
-            paged_size=50,
+            paged_size=self.page_size or DEFAULT_PAGE_SIZE,
             paged_criticality=True,
             generator=True
         )
@@ -662,8 +768,13 @@ class Admin(object):
     def modify(self, dn, changes):
         """Call ldap modify and raise exception on non-success."""
         if changes:
-            self.write_ldap.modify(dn, changes)
-            self._test_raise_exceptions(self.write_ldap)
+            CACHE.invalidate(dn)
+            try:
+                self.write_ldap.modify(dn, changes)
+                self._test_raise_exceptions(self.write_ldap)
+            finally:
+                # Drop the reads cached while the write was in flight.
+                CACHE.invalidate(dn)
 
     def add(self, dn, object_class=None, attributes=None):
         """Call ldap add and raise exception on non-success."""
@@ -671,13 +782,21 @@ class Admin(object):
             (k, v)
             for k, v in six.iteritems(attributes)
         )) if attributes else None
-        self.write_ldap.add(dn, object_class, sorted_attributes)
-        self._test_raise_exceptions(self.write_ldap)
+        CACHE.invalidate(dn)
+        try:
+            self.write_ldap.add(dn, object_class, sorted_attributes)
+            self._test_raise_exceptions(self.write_ldap)
+        finally:
+            CACHE.invalidate(dn)
 
     def delete(self, dn):
         """Call ldap delete and raise exception on non-success."""
-        self.write_ldap.delete(dn)
-        self._test_raise_exceptions(self.write_ldap)
+        CACHE.invalidate(dn)
+        try:
+            self.write_ldap.delete(dn)
+            self._test_raise_exceptions(self.write_ldap)
+        finally:
+            CACHE.invalidate(dn)
 
     def list(self, root=None, dirty=False):
         """Lists all objects in the database."""
@@ -1064,13 +1183,17 @@ class LdapObject(object):
 
     def get(self, ident, dirty=False):
         """Gets object given identity."""
-        entry = self.admin.get(
-            self.dn(ident), self._query(), self.attrs(), dirty
-        )
-        if entry:
-            return self.from_entry(entry, self.dn(ident))
-        else:
-            return None
+        dn = self.dn(ident)
+        key = (dn, 'get', type(self).__name__)
+        if not dirty:
+            found, obj = CACHE.get(key)
+            if found:
+                return obj
+
+        entry = self.admin.get(dn, self._query(), self.attrs(), dirty)
+        obj = self.from_entry(entry, dn) if entry else None
+        CACHE.put(key, obj)
+        return obj
 
     def create(self, ident, attrs):
         """Create new ldap record."""
@@ -1103,14 +1226,23 @@ class LdapObject(object):
                 query(arg, attrs[obj_field])
 
         _LOGGER.debug('Query: %s', query.to_str())
-        result = self.admin.paged_search(search_base=self.dn(),
-                                         search_filter=query.to_str(),
-                                         search_scope=ldap3.SUBTREE,
-                                         attributes=self.attrs(),
-                                         dirty=dirty)
+        key = (self.dn(), 'list', type(self).__name__, query.to_str())
+        found, objs = CACHE.get(key) if not dirty else (False, None)
+        if not found:
+            result = self.admin.paged_search(search_base=self.dn(),
+                                             search_filter=query.to_str(),
+                                             search_scope=ldap3.SUBTREE,
+                                             attributes=self.attrs(),
+                                             dirty=dirty)
+            if CACHE.ttl:
+                objs = [self.from_entry(entry, dn) for dn, entry in result]
+                CACHE.put(key, objs)
+            else:
+                objs = (self.from_entry(entry, dn) for dn, entry in result)
+
         if generator:
-            return (self.from_entry(entry, dn) for dn, entry in result)
-        return [self.from_entry(entry, dn) for dn, entry in result]
+            return iter(objs)
+        return list(objs)
 
     def update(self, ident, attrs):
         """Updates LDAP record."""
@@ -1138,6 +1270,12 @@ class LdapObject(object):
         """Selects all children given the children type."""
         dn = self.dn(ident)
 
+        key = (dn, 'children', clazz.__name__)
+        if not dirty:
+            found, objs = CACHE.get(key)
+            if found:
+                return objs
+
         children_admin = clazz(self.admin)
         attrs = [elem[0] for elem in children_admin.schema()]
         children = self.admin.paged_search(
@@ -1146,10 +1284,12 @@ class LdapObject(object):
             attributes=attrs,
             dirty=dirty
         )
-        return [
+        objs = [
             children_admin.from_entry(entry, child_dn)
             for child_dn, entry in children
         ]
+        CACHE.put(key, objs)
+        return objs
 
 
 class Server(LdapObject):
@@ -6,124 +6,239 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import bisect
+import collections
+import functools
 import logging
+import re
+import threading
 
 import fnmatch
 
-import six
 import kazoo
-import yaml
 
 from treadmill import context
 from treadmill import utils
+from treadmill import zkcodec
 from treadmill import zknamespace as z
-from treadmill import zkwatchers
+from treadmill import zkutils
 
 
 _LOGGER = logging.getLogger(__name__)
 
+_GLOB_CHARS_RE = re.compile(r'[*?\[]')
 
-def make_endpoint_watcher(zkclient, state, proid):
-    """Make endpoint watcher function."""
-    proid_instances = z.join_zookeeper_path(z.ENDPOINTS, proid)
 
-    @zkclient.ChildrenWatch(proid_instances)
-    @utils.exit_on_unhandled
-    def _watch_instances(children):
-        """Watch for proid instances."""
+def _glob_prefix(pattern):
+    """Literal prefix of a glob pattern, all its matches start with it."""
+    match = _GLOB_CHARS_RE.search(pattern)
+    if match is None:
+        return pattern
+    return pattern[:match.start()]
 
-        # TODO: current implementation does nto support instances, so
-        #       state from masters will be stored, but will be never displayed.
-        current = set(state[proid].keys())
-        target = set(children)
 
-        for name in current - target:
-            del state[proid][name]
+class _ProidEndpoints(object):
+    """Endpoints of a proid, indexed by name.
 
-        endpoints = dict()
-        for name in target - current:
-            try:
-                endpoint_node = z.join_zookeeper_path(proid_instances, name)
-                data, _metadata = zkclient.get(endpoint_node)
-                endpoints[name] = data.decode()
-            except kazoo.client.NoNodeError:
-                pass
-
-        state[proid].update(endpoints)
-        return True
+    Endpoint names are ``<app>#<instance>:<proto>:<endpoint>``, they are kept
+    sorted so that a glob lookup only scans the names starting with the
+    literal prefix of the glob.
+    """
 
-    return _watch_instances
+    __slots__ = (
+        'names',
+        'hostports',
+    )
 
+    def __init__(self):
+        self.names = []
+        self.hostports = {}
+
+    def add(self, name, hostport):
+        """Add an endpoint."""
+        if name not in self.hostports:
+            bisect.insort(self.names, name)
+        self.hostports[name] = hostport
+
+    def remove(self, name):
+        """Remove an endpoint."""
+        if self.hostports.pop(name, None) is None:
+            return
+        idx = bisect.bisect_left(self.names, name)
+        del self.names[idx]
+
+    def match(self, pattern):
+        """Generate the (name, hostport) of the endpoints matching a glob."""
+        prefix = _glob_prefix(pattern)
+        idx = bisect.bisect_left(self.names, prefix)
+        while idx < len(self.names):
+            name = self.names[idx]
+            if not name.startswith(prefix):
+                break
+            idx += 1
+            if fnmatch.fnmatchcase(name, pattern):
+                yield name, self.hostports[name]
+
+
+class _EndpointIndex(object):
+    """Index of the cell endpoints, by proid.
+
+    There is a children watch per proid, the data of the new endpoint nodes
+    is fetched with pipelined reads.
+    """
+
+    def __init__(self, zkclient):
+        self.zkclient = zkclient
+        self.proids = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Watch the proids."""
+
+        @self.zkclient.ChildrenWatch(z.ENDPOINTS)
+        @utils.exit_on_unhandled
+        def _watch_endpoints(proids):
+            """Watch /endpoints nodes."""
+            current = set(self.proids)
+            target = set(proids)
+
+            for proid in current - target:
+                _LOGGER.info('Removing proid: %s', proid)
+                with self._lock:
+                    self.proids.pop(proid, None)
+
+            for proid in target - current:
+                _LOGGER.info('Adding proid: %s', proid)
+                with self._lock:
+                    self.proids[proid] = _ProidEndpoints()
+                self._watch_proid(proid)
 
-def make_discovery_state_watcher(zkclient, state, server):
-    """Watch server state changes."""
+            return True
 
-    discovery_state_node = z.path.discovery_state(server)
+    def _watch_proid(self, proid):
+        """Watch the endpoints of a proid."""
+        proid_instances = z.join_zookeeper_path(z.ENDPOINTS, proid)
+
+        @self.zkclient.ChildrenWatch(proid_instances)
+        @utils.exit_on_unhandled
+        def _watch_instances(children):
+            """Watch for proid instances."""
+            endpoints = self.proids.get(proid)
+            if endpoints is None:
+                # Proid removed.
+                return False
+
+            current = set(endpoints.hostports)
+            target = set(children)
+
+            added = sorted(target - current)
+            results = zkutils.pipeline(
+                functools.partial(
+                    self.zkclient.get_async,
+                    z.join_zookeeper_path(proid_instances, name)
+                )
+                for name in added
+            )
+
+            with self._lock:
+                for name in current - target:
+                    endpoints.remove(name)
+
+                for name, async_result in zip(added, results):
+                    try:
+                        data, _metadata = async_result.get()
+                    except kazoo.client.NoNodeError:
+                        continue
+                    endpoints.add(name, data.decode())
 
-    @zkwatchers.ExistingDataWatch(zkclient, discovery_state_node)
-    @utils.exit_on_unhandled
-    def _watch_discovery_state(data, _stat, event):
-        """Watch discovery state for given server."""
-        if (data is None or
-                (event is not None and event.type == 'DELETED')):
-            # The node is deleted
-            state.pop(server, None)
-            return False
-        else:
-            # Reestablish the watch.
-            # TODO: need to remember change it to json once zkutils is modified
-            #       to store json rather than yaml.
-            state[server] = yaml.load(data)
             return True
 
+    def match(self, proid, pattern):
+        """List the (name, hostport) of the endpoints matching a glob."""
+        with self._lock:
+            endpoints = self.proids.get(proid)
+            if endpoints is None:
+                return []
+            return list(endpoints.match(pattern))
+
+
+class _DiscoveryState(object):
+    """Lazily fetched server port states.
+
+    The state of a server is read the first time it is needed, with a
+    one-shot watch which invalidates it on change, so that only the servers
+    being queried are watched.
+
+    Every invalidation bumps the generation of the server, a state read is
+    only kept if its server was not invalidated while it was being read.
+    """
+
+    def __init__(self, zkclient):
+        self.zkclient = zkclient
+        self.servers = {}
+        self.generations = collections.Counter()
+        self._lock = threading.Lock()
+
+    def _invalidate(self, server, _event):
+        """Invalidate a server state."""
+        with self._lock:
+            self.generations[server] += 1
+            self.servers.pop(server, None)
+
+    def get(self, servers):
+        """Get the port states of servers, fetching the missing ones.
+
+        :returns:
+            ``dict`` of server to port states, ``None`` for the servers
+            without state.
+        """
+        with self._lock:
+            result = {
+                server: self.servers[server]
+                for server in servers
+                if server in self.servers
+            }
+            missing = sorted(set(servers) - set(result))
+            generations = {
+                server: self.generations[server] for server in missing
+            }
+
+        results = zkutils.pipeline(
+            functools.partial(
+                self.zkclient.get_async,
+                z.path.discovery_state(server),
+                watch=functools.partial(self._invalidate, server)
+            )
+            for server in missing
+        )
+        for server, async_result in zip(missing, results):
+            try:
+                data, _metadata = async_result.get()
+                state = zkcodec.decode(data) if data else {}
+            except kazoo.client.NoNodeError:
+                state = None
+            result[server] = state
+            if state is not None:
+                with self._lock:
+                    if self.generations[server] == generations[server]:
+                        self.servers[server] = state
+
+        return result
+
 
 class API(object):
     """Treadmill Endpoint REST api."""
 
     def __init__(self):
 
-        cell_state = {}
-        ports_state = {}
+        index = None
+        ports_state = None
 
         if context.GLOBAL.cell is not None:
             zkclient = context.GLOBAL.zk.conn
-
-            @zkclient.ChildrenWatch(z.ENDPOINTS)
-            @utils.exit_on_unhandled
-            def _watch_endpoints(proids):
-                """Watch /endpoints nodes."""
-
-                current = set(cell_state.keys())
-                target = set(proids)
-
-                for proid in current - target:
-                    _LOGGER.info('Removing proid: %s', proid)
-                    cell_state.pop(proid, None)
-
-                for proid in target - current:
-                    _LOGGER.info('Adding proid: %s', proid)
-                    cell_state[proid] = {}
-                    make_endpoint_watcher(zkclient, cell_state, proid)
-
-                return True
-
-            @zkclient.ChildrenWatch(z.DISCOVERY_STATE)
-            @utils.exit_on_unhandled
-            def _watch_discovery_state(servers):
-                """Watch discovery state."""
-                current = set(ports_state.keys())
-                target = set(servers)
-
-                for server in current - target:
-                    _LOGGER.info('Removing server state: %s', server)
-                    ports_state.pop(server, None)
-
-                for server in target - current:
-                    _LOGGER.info('Adding server state: %s', server)
-                    ports_state[server] = {}
-                    make_discovery_state_watcher(zkclient, ports_state, server)
-
-                return True
+            index = _EndpointIndex(zkclient)
+            index.start()
+            ports_state = _DiscoveryState(zkclient)
 
         def _list(pattern, proto, endpoint):
             """List endpoints state."""
@@ -145,19 +260,22 @@ class API(object):
                           match, proto, endpoint)
             full_pattern = ':'.join([match, proto, endpoint])
 
-            endpoints = cell_state.get(proid, {})
-            _LOGGER.debug('endpoints: %r', endpoints)
+            if index is None:
+                return []
+
+            endpoints = index.match(proid, full_pattern)
+            states = ports_state.get(
+                set(hostport.split(':')[0] for _name, hostport in endpoints)
+            )
 
             filtered = []
-            for name, hostport in six.viewitems(endpoints.copy()):
-                if not fnmatch.fnmatch(name, full_pattern):
-                    continue
+            for name, hostport in endpoints:
                 appname, proto, endpoint = name.split(':')
                 host, port = hostport.split(':')
                 port = int(port)
                 try:
-                    state = bool(ports_state[host][port])
-                except KeyError:
+                    state = bool(states[host][port])
+                except (KeyError, TypeError):
                     _LOGGER.exception('not found: %s:%d', host, port)
                     state = None
 
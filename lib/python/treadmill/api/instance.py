@@ -9,6 +9,9 @@ from __future__ import unicode_literals
 import fnmatch
 import logging
 
+import jsonschema
+from ldap3.core import exceptions as ldap_exceptions
+
 from treadmill import admin
 from treadmill import context
 from treadmill import exc
@@ -31,6 +34,17 @@ _TOTAL_SCHEDULED_QUOTA = 50000
 
 _PROID_SCHEDULED_QUOTA = 10000
 
+# Errors of a single application, reported in the bulk create results. Other
+# errors (e.g. Zookeeper, LDAP connection) fail the whole bulk create so that
+# the caller retries it.
+_BULK_CREATE_ERRORS = (
+    exc.InvalidInputError,
+    exc.NotFoundError,
+    exc.QuotaExceededError,
+    jsonschema.exceptions.ValidationError,
+    ldap_exceptions.LDAPNoSuchObjectResult,
+)
+
 
 @schema.schema(
     {'allOf': [{'$ref': 'instance.json#/resource'},
@@ -40,23 +54,27 @@ def _validate(rsrc):
     """Validate instance manifest."""
     memory_mb = utils.megabytes(rsrc['memory'])
     if memory_mb < 100:
-        raise exc.TreadmillError(
+        raise exc.InvalidInputError(
+            __name__,
             'memory size should be larger than or equal to 100M')
 
     disk_mb = utils.megabytes(rsrc['disk'])
     if disk_mb < 100:
-        raise exc.TreadmillError(
+        raise exc.InvalidInputError(
+            __name__,
             'disk size should be larger than or equal to 100M')
 
 
 def _check_required_attributes(configured):
     """Check that all required attributes are populated."""
     if 'proid' not in configured:
-        raise exc.TreadmillError(
+        raise exc.InvalidInputError(
+            __name__,
             'Missing required attribute: proid')
 
     if 'environment' not in configured:
-        raise exc.TreadmillError(
+        raise exc.InvalidInputError(
+            __name__,
             'Missing required attribute: environment')
 
 
@@ -120,31 +138,21 @@ class API(object):
                 inst = plugin.remove_attributes(inst)
             return inst
 
-        @schema.schema(
-            {'$ref': 'app.json#/resource_id'},
-            {'allOf': [{'$ref': 'instance.json#/resource'},
-                       {'$ref': 'instance.json#/verbs/create'}]},
-            count={'type': 'integer', 'minimum': 1, 'maximum': 1000},
-            created_by={'anyOf': [
-                {'type': 'null'},
-                {'$ref': 'common.json#/user'},
-            ]}
-        )
-        def create(rsrc_id, rsrc, count=1, created_by=None):
-            """Create (configure) instance."""
-            _LOGGER.info('create: count = %s, %s %r, created_by = %s',
-                         count, rsrc_id, rsrc, created_by)
+        def _create(rsrc_id, rsrc, count, created_by, scheduled_stats):
+            """Create (configure) instance, within the scheduled quotas.
 
-            # Check scheduled quota.
+            scheduled_stats is updated with the created instances.
+            """
             zkclient = context.GLOBAL.zk.conn
-            scheduled_stats = masterapi.get_scheduled_stats(zkclient)
 
+            # Check scheduled quota.
             total_apps = sum(scheduled_stats.values())
             if total_apps + count > _TOTAL_SCHEDULED_QUOTA:
                 raise exc.QuotaExceededError(
                     'Total scheduled apps quota exceeded.')
 
-            proid_apps = scheduled_stats.get(rsrc_id[:rsrc_id.find('.')], 0)
+            proid = rsrc_id[:rsrc_id.find('.')]
+            proid_apps = scheduled_stats.get(proid, 0)
             if proid_apps + count > _PROID_SCHEDULED_QUOTA:
                 raise exc.QuotaExceededError(
                     'Proid scheduled apps quota exceeded.')
@@ -176,8 +184,60 @@ class API(object):
             scheduled = masterapi.create_apps(
                 zkclient, rsrc_id, configured, count, created_by
             )
+            scheduled_stats[proid] = proid_apps + len(scheduled)
             return scheduled
 
+        @schema.schema(
+            {'$ref': 'app.json#/resource_id'},
+            {'allOf': [{'$ref': 'instance.json#/resource'},
+                       {'$ref': 'instance.json#/verbs/create'}]},
+            count={'type': 'integer', 'minimum': 1, 'maximum': 1000},
+            created_by={'anyOf': [
+                {'type': 'null'},
+                {'$ref': 'common.json#/user'},
+            ]}
+        )
+        def create(rsrc_id, rsrc, count=1, created_by=None):
+            """Create (configure) instance."""
+            _LOGGER.info('create: count = %s, %s %r, created_by = %s',
+                         count, rsrc_id, rsrc, created_by)
+
+            scheduled_stats = masterapi.get_scheduled_stats(
+                context.GLOBAL.zk.conn
+            )
+            return _create(rsrc_id, rsrc, count, created_by, scheduled_stats)
+
+        @schema.schema(
+            {'type': 'array',
+             'items': {'$ref': 'instance.json#/verbs/bulk_create'},
+             'minItems': 1},
+            created_by={'anyOf': [
+                {'type': 'null'},
+                {'$ref': 'common.json#/user'},
+            ]}
+        )
+        def bulk_create(creates, created_by=None):
+            """Bulk create instances of configured applications."""
+            _LOGGER.info('create: %r, created_by = %s', creates, created_by)
+
+            scheduled_stats = masterapi.get_scheduled_stats(
+                context.GLOBAL.zk.conn
+            )
+
+            def _process(rsrc):
+                rsrc_id = rsrc['_id']
+                try:
+                    instances = _create(
+                        rsrc_id, {}, rsrc.get('count', 1), created_by,
+                        scheduled_stats
+                    )
+                    return {'_id': rsrc_id, 'instances': instances}
+                except _BULK_CREATE_ERRORS as err:
+                    return {'_error': {'_id': rsrc_id,
+                                       'why': str(err)}}
+
+            return [_process(rsrc) for rsrc in creates]
+
         @schema.schema(
             {'$ref': 'instance.json#/resource_id'},
             {'allOf': [{'$ref': 'instance.json#/verbs/update'}]}
@@ -254,6 +314,7 @@ class API(object):
         self.list = _list
         self.get = get
         self.create = create
+        self.bulk_create = bulk_create
         self.update = update
         self.delete = delete
         self.bulk_update = bulk_update
@@ -6,11 +6,14 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import atexit
+import codecs
 import collections
 import errno
 import fnmatch
 import functools
 import glob
+import hashlib
 import io
 import json
 import logging
@@ -19,17 +22,38 @@ import re
 import shutil
 import tarfile
 import tempfile
+import threading
 
 import six
-from six.moves import _thread
 
 from treadmill import exc
 from treadmill import appenv
+from treadmill import dirwatch
+from treadmill import fs
 from treadmill import logcontext as lc
 from treadmill import rrdutils
+from treadmill.fs import archive as fs_archive
 
 _LOGGER = lc.ContainerAdapter(logging.getLogger(__name__))
 
+# Number of lines between two offsets of the sparse log line index.
+_LINE_INDEX_STEP = 1000
+
+# Maximum number of log files with a line index.
+_LINE_INDEX_SIZE = 256
+
+# Size of the blocks read when streaming or reading logs backwards.
+_READ_BLOCK_SIZE = 64 * 1024
+
+_LINE_INDEXES = collections.OrderedDict()
+_LINE_INDEXES_LOCK = threading.Lock()
+
+# Maximum size of the members extracted from archives kept on disk.
+_ARCHIVE_CACHE_SIZE = 256 * 1024 * 1024
+
+_ARCHIVE_CACHE = None
+_ARCHIVE_CACHE_LOCK = threading.Lock()
+
 
 def _app_path(tm_env, instance, uniq):
     """Return application path given app env, app id and uniq."""
@@ -43,14 +67,73 @@ def _archive_path(tm_env, archive_type, instance, uniq):
                         (instance.replace('#', '-'), uniq, archive_type))
 
 
-def _temp_dir():
-    """Construct an empty temporary dir for each thread and return the path."""
-    dirname = os.path.join(tempfile.gettempdir(),
-                           'local-{}.temp'.format(_thread.get_ident()))
+class _ArchiveCache(object):
+    """Size bounded LRU store of the members extracted from archives.
+
+    Members are extracted under <root>/<archive key>/<member name>, the
+    archive key changes whenever the archive is replaced. The root is a new
+    private directory, created in ``parent_dir`` (the system temporary
+    directory by default) and removed by :func:`close`.
+    """
 
-    shutil.rmtree(dirname, True)
-    os.mkdir(dirname, 0o755)
-    return dirname
+    def __init__(self, max_size, parent_dir=None):
+        self.root = tempfile.mkdtemp(prefix='local-archive-cache-',
+                                     dir=parent_dir)
+        self.max_size = max_size
+        self.size = 0
+        self._files = collections.OrderedDict()
+
+    def close(self):
+        """Remove the extracted members."""
+        with _ARCHIVE_CACHE_LOCK:
+            shutil.rmtree(self.root, True)
+            self._files.clear()
+            self.size = 0
+
+    def archive_dir(self, arch, arch_stat):
+        """Directory of the extracted members of an archive."""
+        key = '{}:{}:{}:{}'.format(arch, arch_stat.st_ino,
+                                   arch_stat.st_mtime, arch_stat.st_size)
+        return os.path.join(
+            self.root, hashlib.sha1(key.encode()).hexdigest()
+        )
+
+    def get(self, path):
+        """Check if a member is cached, mark it as recently used."""
+        with _ARCHIVE_CACHE_LOCK:
+            if path not in self._files:
+                return False
+            self._files[path] = self._files.pop(path)
+            return True
+
+    def add(self, path):
+        """Track an extracted member, evict least recently used ones."""
+        size = os.stat(path).st_size
+        with _ARCHIVE_CACHE_LOCK:
+            self.size -= self._files.pop(path, 0)
+            self._files[path] = size
+            self.size += size
+
+            # Always keep the newest member, even if too big.
+            while self.size > self.max_size and len(self._files) > 1:
+                evicted, evicted_size = self._files.popitem(last=False)
+                self.size -= evicted_size
+                _LOGGER.info('Evict extracted member %s', evicted)
+                try:
+                    os.unlink(evicted)
+                except OSError as err:
+                    if err.errno != errno.ENOENT:
+                        raise
+
+
+def _archive_cache():
+    """Get the (lazily created) archive member cache."""
+    global _ARCHIVE_CACHE  # pylint: disable=W0603
+    with _ARCHIVE_CACHE_LOCK:
+        if _ARCHIVE_CACHE is None:
+            _ARCHIVE_CACHE = _ArchiveCache(_ARCHIVE_CACHE_SIZE)
+            atexit.register(_ARCHIVE_CACHE.close)
+    return _ARCHIVE_CACHE
 
 
 def _get_file(file_=None,
@@ -93,32 +176,70 @@ def _arch_log_filter(arch_members, rel_log_dir=None):
                     os.path.basename(f.name), '@*.s')))]
 
 
+def _extract_indexed_member(arch, entry, path):
+    """Extract a member of an indexed archive, decompressing only it."""
+    fs.mkdir_safe(os.path.dirname(path))
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path),
+                                     prefix='.tmp',
+                                     delete=False) as extracted:
+        for chunk in fs_archive.read_member(arch, entry):
+            extracted.write(chunk)
+    os.rename(extracted.name, path)
+
+
 def _extract_archive(arch, extract_filter=None):
     """Extract the members filtered by 'extract_filter' from archive
     'arch' and return the path to the extracted files.
+
+    Extracted members are cached, archives with an index are not scanned and
+    only the requested members are decompressed.
     """
 
     _LOGGER.info('Extract archive {}'.format(arch))
-    if not os.path.exists(arch):
-        raise exc.LocalFileNotFoundError('{} cannot be found.'.format(arch))
+    try:
+        arch_stat = os.stat(arch)
+    except OSError as err:
+        if err.errno == errno.ENOENT:
+            raise exc.LocalFileNotFoundError(
+                '{} cannot be found.'.format(arch))
+        raise
+
+    cache = _archive_cache()
+    arch_dir = cache.archive_dir(arch, arch_stat)
+
+    index = fs_archive.read_index(arch)
+    if index is not None:
+        members = sorted(six.itervalues(index))
+        to_extract = extract_filter(members) if extract_filter else members
+        for entry in to_extract:
+            path = os.path.join(arch_dir, entry.name)
+            if not cache.get(path):
+                _extract_indexed_member(arch, entry, path)
+                cache.add(path)
+
+        return [os.path.join(arch_dir, f.name) for f in to_extract]
 
     try:
-        # extract the req. paths from the archive to a temp directory
-        temp_dir = _temp_dir()
         with tarfile.open(arch) as arch_:
             if extract_filter:
                 to_extract = extract_filter(arch_)
             else:
                 to_extract = arch_.getmembers()
 
-            arch_.extractall(path=temp_dir, members=to_extract)
+            for member in to_extract:
+                path = os.path.join(arch_dir, member.name)
+                if member.isdir():
+                    fs.mkdir_safe(path)
+                elif not cache.get(path):
+                    arch_.extract(member, path=arch_dir)
+                    cache.add(path)
 
     except KeyError as err:
         _LOGGER.error(err)
         raise exc.LocalFileNotFoundError(
             'Error while extracting {}: {}'.format(arch, err))
 
-    return [os.path.join(temp_dir, f.name) for f in to_extract]
+    return [os.path.join(arch_dir, f.name) for f in to_extract]
 
 
 def _rel_log_dir_path(logtype, component):
@@ -140,24 +261,145 @@ def _abs_log_dir_path(tm_env, instance, uniq, rel_log_dir_path):
 
 
 def _concat_files(file_lst):
-    """Concatenate the files in file_lst and return a file-like obj."""
+    """Concatenate the files in file_lst, return a generator of text chunks.
+
+    The files are streamed in blocks, nothing is buffered in memory.
+    """
     _LOGGER.info('Concatenating files: {}'.format(file_lst))
-    concatenated = io.BytesIO()
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
     for file_ in file_lst:
         # Do not abort if a file cannot be opened eg. when the oldest log
         # file is "rotated out" while this log retrieval op. is running
         try:
             with io.open(file_, 'rb') as f:
-                shutil.copyfileobj(f, concatenated)
+                for block in iter(lambda: f.read(_READ_BLOCK_SIZE), b''):
+                    chunk = decoder.decode(block)
+                    if chunk:
+                        yield chunk
         except IOError as err:
             if err.errno == errno.ENOENT:
                 _LOGGER.info('File {} cannot be opened: {}'.format(file_, err))
             else:
                 raise
 
-    concatenated.seek(0)
+    chunk = decoder.decode(b'', final=True)
+    if chunk:
+        yield chunk
 
-    return io.TextIOWrapper(concatenated, errors='ignore')
+
+class _LineIndex(object):
+    """Sparse line offset index of an (append only) log file.
+
+    Keeps the offset of every _LINE_INDEX_STEP-th line, the index is extended
+    lazily, only as far as the requested lines.
+    """
+    __slots__ = (
+        'inode',
+        'offsets',
+        'lines',
+        'size',
+    )
+
+    def __init__(self, inode):
+        self.inode = inode
+        # offsets[i] is the offset of line i * _LINE_INDEX_STEP.
+        self.offsets = [0]
+        # Number of complete lines and bytes indexed so far.
+        self.lines = 0
+        self.size = 0
+
+    def seek_line(self, log, line):
+        """Move the file position to the closest indexed line before line.
+
+        :returns:
+            The number of the line at the new file position.
+        """
+        log.seek(self.size)
+        while self.lines < line:
+            data = log.readline()
+            if not data.endswith(b'\n'):
+                # EOF or partial last line (still being written).
+                break
+            self.size += len(data)
+            self.lines += 1
+            if self.lines % _LINE_INDEX_STEP == 0:
+                self.offsets.append(self.size)
+
+        idx = min(line // _LINE_INDEX_STEP, len(self.offsets) - 1)
+        log.seek(self.offsets[idx])
+        return idx * _LINE_INDEX_STEP
+
+
+def _line_index(log):
+    """Get the line index of an open log file."""
+    stat = os.fstat(log.fileno())
+    index = _LINE_INDEXES.pop(log.name, None)
+    if (index is None or index.inode != stat.st_ino or
+            index.size > stat.st_size):
+        # New, rotated or truncated file.
+        index = _LineIndex(stat.st_ino)
+
+    _LINE_INDEXES[log.name] = index
+    while len(_LINE_INDEXES) > _LINE_INDEX_SIZE:
+        _LINE_INDEXES.popitem(last=False)
+
+    return index
+
+
+def _lines(log):
+    """Iterate over the lines of a binary file, from the current position."""
+    return iter(log.readline, b'')
+
+
+def _lines_in_reverse(log):
+    """Iterate over the lines of a binary file backwards, reading blocks from
+    the end of the file.
+    """
+    log.seek(0, os.SEEK_END)
+    pos = log.tell()
+    remainder = b''
+    last_line = True
+    while pos > 0:
+        read_size = min(_READ_BLOCK_SIZE, pos)
+        pos -= read_size
+        log.seek(pos)
+        lines = (log.read(read_size) + remainder).split(b'\n')
+        # The first line of the block may be incomplete.
+        remainder = lines.pop(0)
+        for line in reversed(lines):
+            if last_line:
+                last_line = False
+                # Nothing follows the trailing newline, unless the last line
+                # is partial.
+                if line:
+                    yield line
+                continue
+            yield line + b'\n'
+
+    if not last_line:
+        yield remainder + b'\n'
+    elif remainder:
+        yield remainder
+
+
+def _read_log(log_f, start=0, limit=None, order=None):
+    """Read a fragment of a log file.
+
+    Lines are numbered from the first line of the file, or from the last line
+    if order is 'desc' (in which case the lines are returned in reverse).
+    """
+    with io.open(log_f, 'rb') as log:
+        if order == 'desc':
+            lines = _lines_in_reverse(log)
+        else:
+            with _LINE_INDEXES_LOCK:
+                start -= _line_index(log).seek_line(log, start)
+            lines = _lines(log)
+
+        return [
+            line.decode('utf-8', 'ignore')
+            for line in _fragment(lines, start, limit)
+        ]
 
 
 def _fragment(iterable, start=0, limit=None):
@@ -167,9 +409,6 @@ def _fragment(iterable, start=0, limit=None):
     The lowest index is 0 and designates the first line of the file.
     'Limit' specifies the number of lines to return.
     """
-    # TODO: Naive implementation. Needs to be rewritten to a solution with
-    # file pointer moving around etc. if it turns out that this isn't
-    # performant enough.
     if limit is not None and limit >= 0:
         try:
             fragment = collections.deque(maxlen=limit)
@@ -199,32 +438,6 @@ def _fragment(iterable, start=0, limit=None):
     return list(iterable)
 
 
-def _fragment_in_reverse(iterable, start=0, limit=None):
-    """
-    Selects a fragment of the iterable and returns the items in reverse order.
-
-    The lowest index is 0 and designates the last line of the file.
-    'Limit' specifies the number of lines to return.
-    """
-    # TODO: Naive implementation. Needs to be rewritten to a solution with
-    # file pointer moving around etc. if it turns out that this isn't
-    # performant enough.
-    maxlen = None
-    if limit is not None and limit >= 0:
-        maxlen = start + limit
-
-    fragment = collections.deque(iterable, maxlen)
-    try:
-        for _ in six.moves.range(start):
-            fragment.pop()
-    except IndexError:
-        raise exc.InvalidInputError(
-            __name__, 'Index start=%s is out of range.' % str(start))
-
-    fragment.reverse()
-    return fragment
-
-
 def mk_metrics_api(tm_env):
     """Factory to create metrics api.
     """
@@ -349,14 +562,10 @@ def mk_logapi(tm_env):
                             'Index cannot be less than 0, got: {}'.format(
                                 start))
 
-                    with io.open(log_f, 'rt', errors='ignore') as log:
-                        if order == 'desc':
-                            return _fragment_in_reverse(log, start, limit)
-
-                        return _fragment(log, start, limit)
+                    return _read_log(log_f, start, limit, order)
 
             def _get_all(log_id):
-                """Return a file-like object with all the log entries including
+                """Return a generator streaming all the log entries including
                 the rotated ones.
                 """
                 instance, uniq, logtype, component = log_id.split('/')
@@ -459,6 +668,214 @@ def mk_logapi(tm_env):
     return _LogAPI
 
 
+def _running_entry(path):
+    """Inventory entry of a running instance, given its running dir link."""
+    try:
+        app_path = os.readlink(path)
+        full_name = os.path.basename(app_path)
+        name, instance, uniq = full_name.rsplit('-', 2)
+        ctime = os.stat(app_path).st_ctime
+    except (OSError, ValueError):
+        return None
+
+    return full_name, {
+        '_id': '%s#%s/%s' % (name, instance, uniq),
+        'ctime': ctime,
+        'state': 'running',
+    }
+
+
+_FINISHED_RE = re.compile(r'''.*/        # archives dir
+                              \w+        # proid
+                              \.         # .
+                              \w+        # app
+                              -\d+       # id
+                              -\w+       # uniq
+                              .sys.tar.gz$''', re.X)
+
+
+def _finished_entry(path):
+    """Inventory entry of a finished instance, given its sys archive."""
+    if not _FINISHED_RE.match(path):
+        return None
+
+    try:
+        full_name = os.path.basename(path)[:-len('.sys.tar.gz')]
+        name, instance, uniq = full_name.rsplit('-', 2)
+        ctime = os.stat(path).st_ctime
+    except OSError:
+        return None
+
+    return full_name, {
+        '_id': '%s#%s/%s' % (name, instance, uniq),
+        'ctime': ctime,
+        'state': 'finished',
+    }
+
+
+def _service_entry(path):
+    """Inventory entry of a local service, given its service dir."""
+    try:
+        ctime = os.stat(os.path.join(path, 'log', 'data',
+                                     'current')).st_ctime
+    except OSError:
+        return None
+
+    return path, {
+        '_id': os.path.basename(path),
+        'ctime': ctime,
+        'state': 'running',
+    }
+
+
+class _Inventory(object):
+    """In-memory inventory of the running, finished and service entries of
+    the node.
+
+    The running, archives and init directories are scanned once and then
+    kept current by a dirwatch, so listing costs no file system access.
+    Directories that cannot be watched are scanned on every list.
+    """
+
+    def __init__(self, tm_env):
+        self._tm_env = tm_env
+        self._lock = threading.Lock()
+        self._started = False
+        self._watcher = None
+        # category -> (directory, glob pattern, entry function)
+        self._categories = {}
+        # category -> {path: entry}, for the watched categories.
+        self._entries = {}
+        # directory -> category
+        self._watched = {}
+
+    def _start(self):
+        """Scan and watch the inventory directories."""
+        tm_env = self._tm_env()
+        self._categories = {
+            'running': (tm_env.running_dir, '*', _running_entry),
+            'finished': (tm_env.archives_dir, '*.sys.tar.gz',
+                         _finished_entry),
+            'services': (tm_env.init_dir, '*', None),
+        }
+
+        self._watcher = dirwatch.DirWatcher(coalesce=True)
+        self._watcher.on_created = self._on_changed
+        self._watcher.on_modified = self._on_changed
+        self._watcher.on_deleted = self._on_deleted
+        self._watcher.on_overflow = self._on_overflow
+
+        for category, (directory, _pattern, _func) in six.iteritems(
+                self._categories):
+            try:
+                # Watch before the scan so that no change is lost.
+                self._watcher.add_dir(directory)
+            except OSError as err:
+                _LOGGER.warning('Unable to watch %s: %s', directory, err)
+                continue
+
+            self._watched[directory] = category
+            self._entries[category] = {
+                path: entry
+                for path, entry in self._scan(category)
+            }
+
+        if self._watched:
+            thread = threading.Thread(target=self._run)
+            thread.daemon = True
+            thread.start()
+
+    def _scan(self, category):
+        """Scan a category directory."""
+        directory, pattern, func = self._categories[category]
+        for path in glob.glob(os.path.join(directory, pattern)):
+            # Services are tracked by directory, see list().
+            entry = func(path) if func else (path, None)
+            if entry is not None:
+                yield path, entry
+
+    def _run(self):
+        """Process the dirwatch events."""
+        while True:
+            if self._watcher.wait_for_events():
+                self._watcher.process_events()
+
+    def _on_changed(self, path):
+        """Update the inventory entry of a created/modified path."""
+        category = self._watched.get(os.path.dirname(path))
+        if category is None:
+            return
+
+        _directory, pattern, func = self._categories[category]
+        if not fnmatch.fnmatch(os.path.basename(path), pattern):
+            return
+
+        entry = func(path) if func else (path, None)
+        with self._lock:
+            if entry is None:
+                self._entries[category].pop(path, None)
+            else:
+                self._entries[category][path] = entry
+
+    def _on_deleted(self, path):
+        """Remove the inventory entry of a deleted path."""
+        category = self._watched.get(os.path.dirname(path))
+        if category is None:
+            return
+
+        with self._lock:
+            self._entries[category].pop(path, None)
+
+    def _on_overflow(self, directory):
+        """Rescan a directory whose events were lost."""
+        category = self._watched.get(directory)
+        if category is None:
+            return
+
+        entries = {
+            path: entry
+            for path, entry in self._scan(category)
+        }
+        with self._lock:
+            self._entries[category] = entries
+
+    def _get(self, category):
+        """Get the entries of a category."""
+        if category in self._entries:
+            with self._lock:
+                entries = list(six.itervalues(self._entries[category]))
+        else:
+            entries = [entry for _path, entry in self._scan(category)]
+
+        if category == 'services':
+            # The ctime of a service is the one of its log, which changes with
+            # every write; services are few, stat them on every list.
+            entries = [
+                entry for entry in (
+                    _service_entry(path) for path, _ in entries
+                )
+                if entry is not None
+            ]
+
+        return entries
+
+    def list(self, state=None, inc_svc=False):
+        """List the inventory entries."""
+        with self._lock:
+            if not self._started:
+                self._started = True
+                self._start()
+
+        result = {}
+        if state is None or state == 'running':
+            result.update(self._get('running'))
+            if inc_svc:
+                result.update(self._get('services'))
+        if state is None or state == 'finished':
+            result.update(self._get('finished'))
+        return list(six.itervalues(result))
+
+
 class API(object):
     """Treadmill Local REST api.
     """
@@ -479,88 +896,20 @@ class API(object):
 
             return self._tm_env
 
-        def _list_running():
-            """List all running instances.
-            """
-            result = {}
-            running_glob = os.path.join(tm_env().running_dir, '*')
-            for running in glob.glob(running_glob):
-                try:
-                    app_path = os.readlink(running)
-                    full_name = os.path.basename(app_path)
-                    name, instance, uniq = full_name.rsplit('-', 2)
-                    ctime = os.stat(app_path).st_ctime
-                    result[full_name] = {
-                        '_id': '%s#%s/%s' % (name, instance, uniq),
-                        'ctime': ctime,
-                        'state': 'running',
-                    }
-                except OSError as oserr:
-                    if oserr.errno == errno.ENOENT:
-                        continue
-
-            return result
-
-        def _list_finished():
-            """List all finished instances.
-            """
-            result = {}
-            archive_glob = os.path.join(tm_env().archives_dir, '*.sys.tar.gz')
-            pattern = re.compile(r'''.*/        # archives dir
-                                     \w+        # proid
-                                     \.         # .
-                                     \w+        # app
-                                     -\d+       # id
-                                     -\w+       # uniq
-                                     .sys.tar.gz''', re.X)
-
-            for archive in [f for f in glob.glob(archive_glob)
-                            if pattern.match(f)]:
-                try:
-                    full_name = os.path.basename(archive)[:-len('.sys.tar.gz')]
-                    name, instance, uniq = full_name.rsplit('-', 2)
-                    ctime = os.stat(archive).st_ctime
-                    result[full_name] = {
-                        '_id': '%s#%s/%s' % (name, instance, uniq),
-                        'ctime': ctime,
-                        'state': 'finished',
-                    }
-                except OSError as oserr:
-                    if oserr.errno == errno.ENOENT:
-                        continue
-            return result
-
-        def _list_services():
-            """List the local services.
-            """
-            result = {}
-            services_glob = os.path.join(tm_env().init_dir, '*')
-            for svc in glob.glob(services_glob):
-                try:
-                    svc_name = os.path.basename(svc)
-                    ctime = os.stat(os.path.join(svc, 'log', 'data',
-                                                 'current')).st_ctime
-                    result[svc] = {
-                        '_id': svc_name,
-                        'ctime': ctime,
-                        'state': 'running',
-                    }
-                except OSError as oserr:
-                    if oserr.errno == errno.ENOENT:
-                        continue
-            return result
-
-        def _list(state=None, inc_svc=False):
+        inventory = _Inventory(tm_env)
+
+        def _list(state=None, inc_svc=False, start=0, limit=None):
             """List all instances on the node.
+
+            Instances are ordered by ctime, start and limit select a page.
             """
-            result = {}
-            if state is None or state == 'running':
-                result.update(_list_running())
-                if inc_svc:
-                    result.update(_list_services())
-            if state is None or state == 'finished':
-                result.update(_list_finished())
-            return list(six.itervalues(result))
+            result = sorted(
+                inventory.list(state, inc_svc),
+                key=lambda item: (item['ctime'], item['_id'])
+            )
+            if limit is not None and limit >= 0:
+                return result[start:start + limit]
+            return result[start:]
 
         # TODO: implementation of this is placeholder, need to think about
         #       more relevant info.
@@ -582,10 +931,16 @@ class API(object):
                 if uniq == 'running' or err.errno != errno.ENOENT:
                     raise
 
-                fname = _archive_path(tm_env, 'sys', instance, uniq)
-                with tarfile.open(fname) as archive:
-                    member = archive.extractfile('state.json')
-                    return json.loads(member.read().decode())
+                extracted = _extract_archive(
+                    _archive_path(tm_env, 'sys', instance, uniq),
+                    extract_filter=functools.partial(_arch_file_filter,
+                                                     fname='state.json'))
+                if not extracted:
+                    raise exc.LocalFileNotFoundError(
+                        'state.json cannot be found.')
+
+                with io.open(extracted[0]) as f:
+                    return json.load(f)
 
         class _ArchiveAPI(object):
             """Access to archive files.
@@ -9,15 +9,17 @@ from __future__ import absolute_import
 import logging
 
 import json
+import functools
 import os
 import re
 import zlib
 import sqlite3
 import tempfile
+import threading
 import fnmatch
-import collections
 import time
 
+import kazoo
 import six
 
 from treadmill import admin
@@ -25,6 +27,7 @@ from treadmill import context
 from treadmill import schema
 from treadmill import utils
 from treadmill import yamlwrapper as yaml
+from treadmill import zkcodec
 from treadmill import zknamespace as z
 from treadmill import zkutils
 
@@ -58,13 +61,19 @@ def watch_finished(zkclient, cell_state):
         current = set(cell_state.finished)
         target = set(finished)
 
-        for instance in target - current:
-            finished_data = zkutils.get_default(
-                zkclient,
-                z.path.finished(instance),
-                {}
+        added = sorted(target - current)
+        results = zkutils.pipeline(
+            functools.partial(zkclient.get_async, z.path.finished(instance))
+            for instance in added
+        )
+        for instance, async_result in zip(added, results):
+            try:
+                data, _stat = async_result.get()
+            except kazoo.client.NoNodeError:
+                data = None
+            cell_state.finished[instance] = (
+                zkcodec.decode(data) if data else {}
             )
-            cell_state.finished[instance] = finished_data
 
         for instance in current - target:
             del cell_state.finished[instance]
@@ -114,50 +123,38 @@ def watch_placement(zkclient, cell_state):
 def watch_finished_history(zkclient, cell_state):
     """Watch finished historical snapshots."""
 
-    loaded_snapshots = {}
+    loaded_snapshots = set()
 
     @zkclient.ChildrenWatch(z.FINISHED_HISTORY)
     @utils.exit_on_unhandled
     def _watch_finished_snapshots(snapshots):
         """Watch /finished.history nodes."""
         start_time = time.time()
-        finished_history = cell_state.finished_history.copy()
+        finished_history = cell_state.finished_history
 
-        for db_node in sorted(set(loaded_snapshots) - set(snapshots)):
+        for db_node in sorted(loaded_snapshots - set(snapshots)):
             _LOGGER.info('Unloading snapshot: %s', db_node)
-            for instance in loaded_snapshots.pop(db_node):
-                finished_history.pop(instance, None)
+            finished_history.unload(db_node)
+            loaded_snapshots.discard(db_node)
 
-        for db_node in sorted(set(snapshots) - set(loaded_snapshots)):
+        for db_node in sorted(set(snapshots) - loaded_snapshots):
             _LOGGER.info('Loading snapshot: %s', db_node)
             loading_start_time = time.time()
-            loaded_snapshots[db_node] = []
 
-            data, _stat = zkclient.get(z.path.finished_history(db_node))
-
-            with tempfile.NamedTemporaryFile(delete=False, mode='wb') as f:
-                f.write(zlib.decompress(data))
             try:
-                conn = sqlite3.connect(f.name)
-                cur = conn.cursor()
-                sql = 'SELECT name, data FROM finished ORDER BY timestamp'
-                for row in cur.execute(sql):
-                    instance, data = row
-                    if data:
-                        data = yaml.load(data)
-                    finished_history[instance] = data
-                    loaded_snapshots[db_node].append(instance)
-                conn.close()
-            finally:
-                os.unlink(f.name)
+                data, _stat = zkclient.get(z.path.finished_history(db_node))
+            except kazoo.client.NoNodeError:
+                continue
+
+            finished_history.load(db_node, zlib.decompress(data))
+            loaded_snapshots.add(db_node)
 
             _LOGGER.debug('Loading time: %s', time.time() - loading_start_time)
 
-        cell_state.finished_history = finished_history
         _LOGGER.debug(
             'Loaded snapshots: %d, finished: %d, finished history: %d, '
             'time: %s', len(loaded_snapshots), len(cell_state.finished),
-            len(cell_state.finished_history), time.time() - start_time
+            len(finished_history), time.time() - start_time
         )
 
         return True
@@ -165,6 +162,151 @@ def watch_finished_history(zkclient, cell_state):
     _LOGGER.info('Loaded finished snapshots.')
 
 
+def _glob(pattern):
+    """Convert a fnmatch pattern into a SQLite GLOB pattern."""
+    return pattern.replace('[!', '[^')
+
+
+def _decode_finished(data):
+    """Decode the finished data of a snapshot row."""
+    if not data:
+        return None
+    if isinstance(data, six.text_type):
+        data = data.encode()
+    return zkcodec.decode(data)
+
+
+class FinishedHistory(object):
+    """Index of the finished history snapshots.
+
+    Snapshot rows are copied into a private temporary SQLite database, which
+    SQLite spills to disk, indexed by name and time, so that memory does not
+    grow with the history. Rows are decoded only when queried.
+
+    A single connection is shared by all threads, access is serialized.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE finished (
+            name TEXT PRIMARY KEY,
+            snapshot TEXT NOT NULL,
+            timestamp REAL,
+            host TEXT,
+            data TEXT
+        );
+        CREATE INDEX finished_timestamp_idx ON finished (timestamp);
+        CREATE INDEX finished_snapshot_idx ON finished (snapshot);
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Empty name: private on-disk database, deleted when closed.
+        self._conn = sqlite3.connect('', check_same_thread=False)
+        self._conn.executescript(self._SCHEMA)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        """Close (and delete) the index."""
+        with self._lock:
+            self._conn.close()
+
+    def load(self, db_node, db_data):
+        """Load a snapshot database.
+
+        :param ``str`` db_node:
+            Name of the snapshot node.
+        :param ``bytes`` db_data:
+            Content of the (uncompressed) snapshot database.
+        """
+        with tempfile.NamedTemporaryFile(delete=False, mode='wb') as f:
+            f.write(db_data)
+
+        rows = []
+        try:
+            conn = sqlite3.connect(f.name)
+            try:
+                for name, timestamp, data in conn.execute(
+                        'SELECT name, timestamp, data FROM finished '
+                        'ORDER BY timestamp'):
+                    try:
+                        host = (_decode_finished(data) or {}).get('host')
+                    except (yaml.YAMLError, ValueError, AttributeError):
+                        _LOGGER.warning('Invalid finished data: %s', name)
+                        host = None
+                    rows.append((name, db_node, timestamp, host, data))
+            finally:
+                conn.close()
+        finally:
+            os.unlink(f.name)
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO finished '
+                '(name, snapshot, timestamp, host, data) '
+                'VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+            self._update_count()
+
+    def unload(self, db_node):
+        """Unload the instances of a snapshot."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                'DELETE FROM finished WHERE snapshot = ?', (db_node,)
+            )
+            self._update_count()
+
+    def _update_count(self):
+        (self._count,) = self._conn.execute(
+            'SELECT COUNT(*) FROM finished'
+        ).fetchone()
+
+    def get(self, name):
+        """Get the finished data of an instance, None if not found."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM finished WHERE name = ?', (name,)
+            ).fetchone()
+        if row is None:
+            return None
+        return _decode_finished(row[0])
+
+    def search(self, pattern, limit=None, hosts=None):
+        """Search the instances matching a fnmatch pattern, latest first.
+
+        :param ``str`` pattern:
+            Instance name pattern.
+        :param ``int`` limit:
+            Maximum number of instances returned.
+        :param hosts:
+            If not None, only return instances which finished on these hosts.
+        :returns:
+            ``list`` of ``(name, data)``.
+        """
+        sql = (
+            'SELECT name, host, data FROM finished WHERE name GLOB ? '
+            'ORDER BY timestamp DESC'
+        )
+        args = (_glob(pattern),)
+        if limit and hosts is None:
+            sql += ' LIMIT ?'
+            args += (limit,)
+
+        found = []
+        with self._lock:
+            for name, host, data in self._conn.execute(sql, args):
+                if hosts is not None and host not in hosts:
+                    continue
+                found.append((name, data))
+                if limit and len(found) >= limit:
+                    break
+
+        return [(name, _decode_finished(data)) for name, data in found]
+
+
 class CellState(object):
     """Cell state."""
 
@@ -180,12 +322,14 @@ class CellState(object):
         self.running = []
         self.placement = {}
         self.finished = {}
-        self.finished_history = collections.OrderedDict()
+        self.finished_history = FinishedHistory()
         self.watches = set()
 
-    def get_finished(self, rsrc_id):
+    def get_finished(self, rsrc_id, data=None):
         """Get finished state if present."""
-        data = self.finished.get(rsrc_id) or self.finished_history.get(rsrc_id)
+        if data is None:
+            data = (self.finished.get(rsrc_id) or
+                    self.finished_history.get(rsrc_id))
         if not data:
             return None
 
@@ -270,21 +414,22 @@ class API(object):
             if finished:
                 filtered_finished = {}
 
-                def _filter_finished(iterable, limit=None):
-                    added = 0
-                    for name in iterable:
-                        if not _match(name):
-                            continue
-                        if limit and added >= limit:
-                            break
-                        item = cell_state.get_finished(name)
-                        if item and (hosts is None or item['host'] in hosts):
-                            filtered_finished[name] = item
-                            added += 1
-
-                _filter_finished(six.viewkeys(cell_state.finished.copy()))
-                _filter_finished(reversed(cell_state.finished_history),
-                                 self._FINISHED_LIMIT)
+                for name in six.viewkeys(cell_state.finished.copy()):
+                    if not _match(name):
+                        continue
+                    item = cell_state.get_finished(name)
+                    if item and (hosts is None or item['host'] in hosts):
+                        filtered_finished[name] = item
+
+                # Pattern, hosts and limit are pushed down to the index.
+                for name, data in cell_state.finished_history.search(
+                        match, self._FINISHED_LIMIT,
+                        hosts=None if hosts is None else set(hosts)):
+                    if name in filtered_finished:
+                        continue
+                    item = cell_state.get_finished(name, data)
+                    if item:
+                        filtered_finished[name] = item
 
                 filtered.extend(sorted(six.viewvalues(filtered_finished),
                                        key=lambda item: float(item['when']),
@@ -22,6 +22,10 @@ Upon change, appcfgmgr will do the following:
  - for each app that is not in the scheduled list, remove the symlink
  - trigger svscanctl -an, which will stop all apps that are no longer scheduled
    to run and will start all the new apps.
+
+New instances are configured in batches, by a bounded pool of threads, and
+the supervisor is refreshed once per batch. The latency of every stage is
+recorded in histograms, logged after each batch.
 """
 
 from __future__ import absolute_import
@@ -29,12 +33,17 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import bisect
 import errno
 import glob
 import logging
 import os
+import threading
+import time
 import traceback
 
+from concurrent import futures
+
 import six
 
 from treadmill import appenv
@@ -55,21 +64,107 @@ _LOGGER = lc.Adapter(logging.getLogger(__name__))
 _HEARTBEAT_SEC = 30
 _WATCHDOG_TIMEOUT_SEC = _HEARTBEAT_SEC * 4
 
+# Maximum number of events (instances) processed in a batch.
+_MAX_BATCH = 64
+
+# Number of instances configured concurrently.
+_CONFIGURE_WORKERS = 8
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+_LATENCY_BUCKETS = (
+    0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60
+)
+
+_STAGES = (
+    # Time spent waiting for a configure worker.
+    'queue',
+    # Container directory setup (appcfg.configure).
+    'configure',
+    # Creation of the running link.
+    'link',
+    # Supervisor refresh.
+    'refresh',
+    # Whole batch.
+    'batch',
+)
+
+
+class LatencyHistogram(object):
+    """Histogram of latencies."""
+
+    __slots__ = (
+        'counts',
+        'count',
+        'total',
+        'max',
+        '_lock',
+    )
+
+    def __init__(self):
+        self.counts = [0] * (len(_LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        """Record a latency, in seconds."""
+        idx = bisect.bisect_left(_LATENCY_BUCKETS, latency)
+        with self._lock:
+            self.counts[idx] += 1
+            self.count += 1
+            self.total += latency
+            self.max = max(self.max, latency)
+
+    def buckets(self):
+        """Return the (upper bound, count) of the buckets.
+
+        The upper bound of the last bucket is ``None``.
+        """
+        return list(zip(_LATENCY_BUCKETS + (None,), self.counts))
+
+    def __str__(self):
+        if not self.count:
+            return 'n=0'
+
+        return 'n=%d avg=%.3fs max=%.3fs %s' % (
+            self.count,
+            self.total / self.count,
+            self.max,
+            ' '.join(
+                '%s:%d' % (
+                    '<=%gs' % bound if bound is not None else 'more',
+                    count
+                )
+                for bound, count in self.buckets() if count
+            )
+        )
+
 
 class AppCfgMgr(object):
     """Configure apps from the cache onto the node."""
 
     __slots__ = (
         'tm_env',
+        'latencies',
         '_is_active',
         '_runtime',
+        '_pending',
+        '_refresh',
     )
 
     def __init__(self, root, runtime):
         _LOGGER.info('init appcfgmgr: %s, %s', root, runtime)
         self.tm_env = appenv.AppEnvironment(root=root)
+        self.latencies = {
+            stage: LatencyHistogram() for stage in _STAGES
+        }
         self._is_active = False
         self._runtime = runtime
+        # Instances to configure in the next batch.
+        self._pending = []
+        # Whether the supervisor needs a refresh at the end of the batch.
+        self._refresh = False
 
     @property
     def name(self):
@@ -100,7 +195,8 @@ class AppCfgMgr(object):
 
         while True:
             if watch.wait_for_events(timeout=_HEARTBEAT_SEC):
-                watch.process_events(max_events=5)
+                watch.process_events(max_events=_MAX_BATCH)
+                self._process_batch()
             else:
                 if self._is_active is True:
                     cached_files = glob.glob(
@@ -184,8 +280,9 @@ class AppCfgMgr(object):
                             instance_name)
             return
 
-        elif self._configure(instance_name):
-            self._refresh_supervisor()
+        elif instance_name not in self._pending:
+            # Configured with the rest of the batch.
+            self._pending.append(instance_name)
 
     def _on_deleted(self, event_file):
         """Handle removal event of a cached manifest: terminate an instance.
@@ -212,15 +309,37 @@ class AppCfgMgr(object):
             return
 
         else:
+            if instance_name in self._pending:
+                # Deleted before the batch configured it.
+                self._pending.remove(instance_name)
             self._terminate(instance_name)
+            self._refresh = True
+
+    def _process_batch(self):
+        """Configure the instances of the processed events and refresh the
+        supervisor once.
+        """
+        pending, self._pending = self._pending, []
+        refresh, self._refresh = self._refresh, False
+        if not pending and not refresh:
+            return
+
+        start = time.time()
+        configured = self._configure_batch(pending)
+        if refresh or any(six.itervalues(configured)):
             self._refresh_supervisor()
 
+        self.latencies['batch'].record(time.time() - start)
+        self._log_latencies()
+
     def _first_sync(self):
         """Bring the appcfgmgr into active mode and do a first sync.
         """
         if self._is_active is not True:
             _LOGGER.info('Cache folder ready. Processing events.')
             self._is_active = True
+            # The synchronization configures all the cached instances.
+            self._pending = []
             self._synchronize()
 
     def _synchronize(self):
@@ -255,6 +374,8 @@ class AppCfgMgr(object):
         """
         # Disable R0912(too-many-branches)
         # pylint: disable=R0912
+        # Configured apps to configure again, to their container.
+        existing = {}
         configured = {
             os.path.basename(filename)
             for filename in glob.glob(os.path.join(self.tm_env.apps_dir, '*'))
@@ -293,24 +414,76 @@ class AppCfgMgr(object):
                             _LOGGER.debug('Found cleanup file %r', path)
                             break
                     else:
-                        if self._configure(appname):
-                            needs_cleanup = False
-                            _LOGGER.debug('Added existing app %r', appname)
+                        # Cleaned up if it fails to configure.
+                        existing[appname] = container
+                        needs_cleanup = False
 
                     cached.pop(appname, None)
 
                 if needs_cleanup:
-                    fs.symlink_safe(
-                        os.path.join(self.tm_env.cleanup_dir, appname),
-                        os.path.join(self.tm_env.apps_dir, container)
-                    )
-                    _LOGGER.debug('Removed %r', appname)
+                    self._cleanup(appname, container)
 
-        for appname in six.iterkeys(cached):
-            if self._configure(appname):
+        start = time.time()
+        configured = self._configure_batch(
+            list(existing) + list(cached)
+        )
+        for appname, success in six.iteritems(configured):
+            if appname in existing:
+                if success:
+                    _LOGGER.debug('Added existing app %r', appname)
+                else:
+                    self._cleanup(appname, existing[appname])
+            elif success:
                 _LOGGER.debug('Added new app %r', appname)
 
         self._refresh_supervisor()
+        self.latencies['batch'].record(time.time() - start)
+        self._log_latencies()
+
+    def _cleanup(self, appname, container):
+        """Link a configured container to cleanup."""
+        fs.symlink_safe(
+            os.path.join(self.tm_env.cleanup_dir, appname),
+            os.path.join(self.tm_env.apps_dir, container)
+        )
+        _LOGGER.debug('Removed %r', appname)
+
+    def _configure_batch(self, instance_names):
+        """Configure instances concurrently.
+
+        :param ``list`` instance_names:
+            Names of the instances to configure.
+        :returns ``dict``:
+            Instance name to ``True`` if successfully configured.
+        """
+        if not instance_names:
+            return {}
+
+        def _configure(instance_name, queued):
+            """Configure an instance, recording its queueing latency."""
+            self.latencies['queue'].record(time.time() - queued)
+            return self._configure(instance_name)
+
+        workers = min(_CONFIGURE_WORKERS, len(instance_names))
+        with futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            results = [
+                (
+                    instance_name,
+                    pool.submit(_configure, instance_name, time.time())
+                )
+                for instance_name in instance_names
+            ]
+
+        # _configure handles and reports its errors.
+        return {
+            instance_name: bool(result.result())
+            for instance_name, result in results
+        }
+
+    def _log_latencies(self):
+        """Log the latency histograms."""
+        for stage in _STAGES:
+            _LOGGER.info('latency %-9s: %s', stage, self.latencies[stage])
 
     def _configure(self, instance_name):
         """Configures and starts the instance based on instance cached event.
@@ -330,18 +503,22 @@ class AppCfgMgr(object):
         with lc.LogContext(_LOGGER, instance_name):
             try:
                 _LOGGER.info('Configuring')
+                start = time.time()
                 container_dir = app_cfg.configure(self.tm_env, event_file,
                                                   self._runtime)
+                self.latencies['configure'].record(time.time() - start)
                 if container_dir is None:
                     # configure step failed, skip.
                     fs.rm_safe(event_file)
                     return False
 
                 # symlink_safe(link, target)
+                start = time.time()
                 fs.symlink_safe(
                     os.path.join(self.tm_env.running_dir, instance_name),
                     container_dir
                 )
+                self.latencies['link'].record(time.time() - start)
                 return True
 
             except exc.ContainerSetupError as err:  # pylint: disable=W0703
@@ -406,10 +583,12 @@ class AppCfgMgr(object):
 
     def _refresh_supervisor(self):
         """Notify the supervisor of new instances to run."""
+        start = time.time()
         supervisor.control_svscan(self.tm_env.running_dir, (
             supervisor.SvscanControlAction.alarm,
             supervisor.SvscanControlAction.nuke
         ))
+        self.latencies['refresh'].record(time.time() - start)
 
     @staticmethod
     def _resolve_running_link(running_link):
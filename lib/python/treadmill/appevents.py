@@ -6,12 +6,14 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import functools
 import io
 import logging
 import os
 import time
 
 import kazoo.client
+import kazoo.exceptions
 import six
 
 from treadmill import fs
@@ -30,23 +32,32 @@ _SERVERS_ACL = zkutils.make_role_acl('servers', 'rwcda')
 _HOSTNAME = sysinfo.hostname()
 
 
-def _publish_zk(zkclient, when, instanceid, event_type, event_data, payload):
-    """Publish application event to ZK.
-    """
-    eventnode = '%s,%s,%s,%s' % (when, _HOSTNAME, event_type, event_data)
-    _LOGGER.debug('Creating %s', z.path.trace(instanceid, eventnode))
+# Event types which update the finished node.
+_TERMINAL_EVENT_TYPES = frozenset(['aborted', 'killed', 'finished'])
+
+
+def _create_trace(zkclient, trace_path, payload):
+    """Create application event trace node."""
+    _LOGGER.debug('Creating %s', trace_path)
     try:
         zkutils.with_retry(
             zkutils.create,
             zkclient,
-            z.path.trace(instanceid, eventnode),
+            trace_path,
             payload,
             acl=[_SERVERS_ACL]
         )
     except kazoo.client.NodeExistsError:
         pass
 
-    if event_type in ['aborted', 'killed', 'finished']:
+
+def _publish_zk(zkclient, when, instanceid, event_type, event_data, payload):
+    """Publish application event to ZK.
+    """
+    eventnode = '%s,%s,%s,%s' % (when, _HOSTNAME, event_type, event_data)
+    _create_trace(zkclient, z.path.trace(instanceid, eventnode), payload)
+
+    if event_type in _TERMINAL_EVENT_TYPES:
         # For terminal state, update the finished node with exit summary.
         zkutils.with_retry(
             zkutils.put,
@@ -105,6 +116,48 @@ def post_zk(zkclient, event):
     )
 
 
+def post_zk_many(zkclient, events):
+    """Post and publish many application events directly to ZK.
+
+    Trace nodes are created with pipelined async requests, see post_zk().
+    """
+    when = str(time.time())
+    traces = []
+    for event in events:
+        _LOGGER.debug('post_zk: %r', event)
+        (
+            _ts,
+            _src,
+            instanceid,
+            event_type,
+            event_data,
+            payload
+        ) = event.to_data()
+        if event_type in _TERMINAL_EVENT_TYPES:
+            _publish_zk(
+                zkclient, when, instanceid, event_type, event_data, payload
+            )
+            continue
+
+        eventnode = '%s,%s,%s,%s' % (when, _HOSTNAME, event_type, event_data)
+        traces.append((z.path.trace(instanceid, eventnode), payload))
+
+    results = zkutils.pipeline(
+        functools.partial(zkutils.create_async, zkclient, trace_path,
+                          payload, acl=[_SERVERS_ACL])
+        for trace_path, payload in traces
+    )
+    for (trace_path, payload), async_result in six.moves.zip(
+            traces, results):
+        try:
+            async_result.get()
+        except kazoo.client.NodeExistsError:
+            pass
+        except kazoo.exceptions.KazooException:
+            # Retry failed requests one by one.
+            _create_trace(zkclient, trace_path, payload)
+
+
 def post(events_dir, event):
     """Post application event to event directory.
     """
@@ -7,12 +7,17 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import collections
+import datetime
+import functools
 import hashlib
 import json
 import io
 import logging
 import sqlite3
 import tempfile
+import time
+
+import six
 
 from treadmill import admin
 from treadmill import context
@@ -24,6 +29,164 @@ from treadmill.scheduler import masterapi
 
 _LOGGER = logging.getLogger(__name__)
 
+# Mirrors of the LDAP collections and digests of the data last written to
+# Zookeeper, kept between the runs of the incremental sync.
+_MIRRORS = {}
+_DIGESTS = {}
+
+
+def _ldap_time(value):
+    """Format a modifyTimestamp value as LDAP generalized time."""
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if isinstance(value, datetime.datetime):
+        return time.strftime('%Y%m%d%H%M%SZ', value.utctimetuple())
+    if value is None:
+        return None
+    return six.text_type(value)
+
+
+class _LdapMirror(object):
+    """In-memory mirror of a LDAP collection, kept current by
+    modifyTimestamp.
+
+    Every refresh lists the modifyTimestamp of all the entries of the
+    collection (no other attribute), then fetches, in a single search, only
+    the entries added or modified since the previous refresh.
+    """
+
+    def __init__(self, ldap_obj, search_base, search_filter):
+        self.ldap_obj = ldap_obj
+        self.search_base = search_base
+        self.search_filter = search_filter
+        self.refreshed = False
+        # dn -> modifyTimestamp
+        self.stamps = {}
+        # dn -> object
+        self.objects = {}
+
+    def refresh(self):
+        """Refresh the mirror, returns True if the collection changed."""
+        ldap_admin = self.ldap_obj.admin
+        stamps = {
+            dn: _ldap_time(entry.get('modifyTimestamp'))
+            for dn, entry in ldap_admin.paged_search(
+                search_base=self.search_base,
+                search_filter=self.search_filter,
+                attributes=['modifyTimestamp']
+            )
+        }
+
+        deleted = set(self.stamps) - set(stamps)
+        for dn in deleted:
+            self.objects.pop(dn, None)
+
+        # Entries without modifyTimestamp are always fetched.
+        changed = [
+            dn for dn, stamp in six.iteritems(stamps)
+            if stamp is None or self.stamps.get(dn) != stamp
+        ]
+        if changed:
+            search_filter = self.search_filter
+            if all(stamps[dn] for dn in changed):
+                search_filter = '(&{}(modifyTimestamp>={}))'.format(
+                    search_filter, min(stamps[dn] for dn in changed)
+                )
+
+            for dn, entry in ldap_admin.paged_search(
+                    search_base=self.search_base,
+                    search_filter=search_filter,
+                    attributes=self.ldap_obj.attrs()):
+                self.objects[dn] = self.ldap_obj.from_entry(entry, dn)
+
+        _LOGGER.info('Refresh: %s: %d entries, changed: %d, deleted: %d',
+                     self.search_base, len(stamps), len(changed),
+                     len(deleted))
+
+        self.stamps = stamps
+        first = not self.refreshed
+        self.refreshed = True
+        return first or bool(changed or deleted)
+
+    def reset(self):
+        """Report the whole collection as changed on the next refresh."""
+        self.refreshed = False
+
+    def list(self):
+        """List the mirrored objects."""
+        # Callers modify the objects, return copies.
+        return [dict(obj) for obj in six.itervalues(self.objects)]
+
+
+def _list_changed(name, ldap_obj, search_base, search_filter):
+    """List a LDAP collection through its mirror.
+
+    :returns:
+        ``list`` of objects, ``None`` if the collection did not change since
+        the last call.
+    """
+    mirror = _MIRRORS.get(name)
+    if mirror is None:
+        mirror = _LdapMirror(ldap_obj, search_base, search_filter)
+        _MIRRORS[name] = mirror
+
+    if not mirror.refresh():
+        _LOGGER.info('No changes: %s', name)
+        return None
+
+    return mirror.list()
+
+
+def _resync_on_error(name):
+    """Resync the whole mirrored collection after a failed sync.
+
+    The mirror is refreshed before the collection is written to Zookeeper,
+    the entries not written would otherwise be seen as unchanged by the next
+    incremental sync. The digests skip the entries already written.
+    """
+
+    def _decorator(func):
+        """Decorator."""
+
+        @functools.wraps(func)
+        def _sync(*args, **kwargs):
+            """Reset the mirror if the sync fails."""
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                mirror = _MIRRORS.get(name)
+                if mirror is not None:
+                    mirror.reset()
+                raise
+
+        return _sync
+
+    return _decorator
+
+
+def _digest(data):
+    """Digest of the data written to a Zookeeper node."""
+    return hashlib.sha1(
+        json.dumps(data, sort_keys=True, default=str).encode('utf8')
+    ).hexdigest()
+
+
+def _put_changed(zkclient, path, data, digests=None):
+    """Put data in Zookeeper, unless it is the data last written.
+
+    Without digests, the content of the node is checked instead.
+    """
+    if digests is None:
+        return zkutils.put(zkclient, path, data, check_content=True)
+
+    digest = _digest(data)
+    if digests.get(path) == digest:
+        return None
+
+    result = zkutils.put(zkclient, path, data, check_content=True)
+    digests[path] = digest
+    return result
+
 
 def _match_appgroup(group):
     """Match if appgroup belongs to the cell.
@@ -31,7 +194,7 @@ def _match_appgroup(group):
     return context.GLOBAL.cell in group.get('cells', [])
 
 
-def _sync_collection(zkclient, entities, zkpath, match=None):
+def _sync_collection(zkclient, entities, zkpath, match=None, digests=None):
     """Sync ldap collection to Zookeeper.
     """
     _LOGGER.info('Sync: %s', zkpath)
@@ -49,12 +212,15 @@ def _sync_collection(zkclient, entities, zkpath, match=None):
 
     for to_del in set(in_zk) - set(to_sync):
         _LOGGER.info('Delete: %s', to_del)
-        zkutils.ensure_deleted(zkclient, z.join_zookeeper_path(zkpath, to_del))
+        to_del_path = z.join_zookeeper_path(zkpath, to_del)
+        zkutils.ensure_deleted(zkclient, to_del_path)
+        if digests is not None:
+            digests.pop(to_del_path, None)
 
     # Add or update current app-groups
     for name, entity in to_sync.items():
-        if zkutils.put(zkclient, z.join_zookeeper_path(zkpath, name),
-                       entity, check_content=True):
+        if _put_changed(zkclient, z.join_zookeeper_path(zkpath, name),
+                        entity, digests):
             _LOGGER.info('Update: %s', name)
         else:
             _LOGGER.info('Up to date: %s', name)
@@ -121,7 +287,7 @@ def _create_lookup_db(rows):
     return f.name
 
 
-def _sync_appgroup_lookups(zkclient, cell_app_groups):
+def _sync_appgroup_lookups(zkclient, cell_app_groups, digests=None):
     """Sync app group lookup databases."""
     groups_by_proid, checksum_by_proid = _appgroup_group_by_proid(
         cell_app_groups
@@ -137,16 +303,22 @@ def _sync_appgroup_lookups(zkclient, cell_app_groups):
         # If node already exists with the proper checksum, ensure that others
         # are removed, but not recreate.
         digest = checksum_by_proid[proid].hexdigest()
+        lookup_path = z.path.appgroup_lookup(proid)
+        if digests is not None and digests.get(lookup_path) == digest:
+            continue
+
         if zkclient.exists(z.path.appgroup_lookup(proid, digest)):
             _LOGGER.debug('Appgroup lookup for proid %s is up to date: %s',
                           proid, digest)
-            continue
+        else:
+            db_file = _create_lookup_db(groups_by_proid[proid])
+            try:
+                _save_appgroup_lookup(zkclient, db_file, proid, digest)
+            finally:
+                fs.rm_safe(db_file)
 
-        db_file = _create_lookup_db(groups_by_proid[proid])
-        try:
-            _save_appgroup_lookup(zkclient, db_file, proid, digest)
-        finally:
-            fs.rm_safe(db_file)
+        if digests is not None:
+            digests[lookup_path] = digest
 
 
 def _save_appgroup_lookup(zkclient, db_file, proid, digest):
@@ -168,25 +340,53 @@ def _remove_extra_appgroup_lookup(zkclient, proid, digest):
         zkutils.ensure_deleted(zkclient, z.path.appgroup_lookup(proid, node))
 
 
-def sync_appgroups():
-    """Sync app-groups from LDAP to Zookeeper."""
+@_resync_on_error('appgroups')
+def sync_appgroups(incremental=False):
+    """Sync app-groups from LDAP to Zookeeper.
+
+    In incremental mode, only the app-groups changed in LDAP are fetched and
+    only the app-groups changed since the last sync are written to Zookeeper.
+    """
     _LOGGER.info('Sync appgroups.')
     admin_app_group = admin.AppGroup(context.GLOBAL.ldap.conn)
-    app_groups = admin_app_group.list({})
+    digests = None
+    if incremental:
+        digests = _DIGESTS
+        app_groups = _list_changed(
+            'appgroups', admin_app_group, admin_app_group.dn(),
+            '(objectClass=%s)' % admin_app_group.oc()
+        )
+        if app_groups is None:
+            return
+    else:
+        app_groups = admin_app_group.list({})
     cell_app_groups = [group for group in app_groups if _match_appgroup(group)]
     _sync_collection(context.GLOBAL.zk.conn,
-                     cell_app_groups, z.path.appgroup())
-    _sync_appgroup_lookups(context.GLOBAL.zk.conn, cell_app_groups)
+                     cell_app_groups, z.path.appgroup(), digests=digests)
+    _sync_appgroup_lookups(context.GLOBAL.zk.conn, cell_app_groups,
+                           digests=digests)
 
 
-def sync_partitions():
+@_resync_on_error('partitions')
+def sync_partitions(incremental=False):
     """Syncs partitions to Zookeeper.
     """
     _LOGGER.info('Sync: partitions.')
     zkclient = context.GLOBAL.zk.conn
 
     admin_cell = admin.Cell(context.GLOBAL.ldap.conn)
-    partitions = admin_cell.partitions(context.GLOBAL.cell)
+    digests = None
+    if incremental:
+        digests = _DIGESTS
+        partitions = _list_changed(
+            'partitions', admin.Partition(context.GLOBAL.ldap.conn),
+            admin_cell.dn(context.GLOBAL.cell),
+            '(objectclass=%s)' % admin.Partition.oc()
+        )
+        if partitions is None:
+            return
+    else:
+        partitions = admin_cell.partitions(context.GLOBAL.cell)
 
     zkclient.ensure_path(z.path.partition())
 
@@ -196,6 +396,8 @@ def sync_partitions():
     for extra in set(in_zk) - set(names):
         _LOGGER.debug('Delete: %s', extra)
         zkutils.ensure_deleted(zkclient, z.path.partition(extra))
+        if digests is not None:
+            digests.pop(z.path.partition(extra), None)
 
     # Add or update current partitions
     for partition in partitions:
@@ -209,21 +411,32 @@ def sync_partitions():
             except ValueError:
                 _LOGGER.info('Invalid reboot schedule, ignoring.')
 
-        if zkutils.put(zkclient, z.path.partition(zkname),
-                       partition, check_content=True):
+        if _put_changed(zkclient, z.path.partition(zkname),
+                        partition, digests):
             _LOGGER.info('Update: %s', zkname)
         else:
             _LOGGER.info('Up to date: %s', zkname)
 
 
-def sync_allocations():
+@_resync_on_error('allocations')
+def sync_allocations(incremental=False):
     """Syncronize allocations.
     """
     _LOGGER.info('Sync allocations.')
     zkclient = context.GLOBAL.zk.conn
 
     admin_alloc = admin.CellAllocation(context.GLOBAL.ldap.conn)
-    allocations = admin_alloc.list({'cell': context.GLOBAL.cell})
+    if incremental:
+        allocations = _list_changed(
+            'allocations', admin_alloc, admin_alloc.dn(),
+            '(&(objectClass=%s)(cell=%s))' % (
+                admin_alloc.oc(), context.GLOBAL.cell
+            )
+        )
+        if allocations is None:
+            return
+    else:
+        allocations = admin_alloc.list({'cell': context.GLOBAL.cell})
 
     filtered = []
     for alloc in allocations:
@@ -232,16 +445,43 @@ def sync_allocations():
         alloc['name'] = name
         filtered.append(alloc)
 
-    masterapi.update_allocations(zkclient, filtered)
+    if incremental:
+        # Mirror order is arbitrary, keep the allocations node stable.
+        filtered.sort(key=lambda alloc: alloc['_id'])
+        digest = _digest(filtered)
+        if _DIGESTS.get(z.path.allocation()) == digest:
+            return
+        masterapi.update_allocations(zkclient, filtered)
+        _DIGESTS[z.path.allocation()] = digest
+    else:
+        masterapi.update_allocations(zkclient, filtered)
 
 
-def sync_servers():
+@_resync_on_error('servers')
+def sync_servers(incremental=False):
     """Sync global servers list."""
     _LOGGER.info('Sync servers.')
     admin_srv = admin.Server(context.GLOBAL.ldap.conn)
-    global_servers = admin_srv.list({})
+    if incremental:
+        global_servers = _list_changed(
+            'servers', admin_srv, admin_srv.dn(),
+            '(objectClass=%s)' % admin_srv.oc()
+        )
+        if global_servers is None:
+            return
+        servers = sorted(server['_id'] for server in global_servers)
+    else:
+        servers = [server['_id'] for server in admin_srv.list({})]
+
+    servers_path = z.path.globals('servers')
+    digest = _digest(servers)
+    if incremental and _DIGESTS.get(servers_path) == digest:
+        return
+
     zkutils.ensure_exists(
         context.GLOBAL.zk.conn,
-        z.path.globals('servers'),
-        data=[server['_id'] for server in global_servers]
+        servers_path,
+        data=servers
     )
+    if incremental:
+        _DIGESTS[servers_path] = digest
@@ -30,6 +30,9 @@ _ENDPOINT_FORMATTER = cli.make_formatter('endpoint')
 
 _APP_FORMATTER = cli.make_formatter('app')
 
+# Seconds to wait for an API endpoint before also calling the next one.
+_HEDGE_DELAY = 2
+
 
 def _get_state(apis, match=None, finished=False, partition=None):
     """Get cell state."""
@@ -46,7 +49,7 @@ def _get_state(apis, match=None, finished=False, partition=None):
     if query:
         url += '?' + urllib_parse.urlencode(query)
 
-    response = restclient.get(apis, url)
+    response = restclient.get(apis, url, hedge_delay=_HEDGE_DELAY)
     return response.json()
 
 
@@ -106,7 +109,7 @@ def _show_endpoints(apis, pattern, endpoint, proto):
 
         url += '/' + endpoint
 
-    response = restclient.get(apis, url)
+    response = restclient.get(apis, url, hedge_delay=_HEDGE_DELAY)
     endpoints = [{
         'name': end['name'],
         'proto': end['proto'],
@@ -122,7 +125,7 @@ def _show_instance(apis, instance_id):
     """Show instance manifest."""
     url = '/instance/%s' % urllib_parse.quote(instance_id)
 
-    response = restclient.get(apis, url)
+    response = restclient.get(apis, url, hedge_delay=_HEDGE_DELAY)
     cli.out(_APP_FORMATTER(response.json()))
 
 
@@ -14,6 +14,7 @@ from apscheduler.schedulers import twisted
 
 from treadmill import exc
 from treadmill import zknamespace as z
+from treadmill.cron import jobstore
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -29,14 +30,24 @@ _FIELD_POS = dict((field, i) for i, field in enumerate(_FIELD_NAMES))
 _SCHEDULER = None
 
 
-def get_scheduler(zkclient):
-    """Get scheduler"""
+def get_scheduler(zkclient, cached=False):
+    """Get scheduler
+
+    :param cached:
+        Keep all the jobs indexed in memory, for the process running the
+        scheduler loop. Other users (CLI, REST API) read and write the job
+        nodes they need directly.
+    """
     global _SCHEDULER  # pylint: disable=W0603
 
     if not _SCHEDULER:
 
         _SCHEDULER = twisted.TwistedScheduler()
-        zk_jobstore = zookeeper.ZooKeeperJobStore(
+        if cached:
+            jobstore_cls = jobstore.CachedZooKeeperJobStore
+        else:
+            jobstore_cls = zookeeper.ZooKeeperJobStore
+        zk_jobstore = jobstore_cls(
             path=z.CRON_JOBS,
             client=zkclient
         )
@@ -0,0 +1,442 @@
+"""Indexed, cached Zookeeper job store.
+
+The apscheduler ``ZooKeeperJobStore`` reads and unpickles every job node on
+each wakeup. This job store keeps the jobs in memory instead:
+
+    - the job nodes are watched, a node is fetched and unpickled only when it
+      is created or changed;
+    - the next run times are kept in a min-heap, so that the next wakeup and
+      the due jobs are found without scanning all the jobs;
+    - jobs are reconstituted only when they are due or looked up;
+    - the next run times updated by the scheduler after running jobs are
+      written in batches, with pipelined writes, when the scheduler computes
+      its next wakeup.
+
+The node payloads are unchanged, both job stores can share a path. Loading
+the index reads all the jobs, it is only used by the process running the
+scheduler loop (see :func:`treadmill.cron.get_scheduler`).
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import functools
+import heapq
+import logging
+import threading
+import time
+
+from six.moves import cPickle as pickle
+
+import kazoo
+import kazoo.protocol.states
+
+from apscheduler import util as aps_util
+from apscheduler.jobstores import base
+from apscheduler.jobstores import zookeeper
+from apscheduler.schedulers import base as scheduler_base
+
+from treadmill import zkutils
+
+
+_LOGGER = logging.getLogger(__name__)
+
+# The heap is rebuilt when it holds more stale entries than live ones.
+_HEAP_COMPACT_MIN = 1024
+
+
+class _JobEntry(object):
+    """Cached job node."""
+
+    __slots__ = (
+        'next_run_time',
+        'creation_time',
+        'state',
+        'version',
+        'seq',
+    )
+
+    def __init__(self, next_run_time, creation_time, state, version, seq):
+        self.next_run_time = next_run_time
+        self.creation_time = creation_time
+        self.state = state
+        self.version = version
+        self.seq = seq
+
+
+def _same_definition(state, other):
+    """Check if two job states only differ by their next run time."""
+    if state is None or len(state) != len(other):
+        return False
+
+    for key, value in other.items():
+        if key == 'next_run_time':
+            continue
+        if key not in state or state[key] is not value and \
+                state[key] != value:
+            return False
+
+    return True
+
+
+class CachedZooKeeperJobStore(zookeeper.ZooKeeperJobStore):
+    """Zookeeper job store with a watch-maintained in-memory index."""
+
+    def __init__(self, *args, **kwargs):
+        super(CachedZooKeeperJobStore, self).__init__(*args, **kwargs)
+        self._jobs = {}
+        # (next_run_time, creation_time, seq, job_id), entries are stale
+        # once the seq of their job changed.
+        self._heap = []
+        self._seq = 0
+        self._pending = set()
+        # Job ids returned by get_due_jobs, the scheduler moves them to their
+        # next run time before asking for the next wakeup.
+        self._due = set()
+        # Job ids being written, to the highest version read meanwhile.
+        self._writing = {}
+        self._watched = set()
+        self._watching = False
+        self._lock = threading.RLock()
+
+    def _node_path(self, job_id):
+        """Path of a job node."""
+        return '/'.join([self.path, job_id])
+
+    def _ensure_paths(self):
+        super(CachedZooKeeperJobStore, self)._ensure_paths()
+        if not self._watching:
+            self._watching = True
+            self.client.ChildrenWatch(self.path)(self._on_children)
+
+    def start(self, scheduler, alias):
+        super(CachedZooKeeperJobStore, self).start(scheduler, alias)
+        self._ensure_paths()
+
+    def _on_children(self, children):
+        """Fetch the new job nodes, forget the deleted ones."""
+        if not self._watching:
+            return False
+
+        target = set(children)
+        with self._lock:
+            for job_id in self._watched - target:
+                self._watched.discard(job_id)
+                self._drop(job_id)
+            added = sorted(target - self._watched)
+            self._watched.update(added)
+
+        self._fetch(added)
+        return True
+
+    def _on_changed(self, job_id, event):
+        """Refetch a changed job node."""
+        if event.type == kazoo.protocol.states.EventType.DELETED:
+            with self._lock:
+                self._watched.discard(job_id)
+                self._drop(job_id)
+            return
+
+        self._fetch([job_id])
+
+    def _fetch(self, job_ids):
+        """Fetch and index job nodes, watching them for changes."""
+        results = zkutils.pipeline(
+            functools.partial(
+                self.client.get_async,
+                self._node_path(job_id),
+                watch=functools.partial(self._on_changed, job_id)
+            )
+            for job_id in job_ids
+        )
+
+        failed = []
+        wakeup = False
+        with self._lock:
+            for job_id, async_result in zip(job_ids, results):
+                try:
+                    content, stat = async_result.get()
+                except kazoo.client.NoNodeError:
+                    self._watched.discard(job_id)
+                    self._drop(job_id)
+                    continue
+
+                if job_id in self._writing:
+                    # Most likely our own write, checked once written.
+                    self._writing[job_id] = max(
+                        self._writing[job_id] or 0, stat.version
+                    )
+                    continue
+
+                entry = self._jobs.get(job_id)
+                if entry is not None:
+                    entry.creation_time = stat.ctime
+                    if job_id in self._pending or \
+                            entry.version == stat.version:
+                        # Our own write, or about to be overwritten by it.
+                        continue
+
+                try:
+                    doc = pickle.loads(content)
+                except Exception:  # pylint: disable=W0703
+                    _LOGGER.exception('Unable to restore job: %s', job_id)
+                    failed.append(job_id)
+                    continue
+
+                next_run_time = self._next_run_time()
+                self._index(
+                    job_id, doc['next_run_time'] or None, stat.ctime,
+                    doc['job_state'], stat.version
+                )
+                if doc['next_run_time'] and (
+                        next_run_time is None or
+                        doc['next_run_time'] < next_run_time):
+                    wakeup = True
+
+        for job_id in failed:
+            _LOGGER.info('Removing job: %s', job_id)
+            self.client.delete_async(self._node_path(job_id))
+
+        # Jobs added or moved earlier by other schedulers.
+        if wakeup and self._scheduler is not None and \
+                self._scheduler.state == scheduler_base.STATE_RUNNING:
+            self._scheduler.wakeup()
+
+    def _index(self, job_id, next_run_time, creation_time, state, version):
+        """Add or update a job in the index, with the lock held."""
+        self._seq += 1
+        entry = self._jobs.get(job_id)
+        if entry is None:
+            entry = _JobEntry(
+                next_run_time, creation_time, state, version, self._seq
+            )
+            self._jobs[job_id] = entry
+        else:
+            entry.next_run_time = next_run_time
+            entry.state = state
+            entry.seq = self._seq
+            if version is not None:
+                entry.version = version
+
+        if next_run_time is not None:
+            heapq.heappush(
+                self._heap,
+                (next_run_time, entry.creation_time, self._seq, job_id)
+            )
+            if len(self._heap) > max(_HEAP_COMPACT_MIN, 2 * len(self._jobs)):
+                self._compact()
+
+    def _drop(self, job_id):
+        """Remove a job from the index, with the lock held."""
+        self._jobs.pop(job_id, None)
+        self._pending.discard(job_id)
+        self._due.discard(job_id)
+
+    def _compact(self):
+        """Rebuild the heap without the stale entries."""
+        self._heap = [
+            item for item in self._heap if self._is_current(item)
+        ]
+        heapq.heapify(self._heap)
+
+    def _is_current(self, item):
+        """Check if a heap entry is up to date."""
+        entry = self._jobs.get(item[3])
+        return entry is not None and entry.seq == item[2]
+
+    def _next_run_time(self):
+        """Earliest next run time timestamp, with the lock held."""
+        while self._heap and not self._is_current(self._heap[0]):
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def _job(self, job_id):
+        """Reconstitute a job, with the lock held."""
+        entry = self._jobs[job_id]
+        return self._reconstitute_job(entry.state)
+
+    def _payload(self, job_id):
+        """Pickle a job node payload, with the lock held."""
+        entry = self._jobs[job_id]
+        return pickle.dumps(
+            {
+                'next_run_time': entry.next_run_time,
+                'job_state': entry.state,
+            },
+            self.pickle_protocol
+        )
+
+    def _write(self, writes):
+        """Write job nodes with pipelined requests.
+
+        :param writes:
+            List of (job_id, payload).
+        :returns:
+            ``set`` of the ids of the jobs which no longer exist.
+        """
+        with self._lock:
+            for job_id, _data in writes:
+                self._writing[job_id] = None
+
+        results = zkutils.pipeline(
+            functools.partial(
+                self.client.set_async, self._node_path(job_id), data
+            )
+            for job_id, data in writes
+        )
+
+        missing = set()
+        refetch = []
+        with self._lock:
+            for (job_id, _data), async_result in zip(writes, results):
+                seen = self._writing.pop(job_id, None)
+                try:
+                    stat = async_result.get()
+                except kazoo.client.NoNodeError:
+                    _LOGGER.info('Job removed: %s', job_id)
+                    self._drop(job_id)
+                    missing.add(job_id)
+                    continue
+
+                entry = self._jobs.get(job_id)
+                if entry is not None:
+                    entry.version = stat.version
+                if seen is not None and seen > stat.version:
+                    # Changed by another scheduler while writing.
+                    refetch.append(job_id)
+
+        if refetch:
+            self._fetch(refetch)
+
+        return missing
+
+    def flush(self):
+        """Write the pending next run time updates."""
+        with self._lock:
+            writes = [
+                (job_id, self._payload(job_id))
+                for job_id in sorted(self._pending)
+            ]
+            self._pending.clear()
+            self._due.clear()
+
+        if writes:
+            _LOGGER.debug('Writing %d job updates.', len(writes))
+            self._write(writes)
+
+    def lookup_job(self, job_id):
+        self._ensure_paths()
+        with self._lock:
+            if job_id not in self._jobs:
+                return None
+            return self._job(job_id)
+
+    def get_due_jobs(self, now):
+        self._ensure_paths()
+        timestamp = aps_util.datetime_to_utc_timestamp(now)
+        with self._lock:
+            due = []
+            while self._heap and self._heap[0][0] <= timestamp:
+                item = heapq.heappop(self._heap)
+                if self._is_current(item):
+                    due.append(item)
+
+            # Due jobs stay in the heap until the scheduler updates them.
+            for item in due:
+                heapq.heappush(self._heap, item)
+                self._due.add(item[3])
+
+            return [self._job(item[3]) for item in due]
+
+    def get_next_run_time(self):
+        self._ensure_paths()
+        # The scheduler computes its next wakeup after processing the due
+        # jobs, write their updated next run times at once.
+        self.flush()
+        with self._lock:
+            timestamp = self._next_run_time()
+
+        if timestamp is None:
+            return None
+        return aps_util.utc_timestamp_to_datetime(timestamp)
+
+    def get_all_jobs(self):
+        self._ensure_paths()
+        with self._lock:
+            job_ids = sorted(
+                self._jobs,
+                key=lambda job_id: (
+                    self._jobs[job_id].next_run_time is None,
+                    self._jobs[job_id].next_run_time,
+                    self._jobs[job_id].creation_time,
+                )
+            )
+            return [self._job(job_id) for job_id in job_ids]
+
+    def add_job(self, job):
+        super(CachedZooKeeperJobStore, self).add_job(job)
+        with self._lock:
+            self._index(
+                job.id,
+                aps_util.datetime_to_utc_timestamp(job.next_run_time),
+                int(time.time() * 1000),
+                job.__getstate__(),
+                0
+            )
+
+    def update_job(self, job):
+        self._ensure_paths()
+        state = job.__getstate__()
+        next_run_time = aps_util.datetime_to_utc_timestamp(job.next_run_time)
+
+        with self._lock:
+            entry = self._jobs.get(job.id)
+            if entry is None:
+                raise base.JobLookupError(job.id)
+
+            if job.id in self._due and _same_definition(entry.state, state):
+                # The scheduler moved a due job to its next run time, written
+                # with the others at the next wakeup. Other updates (e.g.
+                # pause, resume) may come from a scheduler not running its
+                # loop and are written at once.
+                self._due.discard(job.id)
+                self._index(job.id, next_run_time, None, state, None)
+                self._pending.add(job.id)
+                return
+
+            self._due.discard(job.id)
+
+            self._pending.discard(job.id)
+            self._index(job.id, next_run_time, None, state, None)
+            data = self._payload(job.id)
+
+        if self._write([(job.id, data)]):
+            raise base.JobLookupError(job.id)
+
+    def remove_job(self, job_id):
+        with self._lock:
+            self._drop(job_id)
+        super(CachedZooKeeperJobStore, self).remove_job(job_id)
+
+    def remove_all_jobs(self):
+        super(CachedZooKeeperJobStore, self).remove_all_jobs()
+        with self._lock:
+            # The children watch stops with the deleted node.
+            self._watching = False
+            self._jobs.clear()
+            self._heap = []
+            self._pending.clear()
+            self._due.clear()
+            self._writing.clear()
+            self._watched.clear()
+
+    def shutdown(self):
+        self.flush()
+        super(CachedZooKeeperJobStore, self).shutdown()
+
+
+__all__ = [
+    'CachedZooKeeperJobStore',
+]
@@ -27,6 +27,9 @@ class DirWatcherEvent(enum.Enum):
     CREATED = 'created'
     DELETED = 'deleted'
     MODIFIED = 'modified'
+    #: Events were lost (e.g. the kernel queue overflowed), the watched
+    #: directory must be rescanned.
+    OVERFLOW = 'overflow'
     #: Fake event returned when more events where received than allowed to
     #: process in ``process_events``
     MORE_PENDING = 'more events pending'
@@ -37,18 +40,23 @@ class DirWatcher(object):
     """Directory watcher base, invoking callbacks on file create/delete events.
     """
     __slots__ = (
+        'coalesce',
         'event_list',
         'on_created',
         'on_deleted',
         'on_modified',
+        'on_overflow',
         '_watches'
     )
 
-    def __init__(self, watch_dir=None):
+    def __init__(self, watch_dir=None, coalesce=False):
+        # Merge the events of a path read at once (where supported).
+        self.coalesce = coalesce
         self.event_list = collections.deque()
         self.on_created = self._noop
         self.on_deleted = self._noop
         self.on_modified = self._noop
+        self.on_overflow = self._overflow
         self._watches = {}
 
         if watch_dir is not None:
@@ -102,6 +110,12 @@ class DirWatcher(object):
         _LOGGER.debug('event on %r', event_src)
         return None
 
+    @staticmethod
+    def _overflow(watch_dir):
+        """Default overflow callback"""
+        _LOGGER.warning('events lost on %r, no rescan callback', watch_dir)
+        return None
+
     @abc.abstractmethod
     def _wait_for_events(self, timeout):
         """Wait for directory change event for up to ``timeout`` seconds.
@@ -134,7 +148,9 @@ class DirWatcher(object):
     def _read_events(self):
         """Reads the events from the system and formats as ``DirWatcherEvent``.
 
-        :returns: List of ``(DirWatcherEvent, <path>)``
+        :returns: List of ``(DirWatcherEvent, <path>)``, overflows are
+                  reported as ``(DirWatcherEvent.OVERFLOW, <watch_dir>)``
+                  for every watched directory.
         """
         return
 
@@ -187,6 +203,10 @@ class DirWatcher(object):
             elif event == DirWatcherEvent.CREATED:
                 res = self.on_created(src_path)  # pylint: disable=E1128
 
+            elif event == DirWatcherEvent.OVERFLOW:
+                # src_path is the watched directory to rescan.
+                res = self.on_overflow(src_path)  # pylint: disable=E1128
+
             else:
                 continue
 
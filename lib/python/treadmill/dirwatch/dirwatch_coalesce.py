@@ -0,0 +1,91 @@
+"""Coalescing of directory watcher events.
+
+A batch of events read at once often holds several events for the same path
+(e.g. a file created, written and renamed in place). Coalescing merges the
+events of every path of the batch into the fewest events with the same final
+outcome:
+
+    - created, [modified...]              -> created
+    - modified, [modified...]             -> modified
+    - created, [modified...], deleted     -> (nothing)
+    - modified, [modified...], deleted    -> deleted
+    - deleted, created, [modified...]     -> deleted, created
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+
+from .dirwatch_base import DirWatcherEvent
+
+_CREATED = DirWatcherEvent.CREATED
+_DELETED = DirWatcherEvent.DELETED
+_MODIFIED = DirWatcherEvent.MODIFIED
+
+
+def _merge(pending, event):
+    """Merge an event into the pending events of a path.
+
+    :returns:
+        ``tuple`` of the pending events.
+    """
+    if not pending:
+        return (event,)
+
+    if event == _MODIFIED:
+        # Modifying a created or modified path does not change its outcome.
+        return pending
+
+    if event == _DELETED:
+        if pending[0] == _CREATED:
+            # The path came and went within the batch.
+            return ()
+        return (_DELETED,)
+
+    # Created.
+    if pending[0] == _DELETED:
+        return (_DELETED, _CREATED)
+    if pending[0] == _MODIFIED:
+        # Deletion was missed, consumers should pick up the new path.
+        return (_DELETED, _CREATED)
+    return pending
+
+
+def coalesce(events):
+    """Coalesce a batch of events.
+
+    Events other than created, deleted and modified (e.g. overflow) are kept,
+    they are barriers: events before and after one are not merged.
+
+    :param events:
+        List of ``(DirWatcherEvent, <path>)``.
+    :returns:
+        List of ``(DirWatcherEvent, <path>)``, the paths in the order of
+        their first event.
+    """
+    result = []
+    pending = collections.OrderedDict()
+
+    def _flush():
+        for path, path_events in pending.items():
+            result.extend((event, path) for event in path_events)
+        pending.clear()
+
+    for event, path in events:
+        if event not in (_CREATED, _DELETED, _MODIFIED):
+            _flush()
+            result.append((event, path))
+            continue
+
+        pending[path] = _merge(pending.get(path), event)
+
+    _flush()
+    return result
+
+
+__all__ = [
+    'coalesce',
+]
@@ -27,6 +27,7 @@ class DirWatcherDispatcher(object):
         self._dirwatcher.on_created = self._on_created
         self._dirwatcher.on_deleted = self._on_deleted
         self._dirwatcher.on_modified = self._on_modified
+        self._dirwatcher.on_overflow = self._on_overflow
 
     @property
     def dirwatcher(self):
@@ -46,10 +47,11 @@ class DirWatcherDispatcher(object):
         })
         self._configs.sort(key=lambda x: x['path'], reverse=True)
 
-    def _trigger_handler(self, path, event):
+    def _trigger_handler(self, path, event, watch_dir=None):
         """Triggers a handler for the given path and event.
         """
-        watch_dir = os.path.dirname(path)
+        if watch_dir is None:
+            watch_dir = os.path.dirname(path)
         for config in self._configs:
             if not fnmatch.fnmatch(watch_dir, config['path']):
                 continue
@@ -77,3 +79,11 @@ class DirWatcherDispatcher(object):
         """Handles path modified events from the directory watcher.
         """
         self._trigger_handler(path, dirwatch_base.DirWatcherEvent.MODIFIED)
+
+    def _on_overflow(self, watch_dir):
+        """Handles lost events (rescan) of a watched directory.
+        """
+        self._trigger_handler(
+            watch_dir, dirwatch_base.DirWatcherEvent.OVERFLOW,
+            watch_dir=watch_dir
+        )
@@ -15,6 +15,7 @@ import six
 from treadmill.syscall import inotify
 
 from . import dirwatch_base
+from . import dirwatch_coalesce
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -27,11 +28,11 @@ class LinuxDirWatcher(dirwatch_base.DirWatcher):
         'poll'
     )
 
-    def __init__(self, watch_dir=None):
+    def __init__(self, watch_dir=None, coalesce=False):
         self.inotify = inotify.Inotify(inotify.IN_CLOEXEC)
         self.poll = select.poll()
         self.poll.register(self.inotify, select.POLLIN)
-        super(LinuxDirWatcher, self).__init__(watch_dir)
+        super(LinuxDirWatcher, self).__init__(watch_dir, coalesce)
 
     def _add_dir(self, watch_dir):
         """Add `directory` to the list of watched directories.
@@ -88,7 +89,15 @@ class LinuxDirWatcher(dirwatch_base.DirWatcher):
         events = self.inotify.read_events()
 
         for event in events:
-            if (event.is_modify or
+            if event.is_overflow:
+                # The kernel queue overflowed, all watched directories must
+                # be rescanned.
+                results.extend(
+                    (dirwatch_base.DirWatcherEvent.OVERFLOW, watch_dir)
+                    for watch_dir in sorted(self._watches.values())
+                )
+
+            elif (event.is_modify or
                     event.is_attrib):
                 results.append(
                     (
@@ -120,4 +129,7 @@ class LinuxDirWatcher(dirwatch_base.DirWatcher):
                 if self._watches.pop(event.wd, None):
                     _LOGGER.info('Watch on %r auto-removed', event.src_path)
 
+        if self.coalesce:
+            results = dirwatch_coalesce.coalesce(results)
+
         return results
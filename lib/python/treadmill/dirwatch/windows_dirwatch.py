@@ -86,10 +86,10 @@ class WindowsDirWatcher(dirwatch_base.DirWatcher):
         '_changed'
     )
 
-    def __init__(self, watch_dir=None):
+    def __init__(self, watch_dir=None, coalesce=False):
         self._dir_infos = {}
         self._changed = collections.deque()
-        super(WindowsDirWatcher, self).__init__(watch_dir)
+        super(WindowsDirWatcher, self).__init__(watch_dir, coalesce)
 
     @staticmethod
     def _read_dir(info):
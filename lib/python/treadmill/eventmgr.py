@@ -9,6 +9,10 @@ server.
 
 Applications that are scheduled to run on the server are mirrored in the
 'cache' directory.
+
+Placement changes are synchronized in batches: the placement and manifest
+nodes are read with pipelined async requests and the cache files are written
+by a pool of threads, each through an atomic rename.
 """
 
 from __future__ import absolute_import
@@ -16,12 +20,15 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import functools
 import glob
 import io
 import logging
 import os
 import time
 
+from concurrent import futures
+
 import kazoo
 import kazoo.client
 
@@ -31,6 +38,7 @@ from treadmill import fs
 from treadmill import sysinfo
 from treadmill import utils
 from treadmill import yamlwrapper as yaml
+from treadmill import zkcodec
 from treadmill import zknamespace as z
 from treadmill import zkutils
 
@@ -42,6 +50,16 @@ _WATCHDOG_TIMEOUT_SEC = _HEARTBEAT_SEC * 4
 
 READY_FILE = '.ready'
 
+# Number of threads writing the cache files.
+_WRITERS = 8
+
+
+def _decode(data):
+    """Decode node data, like zkutils.get."""
+    if data is None:
+        return None
+    return zkcodec.decode(data)
+
 
 class EventMgr(object):
     """Mirror Zookeeper scheduler event into node app cache events."""
@@ -157,13 +175,14 @@ class EventMgr(object):
             os.unlink(manifest)
 
         # If app is missing, fetch its manifest in the cache
-        for app in missing:
-            self._cache(zkclient, app)
-
+        apps = sorted(missing)
         if check_existing:
             _LOGGER.info('existing : %s', ','.join(existing))
-            for app in existing:
-                self._cache(zkclient, app, check_existing=True)
+            apps.extend(sorted(existing))
+
+        self._cache_apps(
+            zkclient, apps, check_existing=existing if check_existing else ()
+        )
 
     def _cache(self, zkclient, app, check_existing=False):
         """Read the manifest and placement data from Zk and store it as YAML in
@@ -174,47 +193,121 @@ class EventMgr(object):
         :param ``bool`` check_existing:
             Whether to check if the file already exists and is up to date.
         """
-        placement_node = z.path.placement(self._hostname, app)
+        self._cache_apps(
+            zkclient, [app], check_existing=[app] if check_existing else ()
+        )
+
+    def _is_up_to_date(self, app, placement_time):
+        """Check if the cache file of an app is newer than its placement."""
+        manifest_file = os.path.join(self.tm_env.cache_dir, app)
         try:
-            placement_data, placement_metadata = zkutils.get_with_metadata(
-                zkclient, placement_node
-            )
-            placement_time = placement_metadata.ctime / 1000.0
-        except kazoo.exceptions.NoNodeError:
-            _LOGGER.info('Placement %s/%s not found', self._hostname, app)
-            return
+            manifest_time = os.stat(manifest_file).st_ctime
+        except FileNotFoundError:
+            manifest_time = None
+
+        if manifest_time and manifest_time >= placement_time:
+            _LOGGER.info('%s is up to date', manifest_file)
+            return True
+
+        return False
+
+    def _write_manifest(self, app, data, placement_data):
+        """Decode a manifest, merge its placement data and cache it.
+
+        :returns:
+            ``float`` - Time at which the cache file was written.
+        """
+        manifest = _decode(data)
+        # TODO: need a function to parse instance id from name.
+        manifest['task'] = app[app.index('#') + 1:]
+
+        if placement_data is not None:
+            manifest.update(placement_data)
 
         manifest_file = os.path.join(self.tm_env.cache_dir, app)
-        if check_existing:
-            try:
-                manifest_time = os.stat(manifest_file).st_ctime
-            except FileNotFoundError:
-                manifest_time = None
+        fs.write_safe(
+            manifest_file,
+            lambda f: yaml.dump(manifest, stream=f),
+            prefix='.%s-' % app,
+            mode='w',
+            permission=0o644
+        )
+        _LOGGER.info('Created cache manifest: %s', manifest_file)
+        return time.time()
+
+    def _cache_apps(self, zkclient, apps, check_existing=()):
+        """Read the manifest and placement data of apps from Zk and store them
+        as YAML in <cache>/<app>.
+
+        :param ``list`` apps:
+            Instance names.
+        :param check_existing:
+            Instances for which to check if the file already exists and is up
+            to date.
+        """
+        if not apps:
+            return
 
-            if manifest_time and manifest_time >= placement_time:
-                _LOGGER.info('%s is up to date', manifest_file)
-                return
+        start = time.time()
+        check_existing = set(check_existing)
 
-        app_node = z.path.scheduled(app)
-        try:
-            manifest = zkutils.get(zkclient, app_node)
-            # TODO: need a function to parse instance id from name.
-            manifest['task'] = app[app.index('#') + 1:]
-
-            if placement_data is not None:
-                manifest.update(placement_data)
-
-            fs.write_safe(
-                manifest_file,
-                lambda f: yaml.dump(manifest, stream=f),
-                prefix='.%s-' % app,
-                mode='w',
-                permission=0o644
+        placements = zkutils.pipeline(
+            functools.partial(
+                zkclient.get_async, z.path.placement(self._hostname, app)
             )
-            _LOGGER.info('Created cache manifest: %s', manifest_file)
+            for app in apps
+        )
+
+        placed = []
+        for app, async_result in zip(apps, placements):
+            try:
+                placement_data, placement_metadata = async_result.get()
+            except kazoo.exceptions.NoNodeError:
+                _LOGGER.info('Placement %s/%s not found', self._hostname, app)
+                continue
+
+            placement_time = placement_metadata.ctime / 1000.0
+            if app in check_existing and \
+                    self._is_up_to_date(app, placement_time):
+                continue
 
-        except kazoo.exceptions.NoNodeError:
-            _LOGGER.info('App %s not found', app)
+            placed.append((app, _decode(placement_data), placement_time))
+
+        manifests = zkutils.pipeline(
+            functools.partial(zkclient.get_async, z.path.scheduled(app))
+            for app, _placement_data, _placement_time in placed
+        )
+
+        writes = []
+        with futures.ThreadPoolExecutor(max_workers=_WRITERS) as pool:
+            for (app, placement_data, placement_time), async_result in zip(
+                    placed, manifests):
+                try:
+                    data, _metadata = async_result.get()
+                except kazoo.exceptions.NoNodeError:
+                    _LOGGER.info('App %s not found', app)
+                    continue
+
+                writes.append((
+                    placement_time,
+                    pool.submit(
+                        self._write_manifest, app, data, placement_data
+                    )
+                ))
+
+        # Propagate write errors.
+        latencies = [
+            write.result() - placement_time
+            for placement_time, write in writes
+        ]
+
+        if latencies:
+            _LOGGER.info(
+                'Cached %d manifests in %.3fs, placement to cache: '
+                'avg %.3fs, max %.3fs',
+                len(latencies), time.time() - start,
+                sum(latencies) / len(latencies), max(latencies)
+            )
 
     def _cache_notify(self, is_ready):
         """Send a cache status notification event.
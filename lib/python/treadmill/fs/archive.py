@@ -0,0 +1,309 @@
+"""Seekable tar.gz archives.
+
+Archives are regular tar.gz files, readable by any tar implementation, but
+every member is compressed in its own gzip member (a concatenation of gzip
+members is a valid gzip file). A sidecar index (``<archive>.idx``) records,
+for every file, the offset of its gzip member in the archive, the offset of
+the data in the uncompressed member and the size of the data, so that a
+single file can be read without decompressing the archive from the start.
+
+Independent gzip members are also what allows the members to be compressed
+in parallel.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import errno
+import gzip
+import io
+import json
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+import zlib
+
+from concurrent import futures
+
+import six
+
+from treadmill import fs
+
+
+_LOGGER = logging.getLogger(__name__)
+
+INDEX_EXT = '.idx'
+
+_READ_CHUNK_SIZE = 64 * 1024
+
+_COMPRESS_LEVEL = 6
+
+# Compressed members larger than this are spooled to disk.
+_SPOOL_SIZE = 4 * 1024 * 1024
+
+
+class IndexEntry(collections.namedtuple('IndexEntry',
+                                        'name offset data_offset size')):
+    """Location of a file in a seekable archive.
+
+    :param name:
+        Name of the archive member.
+    :param offset:
+        Offset of the gzip member holding the file in the archive.
+    :param data_offset:
+        Offset of the file data in the uncompressed gzip member.
+    :param size:
+        Size of the file data.
+    """
+    __slots__ = ()
+
+
+def _compress_member(tarinfo, header, fileobj, level):
+    """Compress a tar member (header, data and padding) to a gzip member.
+
+    :returns:
+        Spooled temporary file holding the gzip member.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    member = tempfile.SpooledTemporaryFile(max_size=_SPOOL_SIZE)
+    try:
+        member.write(compressor.compress(header))
+
+        if fileobj is not None:
+            left = tarinfo.size
+            while left > 0:
+                data = fileobj.read(min(left, _READ_CHUNK_SIZE))
+                if not data:
+                    raise IOError(
+                        errno.EIO, 'File shrank while archiving', tarinfo.name
+                    )
+                left -= len(data)
+                member.write(compressor.compress(data))
+
+            # File data is followed by padding to the next tar block.
+            remainder = tarinfo.size % tarfile.BLOCKSIZE
+            if remainder:
+                member.write(compressor.compress(
+                    tarfile.NUL * (tarfile.BLOCKSIZE - remainder)
+                ))
+
+        member.write(compressor.flush())
+        member.seek(0)
+        return member
+    except Exception:
+        member.close()
+        raise
+    finally:
+        if fileobj is not None:
+            fileobj.close()
+
+
+class ArchiveWriter(object):
+    """Write a seekable tar.gz archive and its index.
+
+    Every member is compressed independently, with ``workers`` threads the
+    files are compressed in parallel (zlib releases the GIL) while the
+    compressed members are written to the archive in order. At most
+    ``2 * workers`` members are in flight, each is spooled to a temporary
+    file once larger than ``_SPOOL_SIZE``, so that memory usage does not
+    depend on the size of the files.
+
+    Usage::
+
+        with archive.ArchiveWriter('foo.tar.gz', workers=4) as writer:
+            writer.add('/path/to/file', 'file')
+    """
+
+    def __init__(self, path, workers=1, level=_COMPRESS_LEVEL):
+        self.path = path
+        self.index = {}
+        self._level = level
+        self._file = io.open(path, 'wb')
+        # Only used to build the member headers.
+        self._tar = tarfile.open(fileobj=io.BytesIO(), mode='w')
+        # Position in the uncompressed tar stream.
+        self._pos = 0
+        self._pending = collections.deque()
+        self._max_pending = 2 * workers
+        self._executor = None
+        if workers > 1:
+            self._executor = futures.ThreadPoolExecutor(max_workers=workers)
+
+    def add(self, filename, arcname):
+        """Add a file to the archive."""
+        tarinfo = self._tar.gettarinfo(filename, arcname)
+        header = tarinfo.tobuf(
+            self._tar.format, self._tar.encoding, self._tar.errors
+        )
+
+        fileobj = None
+        if tarinfo.isreg():
+            fileobj = io.open(filename, 'rb')
+
+        if self._executor is None:
+            member = _compress_member(tarinfo, header, fileobj, self._level)
+        else:
+            member = self._executor.submit(
+                _compress_member, tarinfo, header, fileobj, self._level
+            )
+        self._pending.append((tarinfo, len(header), member))
+
+        # Backpressure, do not read ahead of the archive writes.
+        while len(self._pending) > self._max_pending:
+            self._write_next()
+
+    def _write_next(self):
+        """Write the oldest pending member to the archive."""
+        tarinfo, header_size, member = self._pending.popleft()
+        if self._executor is not None:
+            member = member.result()
+
+        offset = self._file.tell()
+        with member:
+            shutil.copyfileobj(member, self._file, _READ_CHUNK_SIZE)
+
+        if tarinfo.isreg():
+            self.index[tarinfo.name] = IndexEntry(
+                name=tarinfo.name,
+                offset=offset,
+                data_offset=header_size,
+                size=tarinfo.size,
+            )
+
+        blocks, remainder = divmod(tarinfo.size, tarfile.BLOCKSIZE)
+        self._pos += header_size + (
+            blocks + bool(remainder)
+        ) * tarfile.BLOCKSIZE
+
+    def _shutdown(self):
+        """Stop the compression threads, discarding the pending members."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+        while self._pending:
+            _tarinfo, _header_size, member = self._pending.popleft()
+            try:
+                if isinstance(member, futures.Future):
+                    member = member.result()
+                member.close()
+            except Exception:  # pylint: disable=W0703
+                pass
+
+    def close(self):
+        """Finish the archive and write its index."""
+        if self._tar is None:
+            return
+
+        while self._pending:
+            self._write_next()
+        self._shutdown()
+
+        # End of archive blocks, padded to a tar record, in their own member.
+        end_size = 2 * tarfile.BLOCKSIZE
+        remainder = (self._pos + end_size) % tarfile.RECORDSIZE
+        if remainder:
+            end_size += tarfile.RECORDSIZE - remainder
+        with gzip.GzipFile(fileobj=self._file, mode='wb') as end:
+            end.write(tarfile.NUL * end_size)
+
+        self._file.close()
+        self._tar = None
+
+        index = {
+            'size': os.stat(self.path).st_size,
+            'members': [list(entry) for entry in six.itervalues(self.index)],
+        }
+        with io.open(self.path + INDEX_EXT + '.tmp', 'w') as f:
+            f.write(six.text_type(json.dumps(index)))
+        os.rename(self.path + INDEX_EXT + '.tmp', self.path + INDEX_EXT)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            # Do not leave partial archives behind.
+            self._shutdown()
+            self._file.close()
+            fs.rm_safe(self.path)
+
+
+def read_index(path):
+    """Read the index of an archive.
+
+    :returns:
+        ``dict`` of member name to ``IndexEntry`` or ``None`` if the archive
+        has no (valid) index.
+    """
+    try:
+        with io.open(path + INDEX_EXT) as f:
+            index = json.load(f)
+        archive_size = os.stat(path).st_size
+    except (IOError, OSError) as err:
+        if err.errno == errno.ENOENT:
+            return None
+        raise
+    except ValueError:
+        _LOGGER.warning('Invalid archive index: %s', path + INDEX_EXT)
+        return None
+
+    if index.get('size') != archive_size:
+        _LOGGER.warning('Stale archive index: %s', path + INDEX_EXT)
+        return None
+
+    return {
+        entry[0]: IndexEntry(*entry)
+        for entry in index['members']
+    }
+
+
+def read_member(path, entry):
+    """Read an archive member, decompressing only its gzip member.
+
+    :returns:
+        Generator of data chunks.
+    """
+    with io.open(path, 'rb') as f:
+        f.seek(entry.offset)
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        skip = entry.data_offset
+        left = entry.size
+        while left > 0:
+            compressed = f.read(_READ_CHUNK_SIZE)
+            if not compressed:
+                raise EOFError('Truncated archive: %s' % path)
+
+            data = decompressor.decompress(compressed)
+            if skip:
+                skipped = min(skip, len(data))
+                data = data[skipped:]
+                skip -= skipped
+
+            if data:
+                data = data[:left]
+                left -= len(data)
+                yield data
+
+
+def remove(path):
+    """Remove an archive and its index."""
+    fs.rm_safe(path)
+    fs.rm_safe(path + INDEX_EXT)
+
+
+__all__ = [
+    'ArchiveWriter',
+    'INDEX_EXT',
+    'IndexEntry',
+    'read_index',
+    'read_member',
+    'remove',
+]
@@ -0,0 +1,132 @@
+"""Background worker thread, signaling completed jobs through an eventfd.
+
+Jobs are queued by the owner, run one after the other by the worker thread,
+and their results processed in the event loop of the owner: the eventfd of
+the worker (:func:`JobWorker.fileno`) is readable once jobs completed, their
+results are then taken with :func:`JobWorker.completed`.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import logging
+import os
+import struct
+import threading
+
+from six.moves import queue
+
+from treadmill.syscall import eventfd
+
+
+_LOGGER = logging.getLogger(__name__)
+
+_EVENT = struct.pack('@Q', 1)
+
+
+class JobWorker(object):
+    """Background thread running queued jobs.
+
+    :param name:
+        Name of the worker thread.
+    :param run_job:
+        Function running a job and returning its result.
+    """
+
+    __slots__ = (
+        'name',
+        '_run_job',
+        '_jobs',
+        '_done',
+        '_eventfd',
+        '_thread',
+    )
+
+    def __init__(self, name, run_job):
+        self.name = name
+        self._run_job = run_job
+        self._jobs = queue.Queue()
+        self._done = collections.deque()
+        self._eventfd = None
+        self._thread = None
+
+    @property
+    def running(self):
+        """Whether the worker thread is running."""
+        return self._thread is not None
+
+    def start(self):
+        """Start the worker thread."""
+        if self._thread is not None:
+            return
+        if self._eventfd is None:
+            self._eventfd = eventfd.eventfd(0, eventfd.EFD_CLOEXEC)
+        self._thread = threading.Thread(name=self.name, target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the worker thread, after the queued jobs."""
+        if self._thread is not None:
+            self._jobs.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def join(self):
+        """Wait for the queued jobs."""
+        self._jobs.join()
+
+    def fileno(self):
+        """Eventfd readable once jobs completed, ``None`` if never started.
+        """
+        return self._eventfd
+
+    def put(self, job):
+        """Queue a job."""
+        self._jobs.put(job)
+
+    def completed(self):
+        """Take the completed jobs.
+
+        :returns:
+            ``list`` of ``(job, result, error)``, in completion order.
+        """
+        if self._eventfd is not None:
+            os.read(self._eventfd, 8)
+
+        completed = []
+        while self._done:
+            completed.append(self._done.popleft())
+        return completed
+
+    def _run(self):
+        """Run the queued jobs."""
+        while True:
+            job = self._jobs.get()
+            try:
+                if job is None:
+                    return
+                self._done.append(self._run_one(job))
+                os.write(self._eventfd, _EVENT)
+            finally:
+                self._jobs.task_done()
+
+    def _run_one(self, job):
+        """Run a job.
+
+        :returns:
+            ``(job, result, error)``.
+        """
+        try:
+            return (job, self._run_job(job), None)
+        except Exception as err:  # pylint: disable=W0703
+            _LOGGER.exception('%s job failed: %r', self.name, job)
+            return (job, None, err)
+
+
+__all__ = [
+    'JobWorker',
+]
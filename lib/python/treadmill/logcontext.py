@@ -9,8 +9,16 @@ from __future__ import unicode_literals
 import logging
 import threading
 
-LOCAL_ = threading.local()
-LOCAL_.ctx = []
+
+class _Local(threading.local):
+    """Thread local log context, initially empty in every thread."""
+
+    def __init__(self):
+        super(_Local, self).__init__()
+        self.ctx = []
+
+
+LOCAL_ = _Local()
 
 
 class Adapter(logging.LoggerAdapter):
@@ -29,12 +37,20 @@ class Adapter(logging.LoggerAdapter):
         """
         Allow initializing w/o any 'extra' value.
         """
+        self._extra = None
         super(Adapter, self).__init__(logger, extra)
 
-        if self.extra:
-            self.extra = [self.extra]
-        else:
-            self.extra = LOCAL_.ctx
+    @property
+    def extra(self):
+        """The 'extra' value or the log context of the current thread."""
+        if self._extra is not None:
+            return self._extra
+        return LOCAL_.ctx
+
+    @extra.setter
+    def extra(self, value):
+        """Set the 'extra' value, no value means the thread log context."""
+        self._extra = [value] if value else None
 
     def process(self, msg, kwargs):
         """
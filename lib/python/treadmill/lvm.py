@@ -257,6 +257,22 @@ def lvcreate(volume, size_in_bytes, group):
     return subproc.check_call(cmd)
 
 
+###############################################################################
+def lvrename(volume, new_name, group):
+    """Rename a LVM logical volume.
+    """
+    return subproc.check_call(
+        [
+            'lvm',
+            'lvrename',
+            '--autobackup', 'n',
+            group,
+            volume,
+            new_name,
+        ]
+    )
+
+
 ###############################################################################
 def lvremove(volume, group):
     """Remove a LVM logical volume.
@@ -366,6 +382,7 @@ __all__ = [
     'lvcreate',
     'lvdisplay',
     'lvremove',
+    'lvrename',
     'lvsdisplay',
     'pvcreate',
     'vgactivate',
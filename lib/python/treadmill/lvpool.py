@@ -0,0 +1,248 @@
+"""Pool of pre-created LVM logical volumes.
+
+Creating a logical volume for a container takes several LVM commands
+(``lvcreate``, ``lvdisplay`` and a ``vgdisplay`` to refresh the free space).
+The pool keeps volumes of the most used sizes created ahead of time, a
+container volume is then a single ``lvrename`` of a spare volume away.
+
+    - The free extents of the volume group are tracked in memory, extents are
+      taken when a volume is created and given back once it is removed.
+    - Spare volumes are created, and released volumes removed, by a
+      background :class:`treadmill.jobworker.JobWorker` thread. Completed
+      operations are processed in the event loop of the owner with
+      :func:`VolumePool.process`.
+    - Spare volumes are removed when a volume can not be created otherwise,
+      containers come first. The owner should only :func:`VolumePool.refill`
+      the pool when no container is waiting for space.
+
+The LVM commands are run through the ``lvm_`` module/object, the
+:mod:`treadmill.lvm` module by default.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import binascii
+import collections
+import logging
+import math
+import os
+
+import six
+
+from treadmill import jobworker
+from treadmill import lvm
+
+
+_LOGGER = logging.getLogger(__name__)
+
+POOL_LV_PREFIX = 'tmpool-'
+
+_CREATE = 'create'
+_REMOVE = 'remove'
+
+
+def volume_info(lv_info):
+    """Volume information kept for a logical volume."""
+    return {
+        k: lv_info[k]
+        for k in ['name', 'block_dev', 'dev_major', 'dev_minor', 'extent_size']
+    }
+
+
+class VolumePool(object):
+    """Pre-created logical volumes, by size in extents.
+
+    :param group:
+        Name of the LVM volume group.
+    :param targets:
+        ``dict`` of volume size (bytes) to the number of spare volumes of
+        that size to keep.
+    :param lvm_:
+        LVM commands, :mod:`treadmill.lvm` by default.
+    """
+
+    __slots__ = (
+        'group',
+        'extent_size',
+        'extent_free',
+        'spares',
+        '_targets',
+        '_lvm',
+        '_creating',
+        '_worker',
+    )
+
+    def __init__(self, group, targets=None, lvm_=lvm):
+        self.group = group
+        self.extent_size = None
+        self.extent_free = 0
+        # Spare volumes, by size in extents.
+        self.spares = collections.defaultdict(list)
+        self._targets = dict(targets or {})
+        self._lvm = lvm_
+        # Spare volumes being created, by size in extents.
+        self._creating = collections.Counter()
+        self._worker = jobworker.JobWorker('lvpool', self._run_job)
+
+    def reset(self, extent_size, extent_free, spares=()):
+        """Set the volume group state, as read from LVM.
+
+        :param extent_size:
+            Extent size, in bytes.
+        :param extent_free:
+            Number of free extents.
+        :param spares:
+            Spare volumes found in the volume group.
+        """
+        self.extent_size = extent_size
+        self.extent_free = extent_free
+        self.spares.clear()
+        for volume in spares:
+            self.spares[volume['extent_size']].append(volume)
+
+    def extents(self, size_in_bytes):
+        """Number of extents of a volume of a given size."""
+        return int(math.ceil(size_in_bytes / self.extent_size))
+
+    def start(self):
+        """Start the background thread and create the spare volumes."""
+        self._worker.start()
+        self.refill()
+
+    def stop(self):
+        """Stop the background thread, after the queued operations."""
+        self._worker.stop()
+
+    def join(self):
+        """Wait for the queued operations."""
+        self._worker.join()
+
+    def fileno(self):
+        """Eventfd readable once operations completed, ``None`` if never
+        started.
+        """
+        return self._worker.fileno()
+
+    def acquire(self, name, size_in_bytes):
+        """Get a volume for a container, renamed to ``name``.
+
+        :returns:
+            Volume information ``dict`` or ``None`` if there is not enough
+            space in the volume group (yet).
+        """
+        extents = self.extents(size_in_bytes)
+
+        spares = self.spares.get(extents)
+        if spares:
+            volume = spares.pop()
+            self._lvm.lvrename(volume['name'], name, group=self.group)
+            volume.update(
+                name=name,
+                block_dev=os.path.join(
+                    os.path.dirname(volume['block_dev']), name
+                ),
+            )
+            _LOGGER.info('Using spare volume for %r: %r', name, volume)
+            return volume
+
+        if extents > self.extent_free:
+            # Make room with the spare volumes of other sizes.
+            self._reclaim(extents - self.extent_free)
+            return None
+
+        self.extent_free -= extents
+        try:
+            self._lvm.lvcreate(
+                volume=name,
+                group=self.group,
+                size_in_bytes=size_in_bytes,
+            )
+        except Exception:
+            self.extent_free += extents
+            raise
+
+        return volume_info(self._lvm.lvdisplay(volume=name, group=self.group))
+
+    def release(self, volume):
+        """Remove a volume in the background."""
+        self._worker.put((_REMOVE, volume))
+
+    def refill(self):
+        """Create the missing spare volumes in the background."""
+        if self.extent_size is None:
+            return
+
+        for size, count in six.iteritems(self._targets):
+            extents = self.extents(size)
+            missing = (
+                count - len(self.spares[extents]) - self._creating[extents]
+            )
+            while missing > 0 and extents <= self.extent_free:
+                self.extent_free -= extents
+                self._creating[extents] += 1
+                self._worker.put((_CREATE, extents))
+                missing -= 1
+
+    def _reclaim(self, extents):
+        """Remove spare volumes, to free a number of extents."""
+        for size in sorted(self.spares, reverse=True):
+            while self.spares[size] and extents > 0:
+                volume = self.spares[size].pop()
+                _LOGGER.info('Removing spare volume: %r', volume)
+                self.release(volume)
+                extents -= size
+
+    def _run_job(self, job):
+        """Run a LVM operation, in the background thread.
+
+        :returns:
+            The created volume information or the lvremove result.
+        """
+        operation, arg = job
+        if operation == _CREATE:
+            name = POOL_LV_PREFIX + binascii.hexlify(os.urandom(6)).decode()
+            self._lvm.lvcreate(
+                volume=name,
+                group=self.group,
+                size_in_bytes=arg * self.extent_size,
+            )
+            return volume_info(
+                self._lvm.lvdisplay(volume=name, group=self.group)
+            )
+
+        return self._lvm.lvremove(arg['name'], group=self.group)
+
+    def process(self):
+        """Process the completed operations.
+
+        :returns:
+            ``True`` if extents were freed or spare volumes added, volumes
+            not acquired before may be now.
+        """
+        changed = False
+        for (operation, arg), result, error in self._worker.completed():
+            if operation == _CREATE:
+                self._creating[arg] -= 1
+                if error is None:
+                    self.spares[arg].append(result)
+                else:
+                    self.extent_free += arg
+                changed = True
+            elif error is None:
+                _LOGGER.info('Destroyed volume %r', arg['name'])
+                self.extent_free += arg['extent_size']
+                changed = True
+            # Volumes failing removal keep their extents, they are removed as
+            # stale volumes at the next start.
+
+        return changed
+
+
+__all__ = [
+    'POOL_LV_PREFIX',
+    'VolumePool',
+    'volume_info',
+]
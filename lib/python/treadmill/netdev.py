@@ -1,4 +1,7 @@
 """Network device management.
+
+Links and bridges are managed over rtnetlink (see :mod:`treadmill.netlink`),
+addresses and routes are still configured with ``ip``.
 """
 
 from __future__ import absolute_import
@@ -14,6 +17,7 @@ import os
 import enum
 import six
 
+from treadmill import netlink
 from treadmill import subproc
 
 
@@ -21,7 +25,6 @@ _LOGGER = logging.getLogger(__name__)
 
 _SYSFS_NET = '/sys/class/net'
 _BRCTL_EXE = 'brctl'
-_IP_EXE = 'ip'
 
 _PROC_CONF_PROXY_ARP = '/proc/sys/net/ipv4/conf/{dev}/proxy_arp'
 _PROC_CONF_FORWARDING = '/proc/sys/net/ipv4/conf/{dev}/forwarding'
@@ -121,14 +124,7 @@ def link_set_up(devname):
     :param ``str`` devname:
         The name of the network device.
     """
-    subproc.check_call(
-        [
-            _IP_EXE, 'link',
-            'set',
-            'dev', devname,
-            'up'
-        ],
-    )
+    _link_request(netlink.link_set(name=devname, up=True))
 
 
 def link_set_down(devname):
@@ -137,14 +133,7 @@ def link_set_down(devname):
     :param ``str`` devname:
         The name of the network device.
     """
-    subproc.check_call(
-        [
-            _IP_EXE, 'link',
-            'set',
-            'dev', devname,
-            'down'
-        ],
-    )
+    _link_request(netlink.link_set(name=devname, up=False))
 
 
 def link_set_name(devname, newname):
@@ -153,13 +142,10 @@ def link_set_name(devname, newname):
     :param ``str`` devname:
         The current name of the network device.
     """
-    subproc.check_call(
-        [
-            _IP_EXE, 'link',
-            'set',
-            'dev', devname,
-            'name', newname,
-        ],
+    _link_request(
+        netlink.link_set(
+            index=netlink.if_nametoindex(devname), new_name=newname
+        )
     )
 
 
@@ -169,14 +155,7 @@ def link_set_alias(devname, alias):
     :param ``str`` devname:
         The name of the network device.
     """
-    subproc.check_call(
-        [
-            _IP_EXE, 'link',
-            'set',
-            'dev', devname,
-            'alias', alias,
-        ],
-    )
+    _link_request(netlink.link_set(name=devname, alias=alias))
 
 
 def link_set_mtu(devname, mtu):
@@ -185,14 +164,7 @@ def link_set_mtu(devname, mtu):
     :param ``str`` devname:
         The name of the network device.
     """
-    subproc.check_call(
-        [
-            _IP_EXE, 'link',
-            'set',
-            'dev', devname,
-            'mtu', six.text_type(mtu),
-        ],
-    )
+    _link_request(netlink.link_set(name=devname, mtu=mtu))
 
 
 def link_set_netns(devname, namespace):
@@ -200,15 +172,10 @@ def link_set_netns(devname, namespace):
 
     :param ``str`` devname:
         The name of the network device.
+    :param ``int`` namespace:
+        PID of a process in the target network namespace.
     """
-    subproc.check_call(
-        [
-            _IP_EXE, 'link',
-            'set',
-            'dev', devname,
-            'netns', six.text_type(namespace),
-        ],
-    )
+    _link_request(netlink.link_set(name=devname, netns_pid=namespace))
 
 
 def link_set_addr(devname, macaddr):
@@ -219,32 +186,79 @@ def link_set_addr(devname, macaddr):
     :param ``str`` macaddr:
         The mac address.
     """
-    subproc.check_call(
-        [
-            _IP_EXE, 'link',
-            'set',
-            'dev', devname,
-            'address', macaddr,
-        ],
-    )
+    _link_request(netlink.link_set(name=devname, address=macaddr))
 
 
-def link_add_veth(veth0, veth1):
+def link_add_veth(veth0, veth1, mtu=None, bridge=None, alias=None,
+                  up=False):
     """Create a virtual ethernet device pair.
 
+    The pair is created, up and in the bridge, with a single netlink request.
+    The kernel ignores the alias of new devices, it is set with a second
+    request once the pair is created.
+
     :param ``str`` veth0:
         The name of the first network device.
     :param ``str`` veth1:
         The name of the second network device.
+    :param ``int`` mtu:
+        MTU of both network devices.
+    :param ``str`` bridge:
+        Name of the bridge device to add the first network device to.
+    :param ``str`` alias:
+        Alias of both network devices.
+    :param ``bool`` up:
+        Bring the first network device up, the second one stays down.
     """
-    subproc.check_call(
-        [
-            _IP_EXE, 'link',
-            'add', 'name', veth0,
-            'type', 'veth',
-            'peer', 'name', veth1
-        ],
-    )
+    master = None
+    if bridge is not None:
+        master = netlink.if_nametoindex(bridge)
+
+    with netlink.RtNetlink() as rtnl:
+        rtnl.request([
+            netlink.link_add_veth(veth0, veth1, up=up, mtu=mtu, master=master)
+        ])
+        # Only once created, not to change devices already there.
+        if alias is not None:
+            rtnl.request([
+                netlink.link_set(name=veth0, alias=alias),
+                netlink.link_set(name=veth1, alias=alias),
+            ])
+
+
+def link_rename_veth(veth0, veth1, newname0, newname1, alias=None,
+                     up=False):
+    """Rename a virtual ethernet device pair.
+
+    Both network devices must be down, they are renamed with a single
+    netlink exchange. If renaming fails, the pair is deleted: either device
+    may have been renamed already.
+
+    :param ``str`` veth0:
+        The current name of the first network device.
+    :param ``str`` veth1:
+        The current name of the second network device.
+    :param ``str`` alias:
+        Alias of both network devices.
+    :param ``bool`` up:
+        Bring the first network device up once renamed.
+    """
+    index0 = netlink.if_nametoindex(veth0)
+    index1 = netlink.if_nametoindex(veth1)
+    with netlink.RtNetlink() as rtnl:
+        try:
+            # The name is changed before the flags, the device is still down.
+            rtnl.request([
+                netlink.link_set(
+                    index=index0, new_name=newname0, alias=alias,
+                    up=up or None
+                ),
+                netlink.link_set(index=index1, new_name=newname1, alias=alias),
+            ])
+        except netlink.NetlinkError:
+            # Deleted by index, whatever its current name.
+            rtnl.request([netlink.link_del(index=index0)])
+            raise
 
 
 def link_del_veth(devname):
@@ -253,14 +267,20 @@ def link_del_veth(devname):
     :param ``str`` devname:
         The name of the network device.
     """
-    subproc.check_call(
-        [
-            _IP_EXE, 'link',
-            'delete',
-            'dev', devname,
-            'type', 'veth',
-        ],
-    )
+    _link_request(netlink.link_del(devname))
+
+
+def _link_request(*requests):
+    """Send link requests on a new rtnetlink socket.
+
+    A new socket is used for every call, netlink sockets are bound to the
+    network namespace they were opened in.
+
+    :raises:
+        ``netlink.NetlinkError`` (``OSError``) if a request fails.
+    """
+    with netlink.RtNetlink() as rtnl:
+        rtnl.request(requests)
 
 
 def addr_add(addr, devname, addr_scope='link'):
@@ -311,13 +331,7 @@ def bridge_create(devname):
     :param ``str`` devname:
         The name of the network device.
     """
-    subproc.check_call(
-        [
-            _BRCTL_EXE,
-            'addbr',
-            devname
-        ],
-    )
+    _link_request(netlink.link_add(devname, 'bridge'))
 
 
 def bridge_delete(devname):
@@ -326,13 +340,7 @@ def bridge_delete(devname):
     :param ``str`` devname:
         The name of the network device.
     """
-    subproc.check_call(
-        [
-            _BRCTL_EXE,
-            'delbr',
-            devname
-        ],
-    )
+    _link_request(netlink.link_del(devname))
 
 
 def bridge_setfd(devname, forward_delay):
@@ -357,13 +365,10 @@ def bridge_addif(devname, interface):
     :param ``str`` devname:
         The name of the network device.
     """
-    subproc.check_call(
-        [
-            _BRCTL_EXE,
-            'addif',
-            devname,
-            interface,
-        ],
+    _link_request(
+        netlink.link_set(
+            name=interface, master=netlink.if_nametoindex(devname)
+        )
     )
 
 
@@ -373,14 +378,8 @@ def bridge_delif(devname, interface):
     :param ``str`` devname:
         The name of the network device.
     """
-    subproc.check_call(
-        [
-            _BRCTL_EXE,
-            'delif',
-            devname,
-            interface,
-        ],
-    )
+    del devname
+    _link_request(netlink.link_set(name=interface, master=0))
 
 
 def bridge_forward_delay(devname):
@@ -0,0 +1,403 @@
+"""Minimal rtnetlink(7) client for network link management.
+
+Link operations are sent as ``RTM_*LINK`` requests on a ``NETLINK_ROUTE``
+socket instead of running ``ip``/``brctl``. Several requests can be sent
+with a single ``sendmsg`` (see :func:`RtNetlink.request`), every request is
+acknowledged by the kernel and errors are raised as :class:`NetlinkError`.
+
+The socket is wrapped in a transport (``send``/``recv``/``close``) so that
+tests can replace it with a recording fake.
+
+A netlink socket is bound to the network namespace of the process that
+opened it, open a new client after changing namespace.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import errno
+import fcntl
+import itertools
+import os
+import socket
+import struct
+
+import six
+
+
+NETLINK_ROUTE = 0
+
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_SETLINK = 19
+
+NLM_F_REQUEST = 0x1
+NLM_F_ACK = 0x4
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+
+NLMSG_ERROR = 0x2
+NLMSG_DONE = 0x3
+
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_MTU = 4
+IFLA_MASTER = 10
+IFLA_LINKINFO = 18
+IFLA_NET_NS_PID = 19
+IFLA_IFALIAS = 20
+
+IFLA_INFO_KIND = 1
+IFLA_INFO_DATA = 2
+
+VETH_INFO_PEER = 1
+
+IFF_UP = 0x1
+
+_NLMSGHDR = struct.Struct(str('=LHHLL'))
+_IFINFOMSG = struct.Struct(str('=BxHiII'))
+_RTATTR = struct.Struct(str('=HH'))
+_NLMSGERR = struct.Struct(str('=i'))
+
+_SIOCGIFINDEX = 0x8933
+_IFREQ = struct.Struct(str('16si20x'))
+
+_RECV_SIZE = 64 * 1024
+
+
+class NetlinkError(OSError):
+    """Error reported by the kernel for a netlink request."""
+    pass
+
+
+def _align(length):
+    """Netlink 4 bytes alignment."""
+    return (length + 3) & ~3
+
+
+def attr(attr_type, data):
+    """Pack a netlink attribute (``rtattr``).
+
+    :param data:
+        ``bytes``, ``str`` (packed NUL terminated), ``int`` (packed as u32)
+        or ``list`` of attributes (nested).
+    """
+    if isinstance(data, six.text_type):
+        data = data.encode() + b'\0'
+    elif isinstance(data, six.integer_types):
+        data = struct.pack(str('=I'), data)
+    elif isinstance(data, list):
+        data = b''.join(data)
+
+    length = _RTATTR.size + len(data)
+    return (
+        _RTATTR.pack(length, attr_type) + data +
+        b'\0' * (_align(length) - length)
+    )
+
+
+def ifinfomsg(index=0, flags=0, change=0):
+    """Pack a ``ifinfomsg`` header."""
+    return _IFINFOMSG.pack(socket.AF_UNSPEC, 0, index, flags, change)
+
+
+def if_nametoindex(devname):
+    """Index of a network device, in the current network namespace."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        ifreq = fcntl.ioctl(
+            sock.fileno(), _SIOCGIFINDEX,
+            _IFREQ.pack(devname.encode(), 0)
+        )
+    finally:
+        sock.close()
+    return _IFREQ.unpack(ifreq)[1]
+
+
+def parse_messages(data):
+    """Split netlink messages.
+
+    :returns:
+        List of ``(type, flags, seq, payload)``.
+    """
+    messages = []
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        length, msg_type, flags, seq, _pid = _NLMSGHDR.unpack_from(
+            data, offset
+        )
+        if length < _NLMSGHDR.size:
+            break
+        messages.append(
+            (msg_type, flags, seq,
+             data[offset + _NLMSGHDR.size:offset + length])
+        )
+        offset += _align(length)
+    return messages
+
+
+def parse_attrs(data):
+    """Split netlink attributes.
+
+    :returns:
+        ``dict`` of attribute type to data.
+    """
+    attrs = {}
+    offset = 0
+    while offset + _RTATTR.size <= len(data):
+        length, attr_type = _RTATTR.unpack_from(data, offset)
+        if length < _RTATTR.size:
+            break
+        attrs[attr_type] = data[offset + _RTATTR.size:offset + length]
+        offset += _align(length)
+    return attrs
+
+
+def parse_link(payload):
+    """Parse a link message payload.
+
+    :returns:
+        ``(index, flags, change, attrs)``.
+    """
+    _family, _type, index, flags, change = _IFINFOMSG.unpack_from(payload)
+    return (index, flags, change, parse_attrs(payload[_IFINFOMSG.size:]))
+
+
+def ack(seq, error=0):
+    """Pack the acknowledgement of a request (``NLMSG_ERROR``)."""
+    payload = _NLMSGERR.pack(-error) + _NLMSGHDR.pack(0, 0, 0, seq, 0)
+    return _NLMSGHDR.pack(
+        _NLMSGHDR.size + len(payload), NLMSG_ERROR, 0, seq, 0
+    ) + payload
+
+
+class SocketTransport(object):
+    """NETLINK_ROUTE socket."""
+
+    __slots__ = (
+        '_sock',
+    )
+
+    def __init__(self):
+        # pylint: disable=no-member
+        self._sock = socket.socket(
+            socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE
+        )
+        self._sock.bind((0, 0))
+
+    def send(self, data):
+        """Send messages."""
+        self._sock.sendall(data)
+
+    def recv(self):
+        """Receive messages."""
+        return self._sock.recv(_RECV_SIZE)
+
+    def close(self):
+        """Close the socket."""
+        self._sock.close()
+
+
+class RtNetlink(object):
+    """rtnetlink client.
+
+    Usage::
+
+        with netlink.RtNetlink() as rtnl:
+            rtnl.request([netlink.link_set(name='eth0', up=True)])
+    """
+
+    __slots__ = (
+        '_transport',
+        '_seq',
+    )
+
+    def __init__(self, transport=None):
+        if transport is None:
+            transport = SocketTransport()
+        self._transport = transport
+        self._seq = itertools.count(1)
+
+    def request(self, requests):
+        """Send requests at once and wait for their acknowledgements.
+
+        All the requests are processed by the kernel, the first error is
+        raised once they are all acknowledged.
+
+        :param requests:
+            List of ``(type, flags, payload)``, see :func:`link_set` etc.
+        """
+        pending = {}
+        data = []
+        for msg_type, flags, payload in requests:
+            seq = next(self._seq)
+            pending[seq] = (msg_type, payload)
+            length = _NLMSGHDR.size + len(payload)
+            data.append(
+                _NLMSGHDR.pack(
+                    length, msg_type, flags | NLM_F_REQUEST | NLM_F_ACK, seq,
+                    0
+                ) + payload + b'\0' * (_align(length) - length)
+            )
+        self._transport.send(b''.join(data))
+
+        error = None
+        while pending:
+            messages = parse_messages(self._transport.recv())
+            if not messages:
+                raise NetlinkError(errno.EIO, 'Invalid netlink reply')
+
+            for msg_type, _flags, seq, payload in messages:
+                if msg_type != NLMSG_ERROR or seq not in pending:
+                    continue
+                request = pending.pop(seq)
+                code = -_NLMSGERR.unpack_from(payload)[0]
+                if code and error is None:
+                    error = NetlinkError(
+                        code, os.strerror(code), _describe(request)
+                    )
+
+        if error is not None:
+            raise error
+
+    def close(self):
+        """Close the transport."""
+        self._transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _describe(request):
+    """Describe a request, for error messages."""
+    msg_type, payload = request
+    index, _flags, _change, attrs = parse_link(payload)
+    name = attrs.get(IFLA_IFNAME)
+    return '{type}(index={index}, name={name})'.format(
+        type={
+            RTM_NEWLINK: 'RTM_NEWLINK',
+            RTM_DELLINK: 'RTM_DELLINK',
+            RTM_SETLINK: 'RTM_SETLINK',
+        }.get(msg_type, msg_type),
+        index=index,
+        name=name.rstrip(b'\0').decode() if name is not None else None,
+    )
+
+
+def _link_attrs(mtu=None, alias=None, address=None, master=None,
+                netns_pid=None):
+    """Attributes of a link."""
+    attrs = []
+    if mtu is not None:
+        attrs.append(attr(IFLA_MTU, int(mtu)))
+    if alias is not None:
+        # Sent without NUL, as iproute2 does.
+        attrs.append(attr(IFLA_IFALIAS, alias.encode()))
+    if address is not None:
+        attrs.append(
+            attr(IFLA_ADDRESS, bytes(bytearray(
+                int(octet, 16) for octet in address.split(':')
+            )))
+        )
+    if master is not None:
+        attrs.append(attr(IFLA_MASTER, master))
+    if netns_pid is not None:
+        attrs.append(attr(IFLA_NET_NS_PID, int(netns_pid)))
+    return attrs
+
+
+def link_set(name=None, index=0, new_name=None, up=None, **attrs):
+    """Request changing a link, identified by name or index.
+
+    :param new_name:
+        New name of the link, the link must be identified by index.
+    :param up:
+        ``True``/``False`` to bring the link up/down, ``None`` to leave it.
+    :param attrs:
+        ``mtu``, ``alias``, ``address``, ``master`` (index, 0 for none),
+        ``netns_pid``.
+    """
+    assert new_name is None or index, 'Renaming requires the link index.'
+    flags = change = 0
+    if up is not None:
+        change = IFF_UP
+        flags = IFF_UP if up else 0
+
+    payload = [ifinfomsg(index=index, flags=flags, change=change)]
+    if new_name is not None:
+        payload.append(attr(IFLA_IFNAME, new_name))
+    elif name is not None:
+        payload.append(attr(IFLA_IFNAME, name))
+    payload.extend(_link_attrs(**attrs))
+    return (RTM_SETLINK, 0, b''.join(payload))
+
+
+def link_add(name, kind, up=False, data=None, **attrs):
+    """Request creating a link.
+
+    :param kind:
+        Link type (e.g. ``veth``, ``bridge``).
+    :param data:
+        List of type specific attributes.
+    """
+    linkinfo = [attr(IFLA_INFO_KIND, kind)]
+    if data is not None:
+        linkinfo.append(attr(IFLA_INFO_DATA, data))
+
+    payload = [
+        ifinfomsg(flags=IFF_UP if up else 0, change=IFF_UP if up else 0),
+        attr(IFLA_IFNAME, name),
+    ]
+    payload.extend(_link_attrs(**attrs))
+    payload.append(attr(IFLA_LINKINFO, linkinfo))
+    return (RTM_NEWLINK, NLM_F_CREATE | NLM_F_EXCL, b''.join(payload))
+
+
+def link_add_veth(name, peer, up=False, mtu=None, master=None):
+    """Request creating a virtual ethernet device pair.
+
+    :param up:
+        Bring the first device up, the peer stays down.
+    :param mtu:
+        MTU of both devices.
+    :param master:
+        Index of the bridge to add the first device to.
+    """
+    peer_info = [ifinfomsg(), attr(IFLA_IFNAME, peer)]
+    peer_info.extend(_link_attrs(mtu=mtu))
+    return link_add(
+        name, 'veth', up=up,
+        data=[attr(VETH_INFO_PEER, peer_info)],
+        mtu=mtu, master=master
+    )
+
+
+def link_del(name=None, index=0):
+    """Request deleting a link, identified by name or index."""
+    payload = [ifinfomsg(index=index)]
+    if name is not None:
+        payload.append(attr(IFLA_IFNAME, name))
+    return (RTM_DELLINK, 0, b''.join(payload))
+
+
+__all__ = [
+    'NetlinkError',
+    'RtNetlink',
+    'SocketTransport',
+    'ack',
+    'attr',
+    'if_nametoindex',
+    'ifinfomsg',
+    'link_add',
+    'link_add_veth',
+    'link_del',
+    'link_set',
+    'parse_attrs',
+    'parse_link',
+    'parse_messages',
+]
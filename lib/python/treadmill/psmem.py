@@ -14,6 +14,7 @@ import fnmatch
 import io
 import logging
 import os
+import re
 import sys
 
 from treadmill import sysinfo
@@ -25,11 +26,22 @@ _PAGESIZE = os.sysconf(os.sysconf_names['SC_PAGE_SIZE']) // 1024
 
 _KERNEL_VER = sysinfo.kernel_ver()
 
+_PROC_DIR = '/proc'
+
+# Pss, Shared_* and Private_* values of smaps/smaps_rollup, in kB. The
+# fields never start the content, it starts with the mapping line.
+_PSS_RE = re.compile(br'\nPss:[ \t]+(\d+)')
+_SHARED_RE = re.compile(br'\nShared_\w+:[ \t]+(\d+)')
+_PRIVATE_RE = re.compile(br'\nPrivate_\w+:[ \t]+(\d+)')
+
+# smaps_rollup (Linux 4.14+) sums smaps in the kernel, checked once.
+_HAVE_ROLLUP = None
+
 
 def proc_path(*args):
     """Helper function to construct /proc path.
     """
-    return os.path.join('/proc', *(str(a) for a in args))
+    return os.path.join(_PROC_DIR, *(str(a) for a in args))
 
 
 def proc_open(*args):
@@ -66,16 +78,77 @@ def proc_read(*args):
         return f.read()
 
 
+def proc_readbytes(*args):
+    """Read content of /proc file as bytes.
+    """
+    try:
+        with io.open(proc_path(*args), 'rb') as f:
+            return f.read()
+    except (IOError, OSError) as err:
+        # kernel thread or process gone
+        if err.errno == errno.ENOENT or err.errno == errno.EPERM:
+            raise LookupError
+        raise
+
+
+def read_status(pid):
+    """Read /proc/<pid>/status fields.
+
+    :returns:
+        ``dict`` of field name to (stripped) value.
+    """
+    status = {}
+    for line in proc_readlines(pid, 'status'):
+        key, _sep, value = line.partition(':')
+        status[key] = value.strip()
+    return status
+
+
 def get_thread_id(pid):
     """Read thread group id designated in /proc/<pid>/status.
     """
-    return proc_readlines(pid, 'status')[2][6:-1]
+    return read_status(pid)['Tgid']
 
 
 def get_threads(pid):
     """Read number of threads designated in /proc/<pid>/status.
     """
-    return int(proc_readlines(pid, 'status')[26][8:-1].strip())
+    return int(read_status(pid)['Threads'])
+
+
+def _have_rollup():
+    """Check if the kernel provides /proc/<pid>/smaps_rollup."""
+    global _HAVE_ROLLUP  # pylint: disable=W0603
+    if _HAVE_ROLLUP is None:
+        _HAVE_ROLLUP = os.path.exists(proc_path('self', 'smaps_rollup'))
+    return _HAVE_ROLLUP
+
+
+def parse_smaps(data):
+    """Sum the Pss, Shared_* and Private_* values of smaps content.
+
+    The content is scanned as bytes by compiled patterns with a literal
+    prefix, lines are never split or decoded.
+
+    :returns:
+        ``tuple`` of (private, shared, pss, number of Pss values), in kB.
+    """
+    pss = _PSS_RE.findall(data)
+    return (
+        sum(map(int, _PRIVATE_RE.findall(data))),
+        sum(map(int, _SHARED_RE.findall(data))),
+        sum(map(int, pss)),
+        len(pss),
+    )
+
+
+def _read_smaps(pid):
+    """Read the smaps totals of a process, from smaps_rollup if available.
+    """
+    if _have_rollup():
+        return parse_smaps(proc_readbytes(pid, 'smaps_rollup'))
+
+    return parse_smaps(proc_readbytes(pid, 'smaps'))
 
 
 def get_mem_stats(pid, use_pss=True):
@@ -83,36 +156,22 @@ def get_mem_stats(pid, use_pss=True):
 
     Note: shared is always a subset of rss (trs is not always).
     """
-    statm = proc_readline(pid, 'statm').split()
-    rss = int(statm[1]) * _PAGESIZE
-
-    private_lines = []
-    shared_lines = []
-    pss_lines = []
     have_pss = False
 
     if use_pss and os.path.exists(proc_path(pid, 'smaps')):
-        for line in proc_readlines(pid, 'smaps'):
-            if line.startswith('Shared'):
-                shared_lines.append(line)
-            elif line.startswith('Private'):
-                private_lines.append(line)
-            elif line.startswith('Pss'):
-                have_pss = True
-                pss_lines.append(line)
-
-        shared = sum([int(line.split()[1]) for line in shared_lines])
-        private = sum([int(line.split()[1]) for line in private_lines])
+        private, shared, pss, pss_count = _read_smaps(pid)
 
         # shared + private = rss above
         # the Rss in smaps includes video card mem etc.
-        if have_pss:
-            # add 0.5KiB as this avg error due to trunctation
+        if pss_count:
+            have_pss = True
+            # add 0.5KiB per mapping as this avg error due to trunctation
+            # (smaps_rollup has a single, accurately summed, value).
             pss_adjust = 0.5
-            pss = sum([float(line.split()[1]) + pss_adjust
-                       for line in pss_lines])
-            shared = pss - private
+            shared = pss + pss_adjust * pss_count - private
     else:
+        statm = proc_readline(pid, 'statm').split()
+        rss = int(statm[1]) * _PAGESIZE
         shared = int(statm[2]) * _PAGESIZE
         private = rss - shared
 
@@ -120,8 +179,12 @@ def get_mem_stats(pid, use_pss=True):
     return (int(private * 1024), int(shared * 1024), have_pss)
 
 
-def get_cmd_name(pid, verbose):
-    """Returns truncated command line name given pid."""
+def get_cmd_name(pid, verbose, name=None):
+    """Returns truncated command line name given pid.
+
+    :param name:
+        Name of the process (from /proc/<pid>/status), read if not given.
+    """
     cmdline = proc_read(pid, 'cmdline').split(r'\0')
     if cmdline[-1] == '' and len(cmdline) > 1:
         cmdline = cmdline[:-1]
@@ -157,7 +220,7 @@ def get_cmd_name(pid, verbose):
                 path += ' [deleted]'
 
     exe = os.path.basename(path)
-    cmd = proc_readline(pid, 'status')[6:-1]
+    cmd = name if name is not None else proc_readline(pid, 'status')[6:-1]
     if exe.startswith(cmd):
         cmd = exe
 
@@ -165,19 +228,27 @@ def get_cmd_name(pid, verbose):
 
 
 def get_memory_usage(pids, verbose=False, exclude=None, use_pss=True):
-    """Returns memory stats for list of pids, aggregated by cmd line."""
-    # TODO: pylint complains about too many branches, need to refactor.
-    # pylint: disable=R0912
+    """Returns memory stats for list of pids, aggregated by cmd line.
+
+    The pids are swept once, every process has its status, command and
+    smaps (or statm) read once, in pid order.
+    """
     meminfos = []
 
-    for pid in pids:
-        thread_id = int(get_thread_id(pid))
-        if not pid or thread_id != pid:
+    for pid in sorted(pids):
+        if not pid:
             continue
 
         try:
-            cmd = get_cmd_name(pid, verbose)
-        except LookupError:
+            status = read_status(pid)
+            thread_id = int(status['Tgid'])
+            if thread_id != pid:
+                # Thread, accounted for with its thread group.
+                continue
+            cmd = get_cmd_name(pid, verbose, name=status['Name'])
+            private, shared, _have_pss = get_mem_stats(pid,
+                                                       use_pss=use_pss)
+        except (LookupError, RuntimeError):
             # kernel threads don't have exe links or
             # process gone
             continue
@@ -186,33 +257,16 @@ def get_memory_usage(pids, verbose=False, exclude=None, use_pss=True):
             continue
 
         if exclude:
-            match = False
-            for pattern in exclude:
-                if fnmatch.fnmatch(cmd, pattern):
-                    match = True
-                    break
-            if match:
+            if any(fnmatch.fnmatch(cmd, pattern) for pattern in exclude):
                 continue
 
-        meminfo = {}
-        meminfo['name'] = cmd
-        meminfo['tgid'] = thread_id
-        try:
-            private, shared, have_pss = get_mem_stats(pid, use_pss=use_pss)
-        except RuntimeError:
-            continue  # process gone
-
-        if 'shared' in meminfo:
-            if have_pss:
-                meminfo['shared'] += shared
-            else:
-                meminfo['shared'] = max(meminfo['shared'], shared)
-        else:
-            meminfo['shared'] = shared
-
-        meminfo['private'] = meminfo.setdefault('private', 0) + private
-        meminfo['threads'] = get_threads(pid)
-        meminfo['total'] = meminfo['private'] + meminfo['shared']
-        meminfos.append(meminfo)
+        meminfos.append({
+            'name': cmd,
+            'tgid': thread_id,
+            'shared': shared,
+            'private': private,
+            'threads': int(status['Threads']),
+            'total': private + shared,
+        })
 
     return meminfos
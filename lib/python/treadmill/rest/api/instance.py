@@ -41,6 +41,14 @@ def init(api, cors, impl):
         'instances': fields.List(fields.String(description='Application ID')),
     })
 
+    app_count = api.model('ApplicationCount', {
+        '_id': fields.String(description='Application ID'),
+        'count': fields.Integer(description='Instance count'),
+    })
+    bulk_create_inst_req = api.model('ReqBulkCreateInstance', {
+        'instances': fields.List(fields.Nested(app_count)),
+    })
+
     # Responses
     app_request_model, app_response_model = app_model.models(api)
     _erorr_id_why, error_model_resp = error_model.models(api)
@@ -58,6 +66,15 @@ def init(api, cors, impl):
         'instances': fields.List(fields.Nested(bulk_update_resp)),
     })
 
+    app_instances = api.clone(
+        'AppInstances', instances_resp_model, error_model_resp, {
+            '_id': fields.String(description='Application ID'),
+        }
+    )
+    create_resp = api.model('CreateInstance', {
+        'instances': fields.List(fields.Nested(app_instances)),
+    })
+
     prio_request_model = api.model('ReqInstancePriority', {
         'priority': fields.List(fields.Integer(description='Priority')),
     })
@@ -95,6 +112,22 @@ def init(api, cors, impl):
             instance_ids = flask.request.json['instances']
             impl.bulk_delete(instance_ids, user)
 
+    @namespace.route(
+        '/_bulk/create',
+    )
+    class _InstanceBulkCreate(restplus.Resource):
+        """Treadmill Instance resource"""
+
+        @webutils.post_api(api, cors,
+                           req_model=bulk_create_inst_req,
+                           resp_model=create_resp)
+        def post(self):
+            """Bulk creates instances of configured applications."""
+            user = flask.g.get('user')
+            creates = flask.request.json['instances']
+            result = impl.bulk_create(creates, user)
+            return {'instances': result}
+
     @namespace.route(
         '/_bulk/update',
     )
@@ -55,7 +55,11 @@ def init(api, cors, impl):
         @webutils.get_api(api, cors)
         def get(self):
             """Returns list of local instances."""
-            return impl.list(flask.request.args.get('state'))
+            return impl.list(
+                flask.request.args.get('state'),
+                start=flask.request.args.get('start', 0, type=int),
+                limit=flask.request.args.get('limit', None, type=int),
+            )
 
     @app_ns.route('/<app>/<uniq>',)
     class _AppDetails(restplus.Resource):
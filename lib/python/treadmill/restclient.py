@@ -8,17 +8,22 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
 import logging
 import os
 import re
+import threading
 import time
 
+from concurrent import futures
+
 import requests
 import requests_unixsocket
 import requests_kerberos
 import simplejson.scanner
 
 from six.moves import http_client
+from six.moves import urllib_parse
 
 # to support unixscoket for URL
 requests_unixsocket.monkeypatch()
@@ -43,6 +48,13 @@ _DEFAULT_CONNECT_TIMEOUT = .5
 
 _CONNECTION_ERROR_STATUS_CODE = 599
 
+# Maximum number of connections kept open per host.
+_POOL_SIZE = 16
+
+# Pooled sessions, by (scheme, netloc).
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
 
 def _msg(response):
     """Get response error message."""
@@ -130,17 +142,72 @@ def _handle_error(url, response):
         raise handlers[response.status_code]
 
 
+def _session(url):
+    """Get the session of the url host.
+
+    Sessions keep the connections to a host open, so that calls do not pay
+    for the connection setup every time. HTTP(S) sessions have their own
+    Kerberos auth, sending the SPNEGO token with every request instead of
+    waiting for the 401 challenge of the server, so that calls do not pay for
+    an extra round trip either.
+    """
+    parsed = urllib_parse.urlsplit(url)
+    key = (parsed.scheme, parsed.netloc)
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(key)
+        if session is None:
+            # Unix socket session, also handles http(s) URLs.
+            session = requests_unixsocket.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=_POOL_SIZE
+            )
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            if parsed.scheme in ('http', 'https'):
+                session.auth = requests_kerberos.HTTPKerberosAuth(
+                    mutual_authentication=requests_kerberos.DISABLED,
+                    principal=_KERBEROS_AUTH_PRINCIPLE,
+                    force_preemptive=True
+                )
+            _SESSIONS[key] = session
+        return session
+
+
+def close_sessions():
+    """Close the pooled sessions."""
+    with _SESSIONS_LOCK:
+        for session in _SESSIONS.values():
+            session.close()
+        _SESSIONS.clear()
+
+
 def _call(url, method, payload=None, headers=None, auth=_KERBEROS_AUTH,
           proxies=None, timeout=None, stream=None):
     """Call REST url with the supplied method and optional payload"""
     _LOGGER.debug('http: %s %s, payload: %s, headers: %s, timeout: %s',
                   method, url, payload, headers, timeout)
 
-    try:
-        response = getattr(requests, method.lower())(
-            url, json=payload, auth=auth, proxies=proxies, headers=headers,
-            timeout=timeout, stream=stream
+    session = _session(url)
+    if auth is _KERBEROS_AUTH and session.auth is not None:
+        auth = session.auth
+
+    def _request(request_auth):
+        """Issue the request."""
+        return getattr(session, method.lower())(
+            url, json=payload, auth=request_auth, proxies=proxies,
+            headers=headers, timeout=timeout, stream=stream
         )
+
+    try:
+        try:
+            response = _request(auth)
+        except requests_kerberos.exceptions.KerberosExchangeError as err:
+            if auth is not session.auth:
+                raise
+            # No token to send up front (e.g. no ticket), let the server
+            # challenge the request.
+            _LOGGER.debug('Preemptive SPNEGO failed: %s', err)
+            response = _request(_KERBEROS_AUTH)
         _LOGGER.debug('response: %r', response)
     except requests.exceptions.ConnectionError:
         _LOGGER.debug('Connection error: %r', url)
@@ -175,8 +242,67 @@ def _call_list(urls, method, payload=None, headers=None, auth=_KERBEROS_AUTH,
     return False, attempts
 
 
+def _close_response(future):
+    """Close the response of an abandoned call, once it completes."""
+    try:
+        _success, response, _status_code = future.result()
+    except Exception:  # pylint: disable=W0703
+        return
+    if response is not None:
+        response.close()
+
+
+def _call_hedged(urls, method, payload=None, headers=None, auth=_KERBEROS_AUTH,
+                 proxies=None, timeout=None, stream=None, hedge_delay=0):
+    """Call list of supplied URLs concurrently, return on first success.
+
+    The next URL is called when the previous calls failed or did not complete
+    within hedge_delay seconds (all at once if hedge_delay is 0).
+    """
+    _LOGGER.debug('Call %s on %r, hedge delay: %s', method, urls, hedge_delay)
+    attempts = []
+    pending = {}
+    urls = collections.deque(urls)
+
+    pool = futures.ThreadPoolExecutor(max_workers=len(urls))
+    try:
+        while urls or pending:
+            if urls:
+                url = urls.popleft()
+                pending[pool.submit(_call, url, method, payload, headers,
+                                    auth, proxies, timeout=timeout,
+                                    stream=stream)] = url
+                if urls and not hedge_delay:
+                    continue
+
+            done, _not_done = futures.wait(
+                pending,
+                timeout=hedge_delay if urls else None,
+                return_when=futures.FIRST_COMPLETED
+            )
+            for future in done:
+                url = pending.pop(future)
+                # Errors which are not retried are raised.
+                success, response, status_code = future.result()
+                if success:
+                    return success, response
+
+                attempts.append(
+                    (time.time(), url, status_code, _msg(response))
+                )
+    finally:
+        # Do not wait for the slower calls, release their connections when
+        # they complete.
+        for future in pending:
+            future.add_done_callback(_close_response)
+        pool.shutdown(wait=False)
+
+    return False, attempts
+
+
 def _call_list_with_retry(urls, method, payload, headers, auth, proxies,
-                          retries, timeout=None, stream=None):
+                          retries, timeout=None, stream=None,
+                          hedge_delay=None):
     """Call list of supplied URLs with retry."""
     if timeout is None:
         if method == 'get':
@@ -187,11 +313,18 @@ def _call_list_with_retry(urls, method, payload, headers, auth, proxies,
     retry = 0
     attempts = []
     while True:
-        success, response = _call_list(
-            urls, method, payload, headers, auth, proxies,
-            timeout=(_DEFAULT_CONNECT_TIMEOUT + retry, timeout),
-            stream=stream
-        )
+        if hedge_delay is None or len(urls) < 2:
+            success, response = _call_list(
+                urls, method, payload, headers, auth, proxies,
+                timeout=(_DEFAULT_CONNECT_TIMEOUT + retry, timeout),
+                stream=stream
+            )
+        else:
+            success, response = _call_hedged(
+                urls, method, payload, headers, auth, proxies,
+                timeout=(_DEFAULT_CONNECT_TIMEOUT + retry, timeout),
+                stream=stream, hedge_delay=hedge_delay
+            )
         if success:
             return response
 
@@ -204,8 +337,15 @@ def _call_list_with_retry(urls, method, payload, headers, auth, proxies,
 
 
 def call(api, url, method, payload=None, headers=None, auth=_KERBEROS_AUTH,
-         proxies=None, retries=_NUM_OF_RETRIES, timeout=None, stream=None):
-    """Call url(s) with retry."""
+         proxies=None, retries=_NUM_OF_RETRIES, timeout=None, stream=None,
+         hedge_delay=None):
+    """Call url(s) with retry.
+
+    By default, the api endpoints are called one after the other. If
+    hedge_delay is set (only for idempotent calls), the next endpoint is
+    called if the previous ones did not answer within hedge_delay seconds,
+    the first success wins.
+    """
     if not api:
         raise NoApiEndpointsError()
 
@@ -215,15 +355,15 @@ def call(api, url, method, payload=None, headers=None, auth=_KERBEROS_AUTH,
     return _call_list_with_retry(
         [endpoint + url for endpoint in api],
         method, payload, headers, auth, proxies, retries, timeout=timeout,
-        stream=stream)
+        stream=stream, hedge_delay=hedge_delay)
 
 
 def get(api, url, headers=None, auth=_KERBEROS_AUTH, proxies=None,
-        retries=_NUM_OF_RETRIES, timeout=None, stream=None):
+        retries=_NUM_OF_RETRIES, timeout=None, stream=None, hedge_delay=None):
     """Convenience function to get a resoure"""
     return call(api, url, 'get',
                 headers=headers, auth=auth, proxies=proxies, retries=retries,
-                timeout=timeout, stream=stream)
+                timeout=timeout, stream=stream, hedge_delay=hedge_delay)
 
 
 def post(api, url, payload, headers=None, auth=_KERBEROS_AUTH, proxies=None,
@@ -13,7 +13,6 @@ import os
 import random
 import socket
 import stat
-import tarfile
 
 import six
 
@@ -23,6 +22,8 @@ from treadmill import fs
 from treadmill import utils
 from treadmill import plugin_manager
 
+from treadmill.fs import archive as fs_archive
+
 from treadmill.appcfg import abort as app_abort
 from treadmill.appcfg import manifest as app_manifest
 
@@ -32,6 +33,8 @@ STATE_JSON = 'state.json'
 _LOGGER = logging.getLogger(__name__)
 
 _ARCHIVE_LIMIT = utils.size_to_bytes('1G')
+# Threads compressing the archived files.
+_ARCHIVE_WORKERS = 4
 _RUNTIME_NAMESPACE = 'treadmill.runtime'
 
 
@@ -213,9 +216,18 @@ def _cleanup_archive_dir(tm_env):
     infos = []
     dir_size = 0
     for archive in archives:
+        if archive.endswith(fs_archive.INDEX_EXT):
+            # Accounted for with the archive.
+            continue
         archive_stat = os.stat(archive)
-        dir_size += archive_stat.st_size
-        infos.append((archive_stat.st_mtime, archive_stat.st_size, archive))
+        archive_size = archive_stat.st_size
+        try:
+            archive_size += os.stat(archive + fs_archive.INDEX_EXT).st_size
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
+        dir_size += archive_size
+        infos.append((archive_stat.st_mtime, archive_size, archive))
 
     if dir_size <= _ARCHIVE_LIMIT:
         _LOGGER.info('Archive directory below threshold: %s', dir_size)
@@ -229,7 +241,7 @@ def _cleanup_archive_dir(tm_env):
         dir_size -= size
         _LOGGER.info('Unlink old archive %s: ctime: %s, size: %s',
                      archive, ctime, size)
-        fs.rm_safe(archive)
+        fs_archive.remove(archive)
 
 
 def archive_logs(tm_env, name, container_dir):
@@ -249,7 +261,8 @@ def archive_logs(tm_env, name, container_dir):
             else:
                 raise
 
-    with tarfile.open(sys_archive_name, 'w:gz') as f:
+    with fs_archive.ArchiveWriter(sys_archive_name,
+                                  workers=_ARCHIVE_WORKERS) as f:
         logs = glob.glob(
             os.path.join(container_dir, 'sys', '*', 'data', 'log', 'current'))
         for log in logs:
@@ -266,7 +279,8 @@ def archive_logs(tm_env, name, container_dir):
 
         _add(f, os.path.join(container_dir, 'log', 'current'))
 
-    with tarfile.open(app_archive_name, 'w:gz') as f:
+    with fs_archive.ArchiveWriter(app_archive_name,
+                                  workers=_ARCHIVE_WORKERS) as f:
         logs = glob.glob(
             os.path.join(container_dir, 'services', '*', 'data', 'log',
                          'current'))
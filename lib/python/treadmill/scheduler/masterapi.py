@@ -6,6 +6,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import functools
 import logging
 import os
 
@@ -13,6 +14,7 @@ import kazoo
 import six
 
 from treadmill import appevents
+from treadmill import zkcodec
 from treadmill import zknamespace as z
 from treadmill import zkutils
 
@@ -52,42 +54,81 @@ def create_event(zkclient, priority, event, payload):
 
 
 def create_apps(zkclient, app_id, app, count, created_by=None):
-    """Schedules new apps."""
-    instance_ids = []
+    """Schedules new apps.
+
+    The scheduled nodes, then their pending trace events, are created with
+    pipelined async requests. If some nodes fail to be created, the pending
+    trace events of the created ones are still posted, then the first error
+    is raised.
+    """
     acl = zkutils.make_role_acl('servers', 'rwcda')
-    for _idx in range(0, count):
-        node_path = zkutils.put(zkclient,
-                                _app_node(app_id, existing=False),
-                                app,
-                                sequence=True,
-                                acl=[acl])
-        instance_id = os.path.basename(node_path)
-        instance_ids.append(instance_id)
-
-        appevents.post_zk(
-            zkclient,
+    results = zkutils.pipeline(
+        functools.partial(zkutils.create_async,
+                          zkclient,
+                          _app_node(app_id, existing=False),
+                          app,
+                          sequence=True,
+                          acl=[acl])
+        for _idx in range(0, count)
+    )
+    instance_ids = []
+    error = None
+    for async_result in results:
+        try:
+            instance_ids.append(os.path.basename(async_result.get()))
+        except kazoo.exceptions.KazooException as err:
+            if error is None:
+                error = err
+
+    why = '%s:created' % created_by if created_by else 'created'
+    appevents.post_zk_many(
+        zkclient,
+        [
             traceevents.PendingTraceEvent(
                 instanceid=instance_id,
-                why='%s:created' % created_by if created_by else 'created',
+                why=why,
                 payload=''
             )
-        )
+            for instance_id in instance_ids
+        ]
+    )
+
+    if error is not None:
+        raise error
 
     return instance_ids
 
 
 def delete_apps(zkclient, app_ids, deleted_by=None):
-    """Unschedules apps."""
-    for app_id in app_ids:
-        zkutils.ensure_deleted(zkclient, _app_node(app_id))
-
-        appevents.post_zk(
-            zkclient,
+    """Unschedules apps.
+
+    The scheduled nodes are deleted, then their pending delete trace events
+    created, with pipelined async requests.
+    """
+    results = zkutils.pipeline(
+        functools.partial(zkclient.delete_async, _app_node(app_id))
+        for app_id in app_ids
+    )
+    for app_id, async_result in six.moves.zip(app_ids, results):
+        try:
+            async_result.get()
+        except kazoo.client.NoNodeError:
+            pass
+        except kazoo.exceptions.KazooException:
+            # Retry failed requests one by one.
+            zkutils.ensure_deleted(zkclient, _app_node(app_id))
+
+    why = '%s:deleted' % deleted_by if deleted_by else 'deleted'
+    appevents.post_zk_many(
+        zkclient,
+        [
             traceevents.PendingDeleteTraceEvent(
                 instanceid=app_id,
-                why='%s:deleted' % deleted_by if deleted_by else 'deleted'
+                why=why
             )
-        )
+            for app_id in app_ids
+        ]
+    )
 
 
 def get_app(zkclient, app_id):
@@ -108,21 +149,47 @@ def list_running_apps(zkclient):
 
 
 def update_app_priorities(zkclient, updates):
-    """Updates app priority."""
-    modified = []
-    for app_id, priority in six.iteritems(updates):
-        assert 0 <= priority <= 100
+    """Updates app priority.
 
-        app = get_app(zkclient, app_id)
-        if app is None:
+    The apps are read, then the modified ones written, with pipelined async
+    requests. A single event is created for all the modified apps.
+    """
+    app_ids = list(updates)
+    for app_id in app_ids:
+        assert 0 <= updates[app_id] <= 100
+
+    results = zkutils.pipeline(
+        functools.partial(zkclient.get_async, _app_node(app_id))
+        for app_id in app_ids
+    )
+
+    changes = []
+    for app_id, async_result in six.moves.zip(app_ids, results):
+        try:
+            data, _metadata = async_result.get()
+        except kazoo.client.NoNodeError:
             # app does not exist.
             continue
 
-        app['priority'] = priority
+        app = zkcodec.decode(data) or {}
+        app['priority'] = updates[app_id]
+        payload = zkcodec.encode(app, _app_node(app_id))
+        if payload != data:
+            changes.append((app_id, payload))
+
+    results = zkutils.pipeline(
+        functools.partial(zkclient.set_async, _app_node(app_id), payload)
+        for app_id, payload in changes
+    )
 
-        if zkutils.update(zkclient, _app_node(app_id), app,
-                          check_content=True):
-            modified.append(app_id)
+    modified = []
+    for (app_id, _payload), async_result in six.moves.zip(changes, results):
+        try:
+            async_result.get()
+        except kazoo.client.NoNodeError:
+            # app deleted meanwhile.
+            continue
+        modified.append(app_id)
 
     if modified:
         create_event(zkclient, 1, 'apps', modified)
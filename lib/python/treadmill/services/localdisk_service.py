@@ -7,8 +7,8 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import logging
-import math
 import os
+import select
 
 import six
 
@@ -17,7 +17,7 @@ from treadmill import cgutils
 from treadmill import localdiskutils
 from treadmill import logcontext as lc
 from treadmill import lvm
-from treadmill import subproc
+from treadmill import lvpool
 from treadmill import utils
 
 from . import BaseResourceServiceImpl
@@ -26,6 +26,14 @@ _LOGGER = logging.getLogger(__name__)
 
 TREADMILL_LV_PREFIX = 'tm-'
 
+# blkio throttle files and the request values they are set to.
+_BLKIO_THROTTLES = (
+    ('blkio.throttle.write_bps_device', 'write_bps'),
+    ('blkio.throttle.read_bps_device', 'read_bps'),
+    ('blkio.throttle.write_iops_device', 'write_iops'),
+    ('blkio.throttle.read_iops_device', 'read_iops'),
+)
+
 
 def _uniqueid(app_unique_name):
     """Create unique volume name based on unique app name.
@@ -49,6 +57,7 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
         '_default_write_bps',
         '_default_write_iops',
         '_pending',
+        '_pool',
         '_vg_name',
         '_vg_status',
         '_volumes',
@@ -62,7 +71,8 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
     def __init__(self, block_dev, vg_name,
                  read_bps, write_bps, read_iops, write_iops,
                  default_read_bps='20M', default_write_bps='20M',
-                 default_read_iops=100, default_write_iops=100):
+                 default_read_iops=100, default_write_iops=100,
+                 pool_volumes=None):
         super(LocalDiskResourceService, self).__init__()
 
         self._block_dev = block_dev
@@ -75,6 +85,14 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
         self._volumes = {}
         self._extent_reserved = 0
         self._pending = []
+        # Spare volumes to keep, by size.
+        self._pool = lvpool.VolumePool(
+            vg_name,
+            targets={
+                utils.size_to_bytes(size): int(count)
+                for size, count in six.iteritems(pool_volumes or {})
+            },
+        )
         # TODO: temp solution - throttle read/writes to
         #                20M/s. In the future, IO will become part
         #                of app manifest spec and managed by
@@ -94,9 +112,19 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
         # Finally retrieve the LV info
         lvs_info = lvm.lvsdisplay(group=self._vg_name)
 
-        # Mark all retrived volumes that were created by treadmill as 'stale'
-        for lv in lvs_info:
-            lv['stale'] = lv['name'].startswith(TREADMILL_LV_PREFIX)
+        # Unused pool volumes are spares again, all the other volumes created
+        # by treadmill are 'stale'.
+        spares = []
+        for lv in list(lvs_info):
+            if lv['name'].startswith(lvpool.POOL_LV_PREFIX) and \
+                    not lv['open_count']:
+                spares.append(lvpool.volume_info(lv))
+                lvs_info.remove(lv)
+                continue
+
+            lv['stale'] = lv['name'].startswith(
+                (TREADMILL_LV_PREFIX, lvpool.POOL_LV_PREFIX)
+            )
             if lv['open_count']:
                 _LOGGER.warning('Logical volume in use: %r', lv['block_dev'])
 
@@ -106,45 +134,55 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
         ])
 
         volumes = {
-            lv['name']: {
-                k: lv[k]
-                for k in [
-                    'name', 'block_dev',
-                    'dev_major', 'dev_minor',
-                    'extent_size',
-                    'stale',
-                ]
-            }
+            lv['name']: dict(lvpool.volume_info(lv), stale=lv['stale'])
             for lv in lvs_info
         }
         self._volumes = volumes
         self._vg_status = localdiskutils.refresh_vg_status(self._vg_name)
 
+        # From now on, the free extents are tracked by the pool.
+        self._pool.reset(
+            self._vg_status['extent_size'],
+            self._vg_status['extent_free'],
+            spares
+        )
+        self._pool.start()
+
     def synchronize(self):
         """Make sure that all stale volumes are removed.
         """
-        modified = False
         for uniqueid in six.viewkeys(self._volumes.copy()):
             if self._volumes[uniqueid].pop('stale', False):
-                modified = True
                 # This is a stale volume, destroy it.
                 self._destroy_volume(uniqueid)
 
-        if not modified:
-            return
+    def event_handlers(self):
+        if self._pool.fileno() is None:
+            return []
+        return [
+            (self._pool.fileno(), select.POLLIN, self._on_pool_event)
+        ]
 
-        # Now that we successfully removed a volume, retry all the pending
-        # resources.
-        for pending_id in self._pending:
-            self.retry_request(pending_id)
-        self._pending = []
+    def _on_pool_event(self):
+        """Process the completed volume pool operations.
+        """
+        if self._pool.process() and self._pending:
+            # Now that extents were freed, or spare volumes created, retry all
+            # the pending resources. The pool is refilled once they are
+            # served, not to take the extents they are waiting for.
+            for pending_id in self._pending:
+                self.retry_request(pending_id)
+            self._pending = []
 
-        # We just destroyed a volume, refresh cached status from LVM and notify
-        # the service of the availability of the new status.
-        self._vg_status = localdiskutils.refresh_vg_status(self._vg_name)
+        elif not self._pending:
+            self._pool.refill()
+
+        # The free extents changed, notify the service of the new status.
+        return True
 
     def report_status(self):
         status = self._vg_status.copy()
+        status['extent_free'] = self._pool.extent_free
         extent_avail = status['extent_nb'] - self._extent_reserved
         status['size'] = extent_avail * status['extent_size']
         status.update({
@@ -170,90 +208,48 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
             size_in_bytes = utils.size_to_bytes(size)
             uniqueid = _uniqueid(app_unique_name)
 
-            # Create the logical volume
-            existing_volume = uniqueid in self._volumes
-            if not existing_volume:
-                needed = math.ceil(
-                    size_in_bytes / self._vg_status['extent_size']
-                )
-                if needed > self._vg_status['extent_free']:
+            # Create the logical volume, or take it from the pool
+            volume_data = self._volumes.get(uniqueid)
+            if volume_data is None:
+                volume_data = self._pool.acquire(uniqueid, size_in_bytes)
+                if volume_data is None:
                     # If we do not have enough space, delay the creation until
                     # another volume is deleted.
                     log.info(
                         'Delaying request %r until %d extents are free.'
                         ' Current volumes: %r',
-                        rsrc_id, needed, self._volumes)
+                        rsrc_id, self._pool.extents(size_in_bytes),
+                        self._volumes)
                     self._pending.append(rsrc_id)
                     return None
 
-                lvm.lvcreate(
-                    volume=uniqueid,
-                    group=self._vg_name,
-                    size_in_bytes=size_in_bytes,
-                )
-                # We just created a volume, refresh cached status from LVM
-                self._vg_status = localdiskutils.refresh_vg_status(
-                    self._vg_name
-                )
-
-            lv_info = lvm.lvdisplay(
-                volume=uniqueid,
-                group=self._vg_name
-            )
+                # Record existence of the volume.
+                self._volumes[uniqueid] = volume_data
+                if not self._pending:
+                    self._pool.refill()
 
             # Configure block device using cgroups (this is idempotent)
             # FIXME(boysson): The unique id <-> cgroup relation should be
             #                 captured in the cgroup module.
             cgrp = os.path.join('treadmill', 'apps', app_unique_name)
             cgutils.create('blkio', cgrp)
-            major, minor = lv_info['dev_major'], lv_info['dev_minor']
-            cgroups.set_value(
-                'blkio', cgrp,
-                'blkio.throttle.write_bps_device',
-                '{major}:{minor} {bps}'.format(
-                    major=major,
-                    minor=minor,
-                    bps=utils.size_to_bytes(write_bps),
-                )
-            )
-            cgroups.set_value(
-                'blkio', cgrp,
-                'blkio.throttle.read_bps_device',
-                '{major}:{minor} {bps}'.format(
-                    major=major,
-                    minor=minor,
-                    bps=utils.size_to_bytes(read_bps),
-                )
-            )
-            cgroups.set_value(
-                'blkio', cgrp,
-                'blkio.throttle.write_iops_device',
-                '{major}:{minor} {iops}'.format(
-                    major=major,
-                    minor=minor,
-                    iops=write_iops
-                )
-            )
-            cgroups.set_value(
-                'blkio', cgrp,
-                'blkio.throttle.read_iops_device',
-                '{major}:{minor} {iops}'.format(
-                    major=major,
-                    minor=minor,
-                    iops=read_iops
-                )
-            )
-
-            volume_data = {
-                k: lv_info[k]
-                for k in ['name', 'block_dev',
-                          'dev_major', 'dev_minor', 'extent_size']
+            limits = {
+                'read_bps': utils.size_to_bytes(read_bps),
+                'write_bps': utils.size_to_bytes(write_bps),
+                'read_iops': read_iops,
+                'write_iops': write_iops,
             }
+            for pseudofile, limit in _BLKIO_THROTTLES:
+                cgroups.set_value(
+                    'blkio', cgrp, pseudofile,
+                    '{major}:{minor} {limit}'.format(
+                        major=volume_data['dev_major'],
+                        minor=volume_data['dev_minor'],
+                        limit=limits[limit],
+                    )
+                )
 
-            # Record existence of the volume.
-            self._volumes[lv_info['name']] = volume_data
-
-        return volume_data
+        return dict(volume_data)
 
     def on_delete_request(self, rsrc_id):
         app_unique_name = rsrc_id
@@ -261,35 +257,20 @@ class LocalDiskResourceService(BaseResourceServiceImpl):
         with lc.LogContext(_LOGGER, rsrc_id):
             uniqueid = _uniqueid(app_unique_name)
 
-            # Remove it from state (if present)
-            if not self._destroy_volume(uniqueid):
-                return False
-
-            # Now that we successfully removed a volume, retry all the pending
-            # resources.
-            for pending_id in self._pending:
-                self.retry_request(pending_id)
-            self._pending = []
-
-            # We just destroyed a volume, refresh cached status from LVM and
-            # notify the service of the availability of the new status.
-            self._vg_status = localdiskutils.refresh_vg_status(self._vg_name)
-
-        return True
+            # Remove it from state (if present), pending resources are
+            # retried once the volume is actually removed.
+            return self._destroy_volume(uniqueid)
 
     def _destroy_volume(self, uniqueid):
-        """Try destroy a volume from LVM.
+        """Destroy a volume in the background.
         """
         # Remove it from state (if present)
-        self._volumes.pop(uniqueid, None)
-        try:
-            lvm.lvdisplay(uniqueid, group=self._vg_name)
-        except subproc.CalledProcessError:
+        volume = self._volumes.pop(uniqueid, None)
+        if volume is None:
             _LOGGER.warning('Ignoring unknown volume %r', uniqueid)
             return False
 
-        # This should not fail.
-        lvm.lvremove(uniqueid, group=self._vg_name)
-        _LOGGER.info('Destroyed volume %r', uniqueid)
+        self._pool.release(volume)
+        _LOGGER.info('Destroying volume %r', uniqueid)
 
         return True
@@ -9,6 +9,7 @@ from __future__ import unicode_literals
 import errno
 import logging
 import os
+import select
 
 import six
 import netifaces
@@ -16,7 +17,7 @@ import netifaces
 from treadmill import iptables
 from treadmill import logcontext as lc
 from treadmill import netdev
-from treadmill import subproc
+from treadmill import vethpool
 from treadmill import vipfile
 
 from . import BaseResourceServiceImpl
@@ -42,6 +43,7 @@ class NetworkResourceService(BaseResourceServiceImpl):
         'ext_speed',
         '_bridge_mtu',
         '_devices',
+        '_veth_pool',
         '_vips',
     )
 
@@ -55,7 +57,8 @@ class NetworkResourceService(BaseResourceServiceImpl):
     _TM_DEV1 = 'tm1'
     _TM_IP = '192.168.254.254'
 
-    def __init__(self, ext_device, ext_ip=None, ext_mtu=None, ext_speed=None):
+    def __init__(self, ext_device, ext_ip=None, ext_mtu=None, ext_speed=None,
+                 veth_pool_size=0):
         super(NetworkResourceService, self).__init__()
 
         self._vips = None
@@ -75,6 +78,10 @@ class NetworkResourceService(BaseResourceServiceImpl):
             self.ext_ip = _device_ip(ext_device)
         else:
             self.ext_ip = ext_ip
+        # Spare veth pairs to keep.
+        self._veth_pool = vethpool.VethPool(
+            veth_pool_size, self.ext_mtu, self._TMBR_DEV
+        )
 
     def initialize(self, service_dir):
         super(NetworkResourceService, self).initialize(service_dir)
@@ -97,7 +104,7 @@ class NetworkResourceService(BaseResourceServiceImpl):
             netdev.link_set_up(self._TM_DEV1)
             netdev.link_set_up(self._TMBR_DEV)
 
-        except subproc.CalledProcessError:
+        except OSError:
             need_init = True
 
         if need_init:
@@ -121,6 +128,10 @@ class NetworkResourceService(BaseResourceServiceImpl):
             # Treadmill container network.
             if device == self._TM_DEV1:
                 continue
+            # Spare pairs of a previous run are recreated.
+            if vethpool.is_pool_device(device):
+                netdev.link_del_veth(device)
+                continue
 
             dev_info = _device_info(device)
             self._devices[dev_info['alias']] = dev_info
@@ -133,6 +144,9 @@ class NetworkResourceService(BaseResourceServiceImpl):
         for device in self._devices:
             self._devices[device]['stale'] = True
 
+        if self._veth_pool.size:
+            self._veth_pool.start()
+
     def synchronize(self):
         """Cleanup state resource.
         """
@@ -176,6 +190,20 @@ class NetworkResourceService(BaseResourceServiceImpl):
         # Read bridge status
         self._bridge_mtu = netdev.dev_mtu(self._TMBR_DEV)
 
+    def event_handlers(self):
+        if self._veth_pool.fileno() is None:
+            return []
+        return [
+            (self._veth_pool.fileno(), select.POLLIN, self._on_pool_event)
+        ]
+
+    def _on_pool_event(self):
+        """Process the completed veth pool operations.
+        """
+        self._veth_pool.process()
+        # The status does not change.
+        return False
+
     def report_status(self):
         status = {
             'bridge_dev': self._TMBR_DEV,
@@ -218,18 +246,18 @@ class NetworkResourceService(BaseResourceServiceImpl):
                 ip = self._devices[app_unique_name]['ip']
 
             if 'device' not in self._devices[app_unique_name]:
-                # Create the interface pair
-                netdev.link_add_veth(veth0, veth1)
-                # Configure the links
-                netdev.link_set_mtu(veth0, self.ext_mtu)
-                netdev.link_set_mtu(veth1, self.ext_mtu)
-                # Tag the interfaces
-                netdev.link_set_alias(veth0, rsrc_id)
-                netdev.link_set_alias(veth1, rsrc_id)
-                # Add interface to the bridge
-                netdev.bridge_addif(self._TMBR_DEV, veth0)
-                netdev.link_set_up(veth0)
+                # Rename a spare interface pair, or create one, configured
+                # with the MTU, tagged, with veth0 in the bridge and up.
                 # We keep veth1 down until inside the container
+                if not self._veth_pool.acquire(veth0, veth1, rsrc_id):
+                    netdev.link_add_veth(
+                        veth0, veth1,
+                        mtu=self.ext_mtu,
+                        bridge=self._TMBR_DEV,
+                        alias=rsrc_id,
+                        up=True
+                    )
+                self._veth_pool.refill()
 
             # Record the new device in our state
             self._devices[app_unique_name] = _device_info(veth0)
@@ -288,19 +316,19 @@ class NetworkResourceService(BaseResourceServiceImpl):
             #                 bridge.
             netdev.link_set_down(self._TM_DEV0)
             netdev.bridge_delete(self._TM_DEV0)
-        except subproc.CalledProcessError:
+        except OSError:
             pass
 
         try:
             netdev.link_set_down(self._TM_DEV0)
             netdev.link_del_veth(self._TM_DEV0)
-        except subproc.CalledProcessError:
+        except OSError:
             pass
 
         try:
             netdev.link_set_down(self._TMBR_DEV)
             netdev.bridge_delete(self._TMBR_DEV)
-        except subproc.CalledProcessError:
+        except OSError:
             pass
 
         netdev.bridge_create(self._TMBR_DEV)
@@ -1,4 +1,8 @@
 """Watches a directory for manifest changes and creates spawn instances.
+
+Manifests are spawned in batches: the service dirs of all the manifests seen
+in one pass over the directory events are created first, then every affected
+tree bucket is scanned once, instead of once per instance.
 """
 
 from __future__ import absolute_import
@@ -6,9 +10,11 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
 import io
 import logging
 import os
+import time
 
 import six
 
@@ -29,10 +35,14 @@ class ManifestWatch(object):
 
     __slots__ = (
         'paths',
+        'stats',
+        '_batch',
     )
 
     def __init__(self, root, buckets=spawn.BUCKETS):
         self.paths = spawn.SpawnPaths(root, buckets)
+        self.stats = collections.Counter()
+        self._batch = []
         fs.mkdir_safe(self.paths.manifest_dir)
         os.chmod(self.paths.manifest_dir, 0o1777)
 
@@ -64,14 +74,19 @@ class ManifestWatch(object):
             _LOGGER.warning(ex)
 
     def _create_instance(self, path):
-        """Create an spawn instance."""
+        """Create an spawn instance.
+
+        :returns:
+            ``str`` - The tree bucket to scan for the instance.
+        """
         job, bucket, running = spawn_utils.get_instance_path(path, self.paths)
 
         _LOGGER.debug('Creating - (%r, %r)', job, running)
 
         if os.path.exists(running):
+            # Still scan the bucket, in case we stopped before scanning it.
             _LOGGER.debug('Create %r failed - already exists', running)
-            return
+            return bucket
 
         inst = instance.Instance(path)
         data_dir = os.path.join(job, spawn.JOB_DATA_DIR)
@@ -108,7 +123,7 @@ class ManifestWatch(object):
 
         fs.symlink_safe(running, job)
 
-        self._scan(bucket)
+        return bucket
 
     def _on_created(self, path):
         """This is the handler function when new files are seen."""
@@ -116,17 +131,50 @@ class ManifestWatch(object):
             return
 
         _LOGGER.info('New manifest file - %r', path)
-        self._create_instance(path)
-        _LOGGER.info('Created, now removing - %r', path)
-        fs.rm_safe(path)
+        self._batch.append(path)
+
+    def flush(self):
+        """Spawn the instances of the manifests seen since the last flush."""
+        if not self._batch:
+            return
+
+        batch, self._batch = self._batch, []
+        started = time.time()
+
+        buckets = set()
+        for path in batch:
+            buckets.add(self._create_instance(path))
+
+        for bucket in sorted(buckets):
+            self._scan(bucket)
+
+        for path in batch:
+            _LOGGER.info('Created, now removing - %r', path)
+            fs.rm_safe(path)
+
+        elapsed = time.time() - started
+        self.stats.update(
+            batches=1, instances=len(batch), scans=len(buckets)
+        )
+        _LOGGER.info(
+            'Spawned %d instances in %.3fs (%.0f/s), buckets scanned: %d, '
+            'total instances: %d, total scans: %d',
+            len(batch), elapsed, len(batch) / elapsed if elapsed else 0,
+            len(buckets), self.stats['instances'], self.stats['scans']
+        )
 
     def sync(self):
         """Sync manifest dir to running folder."""
         for name in os.listdir(self.paths.manifest_dir):
             self._on_created(os.path.join(self.paths.manifest_dir, name))
+        self.flush()
 
     def get_dir_watch(self):
-        """Construct a watcher for the manifest directory."""
+        """Construct a watcher for the manifest directory.
+
+        The manifests are collected while processing the events, ``flush``
+        spawns them.
+        """
         watch = dirwatch.DirWatcher(self.paths.manifest_dir)
         watch.on_created = self._on_created
         return watch
@@ -10,6 +10,7 @@ import collections
 import itertools
 import logging
 import math
+import threading
 import time
 
 import click
@@ -19,7 +20,7 @@ import six
 from treadmill import context
 from treadmill import restclient
 from treadmill import utils
-from treadmill import yamlwrapper as yaml
+from treadmill import zkcodec
 from treadmill import zknamespace as z
 from treadmill import zkutils
 from treadmill import zkwatchers
@@ -33,9 +34,75 @@ _INTERVAL = float(60 * 60)
 # Delay monitoring for non-existent apps.
 _DELAY_INTERVAL = float(5 * 60)
 
+# Reevaluate at least that often, even if nothing changed.
+_IDLE_INTERVAL = float(60)
+
+# Wait at least that long for a monitor to be due.
+_MIN_INTERVAL = float(1)
+
+_HEADERS = {'X-Treadmill-Trusted-Agent': 'monitor'}
+
+
+def _create_instances(api_url, creates):
+    """Create the instances of the monitors, in bulk.
+
+    :param creates:
+        ``list`` of ``(name, count)``.
+    :returns:
+        ``dict`` of name to ``None`` if created, or the error; names missing
+        from it failed and are retried.
+    """
+    try:
+        response = restclient.post(
+            [api_url], '/instance/_bulk/create',
+            payload={
+                'instances': [
+                    {'_id': name, 'count': count} for name, count in creates
+                ]
+            },
+            headers=_HEADERS
+        )
+    except restclient.NotFoundError:
+        # API without the bulk create endpoint.
+        _LOGGER.warning('Bulk create not supported, creating one by one.')
+        return _create_instances_each(api_url, creates)
+
+    results = {name: None for name, _count in creates}
+    for result in response.json()['instances']:
+        error = result.get('_error')
+        if error:
+            results[error['_id']] = error['why']
+    return results
+
+
+def _create_instances_each(api_url, creates):
+    """Create the instances of the monitors, one monitor at a time."""
+    results = {}
+    for name, count in creates:
+        try:
+            restclient.post(
+                [api_url],
+                '/instance/{}?count={}'.format(name, count),
+                payload={},
+                headers=_HEADERS
+            )
+            results[name] = None
+        except (restclient.NotFoundError,
+                restclient.BadRequestError,
+                restclient.ValidationError) as err:
+            results[name] = err
+        except Exception:  # pylint: disable=W0703
+            _LOGGER.exception('Unable to create instances: %s: %s',
+                              name, count)
+    return results
+
 
 def reevaluate(api_url, state, zkclient, last_waited):
-    """Evaluate state and adjust app count based on monitor"""
+    """Evaluate state and adjust app count based on monitor.
+
+    All the instances to create, and to delete, are sent in a single bulk
+    request.
+    """
     # Disable too many branches/statements warning.
     #
     # pylint: disable=R0912
@@ -77,6 +144,8 @@ def reevaluate(api_url, state, zkclient, last_waited):
 
         conf['last_update'] = now
 
+    creates = []
+    deletes = []
     for name, conf in six.iteritems(monitors):
 
         if suspended.get(name, 0) > now:
@@ -100,59 +169,58 @@ def reevaluate(api_url, state, zkclient, last_waited):
             if allowed <= 0:
                 # in this case available <= 0 as needed >= 1
                 # we got estimated wait time, now + wait seconds
-                print((1 - available) / conf['rate'])
-                waited[name] = now + int((1 - available) / conf['rate'])
+                waited[name] = now + math.ceil(
+                    (1 - available) / conf['rate']
+                )
                 # new wait item, need modify
                 if name not in last_waited:
                     modified = True
 
                 continue
 
-            try:
-                # scheduled, remove app from waited list
-                _scheduled = restclient.post(
-                    [api_url],
-                    '/instance/{}?count={}'.format(name, allowed),
-                    payload={},
-                    headers={'X-Treadmill-Trusted-Agent': 'monitor'}
-                )
+            creates.append((name, allowed))
 
+        elif count < current_count:
+            deletes.extend(grouped[name][:current_count - count])
+
+    if creates:
+        try:
+            results = _create_instances(api_url, creates)
+        except Exception:  # pylint: disable=W0703
+            _LOGGER.exception('Unable to create instances: %r', creates)
+            results = {}
+
+        for name, allowed in creates:
+            if name not in results:
+                continue
+
+            error = results[name]
+            if error is None:
                 if name in last_waited:
-                    # this means app jump out of wait, need to clear it from zk
+                    # this means app jump out of wait, need to clear it
+                    # from zk
                     modified = True
-
-                conf['available'] -= allowed
-            except restclient.NotFoundError:
-                _LOGGER.info('App not configured: %s', name)
-                suspended[name] = now + _DELAY_INTERVAL
-                modified = True
-            except restclient.BadRequestError:
-                _LOGGER.exception('Unable to start: %s', name)
-                suspended[name] = now + _DELAY_INTERVAL
-                modified = True
-            except restclient.ValidationError:
-                _LOGGER.exception('Invalid manifest: %s', name)
+                monitors[name]['available'] -= allowed
+            else:
+                _LOGGER.error('Unable to create instances: %s: %s',
+                              name, error)
                 suspended[name] = now + _DELAY_INTERVAL
                 modified = True
-            except Exception:  # pylint: disable=W0703
-                _LOGGER.exception('Unable to create instances: %s: %s',
-                                  name, needed)
 
-        elif count < current_count:
-            extra = grouped[name][:current_count - count]
-            try:
-                response = restclient.post(
-                    [api_url], '/instance/_bulk/delete',
-                    payload=dict(instances=list(extra)),
-                    headers={'X-Treadmill-Trusted-Agent': 'monitor'}
-                )
-                _LOGGER.info('deleted: %r - %s', extra, response)
+    if deletes:
+        try:
+            response = restclient.post(
+                [api_url], '/instance/_bulk/delete',
+                payload=dict(instances=deletes),
+                headers=_HEADERS
+            )
+            _LOGGER.info('deleted: %r - %s', deletes, response)
 
-                # this means we reduce the count number, no need to wait
-                modified = True
+            # this means we reduce the count number, no need to wait
+            modified = True
 
-            except Exception:  # pylint: disable=W0703
-                _LOGGER.exception('Unable to delete instances: %r', extra)
+        except Exception:  # pylint: disable=W0703
+            _LOGGER.exception('Unable to delete instances: %r', deletes)
 
     # total inactive means
     waited.update(suspended)
@@ -163,16 +231,12 @@ def reevaluate(api_url, state, zkclient, last_waited):
     return waited
 
 
-def _run_sync(api_url):
-    """Sync app monitor count with instance count."""
+def _watch_state(zkclient, state, changed):
+    """Watch the scheduled instances and the monitors.
 
-    zkclient = context.GLOBAL.zk.conn
-
-    state = {
-        'scheduled': {},
-        'monitors': {},
-        'suspended': {},
-    }
+    :param ``threading.Event`` changed:
+        Set when the scheduled instances or the monitors change.
+    """
 
     @zkclient.ChildrenWatch(z.path.scheduled())
     @utils.exit_on_unhandled
@@ -191,6 +255,7 @@ def _run_sync(api_url):
             }
         )
         state['scheduled'] = grouped
+        changed.set()
         return True
 
     def _watch_monitor(name):
@@ -206,7 +271,7 @@ def _run_sync(api_url):
                 return
 
             try:
-                count = yaml.load(data)['count']
+                count = zkcodec.decode(data)['count']
             except Exception:  # pylint: disable=W0703
                 _LOGGER.exception('Invalid monitor: %s', name)
                 return
@@ -218,6 +283,7 @@ def _run_sync(api_url):
                 'last_update': time.time(),
                 'rate': (2.0 * count / _INTERVAL)
             }
+            changed.set()
 
     @zkclient.ChildrenWatch(z.path.appmonitor())
     @utils.exit_on_unhandled
@@ -239,11 +305,44 @@ def _run_sync(api_url):
             _LOGGER.info('Adding missing monitor: %s', name)
             _watch_monitor(name)
 
+        changed.set()
+
+
+def _next_timeout(last_waited):
+    """Time until the next waiting or suspended monitor is due."""
+    if not last_waited:
+        return _IDLE_INTERVAL
+    due = min(six.itervalues(last_waited)) - time.time()
+    return min(max(due, _MIN_INTERVAL), _IDLE_INTERVAL)
+
+
+def _reconcile(api_url, state, zkclient, changed, last_waited):
+    """Wait for a change (or a monitor to be due) and reevaluate."""
+    changed.wait(_next_timeout(last_waited))
+    changed.clear()
+    return reevaluate(api_url, state, zkclient, last_waited)
+
+
+def _run_sync(api_url):
+    """Sync app monitor count with instance count."""
+
+    zkclient = context.GLOBAL.zk.conn
+
+    state = {
+        'scheduled': {},
+        'monitors': {},
+        'suspended': {},
+    }
+    changed = threading.Event()
+
+    _watch_state(zkclient, state, changed)
+
     _LOGGER.info('Ready, loading waited app list')
     last_waited = masterapi.get_suspended_appmonitors(zkclient)
     while True:
-        time.sleep(1)
-        last_waited = reevaluate(api_url, state, zkclient, last_waited)
+        last_waited = _reconcile(
+            api_url, state, zkclient, changed, last_waited
+        )
 
 
 def init():
@@ -20,7 +20,7 @@ from treadmill import zkutils
 _LOGGER = logging.getLogger(__name__)
 
 
-def _run_sync(cellsync_plugins, once):
+def _run_sync(cellsync_plugins, once, incremental=False):
     """Sync Zookeeper with LDAP, runs with lock held.
     """
     while True:
@@ -30,7 +30,10 @@ def _run_sync(cellsync_plugins, once):
         for name in cellsync_plugins:
             try:
                 plugin = plugin_manager.load('treadmill.cellsync', name)
-                plugin()
+                if incremental:
+                    plugin(incremental=True)
+                else:
+                    plugin()
             except Exception:  # pylint: disable=W0703
                 _LOGGER.exception('Error processing sync plugin: %s', name)
 
@@ -51,7 +54,9 @@ def init():
                   help='List of plugins to run.')
     @click.option('--once', is_flag=True, default=False,
                   help='Run once.')
-    def top(no_lock, sync_plugins, once):
+    @click.option('--incremental', is_flag=True, default=False,
+                  help='Only sync the entries changed in LDAP.')
+    def top(no_lock, sync_plugins, once, incremental):
         """Sync LDAP data with Zookeeper data.
         """
         if not no_lock:
@@ -59,9 +64,9 @@ def init():
             lock = zkutils.make_lock(context.GLOBAL.zk.conn,
                                      z.path.election(__name__))
             with lock:
-                _run_sync(sync_plugins, once)
+                _run_sync(sync_plugins, once, incremental)
         else:
             _LOGGER.info('Running without lock.')
-            _run_sync(sync_plugins, once)
+            _run_sync(sync_plugins, once, incremental)
 
     return top
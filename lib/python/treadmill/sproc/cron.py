@@ -29,7 +29,7 @@ _LOGGER = logging.getLogger(__name__)
 
 def _do_watch(zkclient):
     """Actually do the children watch"""
-    scheduler = cron.get_scheduler(zkclient)
+    scheduler = cron.get_scheduler(zkclient, cached=True)
 
     @zkclient.ChildrenWatch(z.CRON_JOBS)
     @utils.exit_on_unhandled
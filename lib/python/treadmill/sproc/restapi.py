@@ -8,11 +8,13 @@ from __future__ import unicode_literals
 
 import sys
 import errno
+import logging
 import time
 import socket as sock
 
 import click
 
+from treadmill import admin
 from treadmill import context
 from treadmill import rest
 from treadmill import zkutils
@@ -22,6 +24,34 @@ from treadmill.rest import api
 from treadmill.rest import error_handlers  # pylint: disable=W0611
 
 
+_LOGGER = logging.getLogger(__name__)
+
+# Minimum interval between two LDAP cache statistics log lines, in seconds.
+_LDAP_CACHE_STATS_INTERVAL = 300
+
+
+def _log_ldap_cache_stats(interval=_LDAP_CACHE_STATS_INTERVAL):
+    """Log the LDAP cache statistics after the requests, at most every
+    interval seconds.
+
+    The cache is per process, every worker logs its own statistics.
+    """
+    last_logged = [time.time()]
+
+    @rest.FLASK_APP.after_request
+    def _after_request_ldap_cache_stats(response):
+        """Log the LDAP cache statistics if the interval elapsed."""
+        now = time.time()
+        if now - last_logged[0] >= interval:
+            last_logged[0] = now
+            stats = admin.CACHE.stats()
+            _LOGGER.info('LDAP cache, hits: %d, misses: %d, size: %d',
+                         stats['hits'], stats['misses'], stats['size'])
+        return response
+
+    return _after_request_ldap_cache_stats
+
+
 def init():
     """Return top level command handler."""
 
@@ -39,10 +69,17 @@ def init():
     @click.option('--backlog', help='Maximum ', default=128)
     @click.option('-A', '--authz', help='Authoriztion argument',
                   required=False)
+    @click.option('--ldap-cache-ttl', type=int, default=0,
+                  help='Cache LDAP object reads for the given seconds.')
+    @click.option('--ldap-page-size', type=int, default=None,
+                  help='LDAP paged search page size.')
     def top(port, socket, auth, title, modules, cors_origin, workers, backlog,
-            authz):
+            authz, ldap_cache_ttl, ldap_page_size):
         """Run Treadmill API server."""
         context.GLOBAL.zk.add_listener(zkutils.exit_on_lost)
+        admin.configure(page_size=ldap_page_size, cache_ttl=ldap_cache_ttl)
+        if ldap_cache_ttl:
+            _log_ldap_cache_stats()
 
         api_paths = api.init(modules, title.replace('_', ' '), cors_origin,
                              authz)
@@ -13,6 +13,7 @@ import signal
 import click
 
 from treadmill import appenv
+from treadmill import cli
 from treadmill import context
 from treadmill import fs
 from treadmill import services
@@ -86,12 +87,17 @@ def init():
         @click.option('--default-write-iops', required=True, type=int,
                       help='Default write IO per second value.',
                       envvar='TREADMILL_LOCALDISK_DEFAULT_WRITE_IOPS')
+        @click.option('--pool-volumes', type=cli.DICT,
+                      help='Spare volumes to keep ready, by size '
+                      '(e.g. 1G=4,10G=2).',
+                      envvar='TREADMILL_LOCALDISK_POOL_VOLUMES')
         def localdisk(img_location, img_size, block_dev, vg_name,
                       block_dev_configuration,
                       block_dev_read_bps, block_dev_write_bps,
                       block_dev_read_iops, block_dev_write_iops,
                       default_read_bps, default_write_bps,
-                      default_read_iops, default_write_iops):
+                      default_read_iops, default_write_iops,
+                      pool_volumes):
             """Runs localdisk service."""
 
             root_dir = local_ctx['root-dir']
@@ -185,6 +191,7 @@ def init():
                 default_write_bps=default_write_bps,
                 default_read_iops=default_read_iops,
                 default_write_iops=default_write_iops,
+                pool_volumes=pool_volumes,
             )
 
         @service.command()
@@ -212,7 +219,9 @@ def init():
                       help='External network MTU.')
         @click.option('--ext-speed', default=None, type=int,
                       help='External network speeds (bps).')
-        def network(ext_device, ext_ip, ext_mtu, ext_speed):
+        @click.option('--veth-pool-size', default=0, type=int,
+                      help='Spare veth pairs to keep ready.')
+        def network(ext_device, ext_ip, ext_mtu, ext_speed, veth_pool_size):
             """Runs the network service.
             """
             root_dir = local_ctx['root-dir']
@@ -229,7 +238,8 @@ def init():
                 ext_device=ext_device,
                 ext_ip=ext_ip,
                 ext_mtu=ext_mtu,
-                ext_speed=ext_speed
+                ext_speed=ext_speed,
+                veth_pool_size=veth_pool_size
             )
 
         del localdisk
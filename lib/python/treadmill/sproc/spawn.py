@@ -38,6 +38,7 @@ def init():
         while True:
             if dirwatch.wait_for_events(60):
                 dirwatch.process_events()
+                watch.flush()
 
     @spawn_grp.command(name='cleanup')
     @click.option('--approot', type=click.Path(exists=True),
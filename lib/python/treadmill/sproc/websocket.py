@@ -7,6 +7,7 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import logging
+import os
 import tornado.httpserver
 import tornado.ioloop
 import tornado.web
@@ -17,6 +18,7 @@ from treadmill import cli
 from treadmill import websocket as ws
 from treadmill.websocket import api
 from treadmill.zksync import utils as zksync_utils
+from treadmill.zksync import zk2sqlite
 
 
 _LOGGER = logging.getLogger(__name__)
@@ -34,7 +36,9 @@ def init():
     @click.option('--port',
                   help='Websocket HTTP port',
                   required=True, default=8080)
-    def websocket(fs_root, modules, port):
+    @click.option('--db', help='Read the zk2fs SQLite mirror database.',
+                  is_flag=True, default=False)
+    def websocket(fs_root, modules, port, db):
         """Treadmill Websocket"""
         _LOGGER.debug('port: %s', port)
 
@@ -46,7 +50,13 @@ def init():
             impl[topic] = topic_impl
             watches.extend(topic_watches)
 
-        pubsub = ws.DirWatchPubSub(fs_root, impl, watches)
+        mirror_db = None
+        if db:
+            mirror_db = zk2sqlite.MirrorDB(
+                os.path.join(fs_root, zk2sqlite.DB_NAME), readonly=True
+            )
+
+        pubsub = ws.DirWatchPubSub(fs_root, impl, watches, mirror_db)
         pubsub.run_detached()
 
         application = tornado.web.Application([(r'/', pubsub.ws)])
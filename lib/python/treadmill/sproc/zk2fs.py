@@ -8,7 +8,6 @@ from __future__ import unicode_literals
 
 import logging
 import os
-import shutil
 import time
 import zlib
 import tempfile
@@ -19,9 +18,8 @@ from treadmill import apptrace
 from treadmill import fs
 from treadmill import context
 from treadmill import zknamespace as z
-from treadmill import utils
 from treadmill.zksync import zk2fs
-from treadmill.zksync import utils as zksync_utils
+from treadmill.zksync import zk2sqlite
 
 
 _LOGGER = logging.getLogger(__name__)
@@ -35,9 +33,8 @@ def _on_add_identity(zk2fs_sync, zkpath):
 
 def _on_del_identity(zk2fs_sync, zkpath):
     """Invoked when identity group is removed."""
-    fpath = zk2fs_sync.fpath(zkpath)
-    _LOGGER.info('Removed identity-group: %s', os.path.basename(fpath))
-    shutil.rmtree(fpath)
+    _LOGGER.info('Removed identity-group: %s', os.path.basename(zkpath))
+    zk2fs_sync.remove_tree(zkpath)
 
 
 def _on_add_endpoint_proid(zk2fs_sync, zkpath):
@@ -48,9 +45,8 @@ def _on_add_endpoint_proid(zk2fs_sync, zkpath):
 
 def _on_del_endpoint_proid(zk2fs_sync, zkpath):
     """Invoked when proid is removed from endpoints (never)."""
-    fpath = zk2fs_sync.fpath(zkpath)
-    _LOGGER.info('Removed proid: %s', os.path.basename(fpath))
-    shutil.rmtree(fpath)
+    _LOGGER.info('Removed proid: %s', os.path.basename(zkpath))
+    zk2fs_sync.remove_tree(zkpath)
 
 
 def _on_add_placement_server(zk2fs_sync, zkpath):
@@ -61,9 +57,8 @@ def _on_add_placement_server(zk2fs_sync, zkpath):
 
 def _on_del_placement_server(zk2fs_sync, zkpath):
     """Invoked when server is removed from placement."""
-    fpath = zk2fs_sync.fpath(zkpath)
-    _LOGGER.info('Removed server: %s', os.path.basename(fpath))
-    shutil.rmtree(fpath)
+    _LOGGER.info('Removed server: %s', os.path.basename(zkpath))
+    zk2fs_sync.remove_tree(zkpath)
 
 
 def _on_add_trace_shard(zk2fs_sync, zkpath):
@@ -85,21 +80,16 @@ def _on_del_trace_shard(zk2fs_sync, zkpath):
 
 def _on_add_trace_event(zk2fs_sync, zkpath):
     """Invoked when trace event is added."""
-    fpath = zk2fs_sync.fpath(zkpath)
-
     # Extract timestamp.
-    _name, timestamp, _rest = os.path.basename(fpath).split(',', 2)
+    _name, timestamp, _rest = os.path.basename(zkpath).split(',', 2)
     utime = float(timestamp)
 
-    zksync_utils.write_data(
-        fpath, None, utime, raise_err=False, tmp_dir=zk2fs_sync.tmp_dir
-    )
+    zk2fs_sync.write(zkpath, None, utime, raise_err=False)
 
 
 def _on_del_trace_event(zk2fs_sync, zkpath):
     """Invoked when trace event is deleted."""
-    fpath = zk2fs_sync.fpath(zkpath)
-    fs.rm_safe(fpath)
+    zk2fs_sync.remove(zkpath)
 
 
 def _on_add_trace_db(zk2fs_sync, zkpath, sow_dir, tmp_dir):
@@ -113,7 +103,7 @@ def _on_add_trace_db(zk2fs_sync, zkpath, sow_dir, tmp_dir):
     db_name = os.path.basename(zkpath)
     os.rename(trace_db.name, os.path.join(sow_dir, db_name))
 
-    utils.touch(zk2fs_sync.fpath(zkpath))
+    zk2fs_sync.write(zkpath, None, time.time())
 
 
 def _on_del_trace_db(zk2fs_sync, zkpath, sow_dir):
@@ -121,8 +111,7 @@ def _on_del_trace_db(zk2fs_sync, zkpath, sow_dir):
     db_path = os.path.join(sow_dir, os.path.basename(zkpath))
     fs.rm_safe(db_path)
 
-    fpath = zk2fs_sync.fpath(zkpath)
-    fs.rm_safe(fpath)
+    zk2fs_sync.remove(zkpath)
 
 
 def init():
@@ -153,9 +142,12 @@ def init():
                   is_flag=True, default=False)
     @click.option('--once', help='Sync once and exit.',
                   is_flag=True, default=False)
+    @click.option('--db', help='Mirror into a SQLite database in the output '
+                  'directory instead of one file per node.',
+                  is_flag=True, default=False)
     def zk2fs_cmd(root, endpoints, identity_groups, appgroups, running,
                   scheduled, servers, servers_data, placement, trace,
-                  app_monitors, once):
+                  app_monitors, once, db):
         """Starts appcfgmgr process."""
 
         fs.mkdir_safe(root)
@@ -163,7 +155,12 @@ def init():
         tmp_dir = os.path.join(root, '.tmp')
         fs.mkdir_safe(tmp_dir)
 
-        zk2fs_sync = zk2fs.Zk2Fs(context.GLOBAL.zk.conn, root, tmp_dir)
+        if db:
+            zk2fs_sync = zk2sqlite.Zk2Sqlite(
+                context.GLOBAL.zk.conn, root, tmp_dir
+            )
+        else:
+            zk2fs_sync = zk2fs.Zk2Fs(context.GLOBAL.zk.conn, root, tmp_dir)
 
         if servers or servers_data:
             zk2fs_sync.sync_children(z.path.server(), watch_data=servers_data)
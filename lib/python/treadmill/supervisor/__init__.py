@@ -41,6 +41,12 @@ All services will be started by Treadmill runtime using 's6-svc' utility. Each
 service will be started with 'svc -o' (run once) option, and Treadmill will
 be responsible for restart and maintaining restart count.
 
+With s6, control, svscan control, supervision checks and waits are performed
+natively (see :mod:`treadmill.supervisor.s6.control`) by writing to the
+supervisor control FIFOs and reading the status files, without forking the s6
+binaries. The s6 binaries remain the fallback when native control is not
+supported.
+
 """
 
 from __future__ import absolute_import
@@ -66,11 +72,13 @@ from . import _utils as supervisor_utils
 
 if os.name == 'nt':
     from . import winss as sup_impl
+    _native_control = None
     _PREFIX = 'winss'
 else:
     # Disable C0411: standard import "import pwd" comes before "import enum"
     import pwd  # pylint: disable=C0411
     from . import s6 as sup_impl
+    from .s6 import control as _native_control
     _PREFIX = 's6'
 
 
@@ -89,6 +97,10 @@ ERR_TIMEOUT = 99
 
 EXITS_DIR = 'exits'
 
+# Password database entries, keyed by user name.
+_PWNAM_CACHE = {}
+_PWNAM_CACHE_TIMEOUT = 300  # 5 mins
+
 
 def open_service(service_dir, existing=True):
     """Open a service object from a service directory.
@@ -144,32 +156,32 @@ def _create_scan_dir_s6(scan_dir, finish_timeout, wait_cgroups=None,
     if not isinstance(scan_dir, sup_impl.ScanDir):
         scan_dir = sup_impl.ScanDir(scan_dir)
 
-    svscan_finish_script = utils.generate_template(
+    svscan_finish_script = utils.render_template(
         's6.svscan.finish',
         timeout=finish_timeout,
         wait_cgroups=wait_cgroups,
         _alias=subproc.get_aliases()
     )
     scan_dir.finish = svscan_finish_script
-    svscan_sigterm_script = utils.generate_template(
+    svscan_sigterm_script = utils.render_template(
         's6.svscan.sigterm',
         kill_svc=kill_svc,
         _alias=subproc.get_aliases()
     )
     scan_dir.sigterm = svscan_sigterm_script
-    svscan_sighup_script = utils.generate_template(
+    svscan_sighup_script = utils.render_template(
         's6.svscan.sighup',
         kill_svc=kill_svc,
         _alias=subproc.get_aliases()
     )
     scan_dir.sighup = svscan_sighup_script
-    svscan_sigint_script = utils.generate_template(
+    svscan_sigint_script = utils.render_template(
         's6.svscan.sigint',
         kill_svc=kill_svc,
         _alias=subproc.get_aliases()
     )
     scan_dir.sigint = svscan_sigint_script
-    svscan_sigquit_script = utils.generate_template(
+    svscan_sigquit_script = utils.render_template(
         's6.svscan.sigquit',
         kill_svc=kill_svc,
         _alias=subproc.get_aliases()
@@ -245,6 +257,22 @@ def read_environ_dir(env_dir):
             raise
 
 
+def _getpwnam(userid):
+    """Lookup a user in the password database, caching the result.
+
+    :raises ``KeyError``:
+        If the user does not exist (misses are not cached).
+    """
+    now = time.time()
+    cached = _PWNAM_CACHE.get(userid)
+    if cached is not None and now - cached[0] < _PWNAM_CACHE_TIMEOUT:
+        return cached[1]
+
+    user_pw = pwd.getpwnam(userid)
+    _PWNAM_CACHE[userid] = (now, user_pw)
+    return user_pw
+
+
 # Disable W0613: Unused argument 'kwargs' (for s6/winss compatibility)
 # pylint: disable=W0613
 def _create_service_s6(base_dir,
@@ -269,12 +297,14 @@ def _create_service_s6(base_dir,
     """Initializes service directory.
 
     Creates run, finish scripts as well as log directory with appropriate
-    run script.
+    run script. Scripts are rendered from cached templates and new service
+    directories are written in a staging directory then atomically renamed
+    into place.
     """
     # Disable R0912: Too many branches
     # pylint: disable=R0912
     try:
-        user_pw = pwd.getpwnam(userid)
+        user_pw = _getpwnam(userid)
 
     except KeyError:
         # Check the identity we are going to run as. It needs to exists on the
@@ -284,8 +314,7 @@ def _create_service_s6(base_dir,
         raise
 
     if isinstance(base_dir, sup_impl.ScanDir):
-        # We are given a scandir as base, use it.
-        svc = base_dir.add_service(name, _service_base.ServiceType.LongRun)
+        svc = LongrunService(base_dir.directory, name)
     else:
         svc = LongrunService(base_dir, name)
 
@@ -303,7 +332,7 @@ def _create_service_s6(base_dir,
         ionice_prio = 6
 
     # Setup the run script
-    svc.run_script = utils.generate_template(
+    svc.run_script = utils.render_template(
         run_script,
         user=userid,
         shell=user_pw.pw_shell,
@@ -315,7 +344,7 @@ def _create_service_s6(base_dir,
 
     if monitor_policy is not None or call_before_finish is not None:
         # Setup the finish script
-        svc.finish_script = utils.generate_template(
+        svc.finish_script = utils.render_template(
             finish_script,
             monitor_policy=monitor_policy,
             trace=trace,
@@ -328,7 +357,7 @@ def _create_service_s6(base_dir,
             logger_args = '-b -p T n20 s1000000'
 
         # Setup the log run script
-        svc.log_run_script = utils.generate_template(
+        svc.log_run_script = utils.render_template(
             log_run_script,
             logdir=os.path.relpath(
                 os.path.join(svc.data_dir, 'log'),
@@ -343,20 +372,27 @@ def _create_service_s6(base_dir,
 
     if monitor_policy is not None:
         svc.timeout_finish = 0
-        if monitor_policy['limit'] > 0:
+    else:
+        svc.timeout_finish = timeout_finish
+
+    with svc.staging():
+        if monitor_policy is not None and monitor_policy['limit'] > 0:
             exits_dir = os.path.join(svc.data_dir, EXITS_DIR)
             fs.mkdir_safe(exits_dir)
             fs.rm_children_safe(exits_dir)
-    else:
-        svc.timeout_finish = timeout_finish
 
-    svc.write()
+        svc.write()
 
-    # Write the app_start script
-    supervisor_utils.script_write(
-        os.path.join(svc.data_dir, 'app_start'),
-        app_run_script
-    )
+        # Write the app_start script
+        supervisor_utils.script_write(
+            os.path.join(svc.data_dir, 'app_start'),
+            app_run_script
+        )
+
+    if isinstance(base_dir, sup_impl.ScanDir):
+        # Register the service in the scan directory. Its definition is
+        # already written and will be read back from disk on demand.
+        svc = base_dir.add_service(name, _service_base.ServiceType.LongRun)
 
     return svc
 
@@ -485,10 +521,46 @@ def _get_wait_action(action):
     return action
 
 
+def _get_action_str(actions):
+    return ''.join(action.value for action in utils.get_iterable(actions))
+
+
+def _native_call(cmd, func_name, *args, **kwargs):
+    """Invoke a native control function, mapping its failures to the exit
+    codes of the equivalent s6 command.
+
+    :returns:
+        The result of the native function or ``NotImplemented`` if native
+        control is not supported (the caller should use the binaries).
+    """
+    if _native_control is None:
+        return NotImplemented
+
+    try:
+        return getattr(_native_control, func_name)(*args, **kwargs)
+
+    except _native_control.UnsupportedError as err:
+        _LOGGER.warning('Native supervisor control unsupported: %s', err)
+        return NotImplemented
+
+    except _native_control.NotSupervisedError:
+        raise subproc.CalledProcessError(ERR_NO_SUP, cmd)
+
+    except (IOError, OSError) as err:
+        _LOGGER.warning('Native supervisor control failed: %r: %s', cmd, err)
+        raise subproc.CalledProcessError(ERR_COMMAND, cmd)
+
+
 def is_supervised(service_dir):
     """Checks if the supervisor is running."""
+    cmd = [_get_cmd('svok'), service_dir]
+
     try:
-        subproc.check_call([_get_cmd('svok'), service_dir])
+        res = _native_call(cmd, 'is_supervised', service_dir)
+        if res is not NotImplemented:
+            return res
+
+        subproc.check_call(cmd)
         return True
     except subproc.CalledProcessError as err:
         # svok returns 1 when the service directory is not supervised.
@@ -519,15 +591,15 @@ def control_service(service_dir, actions, wait=None, timeout=0):
     #     if timeout > 0:
     #         cmd.extend(['-T{}'.format(timeout)])
 
-    action_str = '-'
-    for action in utils.get_iterable(actions):
-        action_str += action.value
+    action_str = _get_action_str(actions)
 
-    cmd.append(action_str)
+    cmd.append('-' + action_str)
     cmd.append(service_dir)
 
     try:
-        subproc.check_call(cmd)
+        res = _native_call(cmd, 'svc', service_dir, action_str)
+        if res is NotImplemented:
+            subproc.check_call(cmd)
         # XXX: Remove below when above bug is fixed.
         if wait is not None:
             wait_service(service_dir, wait, timeout=timeout)
@@ -543,15 +615,19 @@ def control_service(service_dir, actions, wait=None, timeout=0):
 
 def control_svscan(scan_dir, actions):
     """Sends a control signal to a svscan instance."""
-    action_str = '-'
-    for action in utils.get_iterable(actions):
-        action_str += action.value
+    action_str = _get_action_str(actions)
+    cmd = [_get_cmd('svscanctl'), '-' + action_str, scan_dir]
 
-    subproc.check_call([_get_cmd('svscanctl'), action_str, scan_dir])
+    res = _native_call(cmd, 'svscanctl', scan_dir, action_str)
+    if res is NotImplemented:
+        subproc.check_call(cmd)
 
 
 def wait_service(service_dirs, action, all_services=True, timeout=0):
     """Performs a wait task on the given list of service directories.
+
+    :raises ``subproc.CalledProcessError``:
+        With `returncode` set to `ERR_TIMEOUT` if the wait timed out.
     """
     cmd = [_get_cmd('svwait')]
 
@@ -564,7 +640,17 @@ def wait_service(service_dirs, action, all_services=True, timeout=0):
     cmd.append('-' + _get_wait_action(action).value)
     cmd.extend(utils.get_iterable(service_dirs))
 
-    subproc.check_call(cmd)
+    res = _native_call(
+        cmd, 'svwait',
+        list(utils.get_iterable(service_dirs)),
+        _get_wait_action(action).value,
+        all_services=all_services,
+        timeout=timeout
+    )
+    if res is NotImplemented:
+        subproc.check_call(cmd)
+    elif not res:
+        raise subproc.CalledProcessError(ERR_TIMEOUT, cmd)
 
 
 def ensure_not_supervised(service_dir):
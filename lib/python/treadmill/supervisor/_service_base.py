@@ -7,9 +7,11 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import abc
+import contextlib
 import errno
 import logging
 import os
+import tempfile
 
 import enum
 
@@ -73,6 +75,34 @@ class Service(object):
         """
         return self._dir
 
+    @contextlib.contextmanager
+    def staging(self):
+        """Stage the writes of a new service.
+
+        While in the context, the service directory points to a private
+        staging directory (hidden from the scan directory) which is atomically
+        renamed into place on success. Existing services are written in place
+        since they may already be supervised.
+        """
+        final_dir = self._dir
+        if os.path.exists(final_dir):
+            yield self
+            return
+
+        base_dir = os.path.dirname(final_dir)
+        fs.mkdir_safe(base_dir)
+        staging_dir = tempfile.mkdtemp(
+            dir=base_dir,
+            prefix='.{}.'.format(self._name)
+        )
+        self._dir = os.path.join(staging_dir, self._name)
+        try:
+            yield self
+            os.rename(self._dir, final_dir)
+        finally:
+            self._dir = final_dir
+            fs.rmtree_safe(staging_dir)
+
     @abc.abstractmethod
     def write(self):
         """Write down the service definition.
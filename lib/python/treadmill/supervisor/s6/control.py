@@ -0,0 +1,344 @@
+"""Native s6 supervision control.
+
+Talks to ``s6-supervise`` and ``s6-svscan`` directly through their control
+FIFOs and status files instead of forking ``s6-svc``, ``s6-svscanctl``,
+``s6-svok`` and ``s6-svwait`` for every action.
+
+Service control::
+
+    <service_dir>/supervise/control   (FIFO, read by s6-supervise)
+    <service_dir>/supervise/status    (binary status, atomically replaced)
+
+Scan directory control::
+
+    <scan_dir>/.s6-svscan/control     (FIFO, read by s6-svscan)
+
+Waits are multiplexed over a single inotify instance watching the
+``supervise`` directory of every service being waited on.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import errno
+import io
+import logging
+import os
+import select
+import struct
+import time
+
+from treadmill.syscall import inotify
+
+
+_LOGGER = logging.getLogger(__name__)
+
+_SUPERVISE_DIR = 'supervise'
+_SVSCAN_DIR = '.s6-svscan'
+_CONTROL_FILE = 'control'
+_STATUS_FILE = 'status'
+
+# s6 < 2.7: stamp(12) readystamp(12) pid(8) wstat(2) flags(1)
+_STATUS_FMT_V1 = struct.Struct('>12s12sQHB')
+# s6 >= 2.7: stamp(12) readystamp(12) pid(8) pgid(8) wstat(2) flags(1)
+_STATUS_FMT_V2 = struct.Struct('>12s12sQQHB')
+
+_FLAG_PAUSED = 0x01
+_FLAG_FINISHING = 0x02
+_FLAG_WANTUP = 0x04
+_FLAG_READY = 0x08
+
+# Wait states, matching the s6-svwait options.
+WAIT_UP = 'u'
+WAIT_DOWN = 'd'
+WAIT_REALLY_UP = 'U'
+WAIT_REALLY_DOWN = 'D'
+
+_STATUS_EVENTS = (
+    inotify.IN_MOVED_TO |
+    inotify.IN_CLOSE_WRITE |
+    inotify.IN_CREATE |
+    inotify.IN_DELETE_SELF
+)
+
+
+class NotSupervisedError(Exception):
+    """No supervisor process is running on the given directory.
+    """
+
+
+class UnsupportedError(Exception):
+    """The supervisor does not support native control (unknown status
+    format, missing FIFO support, ...); callers should fall back to the s6
+    binaries.
+    """
+
+
+class ServiceStatus(collections.namedtuple('ServiceStatus',
+                                           'pid wstat flags')):
+    """Decoded content of a ``supervise/status`` file.
+
+    :param pid:
+        PID of the supervised process (0 when down).
+    :param wstat:
+        Last wait status of the process.
+    :param flags:
+        Raw status flags.
+    """
+    __slots__ = ()
+
+    @property
+    def is_finishing(self):
+        """Test flag shorthand."""
+        return bool(self.flags & _FLAG_FINISHING)
+
+    @property
+    def is_ready(self):
+        """Test flag shorthand."""
+        return bool(self.flags & _FLAG_READY)
+
+    @property
+    def want_up(self):
+        """Test flag shorthand."""
+        return bool(self.flags & _FLAG_WANTUP)
+
+    @property
+    def is_up(self):
+        """The service process is running (and not finishing)."""
+        return bool(self.pid) and not self.is_finishing
+
+    def match(self, state):
+        """Check if the status satisfies an s6-svwait state.
+
+        :param ``str`` state:
+            One of ``WAIT_UP``, ``WAIT_DOWN``, ``WAIT_REALLY_UP`` or
+            ``WAIT_REALLY_DOWN``.
+        """
+        if state == WAIT_UP:
+            return self.is_up
+        elif state == WAIT_REALLY_UP:
+            return self.is_up and self.is_ready
+        elif state == WAIT_DOWN:
+            return not self.is_up
+        elif state == WAIT_REALLY_DOWN:
+            return not self.pid and not self.is_finishing
+        else:
+            raise ValueError('Invalid wait state: %r' % state)
+
+
+def parse_status(data):
+    """Decode a binary s6 status record.
+
+    :param ``bytes`` data:
+        Content of a ``supervise/status`` file.
+    :returns ``ServiceStatus``:
+        Decoded status.
+    :raises ``UnsupportedError``:
+        If the status format is not known.
+    """
+    if len(data) == _STATUS_FMT_V1.size:
+        (_stamp, _readystamp,
+         pid, wstat, flags) = _STATUS_FMT_V1.unpack(data)
+    elif len(data) == _STATUS_FMT_V2.size:
+        (_stamp, _readystamp,
+         pid, _pgid, wstat, flags) = _STATUS_FMT_V2.unpack(data)
+    else:
+        raise UnsupportedError(
+            'Unknown s6 status format (%d bytes)' % len(data)
+        )
+
+    return ServiceStatus(pid=pid, wstat=wstat, flags=flags)
+
+
+def read_status(service_dir):
+    """Read the status of a supervised service.
+
+    :param ``str`` service_dir:
+        Service directory.
+    :returns ``ServiceStatus``:
+        Current status of the service.
+    :raises ``NotSupervisedError``:
+        If the service was never supervised.
+    """
+    status_file = os.path.join(service_dir, _SUPERVISE_DIR, _STATUS_FILE)
+    try:
+        with io.open(status_file, 'rb') as f:
+            data = f.read()
+    except (IOError, OSError) as err:
+        if err.errno == errno.ENOENT:
+            raise NotSupervisedError(service_dir)
+        raise
+
+    return parse_status(data)
+
+
+def _fifo_write(fifo, data, directory):
+    """Write control bytes to a supervisor FIFO without blocking.
+
+    A FIFO without a reader means there is no supervisor.
+    """
+    try:
+        fd = os.open(fifo, os.O_WRONLY | os.O_NONBLOCK)
+    except OSError as err:
+        if err.errno in (errno.ENOENT, errno.ENXIO, errno.ENOTDIR):
+            raise NotSupervisedError(directory)
+        raise
+
+    try:
+        os.write(fd, data.encode())
+    finally:
+        os.close(fd)
+
+
+def is_supervised(service_dir):
+    """Checks if a supervisor is running on a service directory.
+
+    Equivalent of ``s6-svok``.
+    """
+    control = os.path.join(service_dir, _SUPERVISE_DIR, _CONTROL_FILE)
+    try:
+        fd = os.open(control, os.O_WRONLY | os.O_NONBLOCK)
+    except OSError as err:
+        if err.errno in (errno.ENOENT, errno.ENXIO, errno.ENOTDIR):
+            return False
+        raise
+
+    os.close(fd)
+    return True
+
+
+def svc(service_dir, actions):
+    """Send control actions to a service supervisor.
+
+    Equivalent of ``s6-svc -<actions> <service_dir>``.
+
+    :param ``str`` service_dir:
+        Service directory.
+    :param ``str`` actions:
+        Control characters (see ``supervisor.ServiceControlAction``).
+    """
+    _fifo_write(
+        os.path.join(service_dir, _SUPERVISE_DIR, _CONTROL_FILE),
+        actions,
+        service_dir
+    )
+
+
+def svscanctl(scan_dir, actions):
+    """Send control actions to a scan directory supervisor.
+
+    Equivalent of ``s6-svscanctl -<actions> <scan_dir>``.
+
+    :param ``str`` scan_dir:
+        Scan directory.
+    :param ``str`` actions:
+        Control characters (see ``supervisor.SvscanControlAction``).
+    """
+    _fifo_write(
+        os.path.join(scan_dir, _SVSCAN_DIR, _CONTROL_FILE),
+        actions,
+        scan_dir
+    )
+
+
+def svwait(service_dirs, state, all_services=True, timeout=0):
+    """Wait for services to reach a given state.
+
+    Equivalent of ``s6-svwait [-o] -<state> [-t<timeout>] <service_dirs>``.
+    All the services are watched through a single inotify instance.
+
+    :param ``list`` service_dirs:
+        Service directories to wait on.
+    :param ``str`` state:
+        One of ``WAIT_UP``, ``WAIT_DOWN``, ``WAIT_REALLY_UP`` or
+        ``WAIT_REALLY_DOWN``.
+    :param ``bool`` all_services:
+        Wait for all services (``True``) or any service (``False``).
+    :param ``int`` timeout:
+        Timeout in milliseconds (0 means forever).
+    :returns ``bool``:
+        ``True`` if the condition was met, ``False`` on timeout.
+    """
+    service_dirs = list(service_dirs)
+    if not service_dirs:
+        return True
+
+    if timeout > 0:
+        deadline = time.time() + (timeout / 1000.0)
+    else:
+        deadline = None
+
+    watcher = inotify.Inotify(inotify.IN_CLOEXEC | inotify.IN_NONBLOCK)
+    try:
+        wd_services = {}
+        for service_dir in service_dirs:
+            supervise_dir = os.path.join(service_dir, _SUPERVISE_DIR)
+            try:
+                wd = watcher.add_watch(supervise_dir,
+                                       event_mask=_STATUS_EVENTS)
+            except OSError as err:
+                if err.errno in (errno.ENOENT, errno.ENOTDIR):
+                    raise NotSupervisedError(service_dir)
+                raise
+            wd_services.setdefault(wd, []).append(service_dir)
+
+        poll = select.poll()
+        poll.register(watcher.fileno(), select.POLLIN)
+
+        # Read statuses only after the watches are in place so that no
+        # transition is lost.
+        pending = set(service_dirs)
+        to_check = set(service_dirs)
+        while True:
+            for service_dir in to_check:
+                if read_status(service_dir).match(state):
+                    pending.discard(service_dir)
+
+            if not pending or (not all_services and
+                               len(pending) < len(service_dirs)):
+                return True
+
+            if deadline is None:
+                poll_timeout = -1
+            else:
+                poll_timeout = int((deadline - time.time()) * 1000)
+                if poll_timeout <= 0:
+                    return False
+
+            to_check = set()
+            try:
+                if not poll.poll(poll_timeout):
+                    continue
+            except select.error as err:
+                if getattr(err, 'errno', None) == errno.EINTR:
+                    continue
+                raise
+
+            for event in watcher.read_events():
+                to_check.update(
+                    service_dir
+                    for service_dir in wd_services.get(event.wd, ())
+                    if service_dir in pending
+                )
+    finally:
+        watcher.close()
+
+
+__all__ = [
+    'NotSupervisedError',
+    'ServiceStatus',
+    'UnsupportedError',
+    'WAIT_DOWN',
+    'WAIT_REALLY_DOWN',
+    'WAIT_REALLY_UP',
+    'WAIT_UP',
+    'is_supervised',
+    'parse_status',
+    'read_status',
+    'svc',
+    'svscanctl',
+    'svwait',
+]
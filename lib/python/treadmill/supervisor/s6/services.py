@@ -436,7 +436,7 @@ class LongrunService(_AtomicService):
                 os.path.join(self._dir, 'down'),
                 None
             )
-        else:
+        elif self._default_down is not None:
             fs.rm_safe(os.path.join(self._dir, 'down'))
         if self._timeout_finish is not None:
             _utils.value_write(
@@ -169,7 +169,8 @@ def inotify_rm_watch(fileno, watch_id):
                       'inotify_rm_watch(%r, %r)' % (fileno, watch_id))
 
 
-INOTIFY_EVENT_HDRSIZE = struct.calcsize('iIII')
+_INOTIFY_EVENT_HDR = struct.Struct('iIII')
+INOTIFY_EVENT_HDRSIZE = _INOTIFY_EVENT_HDR.size
 
 
 ###############################################################################
@@ -190,18 +191,24 @@ def _parse_buffer(event_buffer):
     The ``cookie`` member of this struct is used to pair two related
     events, for example, it pairs an IN_MOVED_FROM event with an
     IN_MOVED_TO event.
+
+    The buffer is walked by offset, only the names are copied, so parsing is
+    linear in the size of the buffer.
     """
-    while len(event_buffer) >= INOTIFY_EVENT_HDRSIZE:
-        wd, mask, cookie, length = struct.unpack_from('iIII', event_buffer, 0)
-        name = event_buffer[
-            INOTIFY_EVENT_HDRSIZE:
-            INOTIFY_EVENT_HDRSIZE + length
-        ]
-        name = name.rstrip(b'\x00')
-        event_buffer = event_buffer[INOTIFY_EVENT_HDRSIZE + length:]
+    view = memoryview(event_buffer)
+    size = len(view)
+    offset = 0
+    while offset + INOTIFY_EVENT_HDRSIZE <= size:
+        wd, mask, cookie, length = _INOTIFY_EVENT_HDR.unpack_from(
+            view, offset
+        )
+        offset += INOTIFY_EVENT_HDRSIZE
+        name = view[offset:offset + length].tobytes().rstrip(b'\x00')
+        offset += length
         yield wd, mask, cookie, name
 
-    assert not event_buffer, 'Unparsed bytes left in buffer: %r' % event_buffer
+    assert offset == size, \
+        'Unparsed bytes left in buffer: %r' % view[offset:].tobytes()
 
 
 ###############################################################################
@@ -395,6 +402,11 @@ class InotifyEvent(collections.namedtuple('InotifyEvent',
         """Test mask shorthand."""
         return bool(self.mask & IN_ISDIR)
 
+    @property
+    def is_overflow(self):
+        """Test mask shorthand."""
+        return bool(self.mask & IN_Q_OVERFLOW)
+
     def __repr__(self):
         masks = _fmt_mask(self.mask)
         return ('<InotifyEvent: src_path=%s, wd=%d, mask=%s, cookie=%d>') % (
@@ -489,8 +501,20 @@ class Inotify(object):
         event_buffer = os.read(self._inotify_fd, event_buffer_size)
         event_list = []
         for wd, mask, cookie, name in _parse_buffer(event_buffer):
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped, wd is -1.
+                inotify_event = InotifyEvent(wd, mask, cookie, None)
+                _LOGGER.warning('Received event %r', inotify_event)
+                event_list.append(inotify_event)
+                continue
+
+            wd_path = self._paths.get(wd)
+            if wd_path is None:
+                # Events still queued for a removed watch.
+                _LOGGER.debug('Ignoring event for unknown watch: %d', wd)
+                continue
+
             name = name.decode()
-            wd_path = self._paths[wd]
             src_path = os.path.normpath(os.path.join(wd_path, name))
             inotify_event = InotifyEvent(wd, mask, cookie, src_path)
             _LOGGER.debug('Received event %r', inotify_event)
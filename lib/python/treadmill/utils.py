@@ -51,6 +51,10 @@ _LOGGER = logging.getLogger(__name__)
 
 _JINJA2_ENV = jinja2.Environment(loader=jinja2.PackageLoader(__name__))
 
+# Rendered templates, keyed by template name and arguments.
+_TEMPLATE_CACHE = {}
+_TEMPLATE_CACHE_SIZE = 1024
+
 _EXEC_MODE = (stat.S_IRUSR |
               stat.S_IRGRP |
               stat.S_IROTH |
@@ -76,6 +80,31 @@ def generate_template(templatename, **kwargs):
     return template.generate(**kwargs)
 
 
+def render_template(templatename, **kwargs):
+    """This renders a JINJA template into a string.
+
+    Templates only depend on their arguments, so the rendered content is
+    cached, keyed by the template name and the (JSON serialized) arguments.
+
+    :param ``str`` templatename:
+        The name of the template file.
+    :param ``dict`` kwargs:
+        key/value passed into the template.
+    :returns ``unicode``:
+        The rendered template.
+    """
+    key = (templatename, json.dumps(kwargs, sort_keys=True, default=repr))
+    rendered = _TEMPLATE_CACHE.get(key)
+    if rendered is None:
+        if len(_TEMPLATE_CACHE) >= _TEMPLATE_CACHE_SIZE:
+            _TEMPLATE_CACHE.clear()
+        template = _JINJA2_ENV.get_template(templatename)
+        rendered = template.render(**kwargs)
+        _TEMPLATE_CACHE[key] = rendered
+
+    return rendered
+
+
 def create_script(filename, templatename, mode=_EXEC_MODE, **kwargs):
     """This Creates a file from a JINJA template.
 
@@ -803,6 +832,7 @@ __all__ = [
     'megabytes',
     'parse_mask',
     'reboot_schedule',
+    'render_template',
     'report_ready',
     'restore_signals',
     'rootdir',
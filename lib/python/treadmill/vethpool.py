@@ -0,0 +1,175 @@
+"""Pool of pre-created virtual ethernet device pairs.
+
+Setting up the network devices of a container takes creating a veth pair,
+setting its MTU and alias, adding it to the bridge and bringing it up. The
+pool keeps pairs created, with the right MTU and already added to the bridge,
+ahead of time. A container pair is then a single rename of a spare pair away.
+
+    - Spare pairs are kept down, a network device can only be renamed while
+      down, and are named ``tmvp<id>.0`` / ``tmvp<id>.1``.
+    - Spare pairs are created, and leftover ones deleted, by a background
+      :class:`treadmill.jobworker.JobWorker` thread. Completed operations are
+      processed in the event loop of the owner with :func:`VethPool.process`.
+
+The network devices are managed through the ``netdev_`` module/object, the
+:mod:`treadmill.netdev` module by default.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import logging
+import random
+
+from treadmill import jobworker
+from treadmill import netdev
+
+
+_LOGGER = logging.getLogger(__name__)
+
+POOL_DEV_PREFIX = 'tmvp'
+
+_CREATE = 'create'
+_DELETE = 'delete'
+
+
+def is_pool_device(devname):
+    """Check if a network device is a spare pool device."""
+    return devname.startswith(POOL_DEV_PREFIX)
+
+
+def _pair_names():
+    """Names of a new spare pair, within the 15 characters limit."""
+    devid = '{prefix}{id:09x}'.format(
+        prefix=POOL_DEV_PREFIX,
+        id=random.getrandbits(36),
+    )
+    return (devid + '.0', devid + '.1')
+
+
+class VethPool(object):
+    """Pre-created, bridged, virtual ethernet device pairs.
+
+    :param size:
+        Number of spare pairs to keep.
+    :param mtu:
+        MTU of the network devices.
+    :param bridge:
+        Name of the bridge device the first network device is added to.
+    :param netdev_:
+        Network device operations, :mod:`treadmill.netdev` by default.
+    """
+
+    __slots__ = (
+        'size',
+        'mtu',
+        'bridge',
+        'spares',
+        '_netdev',
+        '_creating',
+        '_worker',
+    )
+
+    def __init__(self, size, mtu, bridge, netdev_=netdev):
+        self.size = size
+        self.mtu = mtu
+        self.bridge = bridge
+        self.spares = collections.deque()
+        self._netdev = netdev_
+        self._creating = 0
+        self._worker = jobworker.JobWorker('vethpool', self._run_job)
+
+    def start(self):
+        """Start the background thread and create the spare pairs."""
+        if self._worker.running:
+            return
+        self._worker.start()
+        self.refill()
+
+    def stop(self):
+        """Stop the background thread, after the queued operations."""
+        self._worker.stop()
+
+    def join(self):
+        """Wait for the queued operations."""
+        self._worker.join()
+
+    def fileno(self):
+        """Eventfd readable once operations completed, ``None`` if never
+        started.
+        """
+        return self._worker.fileno()
+
+    def acquire(self, veth0, veth1, alias):
+        """Rename a spare pair for a container.
+
+        The first network device is brought up, the second one stays down.
+
+        :returns:
+            ``True`` if a spare pair was renamed, ``False`` if the pool is
+            empty.
+        """
+        while self.spares:
+            spare0, spare1 = self.spares.popleft()
+            try:
+                self._netdev.link_rename_veth(
+                    spare0, spare1, veth0, veth1, alias=alias, up=True
+                )
+            except OSError:
+                # The pair is deleted by the failed rename.
+                _LOGGER.exception('Unable to rename spare pair %r', spare0)
+                continue
+
+            _LOGGER.info('Using spare pair %r for %r', spare0, veth0)
+            return True
+
+        return False
+
+    def release(self, devname):
+        """Delete a leftover spare pair in the background."""
+        self._worker.put((_DELETE, devname))
+
+    def refill(self):
+        """Create the missing spare pairs in the background."""
+        missing = self.size - len(self.spares) - self._creating
+        while missing > 0:
+            self._creating += 1
+            self._worker.put((_CREATE, _pair_names()))
+            missing -= 1
+
+    def _run_job(self, job):
+        """Run a network device operation, in the background thread."""
+        operation, arg = job
+        if operation == _CREATE:
+            self._netdev.link_add_veth(
+                arg[0], arg[1], mtu=self.mtu, bridge=self.bridge
+            )
+        else:
+            self._netdev.link_del_veth(arg)
+
+    def process(self):
+        """Process the completed operations.
+
+        :returns:
+            ``True`` if spare pairs were added.
+        """
+        added = False
+        for (operation, arg), _result, error in self._worker.completed():
+            if operation != _CREATE:
+                continue
+            self._creating -= 1
+            if error is None:
+                self.spares.append(arg)
+                added = True
+
+        return added
+
+
+__all__ = [
+    'POOL_DEV_PREFIX',
+    'VethPool',
+    'is_pool_device',
+]
@@ -193,13 +193,43 @@ def make_handler(pubsub):
     return _WS
 
 
+class _PooledDb(object):
+    """Pooled sow db connection.
+
+    The connection is used by the sows, on the tornado thread, and evicted by
+    the dirwatch thread. An evicted connection is closed once unused.
+    """
+
+    __slots__ = (
+        'inode',
+        'conn',
+        'users',
+        'evicted',
+    )
+
+    def __init__(self, inode, conn):
+        self.inode = inode
+        self.conn = conn
+        self.users = 0
+        self.evicted = False
+
+
 class DirWatchPubSub(object):
-    """Pubsub dirwatch events."""
+    """Pubsub dirwatch events.
+
+    If ``mirror_db`` (a ``treadmill.zksync.zk2sqlite.MirrorDB``) is given,
+    Zookeeper nodes are read from the mirror database instead of the file
+    system: only the ``.modified`` file of the mirror root is watched and the
+    database change log is replayed each time it is touched. If the changes
+    to replay were already trimmed, the watched directories are resynchronized
+    from the nodes of the database instead.
+    """
 
-    def __init__(self, root, impl=None, watches=None):
+    def __init__(self, root, impl=None, watches=None, mirror_db=None):
         self.root = os.path.realpath(root)
         self.impl = impl or {}
         self.watches = watches or []
+        self.mirror_db = mirror_db
 
         self.watcher = dirwatch.DirWatcher()
         self.watcher.on_created = self._on_created
@@ -210,19 +240,36 @@ class DirWatchPubSub(object):
         for watch in self.watches:
             watch_dirs = self._get_watch_dirs(watch)
             self.watch_dirs.update(watch_dirs)
-        for directory in self.watch_dirs:
-            _LOGGER.info('Added permanent dir watcher: %s', directory)
-            self.watcher.add_dir(directory)
+
+        if self.mirror_db is not None:
+            self._modified_file = os.path.join(self.root, '.modified')
+            self._last_seq = self.mirror_db.last_seq()
+            _LOGGER.info('Watching mirror db changes: %s', self._modified_file)
+            self.watcher.add_dir(self.root)
+        else:
+            self._modified_file = None
+            for directory in self.watch_dirs:
+                _LOGGER.info('Added permanent dir watcher: %s', directory)
+                self.watcher.add_dir(directory)
 
         self.ws = make_handler(self)
         self.handlers = collections.defaultdict(list)
 
+        # Index of file modification times (directory -> {name: mtime}) of
+        # the watched directories, kept current by the dirwatch events.
+        self._mtimes = {}
+        self._mtimes_lock = threading.Lock()
+        # Open sow db connections: db_path -> _PooledDb.
+        self._db_pool = {}
+        self._db_lock = threading.Lock()
+
     def register(self, watch, pattern, ws_handler, impl, since, sub_id=None):
         """Register handler with pattern."""
         watch_dirs = self._get_watch_dirs(watch)
         for directory in watch_dirs:
             if ((not self.handlers[directory] and
-                 directory not in self.watch_dirs)):
+                 directory not in self.watch_dirs and
+                 self.mirror_db is None)):
                 _LOGGER.info('Added dir watcher: %s', directory)
                 self.watcher.add_dir(directory)
 
@@ -233,9 +280,20 @@ class DirWatchPubSub(object):
             self.handlers[directory].append(
                 (pattern_re, ws_handler, impl, sub_id)
             )
+            if self.mirror_db is not None:
+                # Index the nodes, to resynchronize on trimmed changes.
+                self._get_mtimes(directory)
         self._sow(watch, pattern, since, ws_handler, impl, sub_id=sub_id)
 
     def _get_watch_dirs(self, watch):
+        if self.mirror_db is not None:
+            return [
+                self.root + directory
+                for directory in self.mirror_db.directories(
+                    '/' + watch.strip('/')
+                )
+            ]
+
         pathname = os.path.realpath(os.path.join(self.root, watch.lstrip('/')))
         return [path for path in glob.glob(pathname) if os.path.isdir(path)]
 
@@ -243,12 +301,18 @@ class DirWatchPubSub(object):
     def _on_created(self, path):
         """On file created callback."""
         _LOGGER.debug('created: %s', path)
+        if path == self._modified_file:
+            self._replay_changes()
+            return
         self._handle('c', path)
 
     @utils.exit_on_unhandled
     def _on_modified(self, path):
         """On file modified callback."""
         _LOGGER.debug('modified: %s', path)
+        if path == self._modified_file:
+            self._replay_changes()
+            return
         self._handle('m', path)
 
     @utils.exit_on_unhandled
@@ -257,6 +321,131 @@ class DirWatchPubSub(object):
         _LOGGER.debug('deleted: %s', path)
         self._handle('d', path)
 
+    def _replay_changes(self):
+        """Handle the mirror db changes since the last replay."""
+        changes = self.mirror_db.changes(self._last_seq)
+        if not changes:
+            return
+
+        if changes[0].seq > self._last_seq + 1:
+            _LOGGER.warning('Mirror db changes %d-%d were trimmed, '
+                            'resynchronizing.',
+                            self._last_seq + 1, changes[0].seq - 1)
+            self._last_seq = changes[-1].seq
+            self._resync_mirror_db()
+            return
+
+        self._last_seq = changes[-1].seq
+        for change in changes:
+            self._handle(change.op, self.root + change.path)
+
+    def _resync_mirror_db(self):
+        """Publish the differences between the indexed directories and the
+        mirror db nodes.
+        """
+        with self._mtimes_lock:
+            indexed = {
+                directory: dict(mtimes)
+                for directory, mtimes in six.iteritems(self._mtimes)
+            }
+
+        for directory, mtimes in six.iteritems(indexed):
+            current = self._mirror_db_mtimes(directory)
+            for name in sorted(set(mtimes) - set(current)):
+                self._handle('d', os.path.join(directory, name))
+            for name, mtime in sorted(six.iteritems(current)):
+                if name not in mtimes:
+                    self._handle('c', os.path.join(directory, name))
+                elif mtimes[name] != mtime:
+                    self._handle('m', os.path.join(directory, name))
+
+    def _read_mirror_db(self, path):
+        """Read node data from the mirror db."""
+        node = self.mirror_db.get(path[len(self.root):])
+        if node is None:
+            return None, None
+
+        data, when = node
+        return when, bytes(data).decode() if data else ''
+
+    def _mirror_db_mtimes(self, directory):
+        """Get the modification times of the mirror db nodes of a directory.
+        """
+        return {
+            name: mtime
+            for name, mtime in six.iteritems(
+                self.mirror_db.mtimes(directory[len(self.root):] or '/')
+            )
+            if name[0] != '.'
+        }
+
+    def _file_mtime(self, path):
+        """Get file modification time, None if the file does not exist."""
+        if self.mirror_db is not None:
+            node = self.mirror_db.get(path[len(self.root):])
+            return node[1] if node is not None else None
+
+        if '/trace/' in path:
+            # Trace events are named <instance>,<timestamp>,<event>...
+            try:
+                _, timestamp, _ = os.path.basename(path).split(',', 2)
+                return float(timestamp)
+            except ValueError:
+                pass
+
+        try:
+            return os.stat(path).st_mtime
+        except OSError as err:
+            if err.errno == errno.ENOENT:
+                return None
+            raise
+
+    def _get_mtimes(self, directory):
+        """Get the modification times of the files in a directory.
+
+        The index is kept in memory for the watched directories, other
+        directories are scanned on every call.
+        """
+        with self._mtimes_lock:
+            mtimes = self._mtimes.get(directory)
+            if mtimes is not None:
+                return dict(mtimes)
+
+            if self.mirror_db is not None:
+                mtimes = self._mirror_db_mtimes(directory)
+            else:
+                mtimes = {}
+                for filename in os.listdir(directory):
+                    if filename[0] == '.':
+                        continue
+                    mtime = self._file_mtime(
+                        os.path.join(directory, filename)
+                    )
+                    if mtime is not None:
+                        mtimes[filename] = mtime
+
+            if directory in self.watch_dirs or directory in self.handlers:
+                self._mtimes[directory] = mtimes
+                return dict(mtimes)
+
+        return mtimes
+
+    def _update_mtime(self, operation, directory, filename):
+        """Keep the modification time index current."""
+        with self._mtimes_lock:
+            mtimes = self._mtimes.get(directory)
+            if mtimes is None:
+                return
+
+            mtime = None
+            if operation != 'd':
+                mtime = self._file_mtime(os.path.join(directory, filename))
+
+            if mtime is None:
+                mtimes.pop(filename, None)
+            else:
+                mtimes[filename] = mtime
+
     def _handle(self, operation, path):
         """Get event data and notify interested handlers of the change."""
         directory, filename = os.path.split(path)
@@ -265,6 +454,8 @@ class DirWatchPubSub(object):
         if filename[0] == '.':
             return
 
+        self._update_mtime(operation, directory, filename)
+
         directory_handlers = self.handlers.get(directory, [])
         handlers = [
             (handler, impl, sub_id)
@@ -284,6 +475,11 @@ class DirWatchPubSub(object):
                 # If file was already deleted (trace cleanup), don't ignore it.
                 _, timestamp, _ = filename.split(',', 2)
                 when, content = float(timestamp), ''
+            elif self.mirror_db is not None:
+                when, content = self._read_mirror_db(path)
+                if when is None:
+                    # Node was already deleted, it will be handled as 'd'.
+                    return
             else:
                 try:
                     when = os.stat(path).st_mtime
@@ -325,19 +521,17 @@ class DirWatchPubSub(object):
                 )
 
     def _db_records(self, db_path, sow_table, watch, pattern, since):
-        """Get matching records from db."""
-        # if file does not exist, do not try to open it. Opening connection
-        # will create the file, there is no way to prevent this from
-        # happening until py3.
-        #
-        if not os.path.exists(db_path):
+        """Get matching records from db.
+
+        :returns:
+            ``(pooled, cursor)``, the pooled connection must be released with
+            :func:`_release_db_conn` once the cursor is consumed.
+        """
+        pooled = self._acquire_db_conn(db_path)
+        if pooled is None:
             _LOGGER.info('Ignore deleted db: %s', db_path)
             return (None, None)
 
-        # There is rare condition that the db file is deleted HERE. In this
-        # case connection will be open, but the tables will not be there.
-        conn = sqlite3.connect(db_path)
-
         # Before Python 3.7 GLOB pattern must not be parametrized to use index.
         select_stmt = """
             SELECT timestamp, path, data FROM %s
@@ -348,16 +542,68 @@ class DirWatchPubSub(object):
         # Return open connection, as conn.execute is cursor iterator, not
         # materialized list.
         try:
-            return conn, conn.execute(select_stmt, (watch, since,))
+            return pooled, pooled.conn.execute(select_stmt, (watch, since,))
         except sqlite3.OperationalError as db_err:
             # Not sure if the file needs to be deleted at this point. As
             # sow_table is a parameter, passing non-existing table can cause
             # legit file to be deleted.
             _LOGGER.info('Unable to execute: select from %s:%s ..., %s',
                          db_path, sow_table, str(db_err))
-            conn.close()
+            with self._db_lock:
+                self._evict_db_conn(db_path)
+            self._release_db_conn(pooled)
             return (None, None)
 
+    def _acquire_db_conn(self, db_path):
+        """Get a pooled connection to a sow db, ``None`` if it is deleted.
+
+        Sow dbs are replaced (renamed over), the connection is reopened when
+        the inode changes.
+        """
+        with self._db_lock:
+            # if file does not exist, do not try to open it. Opening
+            # connection will create the file, there is no way to prevent
+            # this from happening until py3.
+            try:
+                inode = os.stat(db_path).st_ino
+            except OSError as err:
+                if err.errno == errno.ENOENT:
+                    self._evict_db_conn(db_path)
+                    return None
+                raise
+
+            pooled = self._db_pool.get(db_path)
+            if pooled is None or pooled.inode != inode:
+                self._evict_db_conn(db_path)
+                # There is rare condition that the db file is deleted HERE.
+                # In this case connection will be open, but the tables will
+                # not be there.
+                pooled = _PooledDb(
+                    inode, sqlite3.connect(db_path, check_same_thread=False)
+                )
+                self._db_pool[db_path] = pooled
+
+            pooled.users += 1
+            return pooled
+
+    def _release_db_conn(self, pooled):
+        """Release a pooled connection, closing it if it was evicted."""
+        with self._db_lock:
+            pooled.users -= 1
+            if pooled.evicted and not pooled.users:
+                pooled.conn.close()
+
+    def _evict_db_conn(self, db_path):
+        """Forget a pooled sow db connection, with the lock held.
+
+        The connection is closed now if unused, else once released.
+        """
+        pooled = self._db_pool.pop(db_path, None)
+        if pooled is not None:
+            pooled.evicted = True
+            if not pooled.users:
+                pooled.conn.close()
+
     def _sow(self, watch, pattern, since, handler, impl, sub_id=None):
         """Publish state of the world."""
         if since is None:
@@ -377,31 +623,28 @@ class DirWatchPubSub(object):
                                   path, content, when, sub_id)
                 handler.send_error_msg(str(err), sub_id=sub_id)
 
-        db_connections = []
         fs_records = self._get_fs_sow(watch, pattern, since)
 
         sow = getattr(impl, 'sow', None)
         sow_table = getattr(impl, 'sow_table', 'sow')
+
+        records = []
+        acquired = []
         try:
-            records = []
             if sow:
                 dbs = sorted(glob.glob(os.path.join(self.root, sow, '*')))
                 for db in dbs:
                     if os.path.basename(db).startswith('.'):
                         continue
 
-                    conn, db_cursor = self._db_records(
+                    pooled, db_cursor = self._db_records(
                         db, sow_table, watch, pattern, since
                     )
+                    if pooled is not None:
+                        acquired.append(pooled)
                     if db_cursor:
                         records.append(db_cursor)
 
-                    # FIXME: Figure out pylint use before assign
-                    #
-                    # pylint: disable=E0601
-                    if conn:
-                        db_connections.append(conn)
-
             records.append(fs_records)
             # Merge db and fs records, removing duplicates.
             prev_path = None
@@ -413,30 +656,46 @@ class DirWatchPubSub(object):
                 prev_path = path
                 _publish(item)
         finally:
-            for conn in db_connections:
-                if conn:
-                    conn.close()
+            for pooled in acquired:
+                self._release_db_conn(pooled)
+
+    def _get_mirror_db_sow(self, watch, pattern, since):
+        """Get state of the world from the mirror db."""
+        return [
+            (when, path, bytes(data).decode() if data else '')
+            for when, path, data in self.mirror_db.records(
+                '/' + watch.strip('/'), pattern, since
+            )
+            # Ignore (.) files, as they are temporary or "system".
+            if not os.path.basename(path).startswith('.')
+        ]
 
     def _get_fs_sow(self, watch, pattern, since):
         """Get state of the world from filesystem."""
-        root_len = len(self.root)
-        fs_glob = os.path.join(self.root, watch.lstrip('/'), pattern)
+        if self.mirror_db is not None:
+            return self._get_mirror_db_sow(watch, pattern, since)
 
-        files = glob.glob(fs_glob)
+        root_len = len(self.root)
+        pattern_re = re.compile(fnmatch.translate(pattern))
 
         items = []
-        for filename in files:
-            try:
-                stat = os.stat(filename)
-                with io.open(filename) as f:
-                    content = f.read()
-                if stat.st_mtime >= since:
-                    path, when = filename[root_len:], stat.st_mtime
-                    items.append((when, path, content))
-            except (IOError, OSError) as err:
-                # Ignore deleted files.
-                if err.errno != errno.ENOENT:
-                    raise
+        for directory in self._get_watch_dirs(watch):
+            # Filter on the indexed mtimes, only matching files are read.
+            for name, when in six.iteritems(self._get_mtimes(directory)):
+                if when < since or not pattern_re.match(name):
+                    continue
+
+                filename = os.path.join(directory, name)
+                try:
+                    with io.open(filename) as f:
+                        content = f.read()
+                except (IOError, OSError) as err:
+                    # Ignore deleted files.
+                    if err.errno != errno.ENOENT:
+                        raise
+                    continue
+
+                items.append((when, filename[root_len:], content))
 
         return sorted(items)
 
@@ -456,11 +715,19 @@ class DirWatchPubSub(object):
                 _LOGGER.info('No active handlers for %s', directory)
                 self.handlers.pop(directory, None)
                 if directory not in self.watch_dirs:
-                    # Watch is not permanent, remove dir from watcher.
-                    self.watcher.remove_dir(directory)
+                    if self.mirror_db is None:
+                        # Watch is not permanent, remove dir from watcher.
+                        self.watcher.remove_dir(directory)
+                    with self._mtimes_lock:
+                        self._mtimes.pop(directory, None)
             else:
                 self.handlers[directory] = handlers
 
+        with self._db_lock:
+            for db_path in list(six.viewkeys(self._db_pool)):
+                if not os.path.exists(db_path):
+                    self._evict_db_conn(db_path)
+
     @utils.exit_on_unhandled
     def run(self, once=False):
         """Run event loop."""
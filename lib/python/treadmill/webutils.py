@@ -14,6 +14,7 @@ import json
 import logging
 import re
 import shutil
+import zlib
 
 import flask
 import six
@@ -364,6 +365,20 @@ def wants_json_resp(request):
         request.accept_mimetypes[best] > request.accept_mimetypes['text/html'])
 
 
+def _gzip_stream(chunks):
+    """Gzip a stream of chunks incrementally."""
+    # 16 + MAX_WBITS: gzip header and trailer.
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if isinstance(chunk, six.text_type):
+            chunk = chunk.encode('utf-8')
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+
+    yield compressor.flush()
+
+
 def opt_gzip(func):
     """Gzip the response if the client accepts it."""
     @functools.wraps(func)
@@ -375,6 +390,13 @@ def opt_gzip(func):
         if 'gzip' not in accept_encodings.lower():
             return response
 
+        if response.is_streamed:
+            # Do not buffer streamed responses, compress them on the fly.
+            response.response = _gzip_stream(response.response)
+            response.headers['Content-Encoding'] = 'gzip'
+            response.headers.pop('Content-Length', None)
+            return response
+
         uncompressed = response.data
         if not isinstance(response.data, io.IOBase):
             uncompressed = io.BytesIO(response.data)
@@ -0,0 +1,209 @@
+"""Zookeeper node payload codec.
+
+Legacy payloads are plain YAML. Encoded payloads start with a magic prefix
+followed by a version, an encoding and a compression byte::
+
+    \\x00TM <version> <encoding> <compression> <data>
+
+The NUL byte can not start a YAML document, so readers tell the two apart
+and decode both, which allows migrating a cell online: first deploy readers,
+then select encodings for the Zookeeper paths, by path prefix.
+
+The encoding is selected with ``configure`` or the ``TREADMILL_ZK_CODEC``
+environment variable, e.g.::
+
+    TREADMILL_ZK_CODEC=/scheduled=json,/placement=msgpack,/finished=json+zlib
+
+Paths without encoding (the default) are written as YAML.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+import logging
+import os
+import zlib
+
+import six
+
+from treadmill import yamlwrapper as yaml
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+_LOGGER = logging.getLogger(__name__)
+
+MAGIC = b'\x00TM'
+VERSION = 1
+
+YAML = 'yaml'
+JSON = 'json'
+MSGPACK = 'msgpack'
+
+_ENCODING_IDS = {
+    JSON: b'j',
+    MSGPACK: b'm',
+}
+_ENCODINGS = {
+    value: key for key, value in six.iteritems(_ENCODING_IDS)
+}
+
+_NO_COMPRESSION = b'-'
+_ZLIB = b'z'
+
+_HEADER_SIZE = len(MAGIC) + 3
+
+# Payloads larger than the threshold are compressed, if compression is
+# enabled for their path.
+_DEFAULT_COMPRESS_THRESHOLD = 4096
+
+_ENV_RULES = 'TREADMILL_ZK_CODEC'
+
+# List of (prefix, encoding, compress), longest prefix first.
+_RULES = []
+
+_COMPRESS_THRESHOLD = _DEFAULT_COMPRESS_THRESHOLD
+
+
+def _parse_rules(value):
+    """Parse /prefix=encoding[+zlib],... rules."""
+    rules = {}
+    for rule in value.split(','):
+        rule = rule.strip()
+        if not rule:
+            continue
+        prefix, encoding = rule.split('=', 1)
+        rules[prefix.strip()] = encoding.strip()
+    return rules
+
+
+def configure(rules=None, compress_threshold=None):
+    """Select the payload encodings by Zookeeper path prefix.
+
+    :param ``dict`` rules:
+        Path prefix to encoding (``yaml``, ``json`` or ``msgpack``), with an
+        optional ``+zlib`` suffix to compress large payloads.
+    :param ``int`` compress_threshold:
+        Minimum size of the payloads to compress.
+    """
+    # W0603: Using the global statement
+    global _RULES, _COMPRESS_THRESHOLD  # pylint: disable=W0603
+
+    if compress_threshold is not None:
+        _COMPRESS_THRESHOLD = compress_threshold
+
+    if rules is None:
+        return
+
+    parsed = []
+    for prefix, encoding in six.iteritems(rules):
+        encoding, _sep, compression = encoding.partition('+')
+        if encoding not in (YAML, JSON, MSGPACK):
+            raise ValueError('Invalid encoding: %s' % encoding)
+        if compression not in ('', 'zlib'):
+            raise ValueError('Invalid compression: %s' % compression)
+        if encoding == MSGPACK and msgpack is None:
+            _LOGGER.warning('msgpack is not installed, using json: %s',
+                            prefix)
+            encoding = JSON
+        parsed.append((prefix.rstrip('/'), encoding, bool(compression)))
+
+    _RULES = sorted(parsed, key=lambda rule: len(rule[0]), reverse=True)
+
+
+def _rule(path):
+    """Find the encoding rule of a path."""
+    if path:
+        for prefix, encoding, compress in _RULES:
+            if path == prefix or path.startswith(prefix + '/'):
+                return encoding, compress
+    return YAML, False
+
+
+def _json_default(obj):
+    """Serialize the objects YAML handles but JSON does not."""
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    raise TypeError('Not JSON serializable: %r' % (obj,))
+
+
+def encode(data, path=None):
+    """Encode data with the encoding selected for the path."""
+    encoding, compress = _rule(path)
+    if encoding == YAML:
+        return yaml.dump(data).encode()
+
+    if encoding == MSGPACK:
+        encoded = msgpack.packb(data, use_bin_type=True)
+    else:
+        encoded = json.dumps(
+            data, separators=(',', ':'), default=_json_default
+        ).encode()
+
+    compression = _NO_COMPRESSION
+    if compress and len(encoded) >= _COMPRESS_THRESHOLD:
+        encoded = zlib.compress(encoded)
+        compression = _ZLIB
+
+    return b''.join([
+        MAGIC,
+        six.int2byte(VERSION),
+        _ENCODING_IDS[encoding],
+        compression,
+        encoded,
+    ])
+
+
+def is_encoded(payload):
+    """Check if a payload is encoded (not legacy YAML)."""
+    return payload[:len(MAGIC)] == MAGIC
+
+
+def decode(payload):
+    """Decode an encoded or legacy YAML payload.
+
+    :raises ``ValueError``:
+        If the payload is not valid.
+    """
+    if not is_encoded(payload):
+        return yaml.load(payload)
+
+    if len(payload) < _HEADER_SIZE:
+        raise ValueError('Truncated payload header.')
+
+    version = six.indexbytes(payload, len(MAGIC))
+    encoding = _ENCODINGS.get(payload[len(MAGIC) + 1:len(MAGIC) + 2])
+    compression = payload[len(MAGIC) + 2:_HEADER_SIZE]
+    if version != VERSION or encoding is None:
+        raise ValueError(
+            'Unsupported payload: version %d, encoding %r' % (
+                version, payload[len(MAGIC) + 1:len(MAGIC) + 2]
+            )
+        )
+
+    data = payload[_HEADER_SIZE:]
+    if compression == _ZLIB:
+        try:
+            data = zlib.decompress(data)
+        except zlib.error as err:
+            raise ValueError('Invalid compressed payload: %s' % err)
+    elif compression != _NO_COMPRESSION:
+        raise ValueError('Unsupported compression: %r' % compression)
+
+    if encoding == MSGPACK:
+        if msgpack is None:
+            raise ValueError('msgpack payload, msgpack is not installed.')
+        return msgpack.unpackb(data, raw=False)
+
+    return json.loads(data.decode())
+
+
+configure(_parse_rules(os.environ.get(_ENV_RULES, '')))
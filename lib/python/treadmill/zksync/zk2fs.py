@@ -6,9 +6,15 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
 import logging
 import glob
 import os
+import shutil
+import time
+
+from concurrent import futures
+
 import kazoo
 
 from treadmill import fs
@@ -21,17 +27,30 @@ from treadmill.zksync import utils as zksync_utils
 
 _LOGGER = logging.getLogger(__name__)
 
+# Maximum number of outstanding async Zookeeper reads.
+_DEFAULT_CONCURRENCY = 64
+
+# Number of threads writing node data to the file system.
+_DEFAULT_WRITERS = 8
+
 
 class Zk2Fs(object):
     """Syncronize Zookeeper with file system."""
 
-    def __init__(self, zkclient, fsroot, tmp_dir=None):
+    def __init__(self, zkclient, fsroot, tmp_dir=None,
+                 concurrency=_DEFAULT_CONCURRENCY, writers=_DEFAULT_WRITERS):
         self.watches = set()
         self.processed_once = set()
+        # Children of each synced zkpath, as last mirrored to the fs.
+        self.children = {}
         self.zkclient = zkclient
         self.fsroot = fsroot
         self.tmp_dir = tmp_dir
+        self.concurrency = concurrency
+        self.writers = writers
         self.ready = False
+        self.started = time.time()
+        self.stats = collections.Counter()
 
         self.zkclient.add_listener(zkutils.exit_on_lost)
 
@@ -40,14 +59,51 @@ class Zk2Fs(object):
         self.ready = True
         self._update_last()
 
+        elapsed = time.time() - self.started
+        _LOGGER.info(
+            'Initial sync done in %.2fs: '
+            'nodes: %d (%.0f/s), bytes: %d, added: %d, deleted: %d',
+            elapsed,
+            self.stats['synced'],
+            self.stats['synced'] / elapsed if elapsed else 0,
+            self.stats['bytes'],
+            self.stats['added'],
+            self.stats['deleted'],
+        )
+
     def _update_last(self):
         """Update modify file timestamp to indicate changes were made."""
         if self.ready:
             zksync_utils.create_ready_file(self.fsroot)
 
+    def write(self, zkpath, data, mtime, raise_err=True):
+        """Store node data, in a file named after the node."""
+        zksync_utils.write_data(
+            self.fpath(zkpath), data, mtime,
+            raise_err=raise_err, tmp_dir=self.tmp_dir
+        )
+
+    def remove(self, zkpath):
+        """Remove node data."""
+        fs.rm_safe(self.fpath(zkpath))
+
+    def remove_tree(self, zkpath):
+        """Remove node data and the data of all its children."""
+        shutil.rmtree(self.fpath(zkpath))
+
+    def _list_children(self, zkpath):
+        """List the names of the stored children of zkpath."""
+        fpath = self.fpath(zkpath)
+        return [os.path.basename(path)
+                for path in glob.glob(os.path.join(fpath, '*'))]
+
+    def _init_dir(self, zkpath):
+        """Prepare storage for the children of zkpath."""
+        fs.mkdir_safe(self.fpath(zkpath))
+
     def _default_on_del(self, zkpath):
         """Default callback invoked on node delete, remove file."""
-        fs.rm_safe(self.fpath(zkpath))
+        self.remove(zkpath)
 
     def _default_on_add(self, zkpath):
         """Default callback invoked on node is added, default - sync data.
@@ -61,31 +117,81 @@ class Zk2Fs(object):
             _LOGGER.warning(
                 'Tried to add node that no longer exists: %s', zkpath
             )
-            fpath = self.fpath(zkpath)
-            fs.rm_safe(fpath)
+            self.remove(zkpath)
 
-    def _write_data(self, fpath, data, stat):
-        """Write Zookeeper data to filesystem.
+    def _write_data(self, zkpath, data, stat):
+        """Write Zookeeper data to storage.
         """
-        zksync_utils.write_data(
-            fpath, data, stat.last_modified,
-            raise_err=True, tmp_dir=self.tmp_dir
-        )
+        self.write(zkpath, data, stat.last_modified)
+        self._count_synced(data)
+
+    def _count_synced(self, data):
+        """Account for synced node data.
+
+        The stats are only updated by the caller threads, never by the
+        writer threads of :func:`_sync_data_bulk`.
+        """
+        self.stats['synced'] += 1
+        if data:
+            self.stats['bytes'] += len(data)
+
+    def _sync_data_bulk(self, zkpaths):
+        """Sync the data of many zk nodes to files.
+
+        Reads are pipelined with up to ``concurrency`` outstanding async gets
+        and the files are written by a pool of ``writers`` threads.
+        """
+        def _write_result(pool, zkpath, async_result):
+            """Wait for a read and queue the write of its data."""
+            try:
+                data, stat = async_result.get()
+            except kazoo.client.NoNodeError:
+                _LOGGER.warning(
+                    'Tried to add node that no longer exists: %s', zkpath
+                )
+                self.remove(zkpath)
+                return None
+
+            return (
+                pool.submit(self.write, zkpath, data, stat.last_modified),
+                data
+            )
+
+        start = time.time()
+        pending = collections.deque()
+        writes = []
+        with futures.ThreadPoolExecutor(max_workers=self.writers) as pool:
+            for zkpath in zkpaths:
+                pending.append((zkpath, self.zkclient.get_async(zkpath)))
+                if len(pending) >= self.concurrency:
+                    writes.append(_write_result(pool, *pending.popleft()))
+
+            while pending:
+                writes.append(_write_result(pool, *pending.popleft()))
+
+        # Propagate write errors.
+        for write in writes:
+            if write is not None:
+                future, data = write
+                future.result()
+                self._count_synced(data)
+
+        _LOGGER.info('Synced %d nodes in %.2fs',
+                     len(zkpaths), time.time() - start)
 
     def _data_watch(self, zkpath, data, stat, event):
         """Invoked when data changes.
         """
-        fpath = self.fpath(zkpath)
         if event is not None and event.type == 'DELETED':
             _LOGGER.info('Node deleted: %s', zkpath)
             self.watches.discard(zkpath)
-            fs.rm_safe(fpath)
+            self.remove(zkpath)
         elif stat is None:
             _LOGGER.info('Node does not exist: %s', zkpath)
             self.watches.discard(zkpath)
-            fs.rm_safe(fpath)
+            self.remove(zkpath)
         else:
-            self._write_data(fpath, data, stat)
+            self._write_data(zkpath, data, stat)
 
     def _filter_children_actions(self, sorted_children, sorted_filenames, add,
                                  remove, common):
@@ -129,11 +235,14 @@ class Zk2Fs(object):
     def _children_watch(self, zkpath, children, watch_data,
                         on_add, on_del, cont_watch_predicate=None):
         """Callback invoked on children watch."""
-        fpath = self.fpath(zkpath)
+        known_children = self.children.get(zkpath)
+        if known_children is None:
+            # Only look at the storage the first time around, after that
+            # the set of synced children is kept in memory.
+            known_children = set(self._list_children(zkpath))
 
         sorted_children = sorted(children)
-        sorted_filenames = sorted(map(os.path.basename,
-                                      glob.glob(os.path.join(fpath, '*'))))
+        sorted_filenames = sorted(known_children)
 
         add = []
         remove = []
@@ -147,26 +256,26 @@ class Zk2Fs(object):
             zknode = z.join_zookeeper_path(zkpath, node)
             self.watches.discard(zknode)
             on_del(zknode)
+        self.stats['deleted'] += len(remove)
 
         if zkpath not in self.processed_once:
             self.processed_once.add(zkpath)
-            for node in common:
-                _LOGGER.info('Common: %s', node)
+            _LOGGER.info('Common: %s: %d nodes', zkpath, len(common))
+            add = common + add
 
-                zknode = z.join_zookeeper_path(zkpath, node)
-                if watch_data:
-                    self.watches.add(zknode)
+        _LOGGER.info('Add: %s: %d nodes', zkpath, len(add))
+        zknodes = [z.join_zookeeper_path(zkpath, node) for node in add]
+        if watch_data:
+            self.watches.update(zknodes)
 
+        if on_add == self._default_on_add and not watch_data:
+            self._sync_data_bulk(zknodes)
+        else:
+            for zknode in zknodes:
                 on_add(zknode)
+        self.stats['added'] += len(zknodes)
 
-        for node in add:
-            _LOGGER.info('Add: %s', node)
-
-            zknode = z.join_zookeeper_path(zkpath, node)
-            if watch_data:
-                self.watches.add(zknode)
-
-            on_add(zknode)
+        self.children[zkpath] = set(sorted_children)
 
         if cont_watch_predicate:
             return cont_watch_predicate(zkpath, sorted_children)
@@ -188,9 +297,8 @@ class Zk2Fs(object):
                 self._data_watch(zkpath, data, stat, event)
                 self._update_last()
         else:
-            fpath = self.fpath(zkpath)
             data, stat = self.zkclient.get(zkpath)
-            self._write_data(fpath, data, stat)
+            self._write_data(zkpath, data, stat)
             self._update_last()
 
     def _make_children_watch(self, zkpath, watch_data=False,
@@ -237,7 +345,9 @@ class Zk2Fs(object):
                      watch_data)
 
         fpath = self.fpath(zkpath)
-        fs.mkdir_safe(fpath)
+        self._init_dir(zkpath)
+        # (Re)discover the synced children from the storage.
+        self.children.pop(zkpath, None)
 
         done_file = os.path.join(fpath, '.done')
         if os.path.exists(done_file):
@@ -0,0 +1,343 @@
+"""Syncronizes Zookeeper to a SQLite database.
+
+Alternative mirror backend to :class:`treadmill.zksync.zk2fs.Zk2Fs`: instead
+of one file per Zookeeper node, nodes are stored in a WAL mode SQLite
+database which readers (e.g. the websocket server) query with indexes rather
+than scanning directories.
+
+Schema::
+
+    nodes(path, directory, name, data, mtime)
+    directories(path)
+    changes(seq, path, op)
+
+Every change is appended to the ``changes`` table (trimmed to the most
+recent entries), and the ``.modified`` ready file in the mirror root is
+touched, so readers can watch the file and replay the changes since the last
+sequence number they have seen.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import kazoo
+import six
+
+from treadmill import fs
+from treadmill.zksync import zk2fs
+
+
+_LOGGER = logging.getLogger(__name__)
+
+DB_NAME = '.zk2fs.db'
+
+# Number of changes kept in the changes table.
+_CHANGES_KEPT = 10000
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS nodes (
+        path TEXT PRIMARY KEY,
+        directory TEXT NOT NULL,
+        name TEXT NOT NULL,
+        data BLOB,
+        mtime REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS nodes_directory_name_idx
+        ON nodes (directory, name);
+    CREATE INDEX IF NOT EXISTS nodes_mtime_idx
+        ON nodes (mtime);
+    CREATE TABLE IF NOT EXISTS directories (
+        path TEXT PRIMARY KEY
+    );
+    CREATE TABLE IF NOT EXISTS changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        path TEXT NOT NULL,
+        op TEXT NOT NULL
+    );
+"""
+
+#: Change operations, matching the websocket event operations.
+OP_CREATED = 'c'
+OP_MODIFIED = 'm'
+OP_DELETED = 'd'
+
+Change = collections.namedtuple('Change', 'seq path op')
+
+
+def _split(path):
+    """Split a zkpath into directory and name."""
+    directory, name = path.rsplit('/', 1)
+    return directory or '/', name
+
+
+class MirrorDB(object):
+    """Zookeeper mirror database.
+
+    A single connection is shared by all threads, access is serialized.
+    """
+
+    def __init__(self, db_path, readonly=False):
+        self.db_path = db_path
+        self.readonly = readonly
+        self._lock = threading.RLock()
+
+        if readonly and six.PY3:
+            self._conn = sqlite3.connect(
+                'file:{}?mode=ro'.format(db_path),
+                uri=True,
+                check_same_thread=False
+            )
+        elif readonly:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        else:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(_SCHEMA)
+            self._conn.commit()
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def _log_change(self, path, op):
+        self._conn.execute(
+            'INSERT INTO changes (path, op) VALUES (?, ?)', (path, op)
+        )
+
+    def put_many(self, records):
+        """Insert or update nodes in a single transaction.
+
+        :param ``list`` records:
+            List of ``(path, data, mtime)``.
+        """
+        with self._lock, self._conn:
+            for path, data, mtime in records:
+                directory, name = _split(path)
+                exists = self._conn.execute(
+                    'SELECT 1 FROM nodes WHERE path = ?', (path,)
+                ).fetchone()
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO nodes '
+                    '(path, directory, name, data, mtime) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (path, directory, name,
+                     sqlite3.Binary(data) if data is not None else None,
+                     mtime)
+                )
+                self._log_change(path, OP_MODIFIED if exists else OP_CREATED)
+
+    def put(self, path, data, mtime):
+        """Insert or update a node."""
+        self.put_many([(path, data, mtime)])
+
+    def delete(self, path):
+        """Delete a node."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                'DELETE FROM nodes WHERE path = ?', (path,)
+            )
+            if cursor.rowcount:
+                self._log_change(path, OP_DELETED)
+
+    def delete_tree(self, path):
+        """Delete a directory, its nodes and all its sub-directories."""
+        with self._lock, self._conn:
+            prefix = path.rstrip('/') + '/'
+            deleted = self._conn.execute(
+                'SELECT path FROM nodes '
+                'WHERE directory = ? OR substr(directory, 1, ?) = ?',
+                (path, len(prefix), prefix)
+            ).fetchall()
+            self._conn.execute(
+                'DELETE FROM nodes '
+                'WHERE directory = ? OR substr(directory, 1, ?) = ?',
+                (path, len(prefix), prefix)
+            )
+            self._conn.execute(
+                'DELETE FROM directories '
+                'WHERE path = ? OR substr(path, 1, ?) = ?',
+                (path, len(prefix), prefix)
+            )
+            for (node_path,) in deleted:
+                self._log_change(node_path, OP_DELETED)
+
+    def add_directory(self, path):
+        """Register a (possibly empty) directory."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR IGNORE INTO directories (path) VALUES (?)', (path,)
+            )
+
+    def directories(self, pattern):
+        """List directories matching a glob pattern."""
+        with self._lock:
+            return [
+                path for (path,) in self._conn.execute(
+                    'SELECT path FROM directories WHERE path GLOB ?',
+                    (pattern,)
+                )
+            ]
+
+    def children(self, directory):
+        """List the names of the nodes in a directory."""
+        with self._lock:
+            return [
+                name for (name,) in self._conn.execute(
+                    'SELECT name FROM nodes WHERE directory = ?',
+                    (directory,)
+                )
+            ]
+
+    def mtimes(self, directory):
+        """Get the modification times of the nodes in a directory.
+
+        :returns:
+            ``dict`` of node name to mtime.
+        """
+        with self._lock:
+            return dict(self._conn.execute(
+                'SELECT name, mtime FROM nodes WHERE directory = ?',
+                (directory,)
+            ))
+
+    def get(self, path):
+        """Get a node.
+
+        :returns:
+            ``(data, mtime)`` or ``None`` if the node does not exist.
+        """
+        with self._lock:
+            return self._conn.execute(
+                'SELECT data, mtime FROM nodes WHERE path = ?', (path,)
+            ).fetchone()
+
+    def records(self, directory, pattern, since=0):
+        """Get the nodes matching directory/name glob patterns, modified
+        since a given time, ordered by modification time.
+
+        :returns:
+            ``list`` of ``(mtime, path, data)``.
+        """
+        with self._lock:
+            return self._conn.execute(
+                'SELECT mtime, path, data FROM nodes '
+                'WHERE directory GLOB ? AND name GLOB ? AND mtime >= ? '
+                'ORDER BY mtime, path',
+                (directory, pattern, since)
+            ).fetchall()
+
+    def last_seq(self):
+        """Sequence number of the last change."""
+        with self._lock:
+            (seq,) = self._conn.execute(
+                'SELECT COALESCE(MAX(seq), 0) FROM changes'
+            ).fetchone()
+        return seq
+
+    def changes(self, since_seq):
+        """List the changes after a given sequence number."""
+        with self._lock:
+            return [
+                Change(*row) for row in self._conn.execute(
+                    'SELECT seq, path, op FROM changes WHERE seq > ? '
+                    'ORDER BY seq',
+                    (since_seq,)
+                )
+            ]
+
+    def trim_changes(self, keep=_CHANGES_KEPT):
+        """Only keep the most recent changes."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                'DELETE FROM changes WHERE seq <= '
+                '(SELECT MAX(seq) FROM changes) - ?',
+                (keep,)
+            )
+
+
+class Zk2Sqlite(zk2fs.Zk2Fs):
+    """Syncronize Zookeeper with a SQLite database."""
+
+    def __init__(self, zkclient, fsroot, tmp_dir=None, db_path=None,
+                 **kwargs):
+        super(Zk2Sqlite, self).__init__(
+            zkclient, fsroot, tmp_dir=tmp_dir, **kwargs
+        )
+        if db_path is None:
+            db_path = os.path.join(fsroot, DB_NAME)
+        self.db = MirrorDB(db_path)
+
+    def _update_last(self):
+        """Trim the change log and notify readers of the changes."""
+        if self.ready:
+            self.db.trim_changes()
+        super(Zk2Sqlite, self)._update_last()
+
+    def write(self, zkpath, data, mtime, raise_err=True):
+        """Store node data."""
+        del raise_err
+        self.db.put(zkpath, data, mtime)
+
+    def remove(self, zkpath):
+        """Remove node data."""
+        self.db.delete(zkpath)
+
+    def remove_tree(self, zkpath):
+        """Remove node data and all its children."""
+        self.db.delete_tree(zkpath)
+
+    def _list_children(self, zkpath):
+        """List the names of the stored children of zkpath."""
+        return self.db.children(zkpath)
+
+    def _init_dir(self, zkpath):
+        """Register zkpath as a mirrored directory."""
+        self.db.add_directory(zkpath)
+        # The done markers of immutable directories stay on the file system.
+        fs.mkdir_safe(self.fpath(zkpath))
+
+    def _sync_data_bulk(self, zkpaths):
+        """Sync the data of many zk nodes in a single transaction.
+
+        Reads are pipelined with up to ``concurrency`` outstanding async gets.
+        """
+        start = time.time()
+        records = []
+
+        def _collect(zkpath, async_result):
+            try:
+                data, stat = async_result.get()
+            except kazoo.client.NoNodeError:
+                _LOGGER.warning(
+                    'Tried to add node that no longer exists: %s', zkpath
+                )
+                self.remove(zkpath)
+                return
+            records.append((zkpath, data, stat.last_modified))
+            self.stats['synced'] += 1
+            if data:
+                self.stats['bytes'] += len(data)
+
+        pending = collections.deque()
+        for zkpath in zkpaths:
+            pending.append((zkpath, self.zkclient.get_async(zkpath)))
+            if len(pending) >= self.concurrency:
+                _collect(*pending.popleft())
+
+        while pending:
+            _collect(*pending.popleft())
+
+        self.db.put_many(records)
+        _LOGGER.info('Synced %d nodes in %.2fs',
+                     len(zkpaths), time.time() - start)
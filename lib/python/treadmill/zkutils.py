@@ -6,6 +6,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
 import fnmatch
 import io
 import logging
@@ -25,6 +26,7 @@ from treadmill import plugin_manager
 from treadmill import utils
 from treadmill import sysinfo
 from treadmill import yamlwrapper as yaml
+from treadmill import zkcodec
 from treadmill import zknamespace as z
 
 
@@ -39,6 +41,9 @@ _ZK_PLUGIN_MOD = None
 
 DEFAULT_ACL = True
 
+# Maximum number of outstanding async requests of pipelined operations.
+PIPELINE_CONCURRENCY = 64
+
 
 try:
     _ZK_PLUGIN_MOD = plugin_manager.load('treadmill.connection.manager',
@@ -387,8 +392,10 @@ def watch_sequence(zkclient, path, func, delim='-', pattern=None,
             watcher.invoke_callback(path, node)
 
 
-def _payload(data):
+def _payload(data, path=None):
     """Converts payload to serialized bytes.
+
+    Data is encoded with the codec selected for the path (YAML by default).
     """
     payload = b''
     if data is not None:
@@ -397,14 +404,14 @@ def _payload(data):
         elif isinstance(data, six.string_types) and hasattr(data, 'encode'):
             payload = data.encode()
         else:
-            payload = yaml.dump(data).encode()
+            payload = zkcodec.encode(data, path)
     return payload
 
 
 def create(zkclient, path, data=None, acl=None, sequence=False,
            default_acl=True, ephemeral=False):
     """Serialize data into Zk node, fail if node exists."""
-    payload = _payload(data)
+    payload = _payload(data, path)
     if default_acl:
         realacl = make_default_acl(acl)
     else:
@@ -414,6 +421,49 @@ def create(zkclient, path, data=None, acl=None, sequence=False,
                            sequence=sequence, ephemeral=ephemeral)
 
 
+def create_async(zkclient, path, data=None, acl=None, sequence=False,
+                 default_acl=True, ephemeral=False):
+    """Serialize data into Zk node asynchronously, see create().
+
+    :returns:
+        ``IAsyncResult`` of the created path.
+    """
+    payload = _payload(data, path)
+    if default_acl:
+        realacl = make_default_acl(acl)
+    else:
+        realacl = acl
+
+    return zkclient.create_async(path, payload, makepath=True, acl=realacl,
+                                 sequence=sequence, ephemeral=ephemeral)
+
+
+def pipeline(requests, concurrency=PIPELINE_CONCURRENCY):
+    """Issue async requests, with up to concurrency requests outstanding.
+
+    :param requests:
+        Iterable of functions, each issuing an async request and returning
+        its ``IAsyncResult``.
+    :returns:
+        ``list`` of the completed ``IAsyncResult``, in request order.
+    """
+    done = []
+    pending = collections.deque()
+    for request in requests:
+        pending.append(request())
+        if len(pending) >= concurrency:
+            async_result = pending.popleft()
+            async_result.wait()
+            done.append(async_result)
+
+    while pending:
+        async_result = pending.popleft()
+        async_result.wait()
+        done.append(async_result)
+
+    return done
+
+
 def put(zkclient, path, data=None, acl=None, sequence=False, default_acl=True,
         ephemeral=False, check_content=False):
     """Serialize data into Zk node, converting data to YAML.
@@ -421,7 +471,7 @@ def put(zkclient, path, data=None, acl=None, sequence=False, default_acl=True,
     Default acl is set to admin:all, anonymous:readonly. These acls are
     appended to any addidional acls provided in the argument.
     """
-    payload = _payload(data)
+    payload = _payload(data, path)
 
     # Default acl assumes world readable data, safe to log the payload. If
     # default acl is not specified, do not log the payload as it may be
@@ -458,7 +508,7 @@ def update(zkclient, path, data, check_content=False):
     """Set data into Zk node, converting data to YAML."""
     _LOGGER.debug('update %s', path)
 
-    payload = _payload(data)
+    payload = _payload(data, path)
     if check_content:
         current, _metadata = zkclient.get(path)
         if current == payload:
@@ -482,8 +532,8 @@ def get_with_metadata(zkclient, path, watcher=None, strict=True):
     result = None
     if data is not None:
         try:
-            result = yaml.load(data)
-        except yaml.YAMLError:
+            result = zkcodec.decode(data)
+        except (yaml.YAMLError, ValueError):
             if strict:
                 raise
             else:
@@ -524,13 +574,13 @@ def ensure_exists(zkclient, path, acl=None, sequence=False, data=None):
     realacl = make_default_acl(acl)
     try:
         # new node has default empty data
-        newdata = _payload(data)
+        newdata = _payload(data, path)
         return zkclient.create(path, newdata, makepath=True, acl=realacl,
                                sequence=sequence)
     except kazoo.client.NodeExistsError:
         # if data not provided, we keep original data pristine
         if data is not None:
-            newdata = _payload(data)
+            newdata = _payload(data, path)
             zkclient.set(path, newdata)
 
         zkclient.set_acls(path, realacl)
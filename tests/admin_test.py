@@ -785,5 +785,89 @@ class PartitionTest(unittest.TestCase):
         self.assertEqual(obj, self.part.from_entry(ldap_entry))
 
 
+class LdapCacheTest(unittest.TestCase):
+    """Tests LDAP object read cache."""
+
+    def setUp(self):
+        admin.configure(cache_ttl=60)
+        admin.CACHE.hits = admin.CACHE.misses = 0
+        self.admin = admin.Admin(None, 'dc=xx,dc=com')
+        self.admin.write_ldap = mock.Mock()
+        self.admin.write_ldap.result = None
+
+    def tearDown(self):
+        admin.configure(cache_ttl=0)
+
+    @mock.patch('treadmill.admin.Admin.get', mock.Mock())
+    @mock.patch('treadmill.admin.Admin.paged_search', mock.Mock())
+    def test_read_through(self):
+        """Tests reads are cached and invalidated by writes."""
+        treadmill.admin.Admin.get.return_value = {'server': ['foo']}
+        treadmill.admin.Admin.paged_search.return_value = [
+            ('server=foo,ou=servers,ou=treadmill,dc=xx,dc=com',
+             {'server': ['foo']}),
+        ]
+        srv = admin.Server(self.admin)
+
+        self.assertEqual(srv.get('foo')['_id'], 'foo')
+        srv.get('foo')['_id'] = 'modified'
+        self.assertEqual(srv.get('foo')['_id'], 'foo')
+        self.assertEqual(treadmill.admin.Admin.get.call_count, 1)
+
+        self.assertEqual(len(srv.list({})), 1)
+        self.assertEqual(len(srv.list({})), 1)
+        self.assertEqual(treadmill.admin.Admin.paged_search.call_count, 1)
+        self.assertEqual(admin.CACHE.stats(),
+                         {'hits': 3, 'misses': 2, 'size': 2})
+
+        # Dirty reads bypass the cache.
+        srv.get('foo', dirty=True)
+        self.assertEqual(treadmill.admin.Admin.get.call_count, 2)
+
+        # Writes invalidate the object and the lists it belongs to.
+        srv.delete('foo')
+        srv.get('foo')
+        srv.list({})
+        self.assertEqual(treadmill.admin.Admin.get.call_count, 3)
+        self.assertEqual(treadmill.admin.Admin.paged_search.call_count, 2)
+
+    @mock.patch('treadmill.admin.Admin.get', mock.Mock())
+    def test_read_during_write(self):
+        """Tests reads cached while a write is in flight are invalidated."""
+        treadmill.admin.Admin.get.return_value = {'server': ['foo']}
+        srv = admin.Server(self.admin)
+
+        def _modify(_dn, _changes):
+            """Read the object while it is being written."""
+            srv.get('foo')
+            raise ldap3.core.exceptions.LDAPSocketReceiveError()
+
+        self.admin.write_ldap.modify.side_effect = _modify
+        with self.assertRaises(ldap3.core.exceptions.LDAPSocketReceiveError):
+            self.admin.modify(
+                'server=foo,ou=servers,ou=treadmill,dc=xx,dc=com',
+                {'cell': [(ldap3.MODIFY_REPLACE, ['test'])]}
+            )
+
+        self.assertEqual(admin.CACHE.stats()['size'], 0)
+        srv.get('foo')
+        self.assertEqual(treadmill.admin.Admin.get.call_count, 2)
+
+    def test_paged_search_page_size(self):
+        """Tests paged search page size is configurable."""
+        self.admin.ldap = mock.Mock()
+        self.admin.ldap.result = None
+        self.admin.ldap.extend.standard.paged_search.return_value = []
+
+        list(self.admin.paged_search('ou=treadmill', '(objectClass=*)'))
+        _args, kwargs = self.admin.ldap.extend.standard.paged_search.call_args
+        self.assertEqual(kwargs['paged_size'], 50)
+
+        self.admin.page_size = 500
+        list(self.admin.paged_search('ou=treadmill', '(objectClass=*)'))
+        _args, kwargs = self.admin.ldap.extend.standard.paged_search.call_args
+        self.assertEqual(kwargs['paged_size'], 500)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,106 @@
+"""Endpoint API tests.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import unittest
+
+import mock
+
+from tests.testutils import mockzk
+
+from treadmill.api import endpoint
+
+
+class ApiEndpointTest(unittest.TestCase):
+    """treadmill.api.endpoint tests."""
+
+    def setUp(self):
+        self.zkclient = mockzk.FakeZkClient({
+            '/endpoints/foo/bar#1:tcp:http': b'host1:1000',
+            '/endpoints/foo/bar#2:tcp:http': b'host2:2000',
+            '/endpoints/foo/baz#3:tcp:ssh': b'host1:3000',
+            '/endpoints/foo/qux#4:udp:dns': b'host3:4000',
+            '/discovery.state/host1': b'{1000: true, 3000: false}',
+            '/discovery.state/host2': b'{2000: true}',
+        })
+
+    def test_glob_prefix(self):
+        """Test glob literal prefix."""
+        self.assertEqual(endpoint._glob_prefix('bar#*:tcp:*'), 'bar#')
+        self.assertEqual(endpoint._glob_prefix('ba?#1:tcp:http'), 'ba')
+        self.assertEqual(endpoint._glob_prefix('bar#1:tcp:http'),
+                         'bar#1:tcp:http')
+
+    def test_list(self):
+        """Test listing endpoints."""
+        with mock.patch('treadmill.context.GLOBAL',
+                        mock.Mock(cell='test')) as ctx:
+            ctx.zk.conn = self.zkclient
+            api = endpoint.API()
+
+        self.assertEqual(
+            api.list('foo.bar', None, None),
+            [
+                {'name': 'foo.bar#1', 'proto': 'tcp', 'endpoint': 'http',
+                 'host': 'host1', 'port': 1000, 'state': True},
+                {'name': 'foo.bar#2', 'proto': 'tcp', 'endpoint': 'http',
+                 'host': 'host2', 'port': 2000, 'state': True},
+            ]
+        )
+        self.assertEqual(
+            [item['name'] for item in api.list('foo.*', 'tcp', None)],
+            ['foo.bar#1', 'foo.bar#2', 'foo.baz#3']
+        )
+        # Unknown server state.
+        self.assertEqual(api.list('foo.qux', None, None)[0]['state'], None)
+        self.assertEqual(api.list('nosuch.*', None, None), [])
+
+        # Server states are fetched once.
+        self.assertEqual(
+            sorted(path for path in self.zkclient.gets
+                   if path.startswith('/discovery.state')),
+            ['/discovery.state/host1', '/discovery.state/host2',
+             '/discovery.state/host3']
+        )
+
+        # Endpoint removed/added.
+        self.zkclient.delete('/endpoints/foo/bar#1:tcp:http')
+        self.zkclient.create('/endpoints/foo/bar#5:tcp:http', b'host2:2000')
+        self.assertEqual(
+            [item['name'] for item in api.list('foo.bar', None, None)],
+            ['foo.bar#2', 'foo.bar#5']
+        )
+
+    def test_discovery_state_invalidated(self):
+        """Test a state invalidated while being read is not kept."""
+        state = endpoint._DiscoveryState(self.zkclient)
+
+        get_async = self.zkclient.get_async
+
+        def _get_async(path, watch=None):
+            """Get a node, changed before the reply is received."""
+            async_result = get_async(path, watch=watch)
+            self.zkclient.set(path, self.zkclient.nodes[path])
+            return async_result
+
+        with mock.patch.object(self.zkclient, 'get_async', _get_async):
+            self.assertEqual(
+                state.get(['host2']), {'host2': {2000: True}}
+            )
+        self.assertEqual(state.servers, {})
+
+        # Read again, and kept, on the next get.
+        self.assertEqual(state.get(['host2']), {'host2': {2000: True}})
+        self.assertEqual(state.servers, {'host2': {2000: True}})
+        self.assertEqual(
+            self.zkclient.gets,
+            ['/discovery.state/host2', '/discovery.state/host2']
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
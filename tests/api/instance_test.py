@@ -8,6 +8,7 @@ from __future__ import unicode_literals
 
 import unittest
 
+import kazoo.exceptions
 import mock
 import jsonschema
 import six
@@ -355,6 +356,77 @@ class ApiInstanceTest(unittest.TestCase):
             mock.ANY, {'proid.app#0000000001': 1}
         )
 
+    @mock.patch('treadmill.context.AdminContext.conn',
+                mock.Mock(return_value=admin.Admin(None, None)))
+    @mock.patch('treadmill.context.ZkContext.conn', mock.Mock())
+    @mock.patch('treadmill.admin.Application.get')
+    @mock.patch('treadmill.scheduler.masterapi.create_apps')
+    @mock.patch('treadmill.api.instance._check_required_attributes',
+                mock.Mock())
+    @mock.patch('treadmill.api.instance._set_defaults', mock.Mock())
+    @mock.patch('treadmill.scheduler.masterapi.get_scheduled_stats',
+                mock.Mock(return_value={'proid': 9997}))
+    def test_instance_bulk_create(self, create_apps_mock, app_get_mock):
+        """Test bulk creating instances of configured applications.
+        """
+        def _app_get(app_id):
+            if app_id == 'proid.missing':
+                raise exc.NotFoundError(app_id)
+            return {
+                '_id': app_id,
+                'cpu': '10%',
+                'memory': '100M',
+                'disk': '100M',
+                'services': [{
+                    'command': '/bin/sleep 60',
+                    'name': 'sleep',
+                    'restart': {'interval': 60, 'limit': 3}
+                }],
+            }
+
+        app_get_mock.side_effect = _app_get
+        create_apps_mock.side_effect = (
+            lambda _zkclient, app_id, _app, count, _created_by: [
+                '{}#{:010d}'.format(app_id, idx) for idx in range(count)
+            ]
+        )
+
+        result = self.instance.bulk_create(
+            [
+                {'_id': 'proid.foo', 'count': 2},
+                {'_id': 'proid.missing'},
+                {'_id': 'proid.bar', 'count': 2},
+            ],
+            'monitor'
+        )
+
+        # The proid quota is accounted across the bulk.
+        self.assertEqual(
+            result,
+            [
+                {'_id': 'proid.foo',
+                 'instances': ['proid.foo#0000000000',
+                               'proid.foo#0000000001']},
+                {'_error': {'_id': 'proid.missing', 'why': 'proid.missing'}},
+                {'_error': {'_id': 'proid.bar',
+                            'why': 'Proid scheduled apps quota exceeded.'}},
+            ]
+        )
+        create_apps_mock.assert_called_once_with(
+            mock.ANY, 'proid.foo', mock.ANY, 2, 'monitor'
+        )
+
+        with six.assertRaisesRegex(
+            self, jsonschema.exceptions.ValidationError,
+            '1001 is greater than the maximum of 1000'
+        ):
+            self.instance.bulk_create([{'_id': 'proid.foo', 'count': 1001}])
+
+        # Other errors fail the whole bulk create.
+        create_apps_mock.side_effect = kazoo.exceptions.ConnectionLoss()
+        with self.assertRaises(kazoo.exceptions.ConnectionLoss):
+            self.instance.bulk_create([{'_id': 'proid.foo'}])
+
     @mock.patch('treadmill.context.AdminContext.conn',
                 mock.Mock(return_value=admin.Admin(None, None)))
     @mock.patch('treadmill.context.ZkContext.conn', mock.Mock())
@@ -13,6 +13,7 @@ import os
 import shutil
 import tarfile
 import tempfile
+import time
 import unittest
 
 import mock
@@ -20,6 +21,7 @@ import six
 from six.moves import _thread
 
 from treadmill.api import local
+from treadmill.fs import archive as fs_archive
 # pylint: disable=W0622
 from treadmill.exc import (LocalFileNotFoundError, InvalidInputError)
 
@@ -96,16 +98,15 @@ class LogAPITest(unittest.TestCase):
     def test_get(self):
         """Test the _LogAPI.get() method."""
         with mock.patch('treadmill.api.local._get_file'):
-            with mock.patch('io.open', mock.mock_open()):
-                with self.assertRaises(InvalidInputError):
-                    self.log.get('no/such/log/exists', start=-1)
-                with mock.patch('treadmill.api.local._fragment',
-                                mock.Mock(spec_set=True,
-                                          return_value='invoked')):
-                    self.assertEqual(
-                        self.log.get('no/such/log/exists', start=0, limit=3),
-                        'invoked'
-                    )
+            with self.assertRaises(InvalidInputError):
+                self.log.get('no/such/log/exists', start=-1)
+            with mock.patch('treadmill.api.local._read_log',
+                            mock.Mock(spec_set=True,
+                                      return_value='invoked')):
+                self.assertEqual(
+                    self.log.get('no/such/log/exists', start=0, limit=3),
+                    'invoked'
+                )
 
         # make sure that things don't break if the log file contains some
         # binary data with ord num > 128 (eg. \xc5 below) ie. not ascii
@@ -182,18 +183,33 @@ class HelperFuncTests(unittest.TestCase):
         self.tm_env_func = mock.Mock()
         self.tm_env_func.return_value = self.tm_env
 
-    @mock.patch('_thread.get_ident', mock.Mock(return_value='123'))
-    def test_temp_dir(self):
-        """Dummy test of _temp_dir()."""
-        self.assertEqual(local._temp_dir(),
-                         os.path.join(tempfile.gettempdir(), 'local-123.temp'))
-        shutil.copy(__file__,
-                    os.path.join(tempfile.gettempdir(), 'local-123.temp'))
-        self.assertEqual(len(os.listdir(
-            os.path.join(tempfile.gettempdir(), 'local-123.temp'))), 1)
-        # subsequent invocations should delete the temp dir content
-        self.assertEqual(os.listdir(local._temp_dir()), [])
-
+    def test_archive_cache(self):
+        """Test the LRU store of extracted archive members."""
+        cache = local._ArchiveCache(10)
+        root = cache.root
+        self.assertEqual(os.listdir(root), [])
+
+        for name in ('a', 'b', 'c'):
+            with io.open(os.path.join(root, name), 'wb') as f:
+                f.write(b'12345')
+            self.assertFalse(cache.get(os.path.join(root, name)))
+            cache.add(os.path.join(root, name))
+            # Make 'a' the most recently used.
+            self.assertTrue(cache.get(os.path.join(root, 'a')))
+
+        self.assertEqual(sorted(os.listdir(root)), ['a', 'c'])
+        self.assertEqual(cache.size, 10)
+
+        # Another cache does not share (nor clear) the directory.
+        other = local._ArchiveCache(10)
+        self.assertNotEqual(other.root, root)
+        self.assertEqual(sorted(os.listdir(root)), ['a', 'c'])
+        other.close()
+
+        cache.close()
+        self.assertFalse(os.path.exists(root))
+
+    @mock.patch('treadmill.api.local._ARCHIVE_CACHE', None)
     def test_extract_archive(self):
         """Test the _extract_archive() func."""
         with self.assertRaises(LocalFileNotFoundError):
@@ -224,6 +240,31 @@ class HelperFuncTests(unittest.TestCase):
                                            local._arch_log_filter,
                                            rel_log_dir='foo'))),
             2)
+
+        # Indexed archive, only the requested member is decompressed, once.
+        archive = os.path.join(temp_dir, 'f.tar.gz')
+        with fs_archive.ArchiveWriter(archive) as writer:
+            writer.add(os.path.join(temp_subdir, 'current'), 'foo/current')
+            writer.add(os.path.join(temp_subdir, '@4000zzzz.s'),
+                       'foo/@4000zzzz.s')
+
+        with mock.patch('tarfile.open') as tarfile_open:
+            extract = functools.partial(
+                local._extract_archive, archive,
+                extract_filter=functools.partial(local._arch_file_filter,
+                                                 fname='foo/current')
+            )
+            extracted = extract()
+            self.assertFalse(tarfile_open.called)
+
+        with io.open(extracted[0], 'rb') as f:
+            with io.open(__file__, 'rb') as orig:
+                self.assertEqual(f.read(), orig.read())
+
+        with mock.patch('treadmill.fs.archive.read_member') as read_member:
+            self.assertEqual(extract(), extracted)
+            self.assertFalse(read_member.called)
+
         shutil.rmtree(temp_dir)
 
     def test_concat_files(self):
@@ -237,12 +278,12 @@ class HelperFuncTests(unittest.TestCase):
                 logs.write(bytearray('{}\n'.format(i), 'ascii'))
 
         result = local._concat_files(file_lst)
-        self.assertTrue(isinstance(result, io.TextIOWrapper))
-        self.assertEqual(result.read(), u'0\n1\n2\n')
+        self.assertEqual(''.join(result), u'0\n1\n2\n')
 
         # check that _concat_files() catches IOError for non existing file
         file_lst.append('no_such_file')
-        local._concat_files(file_lst)
+        self.assertEqual(''.join(local._concat_files(file_lst)),
+                         u'0\n1\n2\n')
 
         for f in file_lst[:-1]:
             os.remove(f)
@@ -313,53 +354,51 @@ class HelperFuncTests(unittest.TestCase):
         with self.assertRaises(InvalidInputError):
             list(local._fragment(iter(six.moves.range(10)), 99, limit=5))
 
-    def test_fragment_in_reverse(self):
-        """Test the _fragment_in_reverse() func."""
-        self.assertEqual(
-            list(local._fragment_in_reverse(iter(six.moves.range(10)),
-                                            limit=-1)),
-            list(reversed(six.moves.range(10))))
-
-        self.assertEqual(
-            list(local._fragment_in_reverse(iter(six.moves.range(10)),
-                                            limit=2)),
-            [9, 8])
-
-        self.assertEqual(
-            list(local._fragment_in_reverse(iter(six.moves.range(10)), 0,
-                                            limit=3)),
-            [9, 8, 7])
-
-        self.assertEqual(
-            list(local._fragment_in_reverse(iter(six.moves.range(10)), 1, 4)),
-            list(six.moves.range(8, 4, -1)))
-
-        self.assertEqual(
-            list(local._fragment_in_reverse(iter(six.moves.range(10)),
-                                            start=5, limit=-1)),
-            [4, 3, 2, 1, 0])
-
-        self.assertEqual(
-            list(local._fragment_in_reverse(iter(six.moves.range(10)), 8,
-                                            limit=8)),
-            [1, 0])
-
-        self.assertEqual(
-            list(local._fragment_in_reverse(iter(six.moves.range(10)), 8,
-                                            limit=40)),
-            [1, 0])
-
-        self.assertEqual(
-            list(local._fragment_in_reverse(iter(six.moves.range(10)), 8, 1)),
-            [1])
-
-        with self.assertRaises(InvalidInputError):
-            list(local._fragment_in_reverse(iter(six.moves.range(10)),
-                                            start=99))
-
-        with self.assertRaises(InvalidInputError):
-            list(local._fragment_in_reverse(iter(six.moves.range(10)), 99,
-                                            limit=9))
+    @mock.patch('treadmill.api.local._LINE_INDEX_STEP', 3)
+    @mock.patch('treadmill.api.local._READ_BLOCK_SIZE', 4)
+    def test_read_log(self):
+        """Test the _read_log() func."""
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False) as temp:
+            temp.write(''.join(
+                '{}\n'.format(i) for i in six.moves.range(10)
+            ).encode())
+
+        lines = ['{}\n'.format(i) for i in six.moves.range(10)]
+        try:
+            self.assertEqual(local._read_log(temp.name), lines)
+            self.assertEqual(local._read_log(temp.name, 4, 3), lines[4:7])
+            self.assertEqual(local._read_log(temp.name, 8, 40), lines[8:])
+            self.assertEqual(local._read_log(temp.name, 10), [])
+            with self.assertRaises(InvalidInputError):
+                local._read_log(temp.name, 11)
+
+            self.assertEqual(
+                local._read_log(temp.name, order='desc'),
+                list(reversed(lines))
+            )
+            self.assertEqual(
+                local._read_log(temp.name, 1, 4, order='desc'),
+                ['8\n', '7\n', '6\n', '5\n']
+            )
+            self.assertEqual(
+                local._read_log(temp.name, 8, 40, order='desc'),
+                ['1\n', '0\n']
+            )
+            with self.assertRaises(InvalidInputError):
+                local._read_log(temp.name, 99, 9, order='desc')
+
+            # The index is extended when the log grows.
+            index = local._LINE_INDEXES[temp.name]
+            self.assertEqual(index.offsets, [0, 6, 12, 18])
+            with io.open(temp.name, 'ab') as f:
+                f.write(b'10\n11')
+            self.assertEqual(local._read_log(temp.name, 10),
+                             ['10\n', '11'])
+            self.assertEqual(local._read_log(temp.name, 0, 2, order='desc'),
+                             ['11', '10\n'])
+            self.assertIs(index, local._LINE_INDEXES[temp.name])
+        finally:
+            os.unlink(temp.name)
 
     def test_archive_path(self):
         """Test the _archive_paths() func."""
@@ -403,6 +442,43 @@ class APITest(unittest.TestCase):
         self.assertEqual(len(res), 1)
         self.assertEqual(res[0]['_id'], 'proid.app#123/uniq')
 
+    def _wait_for_list(self, expected, **kwargs):
+        """Wait for the inventory to catch up with the file system."""
+        for _ in range(100):
+            res = [item['_id'] for item in self.api.list(**kwargs)]
+            if res == expected:
+                break
+            time.sleep(0.05)
+        self.assertEqual(res, expected)
+
+    def test_list_inventory(self):
+        """Test list() is maintained by the inventory watch and paged.
+        """
+        for dirname in ('apps', 'running', 'archives'):
+            os.makedirs(os.path.join(self.root, dirname))
+
+        def _add_running(name):
+            app_dir = os.path.join(self.root, 'apps', name)
+            os.makedirs(app_dir)
+            os.symlink(app_dir, os.path.join(self.root, 'running', name))
+
+        _add_running('proid.app-1-uniq1')
+        io.open(
+            os.path.join(self.root, 'archives',
+                         'proid.app-0-uniq0.sys.tar.gz'),
+            'wb'
+        ).close()
+
+        self._wait_for_list(['proid.app#0/uniq0', 'proid.app#1/uniq1'])
+
+        _add_running('proid.app-2-uniq2')
+        os.unlink(os.path.join(self.root, 'running', 'proid.app-1-uniq1'))
+
+        self._wait_for_list(['proid.app#0/uniq0', 'proid.app#2/uniq2'])
+        self._wait_for_list(['proid.app#2/uniq2'], state='running')
+        self._wait_for_list(['proid.app#0/uniq0'], start=0, limit=1)
+        self._wait_for_list(['proid.app#2/uniq2'], start=1)
+
     def test_get(self):
         """Test _get(uniqid).
         """
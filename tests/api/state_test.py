@@ -6,10 +6,16 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
 import unittest
 import json
 import zlib
 
+import kazoo
 import mock
 
 import treadmill.utils
@@ -17,6 +23,39 @@ from treadmill.api import state
 from treadmill import yamlwrapper as yaml
 
 
+def _snapshot_db(rows):
+    """Create a finished history snapshot database."""
+    tmpdir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(tmpdir, 'finished.db')
+        conn = sqlite3.connect(db_path)
+        with conn:
+            conn.execute(
+                'CREATE TABLE finished (path text, timestamp real, data text, '
+                'directory text, name text)'
+            )
+            conn.executemany(
+                'INSERT INTO finished '
+                '(path, timestamp, data, directory, name) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [
+                    ('/finished/' + name, timestamp, yaml.dump(data),
+                     '/finished', name)
+                    for name, timestamp, data in rows
+                ]
+            )
+        conn.close()
+        with io.open(db_path, 'rb') as f:
+            return f.read()
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def _finished(host, when):
+    """Finished data of an instance."""
+    return {'data': '0.0', 'host': host, 'when': when, 'state': 'finished'}
+
+
 def _create_zkclient_mock(placement_data):
     data_watch_mock = mock.Mock(
         side_effect=lambda func: func(placement_data, None, None)
@@ -254,6 +293,119 @@ class ApiStateTest(unittest.TestCase):
             }
         )
 
+    def test_watch_finished(self):
+        """Test loading finished instances with pipelined reads.
+        """
+        cell_state = state.CellState()
+        cell_state.finished = {'foo.bar#0000000001': {}}
+
+        def _get_async(path):
+            result = mock.Mock()
+            if path == '/finished/foo.bar#0000000003':
+                result.get.side_effect = kazoo.client.NoNodeError
+            else:
+                result.get.return_value = (
+                    yaml.dump(_finished('baz', '1.0')).encode(), None
+                )
+            return result
+
+        zkclient_mock = mock.Mock()
+        zkclient_mock.get_async.side_effect = _get_async
+        zkclient_mock.ChildrenWatch.return_value = mock.Mock(
+            side_effect=lambda func: func(
+                ['foo.bar#0000000002', 'foo.bar#0000000003']
+            )
+        )
+
+        state.watch_finished(zkclient_mock, cell_state)
+
+        self.assertEqual(
+            cell_state.finished,
+            {
+                'foo.bar#0000000002': _finished('baz', '1.0'),
+                'foo.bar#0000000003': {},
+            }
+        )
+        self.assertEqual(zkclient_mock.get_async.call_count, 2)
+
+    def test_finished_history(self):
+        """Test the finished history index.
+        """
+        history = state.FinishedHistory()
+        self.addCleanup(history.close)
+
+        history.load('finished.db.gzip-0000000000', _snapshot_db([
+            ('foo.bar#0000000001', 1.0, _finished('baz1', '1.0')),
+            ('foo.bar#0000000002', 2.0, _finished('baz2', '2.0')),
+            ('foo.baz#0000000003', 3.0, _finished('baz1', '3.0')),
+        ]))
+        history.load('finished.db.gzip-0000000001', _snapshot_db([
+            ('foo.bar#0000000004', 4.0, _finished('baz1', '4.0')),
+        ]))
+        self.assertEqual(len(history), 4)
+
+        self.assertEqual(
+            history.get('foo.bar#0000000002'), _finished('baz2', '2.0')
+        )
+        self.assertIsNone(history.get('foo.bar#0000000005'))
+
+        # Latest first, limited.
+        self.assertEqual(
+            [name for name, _data in history.search('foo.bar#*', 2)],
+            ['foo.bar#0000000004', 'foo.bar#0000000002']
+        )
+        self.assertEqual(
+            [name for name, _data in history.search('foo.*#000000000[!4]')],
+            ['foo.baz#0000000003', 'foo.bar#0000000002',
+             'foo.bar#0000000001']
+        )
+        self.assertEqual(
+            history.search('foo.*', 2, hosts={'baz1'}),
+            [('foo.bar#0000000004', _finished('baz1', '4.0')),
+             ('foo.baz#0000000003', _finished('baz1', '3.0'))]
+        )
+
+        history.unload('finished.db.gzip-0000000000')
+        self.assertEqual(len(history), 1)
+        self.assertEqual(
+            [name for name, _data in history.search('*')],
+            ['foo.bar#0000000004']
+        )
+
+    @mock.patch('treadmill.context.GLOBAL', mock.Mock())
+    @mock.patch('treadmill.api.state.watch_running', mock.Mock())
+    @mock.patch('treadmill.api.state.watch_placement', mock.Mock())
+    @mock.patch('treadmill.api.state.watch_finished', mock.Mock())
+    @mock.patch('treadmill.api.state.watch_finished_history', mock.Mock())
+    @mock.patch('treadmill.api.state.CellState')
+    def test_list_history(self, cell_state_cls_mock):
+        """Tests for treadmill.api.state.list() with finished history"""
+        cell_state_cls_mock.return_value = self.cell_state
+        self.cell_state.finished_history.load(
+            'finished.db.gzip-0000000000',
+            _snapshot_db([
+                ('foo.bar#0000000008', 8.0, _finished('baz1', '8.0')),
+                ('foo.bar#0000000009', 9.0, _finished('baz2', '9.0')),
+            ])
+        )
+
+        state_api = state.API()
+
+        self.assertEqual(
+            state_api.list('foo.bar#000000000[89]', True),
+            [
+                {'host': 'baz1', 'name': 'foo.bar#0000000008', 'oom': False,
+                 'when': '8.0', 'state': 'finished', 'exitcode': 0},
+                {'host': 'baz2', 'name': 'foo.bar#0000000009', 'oom': False,
+                 'when': '9.0', 'state': 'finished', 'exitcode': 0},
+            ]
+        )
+        self.assertEqual(
+            state_api.get('foo.bar#0000000009'),
+            {'host': 'baz2', 'name': 'foo.bar#0000000009', 'oom': False,
+             'when': '9.0', 'state': 'finished', 'exitcode': 0}
+        )
+
 
 if __name__ == '__main__':
     unittest.main()
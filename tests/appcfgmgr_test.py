@@ -10,12 +10,15 @@ import io
 import os
 import shutil
 import tempfile
+import threading
+import time
 import unittest
 
 import mock
 
 import treadmill
 from treadmill import appcfgmgr
+from treadmill import eventmgr
 from treadmill import fs
 
 
@@ -112,6 +115,128 @@ class AppCfgMgrTest(unittest.TestCase):
         )
         self.assertFalse(res)
 
+    @mock.patch('treadmill.appcfg.configure.configure', mock.Mock())
+    @mock.patch('treadmill.fs.symlink_safe', mock.Mock())
+    def test__configure_batch(self):
+        """Tests instances are configured concurrently.
+        """
+        # Access to a protected member _configure_batch of a client class
+        # pylint: disable=W0212
+        threads = set()
+
+        def _configure(_tm_env, event_file, _runtime):
+            """Slow configure, failing for foo#3."""
+            threads.add(threading.current_thread())
+            time.sleep(0.2)
+            if event_file.endswith('#3'):
+                return None
+            return os.path.join(self.apps, os.path.basename(event_file))
+
+        treadmill.appcfg.configure.configure.side_effect = _configure
+
+        start = time.time()
+        res = self.appcfgmgr._configure_batch(
+            ['foo#%d' % idx for idx in range(8)]
+        )
+
+        # 8 configures of 0.2s, one after the other would take 1.6s.
+        self.assertLess(time.time() - start, 1.2)
+        self.assertGreater(len(threads), 1)
+        self.assertEqual(
+            res,
+            {'foo#%d' % idx: idx != 3 for idx in range(8)}
+        )
+        self.assertEqual(7, treadmill.fs.symlink_safe.call_count)
+        self.assertEqual(self.appcfgmgr.latencies['configure'].count, 8)
+        self.assertEqual(self.appcfgmgr.latencies['queue'].count, 8)
+        self.assertEqual(self.appcfgmgr.latencies['link'].count, 7)
+
+    @mock.patch('treadmill.appcfgmgr.AppCfgMgr._configure',
+                mock.Mock(return_value=True))
+    @mock.patch('treadmill.appcfgmgr.AppCfgMgr._refresh_supervisor',
+                mock.Mock())
+    @mock.patch('treadmill.appcfgmgr.AppCfgMgr._terminate', mock.Mock())
+    def test__process_batch(self):
+        """Tests created/deleted events are handled with a single refresh.
+        """
+        # Access to a protected member of a client class
+        # pylint: disable=W0212
+        self.appcfgmgr._is_active = True
+
+        for app in ('proid.app#0', 'proid.app#1', 'proid.app#0', '.tmp',
+                    'proid.app#3'):
+            self.appcfgmgr._on_created(os.path.join(self.cache, app))
+        self.appcfgmgr._on_deleted(os.path.join(self.cache, 'proid.app#2'))
+        # Deleted before being configured.
+        self.appcfgmgr._on_deleted(os.path.join(self.cache, 'proid.app#3'))
+
+        treadmill.appcfgmgr.AppCfgMgr._configure.assert_not_called()
+        treadmill.appcfgmgr.AppCfgMgr._terminate.assert_has_calls([
+            mock.call('proid.app#2'),
+            mock.call('proid.app#3'),
+        ])
+
+        self.appcfgmgr._process_batch()
+
+        treadmill.appcfgmgr.AppCfgMgr._configure.assert_has_calls(
+            [
+                mock.call('proid.app#0'),
+                mock.call('proid.app#1'),
+            ],
+            any_order=True
+        )
+        self.assertEqual(
+            2, treadmill.appcfgmgr.AppCfgMgr._configure.call_count
+        )
+        treadmill.appcfgmgr.AppCfgMgr._refresh_supervisor \
+                 .assert_called_once_with()
+        self.assertEqual(self.appcfgmgr.latencies['batch'].count, 1)
+
+        # Nothing to do.
+        self.appcfgmgr._process_batch()
+        treadmill.appcfgmgr.AppCfgMgr._refresh_supervisor \
+                 .assert_called_once_with()
+
+    @mock.patch('treadmill.appcfgmgr.AppCfgMgr._synchronize', mock.Mock())
+    def test__first_sync(self):
+        """Tests the first sync drops the pending instances."""
+        # Access to a protected member of a client class
+        # pylint: disable=W0212
+        self.appcfgmgr._is_active = True
+        self.appcfgmgr._on_created(os.path.join(self.cache, 'proid.app#0'))
+        self.appcfgmgr._on_deleted(
+            os.path.join(self.cache, eventmgr.READY_FILE)
+        )
+        self.assertFalse(self.appcfgmgr._is_active)
+
+        self.appcfgmgr._on_created(
+            os.path.join(self.cache, eventmgr.READY_FILE)
+        )
+        self.assertTrue(self.appcfgmgr._is_active)
+        treadmill.appcfgmgr.AppCfgMgr._synchronize.assert_called_once_with()
+        self.assertEqual(self.appcfgmgr._pending, [])
+
+    def test_latency_histogram(self):
+        """Tests the latency histogram.
+        """
+        histogram = appcfgmgr.LatencyHistogram()
+        self.assertEqual(str(histogram), 'n=0')
+
+        for latency in (0.001, 0.01, 0.2, 0.3, 100):
+            histogram.record(latency)
+
+        self.assertEqual(histogram.count, 5)
+        self.assertEqual(histogram.max, 100)
+        buckets = dict(histogram.buckets())
+        self.assertEqual(buckets[0.01], 2)
+        self.assertEqual(buckets[0.25], 1)
+        self.assertEqual(buckets[0.5], 1)
+        self.assertEqual(buckets[None], 1)
+        self.assertEqual(
+            str(histogram),
+            'n=5 avg=20.102s max=100.000s <=0.01s:2 <=0.25s:1 <=0.5s:1 more:1'
+        )
+
     @mock.patch('treadmill.subproc.check_call', mock.Mock())
     @mock.patch('treadmill.utils.rootdir',
                 mock.Mock(return_value='/treadmill'))
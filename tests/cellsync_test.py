@@ -138,6 +138,124 @@ class CellsyncTest(unittest.TestCase):
                          [('foo.1.*', 'lbendpoint', 'tcp', '{}'),
                           ('foo.2.*', 'dns', 'http', '{}')])
 
+    def test_ldap_mirror(self):
+        """Test the LDAP mirror only fetches changed entries."""
+        entries = {
+            'cn=foo': {'modifyTimestamp': ['20180101000000Z'], 'x': ['1']},
+            'cn=bar': {'modifyTimestamp': ['20180102000000Z'], 'x': ['2']},
+        }
+        searches = []
+
+        def _paged_search(search_base, search_filter, attributes):
+            """Fake paged search, supporting modifyTimestamp>= filters."""
+            del search_base
+            searches.append((search_filter, attributes))
+            since = ''
+            if 'modifyTimestamp>=' in search_filter:
+                since = search_filter.split('>=')[1].rstrip(')')
+            for dn, entry in sorted(entries.items()):
+                if entry['modifyTimestamp'][0] >= since:
+                    yield dn, dict(entry)
+
+        ldap_obj = mock.Mock()
+        ldap_obj.admin.paged_search.side_effect = _paged_search
+        ldap_obj.attrs.return_value = ['x']
+        ldap_obj.from_entry.side_effect = lambda entry, dn: {
+            '_id': dn, 'x': entry['x'][0]
+        }
+
+        mirror = cellsync._LdapMirror(ldap_obj, 'ou=test', '(objectClass=x)')
+        self.assertTrue(mirror.refresh())
+        self.assertEqual(
+            sorted(mirror.list(), key=lambda obj: obj['_id']),
+            [{'_id': 'cn=bar', 'x': '2'}, {'_id': 'cn=foo', 'x': '1'}]
+        )
+        self.assertEqual(
+            searches[-1],
+            ('(&(objectClass=x)(modifyTimestamp>=20180101000000Z))', ['x'])
+        )
+
+        # No changes, only the timestamps are listed.
+        del searches[:]
+        self.assertFalse(mirror.refresh())
+        self.assertEqual(searches, [('(objectClass=x)', ['modifyTimestamp'])])
+
+        # Modify foo, delete bar.
+        entries['cn=foo'] = {'modifyTimestamp': ['20180103000000Z'],
+                             'x': ['3']}
+        del entries['cn=bar']
+        del searches[:]
+        self.assertTrue(mirror.refresh())
+        self.assertEqual(mirror.list(), [{'_id': 'cn=foo', 'x': '3'}])
+        self.assertEqual(
+            searches[-1],
+            ('(&(objectClass=x)(modifyTimestamp>=20180103000000Z))', ['x'])
+        )
+
+    @mock.patch('treadmill.zkutils.put', mock.Mock())
+    @mock.patch('treadmill.zkutils.ensure_deleted', mock.Mock())
+    def test_sync_collection_digests(self):
+        """Test unchanged entities are not written again to Zookeeper."""
+        zkclient = mock.Mock()
+        zkclient.get_children.return_value = ['foo', 'bar']
+        digests = {}
+
+        cellsync._sync_collection(
+            zkclient,
+            [{'_id': 'foo', 'x': 1}, {'_id': 'bar', 'x': 2}],
+            '/test', digests=digests
+        )
+        self.assertEqual(zkutils.put.call_count, 2)
+        self.assertEqual(sorted(digests), ['/test/bar', '/test/foo'])
+
+        zkutils.put.reset_mock()
+        cellsync._sync_collection(
+            zkclient,
+            [{'_id': 'foo', 'x': 1}, {'_id': 'bar', 'x': 3}],
+            '/test', digests=digests
+        )
+        zkutils.put.assert_called_once_with(
+            zkclient, '/test/bar', {'x': 3}, check_content=True
+        )
+
+        zkutils.put.reset_mock()
+        cellsync._sync_collection(
+            zkclient, [{'_id': 'foo', 'x': 1}], '/test', digests=digests
+        )
+        zkutils.put.assert_not_called()
+        zkutils.ensure_deleted.assert_called_once_with(zkclient, '/test/bar')
+        self.assertEqual(list(digests), ['/test/foo'])
+
+    @mock.patch('treadmill.context.GLOBAL', mock.Mock(cell='test'))
+    @mock.patch('treadmill.admin.Server')
+    @mock.patch('treadmill.zkutils.ensure_exists', mock.Mock())
+    @mock.patch.dict(cellsync._MIRRORS, clear=True)
+    @mock.patch.dict(cellsync._DIGESTS, clear=True)
+    def test_sync_servers_error(self, server_cls):
+        """Test the mirror is resynced after a failed incremental sync."""
+        admin_srv = server_cls.return_value
+        admin_srv.admin.paged_search.return_value = [
+            ('cn=foo', {'modifyTimestamp': ['20180101000000Z']}),
+        ]
+        admin_srv.from_entry.side_effect = lambda entry, dn: {'_id': dn}
+
+        zkutils.ensure_exists.side_effect = (
+            kazoo.exceptions.ConnectionLoss()
+        )
+        with self.assertRaises(kazoo.exceptions.ConnectionLoss):
+            cellsync.sync_servers(incremental=True)
+
+        # LDAP did not change, the servers are still written.
+        zkutils.ensure_exists.side_effect = None
+        cellsync.sync_servers(incremental=True)
+        zkutils.ensure_exists.assert_called_with(
+            mock.ANY, '/globals/servers', data=['cn=foo']
+        )
+
+        zkutils.ensure_exists.reset_mock()
+        cellsync.sync_servers(incremental=True)
+        zkutils.ensure_exists.assert_not_called()
+
 
 if __name__ == '__main__':
     unittest.main()
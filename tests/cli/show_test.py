@@ -82,6 +82,21 @@ class ShowTest(unittest.TestCase):
         self.assertNotIn('1246', result.output)
         self.assertNotIn('ssh', result.output)
 
+    @mock.patch('treadmill.restclient.get',
+                mock.Mock(return_value=mock.MagicMock(requests.Response)))
+    @mock.patch('treadmill.context.Context.state_api',
+                mock.Mock(return_value=['http://xxx:1234', 'http://yyy:1234']))
+    def test_show_state_hedged(self):
+        """Test cli.show.state calls the state API endpoints hedged."""
+        restclient.get.return_value.json.return_value = []
+
+        result = self.runner.invoke(self.cli, ['--cell', 'test', 'state'])
+        self.assertEqual(result.exit_code, 0)
+        restclient.get.assert_called_once_with(
+            ['http://xxx:1234', 'http://yyy:1234'], '/state/',
+            hedge_delay=mock.ANY
+        )
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,107 @@
+"""Performance test for treadmill.cron.jobstore.
+
+Times a scheduler tick (due jobs, update of their next run time and next
+wakeup) on synthetic jobs, with the apscheduler Zookeeper job store and with
+the cached job store. Zookeeper is the in-memory fake client of the tests,
+the real cost of the apscheduler job store is much higher as it reads every
+node on every tick.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import datetime
+import pickle
+import timeit
+
+import mock
+import pytz
+
+from apscheduler import job as aps_job
+from apscheduler import util as aps_util
+from apscheduler.jobstores import zookeeper
+from apscheduler.triggers import interval
+
+from tests.testutils import mockzk
+
+from treadmill.cron import jobstore
+
+_EPOCH = datetime.datetime(2018, 1, 1, tzinfo=pytz.utc)
+
+_DUE_PER_TICK = 10
+
+
+def _nodes(jobs_count):
+    """Synthetic job nodes, one per second."""
+    nodes = {}
+    for idx in range(jobs_count):
+        job = aps_job.Job(
+            mock.Mock(),
+            id='job-%06d' % idx,
+            func='time:time',
+            args=(),
+            kwargs={'count': 1},
+            name='proid.app:start',
+            trigger=interval.IntervalTrigger(seconds=jobs_count,
+                                             timezone=pytz.utc),
+            executor='default',
+            misfire_grace_time=60,
+            coalesce=True,
+            max_instances=1,
+            next_run_time=_EPOCH + datetime.timedelta(seconds=idx),
+        )
+        nodes['/cron-jobs/' + job.id] = pickle.dumps({
+            'next_run_time': aps_util.datetime_to_utc_timestamp(
+                job.next_run_time
+            ),
+            'job_state': job.__getstate__(),
+        })
+    return nodes
+
+
+def _tick(store, now):
+    """Run the jobstore calls of a scheduler wakeup."""
+    for job in store.get_due_jobs(now):
+        job.next_run_time = job.trigger.get_next_fire_time(
+            job.next_run_time, now
+        )
+        store.update_job(job)
+    return store.get_next_run_time()
+
+
+def test_tick(jobs_count, attempts):
+    """Time scheduler ticks on jobs_count jobs."""
+    nodes = _nodes(jobs_count)
+
+    results = []
+    for store_cls in (zookeeper.ZooKeeperJobStore,
+                      jobstore.CachedZooKeeperJobStore):
+        store = store_cls(path='/cron-jobs',
+                          client=mockzk.FakeZkClient(nodes))
+        start = timeit.timeit(
+            stmt=lambda: store.start(mock.Mock(state=0), 'default'),
+            number=1
+        )
+
+        ticks = iter(range(attempts))
+        tick = timeit.timeit(
+            stmt=lambda: _tick(
+                store,
+                _EPOCH + datetime.timedelta(
+                    seconds=(next(ticks) + 1) * _DUE_PER_TICK
+                )
+            ),
+            number=attempts
+        )
+        results.append((store_cls.__name__, start, tick / attempts))
+
+    for name, start, tick in results:
+        print('jobs: %7d, %-24s start: %8.3f s, tick: %10.3f ms' % (
+            jobs_count, name, start, tick * 1e3))
+
+
+if __name__ == '__main__':
+    for count in (1000, 10000, 100000):
+        test_tick(count, 5)
@@ -0,0 +1,262 @@
+"""Unit test for treadmill.cron.jobstore.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import datetime
+import pickle
+import unittest
+
+import mock
+import pytz
+
+from apscheduler import job as aps_job
+from apscheduler import util as aps_util
+from apscheduler.jobstores import base
+from apscheduler.schedulers import twisted
+from apscheduler.triggers import interval
+
+from tests.testutils import mockzk
+
+from treadmill.cron import jobstore
+
+
+_EPOCH = datetime.datetime(2018, 1, 1, tzinfo=pytz.utc)
+
+
+def _at(seconds):
+    """Datetime at a number of seconds after the epoch of the tests."""
+    return _EPOCH + datetime.timedelta(seconds=seconds)
+
+
+def _job(job_id, next_run_time):
+    """Create an apscheduler job."""
+    return aps_job.Job(
+        mock.Mock(),
+        id=job_id,
+        func='time:time',
+        args=(),
+        kwargs={},
+        name=job_id,
+        trigger=interval.IntervalTrigger(seconds=60, timezone=pytz.utc),
+        executor='default',
+        misfire_grace_time=60,
+        coalesce=True,
+        max_instances=1,
+        next_run_time=next_run_time,
+    )
+
+
+def _put(zkclient, job, path='/cron-jobs'):
+    """Write a job node the way the apscheduler job store does."""
+    zkclient.create(
+        '/'.join([path, job.id]),
+        pickle.dumps({
+            'next_run_time': aps_util.datetime_to_utc_timestamp(
+                job.next_run_time
+            ),
+            'job_state': job.__getstate__(),
+        })
+    )
+
+
+class CachedZooKeeperJobStoreTest(unittest.TestCase):
+    """Tests for treadmill.cron.jobstore.CachedZooKeeperJobStore."""
+
+    def setUp(self):
+        self.zkclient = mockzk.FakeZkClient()
+        self.scheduler = mock.Mock(state=0)
+        self.store = jobstore.CachedZooKeeperJobStore(
+            path='/cron-jobs', client=self.zkclient
+        )
+
+    def _start(self):
+        self.store.start(self.scheduler, 'default')
+
+    def test_load(self):
+        """Test the jobs are read once, at start."""
+        _put(self.zkclient, _job('foo', _at(20)))
+        _put(self.zkclient, _job('bar', _at(10)))
+        _put(self.zkclient, _job('baz', None))
+        self._start()
+        self.assertEqual(len(self.zkclient.gets), 3)
+
+        self.assertEqual(self.store.get_next_run_time(), _at(10))
+        self.assertEqual(
+            [job.id for job in self.store.get_all_jobs()],
+            ['bar', 'foo', 'baz']
+        )
+        self.assertEqual(
+            [job.id for job in self.store.get_due_jobs(_at(15))],
+            ['bar']
+        )
+        self.assertEqual(self.store.lookup_job('foo').next_run_time, _at(20))
+        self.assertIsNone(self.store.lookup_job('nosuchjob'))
+
+        # All from the cache.
+        self.assertEqual(len(self.zkclient.gets), 3)
+
+    def test_watch(self):
+        """Test the jobs changed by other schedulers are picked up."""
+        self._start()
+        self.assertIsNone(self.store.get_next_run_time())
+
+        _put(self.zkclient, _job('foo', _at(20)))
+        self.assertEqual(self.store.get_next_run_time(), _at(20))
+
+        other = jobstore.CachedZooKeeperJobStore(
+            path='/cron-jobs', client=self.zkclient
+        )
+        other.start(mock.Mock(state=0), 'default')
+        other.update_job(_job('foo', _at(5)))
+        self.assertEqual(self.store.get_next_run_time(), _at(5))
+
+        other.remove_job('foo')
+        self.assertIsNone(self.store.get_next_run_time())
+        self.assertIsNone(self.store.lookup_job('foo'))
+
+    def test_watch_wakeup(self):
+        """Test the scheduler is woken up by an earlier job."""
+        _put(self.zkclient, _job('foo', _at(20)))
+        self._start()
+        self.scheduler.state = 1
+
+        _put(self.zkclient, _job('bar', _at(30)))
+        self.scheduler.wakeup.assert_not_called()
+
+        _put(self.zkclient, _job('baz', _at(10)))
+        self.scheduler.wakeup.assert_called_once_with()
+
+    def test_add_remove(self):
+        """Test adding and removing jobs."""
+        self._start()
+        self.store.add_job(_job('foo', _at(20)))
+        self.assertIn('/cron-jobs/foo', self.zkclient.nodes)
+        self.assertEqual(self.store.get_next_run_time(), _at(20))
+
+        with self.assertRaises(base.ConflictingIdError):
+            self.store.add_job(_job('foo', _at(20)))
+
+        self.store.remove_job('foo')
+        self.assertNotIn('/cron-jobs/foo', self.zkclient.nodes)
+        self.assertIsNone(self.store.get_next_run_time())
+
+        with self.assertRaises(base.JobLookupError):
+            self.store.remove_job('foo')
+        with self.assertRaises(base.JobLookupError):
+            self.store.update_job(_job('foo', _at(20)))
+
+    def test_update_batched(self):
+        """Test next run time updates are written at the next wakeup."""
+        for idx in range(3):
+            _put(self.zkclient, _job('job%d' % idx, _at(idx)))
+        self._start()
+        writes = self.zkclient.writes
+
+        for job in self.store.get_due_jobs(_at(10)):
+            job.next_run_time = job.next_run_time + datetime.timedelta(
+                seconds=100
+            )
+            self.store.update_job(job)
+
+        # Not written yet, but visible.
+        self.assertEqual(self.zkclient.writes, writes)
+        self.assertEqual(self.store.lookup_job('job0').next_run_time,
+                         _at(100))
+        self.assertEqual(self.store.get_due_jobs(_at(10)), [])
+
+        self.assertEqual(self.store.get_next_run_time(), _at(100))
+        self.assertEqual(self.zkclient.writes, writes + 3)
+
+        doc = pickle.loads(self.zkclient.nodes['/cron-jobs/job1'])
+        self.assertEqual(doc['job_state']['next_run_time'], _at(101))
+
+        # Own writes are not unpickled again.
+        with mock.patch('pickle.loads') as loads:
+            self.store.get_next_run_time()
+            for job in self.store.get_due_jobs(_at(200)):
+                job.next_run_time = _at(300)
+                self.store.update_job(job)
+            self.store.get_next_run_time()
+            loads.assert_not_called()
+
+        other = jobstore.CachedZooKeeperJobStore(
+            path='/cron-jobs', client=self.zkclient
+        )
+        other.start(mock.Mock(state=0), 'default')
+        self.assertEqual(other.get_next_run_time(), _at(300))
+
+    def test_update_changed(self):
+        """Test job definition changes are written at once."""
+        _put(self.zkclient, _job('foo', _at(20)))
+        self._start()
+        writes = self.zkclient.writes
+
+        job = _job('foo', _at(20))
+        job.kwargs = {'count': 2}
+        self.store.update_job(job)
+        self.assertEqual(self.zkclient.writes, writes + 1)
+        self.assertEqual(self.store.lookup_job('foo').kwargs, {'count': 2})
+
+    def test_pause_resume(self):
+        """Test pause/resume through a scheduler not running its loop."""
+        _put(self.zkclient, _job('foo', _at(20)))
+        # The reactor never runs, as in the admin CLI and the REST API.
+        scheduler = twisted.TwistedScheduler(
+            reactor=mock.Mock(), timezone=pytz.utc
+        )
+        scheduler.add_jobstore(self.store)
+        scheduler.start()
+        self.addCleanup(scheduler.shutdown, wait=False)
+
+        scheduler.pause_job('foo')
+        doc = pickle.loads(self.zkclient.nodes['/cron-jobs/foo'])
+        self.assertIsNone(doc['next_run_time'])
+
+        scheduler.resume_job('foo')
+        doc = pickle.loads(self.zkclient.nodes['/cron-jobs/foo'])
+        self.assertIsNotNone(doc['next_run_time'])
+
+    def test_update_removed(self):
+        """Test batched updates of jobs removed meanwhile are dropped."""
+        _put(self.zkclient, _job('foo', _at(20)))
+        self._start()
+
+        job = self.store.lookup_job('foo')
+        job.next_run_time = _at(30)
+        self.store.update_job(job)
+
+        self.zkclient.delete('/cron-jobs/foo')
+        self.assertIsNone(self.store.get_next_run_time())
+        self.assertNotIn('/cron-jobs/foo', self.zkclient.nodes)
+
+    def test_invalid_job(self):
+        """Test jobs that can not be unpickled are removed."""
+        self.zkclient.create('/cron-jobs/foo', b'garbage')
+        self._start()
+        self.assertNotIn('/cron-jobs/foo', self.zkclient.nodes)
+        self.assertIsNone(self.store.lookup_job('foo'))
+
+    def test_heap_compact(self):
+        """Test stale heap entries do not accumulate."""
+        _put(self.zkclient, _job('foo', _at(0)))
+        self._start()
+
+        job = self.store.lookup_job('foo')
+        for idx in range(5000):
+            job.next_run_time = _at(idx)
+            self.store.update_job(job)
+
+        # W0212: access to protected member.
+        self.assertLessEqual(
+            len(self.store._heap),  # pylint: disable=W0212
+            jobstore._HEAP_COMPACT_MIN + 1  # pylint: disable=W0212
+        )
+        self.assertEqual(self.store.get_next_run_time(), _at(4999))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,8 +10,12 @@ import unittest
 
 import mock
 
+from apscheduler.jobstores import zookeeper
+
 import treadmill
+from treadmill import cron
 from treadmill import restclient
+from treadmill.cron import jobstore
 from treadmill.cron import model as cron_model
 from treadmill.cron.run import app as cron_app
 
@@ -61,6 +65,21 @@ class CronTest(unittest.TestCase):
             payload=dict(instances=[u'foo.bar#123456789'])
         )
 
+    @mock.patch('apscheduler.schedulers.twisted.TwistedScheduler')
+    def test_get_scheduler(self, scheduler_cls):
+        """Tests only the scheduler loop indexes the jobs.
+        """
+        zkclient = mock.Mock()
+        with mock.patch('treadmill.cron._SCHEDULER', None):
+            cron.get_scheduler(zkclient)
+        store = scheduler_cls.return_value.add_jobstore.call_args[0][0]
+        self.assertIs(type(store), zookeeper.ZooKeeperJobStore)
+
+        with mock.patch('treadmill.cron._SCHEDULER', None):
+            cron.get_scheduler(zkclient, cached=True)
+        store = scheduler_cls.return_value.add_jobstore.call_args[0][0]
+        self.assertIsInstance(store, jobstore.CachedZooKeeperJobStore)
+
 
 if __name__ == '__main__':
     unittest.main()
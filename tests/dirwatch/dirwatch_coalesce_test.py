@@ -0,0 +1,91 @@
+"""Unit test for treadmill.dirwatch.dirwatch_coalesce.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import unittest
+
+from treadmill.dirwatch import dirwatch_coalesce
+from treadmill.dirwatch import DirWatcherEvent
+
+_CREATED = DirWatcherEvent.CREATED
+_DELETED = DirWatcherEvent.DELETED
+_MODIFIED = DirWatcherEvent.MODIFIED
+_OVERFLOW = DirWatcherEvent.OVERFLOW
+
+
+class DirWatchCoalesceTest(unittest.TestCase):
+    """Tests for treadmill.dirwatch.dirwatch_coalesce."""
+
+    def test_coalesce(self):
+        """Test merging the events of a path."""
+        self.assertEqual(
+            dirwatch_coalesce.coalesce([
+                (_CREATED, '/a'),
+                (_MODIFIED, '/b'),
+                (_MODIFIED, '/a'),
+                (_MODIFIED, '/b'),
+                (_CREATED, '/c'),
+                (_MODIFIED, '/a'),
+                (_DELETED, '/c'),
+                (_DELETED, '/d'),
+                (_CREATED, '/d'),
+                (_MODIFIED, '/d'),
+                (_MODIFIED, '/e'),
+                (_DELETED, '/e'),
+            ]),
+            [
+                (_CREATED, '/a'),
+                (_MODIFIED, '/b'),
+                (_DELETED, '/d'),
+                (_CREATED, '/d'),
+                (_DELETED, '/e'),
+            ]
+        )
+
+    def test_coalesce_recreated(self):
+        """Test a path created, deleted and created again."""
+        self.assertEqual(
+            dirwatch_coalesce.coalesce([
+                (_CREATED, '/a'),
+                (_DELETED, '/a'),
+                (_CREATED, '/a'),
+                (_MODIFIED, '/a'),
+            ]),
+            [
+                (_CREATED, '/a'),
+            ]
+        )
+        self.assertEqual(
+            dirwatch_coalesce.coalesce([
+                (_MODIFIED, '/a'),
+                (_CREATED, '/a'),
+            ]),
+            [
+                (_DELETED, '/a'),
+                (_CREATED, '/a'),
+            ]
+        )
+
+    def test_coalesce_overflow(self):
+        """Test that events are not merged across an overflow."""
+        self.assertEqual(
+            dirwatch_coalesce.coalesce([
+                (_CREATED, '/x/a'),
+                (_OVERFLOW, '/x'),
+                (_MODIFIED, '/x/a'),
+                (_MODIFIED, '/x/a'),
+            ]),
+            [
+                (_CREATED, '/x/a'),
+                (_OVERFLOW, '/x'),
+                (_MODIFIED, '/x/a'),
+            ]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -86,6 +86,30 @@ class DirWatchDispatcherTest(unittest.TestCase):
         self.assertEqual(last_called, set(['_created3']))
         last_called.clear()
 
+    def test_trigger_overflow(self):
+        """Test rescan handlers."""
+        # Access protected module
+        # pylint: disable=W0212
+        dirwatcher = mock.Mock()
+        dispatcher = dirwatch.DirWatcherDispatcher(dirwatcher)
+        rescanned = []
+
+        dispatcher.register('/path/to/server', {
+            dirwatch.DirWatcherEvent.OVERFLOW: rescanned.append,
+        })
+        dispatcher.register('/path/to/placement/*', {
+            dirwatch.DirWatcherEvent.OVERFLOW: rescanned.append,
+        })
+
+        self.assertEqual(dirwatcher.on_overflow, dispatcher._on_overflow)
+
+        dispatcher._on_overflow('/path/to/server')
+        dispatcher._on_overflow('/path/to/placement')
+        dispatcher._on_overflow('/path/to/placement/test')
+        self.assertEqual(
+            rescanned, ['/path/to/server', '/path/to/placement/test']
+        )
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -21,6 +21,8 @@ from treadmill import dirwatch
 if os.name != 'nt':
     import select
 
+    from treadmill.syscall import inotify
+
 
 class DirWatcherTest(unittest.TestCase):
     """Tests for teadmill.dirwatch."""
@@ -87,6 +89,56 @@ class DirWatcherTest(unittest.TestCase):
                 res,
             )
 
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
+    def test_watcher_coalesce(self):
+        """Tests events coalescing."""
+        test_file = os.path.join(self.root, 'a')
+        tmp_file = os.path.join(self.root, 'b')
+
+        watcher = dirwatch.DirWatcher(self.root, coalesce=True)
+
+        with io.open(test_file, 'w') as f:
+            f.write('hello')
+        with io.open(test_file, 'a') as f:
+            f.write(' world!')
+        with io.open(tmp_file, 'w') as f:
+            f.write('temporary')
+        os.unlink(tmp_file)
+
+        res = watcher.process_events()
+
+        self.assertEqual(
+            [
+                (dirwatch.DirWatcherEvent.CREATED, test_file, None),
+            ],
+            res,
+        )
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
+    def test_overflow(self):
+        """Tests the rescan callback on overflow."""
+        rescanned = []
+        other_dir = os.path.join(self.root, 'other')
+        os.mkdir(other_dir)
+
+        watcher = dirwatch.DirWatcher(self.root)
+        watcher.add_dir(other_dir)
+        watcher.on_overflow = lambda x: rescanned.append(x) or 'rescan'
+
+        overflow = inotify.InotifyEvent(-1, inotify.IN_Q_OVERFLOW, 0, None)
+        with mock.patch.object(watcher.inotify, 'read_events',
+                               return_value=[overflow]):
+            res = watcher.process_events()
+
+        self.assertEqual([self.root, other_dir], rescanned)
+        self.assertEqual(
+            [
+                (dirwatch.DirWatcherEvent.OVERFLOW, self.root, 'rescan'),
+                (dirwatch.DirWatcherEvent.OVERFLOW, other_dir, 'rescan'),
+            ],
+            res,
+        )
+
     @unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
     @mock.patch('select.poll', mock.Mock())
     def test_signal(self):
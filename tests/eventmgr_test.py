@@ -11,6 +11,7 @@ import io
 import os
 import shutil
 import tempfile
+import time
 import unittest
 
 import kazoo
@@ -86,6 +87,9 @@ class EventMgrTest(mockzk.MockZookeeperTestCase):
         )
 
         mock_zkclient.get.return_value = ('{}', mock.Mock(ctime=1000))
+        mock_zkclient.get_async.return_value.get.return_value = (
+            b'{}', mock.Mock(ctime=1000)
+        )
         mock_zkclient.DataWatch.return_value = mock_data_watch
         mock_zkclient.ChildrenWatch.return_value = mock_children_watch
         mock_zkclient.handler.event_object.side_effect = mock_event_object
@@ -124,6 +128,9 @@ class EventMgrTest(mockzk.MockZookeeperTestCase):
         )
 
         mock_zkclient.get.return_value = ('{}', mock.Mock(ctime=1000))
+        mock_zkclient.get_async.return_value.get.return_value = (
+            b'{}', mock.Mock(ctime=1000)
+        )
         mock_zkclient.DataWatch.return_value = mock_data_watch
         mock_zkclient.ChildrenWatch.return_value = mock_children_watch
         mock_zkclient.handler.event_object.side_effect = mock_event_object
@@ -152,65 +159,56 @@ class EventMgrTest(mockzk.MockZookeeperTestCase):
 
         self.assertFalse(os.path.exists(os.path.join(self.cache, '.ready')))
 
-    @mock.patch('treadmill.zkutils.get', mock.Mock())
-    @mock.patch('treadmill.zkutils.get_with_metadata', mock.Mock())
+    def _zkclient(self, apps, latency=0):
+        """Fake Zookeeper with placed and scheduled apps."""
+        zkclient = mockzk.FakeZkClient(latency=latency)
+        for app in apps:
+            zkclient.create('/placement/%s/%s' % (self.evmgr._hostname, app),
+                            yaml.dump({'identity': 1}).encode())
+            zkclient.create('/scheduled/%s' % app,
+                            yaml.dump({'memory': '1G'}).encode())
+        return zkclient
+
     def test__cache(self):
         """Test application cache event.
         """
         # Access to a protected member _cache of a client class
         # pylint: disable=W0212
-        treadmill.zkutils.get.return_value = {}
-
-        treadmill.zkutils.get_with_metadata.return_value = (
-            {}, mock.Mock(ctime=1000)
-        )
-
-        zkclient = kazoo.client.KazooClient()
+        zkclient = self._zkclient(['foo#001'])
         self.evmgr._cache(zkclient, 'foo#001')
 
         appcache = os.path.join(self.cache, 'foo#001')
         self.assertTrue(os.path.exists(appcache))
+        with io.open(appcache) as f:
+            self.assertEqual(
+                yaml.load(stream=f),
+                {'memory': '1G', 'identity': 1, 'task': '001'}
+            )
 
-    @mock.patch('treadmill.zkutils.get', mock.Mock())
-    @mock.patch('treadmill.zkutils.get_with_metadata', mock.Mock())
     def test__cache_placement_notfound(self):
         """Test application cache event when placement is not found.
         """
         # Access to a protected member _cache of a client class
         # pylint: disable=W0212
-        treadmill.zkutils.get.return_value = {}
-
-        treadmill.zkutils.get_with_metadata.side_effect = \
-            kazoo.exceptions.NoNodeError
-
-        zkclient = kazoo.client.KazooClient()
+        zkclient = self._zkclient(['foo#001'])
+        del zkclient.nodes['/placement/%s/foo#001' % self.evmgr._hostname]
         self.evmgr._cache(zkclient, 'foo#001')
 
         appcache = os.path.join(self.cache, 'foo#001')
         self.assertFalse(os.path.exists(appcache))
 
-    @mock.patch('treadmill.zkutils.get', mock.Mock())
-    @mock.patch('treadmill.zkutils.get_with_metadata', mock.Mock())
     def test__cache_app_notfound(self):
         """Test application cache event when app is not found.
         """
         # Access to a protected member _cache of a client class
         # pylint: disable=W0212
-        treadmill.zkutils.get.side_effect = \
-            kazoo.exceptions.NoNodeError
-
-        treadmill.zkutils.get_with_metadata.return_value = (
-            {}, mock.Mock(ctime=1000)
-        )
-
-        zkclient = kazoo.client.KazooClient()
+        zkclient = self._zkclient(['foo#001'])
+        del zkclient.nodes['/scheduled/foo#001']
         self.evmgr._cache(zkclient, 'foo#001')
 
         appcache = os.path.join(self.cache, 'foo#001')
         self.assertFalse(os.path.exists(appcache))
 
-    @mock.patch('treadmill.zkutils.get', mock.Mock())
-    @mock.patch('treadmill.zkutils.get_with_metadata', mock.Mock())
     @mock.patch('treadmill.fs.write_safe', mock.Mock())
     @mock.patch('os.stat', mock.Mock())
     def test__cache_check_existing(self):
@@ -218,13 +216,7 @@ class EventMgrTest(mockzk.MockZookeeperTestCase):
         """
         # Access to a protected member _cache of a client class
         # pylint: disable=W0212
-        treadmill.zkutils.get.return_value = {}
-
-        treadmill.zkutils.get_with_metadata.return_value = (
-            {}, mock.Mock(ctime=1000)
-        )
-
-        zkclient = kazoo.client.KazooClient()
+        zkclient = self._zkclient(['foo#001'])
 
         # File doesn't exist.
         os.stat.side_effect = FileNotFoundError
@@ -250,8 +242,28 @@ class EventMgrTest(mockzk.MockZookeeperTestCase):
 
         treadmill.fs.write_safe.assert_called()
 
+    def test__synchronize_latency(self):
+        """Test the reads of a large placement change are pipelined."""
+        # Access to a protected member _synchronize of a client class
+        # pylint: disable=W0212
+        apps = ['proid.app#%03d' % idx for idx in range(200)]
+        zkclient = self._zkclient(apps, latency=0.05)
+
+        # Extra app, to be removed.
+        with io.open(os.path.join(self.cache, 'proid.app#999'), 'w'):
+            pass
+
+        start = time.time()
+        self.evmgr._synchronize(zkclient, apps)
+
+        # 400 reads, read one by one would take 20s.
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(sorted(os.listdir(self.cache)), apps)
+        with io.open(os.path.join(self.cache, 'proid.app#042')) as f:
+            self.assertEqual(yaml.load(stream=f)['task'], '042')
+
     @mock.patch('glob.glob', mock.Mock())
-    @mock.patch('treadmill.eventmgr.EventMgr._cache', mock.Mock())
+    @mock.patch('treadmill.eventmgr.EventMgr._cache_apps', mock.Mock())
     def test__synchronize(self):
         """Check that app events are synchronized properly."""
         # Access to a protected member _synchronize of a client class
@@ -263,12 +275,12 @@ class EventMgrTest(mockzk.MockZookeeperTestCase):
         self.evmgr._synchronize(zkclient, ['foo#001'])
 
         # cache should have been called with 'foo' app
-        treadmill.eventmgr.EventMgr._cache.assert_called_with(
-            zkclient, 'foo#001')
+        treadmill.eventmgr.EventMgr._cache_apps.assert_called_with(
+            zkclient, ['foo#001'], check_existing=())
 
     @mock.patch('glob.glob', mock.Mock())
     @mock.patch('os.unlink', mock.Mock())
-    @mock.patch('treadmill.eventmgr.EventMgr._cache', mock.Mock())
+    @mock.patch('treadmill.eventmgr.EventMgr._cache_apps', mock.Mock())
     def test__synchronize_empty(self):
         """Check synchronized properly remove extra apps."""
         # Access to a protected member _synchronize of a client class
@@ -286,9 +298,11 @@ class EventMgrTest(mockzk.MockZookeeperTestCase):
             ],
             any_order=True
         )
-        self.assertFalse(treadmill.eventmgr.EventMgr._cache.called)
+        treadmill.eventmgr.EventMgr._cache_apps.assert_called_with(
+            zkclient, [], check_existing=())
 
     @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
     def test_cache_placement_data(self):
@@ -0,0 +1,58 @@
+"""Performance test for treadmill.fs.archive.
+
+Times writing a seekable archive of log files, compressed serially and with
+parallel workers.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import shutil
+import tempfile
+import timeit
+
+from treadmill.fs import archive as fs_archive
+
+
+def _logs(root, count, size):
+    """Create compressible log files."""
+    line = b'2018-01-01 00:00:00.000 INFO proid.app#1234 some log line %d\n'
+    names = []
+    for idx in range(count):
+        name = os.path.join(root, 'log%03d' % idx)
+        with io.open(name, 'wb') as f:
+            written = 0
+            while written < size:
+                data = b''.join(line % (written + n) for n in range(1000))
+                f.write(data)
+                written += len(data)
+        names.append(name)
+    return names
+
+
+def test_archive(count, size, workers):
+    """Time archiving count files of size bytes."""
+    root = tempfile.mkdtemp()
+    try:
+        logs = _logs(root, count, size)
+        archive = os.path.join(root, 'test.tar.gz')
+
+        def _write():
+            with fs_archive.ArchiveWriter(archive, workers=workers) as writer:
+                for log in logs:
+                    writer.add(log, os.path.basename(log))
+
+        elapsed = timeit.timeit(stmt=_write, number=1)
+        print('files: %4d, size: %6d MB, workers: %d, time: %7.3f s' % (
+            count, count * size // (1024 * 1024), workers, elapsed))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    for workers in (1, 2, 4):
+        test_archive(16, 16 * 1024 * 1024, workers)
@@ -6,6 +6,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
 import io
 import os
 import shutil
@@ -19,6 +20,7 @@ import mock
 import treadmill
 import treadmill.fs
 import treadmill.subproc
+from treadmill.fs import archive as fs_archive
 
 if sys.platform.startswith('linux'):
     import treadmill.fs.linux
@@ -625,5 +627,109 @@ class FsTest(unittest.TestCase):
         )
 
 
+class ArchiveTest(unittest.TestCase):
+    """Tests for teadmill.fs.archive.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        if self.root and os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+
+    def test_seekable_archive(self):
+        """Test writing and randomly reading a seekable archive.
+        """
+        contents = {
+            'a/current': b'x' * 1000,
+            'b/current': os.urandom(70000),
+            'empty': b'',
+        }
+        for name, content in contents.items():
+            treadmill.fs.mkdir_safe(
+                os.path.dirname(os.path.join(self.root, name))
+            )
+            with io.open(os.path.join(self.root, name), 'wb') as f:
+                f.write(content)
+
+        archive = os.path.join(self.root, 'test.tar.gz')
+        with fs_archive.ArchiveWriter(archive) as writer:
+            for name in sorted(contents):
+                writer.add(os.path.join(self.root, name), name)
+
+        # Regular tar.gz.
+        with tarfile.open(archive) as tar:
+            self.assertEqual(sorted(tar.getnames()), sorted(contents))
+            self.assertEqual(tar.extractfile('b/current').read(),
+                             contents['b/current'])
+
+        index = fs_archive.read_index(archive)
+        self.assertEqual(sorted(index), sorted(contents))
+        for name, content in contents.items():
+            self.assertEqual(
+                b''.join(fs_archive.read_member(archive, index[name])),
+                content
+            )
+
+        # Index of a modified archive is ignored.
+        with io.open(archive, 'ab') as f:
+            f.write(b'\0')
+        self.assertIsNone(fs_archive.read_index(archive))
+
+        fs_archive.remove(archive)
+        self.assertFalse(os.path.exists(archive))
+        self.assertFalse(os.path.exists(archive + fs_archive.INDEX_EXT))
+        self.assertIsNone(fs_archive.read_index(archive))
+
+    def test_parallel_archive(self):
+        """Test members compressed in parallel are written in order.
+        """
+        contents = collections.OrderedDict(
+            ('log%02d/current' % idx, os.urandom(idx * 10000) + b'x' * idx)
+            for idx in range(20)
+        )
+        for name, content in contents.items():
+            treadmill.fs.mkdir_safe(
+                os.path.dirname(os.path.join(self.root, name))
+            )
+            with io.open(os.path.join(self.root, name), 'wb') as f:
+                f.write(content)
+
+        archive = os.path.join(self.root, 'test.tar.gz')
+        with fs_archive.ArchiveWriter(archive, workers=3) as writer:
+            for name in contents:
+                writer.add(os.path.join(self.root, name), name)
+            writer.add(os.path.join(self.root, 'log00'), 'log00')
+
+        with tarfile.open(archive) as tar:
+            self.assertEqual(tar.getnames(), list(contents) + ['log00'])
+            for name, content in contents.items():
+                self.assertEqual(tar.extractfile(name).read(), content)
+
+        index = fs_archive.read_index(archive)
+        self.assertEqual(sorted(index), sorted(contents))
+        for name, content in contents.items():
+            self.assertEqual(
+                b''.join(fs_archive.read_member(archive, index[name])),
+                content
+            )
+
+    def test_archive_error(self):
+        """Test partial archives are removed.
+        """
+        with io.open(os.path.join(self.root, 'file'), 'wb') as f:
+            f.write(b'x' * 1000)
+
+        archive = os.path.join(self.root, 'test.tar.gz')
+        with self.assertRaises(OSError):
+            with fs_archive.ArchiveWriter(archive, workers=2) as writer:
+                writer.add(os.path.join(self.root, 'file'), 'file')
+                writer.add(os.path.join(self.root, 'nosuchfile'), 'x')
+
+        self.assertFalse(os.path.exists(archive))
+        self.assertIsNone(fs_archive.read_index(archive))
+
+
 if __name__ == '__main__':
     unittest.main()
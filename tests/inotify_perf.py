@@ -0,0 +1,71 @@
+"""Performance test for treadmill.syscall.inotify event parsing.
+
+Replays synthetic inotify buffers of increasing size, parsing throughput
+should not depend on the size of the buffer.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import struct
+import timeit
+
+from treadmill.dirwatch import dirwatch_base
+from treadmill.dirwatch import dirwatch_coalesce
+from treadmill.syscall import inotify
+
+
+def _buffer(events_count):
+    """Synthetic buffer of create/modify/delete events on a few files."""
+    events = []
+    for idx in range(events_count):
+        mask = (inotify.IN_CREATE, inotify.IN_MODIFY, inotify.IN_DELETE)[
+            idx % 3
+        ]
+        name = ('app-{:06d}'.format(idx // 3)).encode()
+        name += b'\x00' * (16 - len(name) % 16)
+        events.append(struct.pack('iIII', 1, mask, 0, len(name)) + name)
+    return b''.join(events)
+
+
+def _events(event_buffer):
+    """Parse and translate a buffer into dirwatch events."""
+    translated = {
+        inotify.IN_CREATE: dirwatch_base.DirWatcherEvent.CREATED,
+        inotify.IN_MODIFY: dirwatch_base.DirWatcherEvent.MODIFIED,
+        inotify.IN_DELETE: dirwatch_base.DirWatcherEvent.DELETED,
+    }
+    # Access protected module _parse_buffer
+    # pylint: disable=W0212
+    return [
+        (translated[mask], name)
+        for _wd, mask, _cookie, name in inotify._parse_buffer(event_buffer)
+    ]
+
+
+def test_parse(events_count, attempts):
+    """Time parsing and coalescing a buffer of events_count events."""
+    event_buffer = _buffer(events_count)
+
+    parse = timeit.timeit(
+        stmt=lambda: _events(event_buffer),
+        number=attempts
+    )
+    events = _events(event_buffer)
+    coalesce = timeit.timeit(
+        stmt=lambda: dirwatch_coalesce.coalesce(events),
+        number=attempts
+    )
+    print('events: %7d, size: %9d, parse: %.3f us/event, '
+          'coalesce: %.3f us/event, coalesced: %d' % (
+              events_count, len(event_buffer),
+              parse / attempts / events_count * 1e6,
+              coalesce / attempts / events_count * 1e6,
+              len(dirwatch_coalesce.coalesce(events))))
+
+
+if __name__ == '__main__':
+    for count in (1000, 10000, 100000):
+        test_parse(count, 10)
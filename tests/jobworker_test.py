@@ -0,0 +1,74 @@
+"""Unit test for treadmill.jobworker.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import select
+import sys
+import unittest
+
+# Disable W0611: Unused import
+import tests.treadmill_test_skip_windows  # pylint: disable=W0611
+
+from treadmill import jobworker
+
+
+def _run_job(job):
+    """Square a number, fail on negative numbers."""
+    if job < 0:
+        raise ValueError(job)
+    return job * job
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
+class JobWorkerTest(unittest.TestCase):
+    """Tests for treadmill.jobworker.JobWorker."""
+
+    def setUp(self):
+        self.worker = jobworker.JobWorker('test', _run_job)
+
+    def tearDown(self):
+        self.worker.stop()
+
+    def test_completed(self):
+        """Test jobs run in background and are signaled once completed."""
+        self.assertIsNone(self.worker.fileno())
+        self.worker.start()
+        self.assertTrue(self.worker.running)
+
+        for job in (2, -1, 3):
+            self.worker.put(job)
+        self.worker.join()
+
+        self.assertEqual(
+            select.select([self.worker.fileno()], [], [], 0)[0],
+            [self.worker.fileno()]
+        )
+        completed = self.worker.completed()
+        self.assertEqual(
+            [(job, result) for job, result, _error in completed],
+            [(2, 4), (-1, None), (3, 9)]
+        )
+        self.assertIsInstance(completed[1][2], ValueError)
+        self.assertEqual(select.select([self.worker.fileno()], [], [], 0)[0],
+                         [])
+
+    def test_stop(self):
+        """Test the worker stops after the queued jobs."""
+        self.worker.start()
+        fileno = self.worker.fileno()
+        self.worker.put(2)
+        self.worker.stop()
+        self.assertFalse(self.worker.running)
+        self.assertEqual(self.worker.completed(), [(2, 4, None)])
+
+        # Restarted on the same eventfd.
+        self.worker.start()
+        self.assertEqual(self.worker.fileno(), fileno)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+"""Unit test for treadmill.lvpool.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import select
+import sys
+import unittest
+
+# Disable W0611: Unused import
+import tests.treadmill_test_skip_windows  # pylint: disable=W0611
+
+from treadmill import lvpool
+from treadmill import subproc
+
+_MB = 1024 * 1024
+
+
+class _FakeLvm(object):
+    """In-memory LVM volume group, recording the commands."""
+
+    def __init__(self, group, extent_size):
+        self.group = group
+        self.extent_size = extent_size
+        self.volumes = {}
+        self.commands = []
+        self._minor = 0
+
+    def lvcreate(self, volume, size_in_bytes, group):
+        """Create a logical volume."""
+        assert group == self.group
+        self.commands.append('lvcreate')
+        if volume in self.volumes:
+            raise subproc.CalledProcessError(returncode=5, cmd='lvm')
+        self._minor += 1
+        self.volumes[volume] = (size_in_bytes // self.extent_size,
+                                self._minor)
+
+    def lvdisplay(self, volume, group):
+        """Logical volume information."""
+        self.commands.append('lvdisplay')
+        extents, minor = self.volumes[volume]
+        return {
+            'block_dev': os.path.join('/dev', group, volume),
+            'name': volume,
+            'group': group,
+            'open_count': 0,
+            'extent_size': extents,
+            'extent_alloc': -1,
+            'dev_major': 253,
+            'dev_minor': minor,
+        }
+
+    def lvrename(self, volume, new_name, group):
+        """Rename a logical volume."""
+        assert group == self.group
+        self.commands.append('lvrename')
+        self.volumes[new_name] = self.volumes.pop(volume)
+
+    def lvremove(self, volume, group):
+        """Remove a logical volume."""
+        assert group == self.group
+        self.commands.append('lvremove')
+        del self.volumes[volume]
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
+class VolumePoolTest(unittest.TestCase):
+    """Tests for treadmill.lvpool.VolumePool."""
+
+    def setUp(self):
+        self.lvm = _FakeLvm('treadmill', 4 * _MB)
+        self.pool = lvpool.VolumePool(
+            'treadmill', targets={100 * _MB: 2}, lvm_=self.lvm
+        )
+        self.pool.reset(extent_size=4 * _MB, extent_free=100)
+
+    def tearDown(self):
+        self.pool.stop()
+
+    def _process(self):
+        """Wait for the background operations and process them."""
+        self.pool.join()
+        self.assertEqual(
+            select.select([self.pool.fileno()], [], [], 0)[0],
+            [self.pool.fileno()]
+        )
+        return self.pool.process()
+
+    def test_spares(self):
+        """Test spare volumes are created and handed out."""
+        self.pool.start()
+        self.assertEqual(self.pool.extent_free, 50)
+        self.assertTrue(self._process())
+        self.assertEqual(len(self.pool.spares[25]), 2)
+        self.assertEqual(len(self.lvm.volumes), 2)
+
+        del self.lvm.commands[:]
+        volume = self.pool.acquire('tm-foo', 100 * _MB)
+        self.assertEqual(self.lvm.commands, ['lvrename'])
+        self.assertEqual(volume['name'], 'tm-foo')
+        self.assertEqual(volume['block_dev'], '/dev/treadmill/tm-foo')
+        self.assertEqual(volume['dev_minor'], self.lvm.volumes['tm-foo'][1])
+        self.assertEqual(self.pool.extent_free, 50)
+
+        self.pool.refill()
+        self.assertTrue(self._process())
+        self.assertEqual(len(self.pool.spares[25]), 2)
+        self.assertEqual(self.pool.extent_free, 25)
+
+        # Other sizes are created on demand.
+        del self.lvm.commands[:]
+        volume = self.pool.acquire('tm-bar', 40 * _MB)
+        self.assertEqual(self.lvm.commands, ['lvcreate', 'lvdisplay'])
+        self.assertEqual(volume['extent_size'], 10)
+        self.assertEqual(self.pool.extent_free, 15)
+
+    def test_release(self):
+        """Test released volumes are removed in the background."""
+        self.pool.start()
+        self._process()
+        volume = self.pool.acquire('tm-foo', 100 * _MB)
+
+        self.pool.release(volume)
+        self.assertEqual(self.pool.extent_free, 50)
+        self.assertTrue(self._process())
+        self.assertNotIn('tm-foo', self.lvm.volumes)
+        self.assertEqual(self.pool.extent_free, 75)
+
+    def test_reclaim(self):
+        """Test spare volumes make room for containers."""
+        self.pool.start()
+        self._process()
+
+        # Only the spare volumes needed are removed.
+        self.assertIsNone(self.pool.acquire('tm-foo', 300 * _MB))
+        self.assertEqual(len(self.pool.spares[25]), 1)
+        self.assertTrue(self._process())
+        self.assertEqual(self.pool.extent_free, 75)
+
+        volume = self.pool.acquire('tm-foo', 300 * _MB)
+        self.assertEqual(volume['extent_size'], 75)
+        self.assertEqual(self.pool.extent_free, 0)
+
+    def test_acquire_creating(self):
+        """Test volumes waiting for the spare volumes being created."""
+        self.pool.reset(extent_size=4 * _MB, extent_free=50)
+        self.pool.start()
+        self.assertEqual(self.pool.extent_free, 0)
+
+        # All the extents are taken by the spare volumes being created.
+        self.assertIsNone(self.pool.acquire('tm-foo', 100 * _MB))
+
+        # Created, the volume can be acquired now.
+        self.assertTrue(self._process())
+        volume = self.pool.acquire('tm-foo', 100 * _MB)
+        self.assertEqual(volume['name'], 'tm-foo')
+
+    def test_create_error(self):
+        """Test extents of failed creations are given back."""
+        self.lvm.volumes['tm-foo'] = (25, 42)
+        self.assertRaises(
+            subproc.CalledProcessError,
+            self.pool.acquire, 'tm-foo', 100 * _MB
+        )
+        self.assertEqual(self.pool.extent_free, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -28,6 +28,7 @@ from tests.testutils import mockzk
 import treadmill
 import treadmill.exc
 from treadmill import scheduler
+from treadmill import zkcodec
 from treadmill.scheduler import loader
 from treadmill.scheduler import master
 from treadmill.scheduler import masterapi
@@ -1099,18 +1100,36 @@ class MasterTest(mockzk.MockZookeeperTestCase):
         self.assertTrue(master.Master.load_allocations.called)
         self.assertTrue(master.Master.load_apps.called)
 
-    @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
-    @mock.patch('kazoo.client.KazooClient.create', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.create_async', mock.Mock())
     @mock.patch('time.time', mock.Mock(return_value=123.34))
     @mock.patch('treadmill.appevents._HOSTNAME', 'xxx')
     def test_create_apps(self):
         """Tests app api."""
         zkclient = kazoo.client.KazooClient()
-        kazoo.client.KazooClient.create.return_value = '/scheduled/foo.bar#12'
+        created = iter(['/scheduled/foo.bar#12', '/scheduled/foo.bar#13'])
 
-        masterapi.create_apps(zkclient, 'foo.bar', {}, 2)
+        def _create_async(path, *_args, **_kwargs):
+            """Return the created sequence node."""
+            if path.endswith('#'):
+                path = next(created)
+            return mockzk.MockAsyncResult(lambda: path)
 
-        kazoo.client.KazooClient.create.assert_has_calls([
+        kazoo.client.KazooClient.create_async.side_effect = _create_async
+
+        self.assertEqual(
+            masterapi.create_apps(zkclient, 'foo.bar', {}, 2),
+            ['foo.bar#12', 'foo.bar#13']
+        )
+
+        kazoo.client.KazooClient.create_async.assert_has_calls([
+            mock.call(
+                '/scheduled/foo.bar#',
+                b'{}\n',
+                makepath=True,
+                sequence=True,
+                ephemeral=False,
+                acl=mock.ANY
+            ),
             mock.call(
                 '/scheduled/foo.bar#',
                 b'{}\n',
@@ -1125,23 +1144,18 @@ class MasterTest(mockzk.MockZookeeperTestCase):
                 ephemeral=False, makepath=True, sequence=False,
                 acl=mock.ANY
             ),
-            # Mock call returns same instance (#12), so same task is created
-            # twice.
-            mock.call('/scheduled/foo.bar#',
-                      b'{}\n',
-                      makepath=True,
-                      sequence=True,
-                      ephemeral=False,
-                      acl=mock.ANY),
-            mock.call('/trace/000C/foo.bar#12,123.34,xxx,pending,created',
-                      b'',
-                      ephemeral=False, makepath=True, sequence=False,
-                      acl=mock.ANY)
+            mock.call(
+                '/trace/000D/foo.bar#13,123.34,xxx,pending,created',
+                b'',
+                ephemeral=False, makepath=True, sequence=False,
+                acl=mock.ANY
+            ),
         ])
 
-        kazoo.client.KazooClient.create.reset_mock()
+        kazoo.client.KazooClient.create_async.reset_mock()
+        created = iter(['/scheduled/foo.bar#14'])
         masterapi.create_apps(zkclient, 'foo.bar', {}, 1, 'monitor')
-        kazoo.client.KazooClient.create.assert_has_calls([
+        kazoo.client.KazooClient.create_async.assert_has_calls([
             mock.call('/scheduled/foo.bar#',
                       b'{}\n',
                       makepath=True,
@@ -1149,29 +1163,74 @@ class MasterTest(mockzk.MockZookeeperTestCase):
                       ephemeral=False,
                       acl=mock.ANY),
             mock.call(
-                '/trace/000C/foo.bar#12,123.34,xxx,pending,monitor:created',
+                '/trace/000E/foo.bar#14,123.34,xxx,pending,monitor:created',
                 b'',
                 ephemeral=False, makepath=True, sequence=False,
                 acl=mock.ANY
             )
         ])
 
-    @mock.patch('kazoo.client.KazooClient.get_children',
-                mock.Mock(return_value=[]))
-    @mock.patch('kazoo.client.KazooClient.delete', mock.Mock())
-    @mock.patch('kazoo.client.KazooClient.create', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.create_async', mock.Mock())
+    @mock.patch('time.time', mock.Mock(return_value=123.34))
+    @mock.patch('treadmill.appevents._HOSTNAME', 'xxx')
+    def test_create_apps_error(self):
+        """Tests the created apps are traced when others fail."""
+        zkclient = kazoo.client.KazooClient()
+        created = iter([
+            mockzk.MockAsyncResult(lambda: '/scheduled/foo.bar#12'),
+            mockzk.MockAsyncResult(
+                mock.Mock(side_effect=kazoo.exceptions.ConnectionLoss())
+            ),
+            mockzk.MockAsyncResult(lambda: '/scheduled/foo.bar#14'),
+        ])
+
+        def _create_async(path, *_args, **_kwargs):
+            """Return the created sequence node."""
+            if path.endswith('#'):
+                return next(created)
+            return mockzk.MockAsyncResult(lambda: path)
+
+        kazoo.client.KazooClient.create_async.side_effect = _create_async
+
+        with self.assertRaises(kazoo.exceptions.ConnectionLoss):
+            masterapi.create_apps(zkclient, 'foo.bar', {}, 3)
+
+        kazoo.client.KazooClient.create_async.assert_has_calls([
+            mock.call(
+                '/trace/000C/foo.bar#12,123.34,xxx,pending,created',
+                b'',
+                ephemeral=False, makepath=True, sequence=False,
+                acl=mock.ANY
+            ),
+            mock.call(
+                '/trace/000E/foo.bar#14,123.34,xxx,pending,created',
+                b'',
+                ephemeral=False, makepath=True, sequence=False,
+                acl=mock.ANY
+            ),
+        ])
+
+    @mock.patch('kazoo.client.KazooClient.delete_async', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.create_async', mock.Mock(
+        return_value=mockzk.MockAsyncResult(lambda: None)))
     @mock.patch('time.time', mock.Mock(return_value=123.34))
     @mock.patch('treadmill.appevents._HOSTNAME', 'xxx')
     def test_delete_apps(self):
         """Tests app api."""
         zkclient = kazoo.client.KazooClient()
+        kazoo.client.KazooClient.delete_async.side_effect = [
+            mockzk.MockAsyncResult(lambda: True),
+            mockzk.MockAsyncResult(
+                mock.Mock(side_effect=kazoo.client.NoNodeError())
+            ),
+        ]
 
         masterapi.delete_apps(zkclient, ['foo.bar#12', 'foo.bar#22'])
-        kazoo.client.KazooClient.delete.assert_has_calls([
+        kazoo.client.KazooClient.delete_async.assert_has_calls([
             mock.call('/scheduled/foo.bar#12'),
             mock.call('/scheduled/foo.bar#22')
         ])
-        kazoo.client.KazooClient.create.assert_has_calls([
+        kazoo.client.KazooClient.create_async.assert_has_calls([
             mock.call(
                 '/trace/000C/foo.bar#12,123.34,xxx,pending_delete,deleted',
                 b'',
@@ -1186,13 +1245,17 @@ class MasterTest(mockzk.MockZookeeperTestCase):
             )
         ])
 
-        kazoo.client.KazooClient.delete.reset_mock()
-        kazoo.client.KazooClient.create.reset_mock()
+        kazoo.client.KazooClient.delete_async.reset_mock()
+        kazoo.client.KazooClient.delete_async.side_effect = None
+        kazoo.client.KazooClient.delete_async.return_value = (
+            mockzk.MockAsyncResult(lambda: True)
+        )
+        kazoo.client.KazooClient.create_async.reset_mock()
         masterapi.delete_apps(zkclient, ['foo.bar#12'], 'monitor')
-        kazoo.client.KazooClient.delete.assert_has_calls([
+        kazoo.client.KazooClient.delete_async.assert_has_calls([
             mock.call('/scheduled/foo.bar#12')
         ])
-        kazoo.client.KazooClient.create.assert_has_calls([
+        kazoo.client.KazooClient.create_async.assert_has_calls([
             mock.call(
                 (
                     '/trace/000C/foo.bar#12,123.34,xxx,'
@@ -1204,52 +1267,57 @@ class MasterTest(mockzk.MockZookeeperTestCase):
             )
         ])
 
-    @mock.patch('kazoo.client.KazooClient.get', mock.Mock(
-        return_value=('{}', None)))
-    @mock.patch('kazoo.client.KazooClient.set', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.set_async', mock.Mock(
+        return_value=mockzk.MockAsyncResult(lambda: None)))
     @mock.patch('kazoo.client.KazooClient.create', mock.Mock())
     def test_update_app_priority(self):
         """Tests app api."""
         zkclient = kazoo.client.KazooClient()
+        kazoo.client.KazooClient.get_async.side_effect = [
+            mockzk.MockAsyncResult(lambda: (b'{}', None)),
+            mockzk.MockAsyncResult(lambda: (b'{}', None)),
+            mockzk.MockAsyncResult(
+                mock.Mock(side_effect=kazoo.client.NoNodeError())
+            ),
+        ]
 
         kazoo.client.KazooClient.create.return_value = '/events/001-apps-1'
         masterapi.update_app_priorities(zkclient, {'foo.bar#1': 10,
-                                                   'foo.bar#2': 20})
-        kazoo.client.KazooClient.set.assert_has_calls(
+                                                   'foo.bar#2': 20,
+                                                   'foo.bar#3': 30})
+        self.assertEqual(
+            sorted(
+                (args[0], zkcodec.decode(args[1]))
+                for args, _kwargs in
+                kazoo.client.KazooClient.set_async.call_args_list
+            ),
             [
-                mock.call('/scheduled/foo.bar#1', b'{priority: 10}\n'),
-                mock.call('/scheduled/foo.bar#2', b'{priority: 20}\n'),
-            ],
-            any_order=True
+                ('/scheduled/foo.bar#1', {'priority': 10}),
+                ('/scheduled/foo.bar#2', {'priority': 20}),
+            ]
         )
 
-        # Verify that event is placed correctly.
-        kazoo.client.KazooClient.create.assert_called_with(
+        # Verify that a single event is placed correctly.
+        kazoo.client.KazooClient.create.assert_called_once_with(
             '/events/001-apps-', mock.ANY,
             makepath=True, acl=mock.ANY, sequence=True, ephemeral=False
         )
 
-    @mock.patch('kazoo.client.KazooClient.get', mock.Mock(
-        return_value=('{}', None)))
-    @mock.patch('treadmill.zkutils.update', mock.Mock(return_value=None))
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock(
+        return_value=mockzk.MockAsyncResult(
+            lambda: (zkcodec.encode({'priority': 10}), None)
+        )))
+    @mock.patch('kazoo.client.KazooClient.set_async', mock.Mock())
     @mock.patch('treadmill.scheduler.masterapi.create_event',
                 mock.Mock(return_value=None))
     def test_update_app_priority_noop(self):
         """Tests app api."""
         zkclient = kazoo.client.KazooClient()
 
-        # kazoo.client.KazooClient.create.return_value = '/events/001-apps-1'
         masterapi.update_app_priorities(zkclient, {'foo.bar#1': 10,
-                                                   'foo.bar#2': 20})
-        treadmill.zkutils.update.assert_has_calls(
-            [
-                mock.call(mock.ANY, '/scheduled/foo.bar#1', {'priority': 10},
-                          check_content=True),
-                mock.call(mock.ANY, '/scheduled/foo.bar#2', {'priority': 20},
-                          check_content=True),
-            ],
-            any_order=True
-        )
+                                                   'foo.bar#2': 10})
+        self.assertFalse(kazoo.client.KazooClient.set_async.called)
 
         # Verify that event is placed correctly.
         self.assertFalse(treadmill.scheduler.masterapi.create_event.called)
@@ -20,6 +20,7 @@ import tests.treadmill_test_skip_windows  # pylint: disable=W0611
 
 import treadmill
 from treadmill import netdev
+from tests.testutils import mocknetlink
 
 
 class NetDevTest(unittest.TestCase):
@@ -116,137 +117,245 @@ class NetDevTest(unittest.TestCase):
         io.open.assert_called_with('/sys/class/net/foo/speed')
         self.assertEqual(res, 0)
 
-    @mock.patch('treadmill.subproc.check_call', mock.Mock())
+    def _transport(self):
+        """Record the netlink requests.
+        """
+        transport = mocknetlink.FakeTransport()
+        treadmill.netlink.SocketTransport.return_value = transport
+        return transport
+
+    @mock.patch('treadmill.netlink.SocketTransport', mock.Mock())
     def test_link_set_up(self):
         """Test of device up."""
+        transport = self._transport()
+
         netdev.link_set_up('foo')
 
-        treadmill.subproc.check_call.assert_called_with(
+        self.assertEqual(
+            transport.requests,
             [
-                'ip', 'link',
-                'set',
-                'dev', 'foo',
-                'up',
-            ],
+                {'op': 'setlink', 'index': 0, 'name': 'foo', 'up': True},
+            ]
         )
+        self.assertEqual(transport.closed, 1)
 
-    @mock.patch('treadmill.subproc.check_call', mock.Mock())
+    @mock.patch('treadmill.netlink.SocketTransport', mock.Mock())
     def test_link_set_down(self):
         """Test of device down."""
+        transport = self._transport()
+
         netdev.link_set_down('foo')
 
-        treadmill.subproc.check_call.assert_called_with(
+        self.assertEqual(
+            transport.requests,
             [
-                'ip', 'link',
-                'set',
-                'dev', 'foo',
-                'down',
-            ],
+                {'op': 'setlink', 'index': 0, 'name': 'foo', 'up': False},
+            ]
         )
 
-    @mock.patch('treadmill.subproc.check_call', mock.Mock())
+    @mock.patch('treadmill.netlink.SocketTransport', mock.Mock())
+    def test_link_error(self):
+        """Test link operation failure.
+        """
+        transport = self._transport()
+        transport.errors['foo'] = errno.ENODEV
+
+        with self.assertRaises(OSError) as err:
+            netdev.link_set_up('foo')
+
+        self.assertEqual(err.exception.errno, errno.ENODEV)
+        self.assertEqual(transport.closed, 1)
+
+    @mock.patch('treadmill.netlink.SocketTransport', mock.Mock())
+    @mock.patch('treadmill.netlink.if_nametoindex',
+                mock.Mock(return_value=42))
     def test_link_set_name(self):
         """Test of device name change.
         """
+        transport = self._transport()
+
         netdev.link_set_name('foo', 'bar')
 
-        treadmill.subproc.check_call.assert_called_with(
+        treadmill.netlink.if_nametoindex.assert_called_with('foo')
+        self.assertEqual(
+            transport.requests,
             [
-                'ip', 'link',
-                'set',
-                'dev', 'foo',
-                'name', 'bar',
-            ],
+                {'op': 'setlink', 'index': 42, 'name': 'bar'},
+            ]
         )
 
-    @mock.patch('treadmill.subproc.check_call', mock.Mock())
+    @mock.patch('treadmill.netlink.SocketTransport', mock.Mock())
     def test_link_set_alias(self):
         """Test configuration of device alias.
         """
+        transport = self._transport()
+
         netdev.link_set_alias('foo', 'hello world!')
 
-        treadmill.subproc.check_call.assert_called_with(
+        self.assertEqual(
+            transport.requests,
             [
-                'ip', 'link',
-                'set',
-                'dev', 'foo',
-                'alias', 'hello world!',
-            ],
+                {'op': 'setlink', 'index': 0, 'name': 'foo',
+                 'alias': 'hello world!'},
+            ]
         )
 
-    @mock.patch('treadmill.subproc.check_call', mock.Mock())
+    @mock.patch('treadmill.netlink.SocketTransport', mock.Mock())
     def test_link_set_mtu(self):
         """Test configuration of device MTU.
         """
+        transport = self._transport()
+
         netdev.link_set_mtu('foo', 9000)
 
-        treadmill.subproc.check_call.assert_called_with(
+        self.assertEqual(
+            transport.requests,
             [
-                'ip', 'link',
-                'set',
-                'dev', 'foo',
-                'mtu', '9000',
-            ],
+                {'op': 'setlink', 'index': 0, 'name': 'foo', 'mtu': 9000},
+            ]
         )
 
-    @mock.patch('treadmill.subproc.check_call', mock.Mock())
+    @mock.patch('treadmill.netlink.SocketTransport', mock.Mock())
     def test_link_set_addr(self):
         """Test configuration of device MTU.
         """
+        transport = self._transport()
+
         netdev.link_set_addr('foo', '11:22:33:44:55:66')
 
-        treadmill.subproc.check_call.assert_called_with(
+        self.assertEqual(
+            transport.requests,
             [
-                'ip', 'link',
-                'set',
-                'dev', 'foo',
-                'address', '11:22:33:44:55:66',
-            ],
+                {'op': 'setlink', 'index': 0, 'name': 'foo',
+                 'address': '11:22:33:44:55:66'},
+            ]
         )
 
-    @mock.patch('treadmill.subproc.check_call', mock.Mock())
+    @mock.patch('treadmill.netlink.SocketTransport', mock.Mock())
     def test_link_set_netns(self):
         """Test setting of device network namespace.
         """
+        transport = self._transport()
+
         netdev.link_set_netns('foo', 123)
 
-        treadmill.subproc.check_call.assert_called_with(
+        self.assertEqual(
+            transport.requests,
             [
-                'ip', 'link',
-                'set',
-                'dev', 'foo',
-                'netns', '123',
-            ],
+                {'op': 'setlink', 'index': 0, 'name': 'foo',
+                 'netns_pid': 123},
+            ]
         )
 
-    @mock.patch('treadmill.subproc.check_call', mock.Mock())
+    @mock.patch('treadmill.netlink.SocketTransport', mock.Mock())
     def test_link_add_veth(self):
         """Test definitiion of veth device.
         """
+        transport = self._transport()
+
         netdev.link_add_veth('foo', 'bar')
 
-        treadmill.subproc.check_call.assert_called_with(
+        self.assertEqual(
+            transport.requests,
             [
-                'ip', 'link',
-                'add', 'name', 'foo',
-                'type', 'veth',
-                'peer', 'name', 'bar'
-            ],
+                {'op': 'newlink', 'index': 0, 'name': 'foo', 'kind': 'veth',
+                 'peer': {'index': 0, 'name': 'bar'}},
+            ]
         )
 
-    @mock.patch('treadmill.subproc.check_call', mock.Mock())
+    @mock.patch('treadmill.netlink.SocketTransport', mock.Mock())
+    @mock.patch('treadmill.netlink.if_nametoindex',
+                mock.Mock(return_value=42))
+    def test_link_add_veth_configured(self):
+        """Test definitiion of a configured veth device.
+        """
+        transport = self._transport()
+
+        netdev.link_add_veth('foo', 'bar', mtu=9000, bridge='br0',
+                             alias='baz', up=True)
+
+        treadmill.netlink.if_nametoindex.assert_called_with('br0')
+        self.assertEqual(transport.sends, 2)
+        self.assertEqual(
+            transport.requests,
+            [
+                {'op': 'newlink', 'index': 0, 'name': 'foo', 'kind': 'veth',
+                 'mtu': 9000, 'master': 42, 'up': True,
+                 'peer': {'index': 0, 'name': 'bar', 'mtu': 9000}},
+                {'op': 'setlink', 'index': 0, 'name': 'foo', 'alias': 'baz'},
+                {'op': 'setlink', 'index': 0, 'name': 'bar', 'alias': 'baz'},
+            ]
+        )
+
+    @mock.patch('treadmill.netlink.SocketTransport', mock.Mock())
+    def test_link_add_veth_exists(self):
+        """Test existing devices are not configured.
+        """
+        transport = self._transport()
+        transport.errors['foo'] = errno.EEXIST
+
+        with self.assertRaises(OSError) as err:
+            netdev.link_add_veth('foo', 'bar', alias='baz')
+
+        self.assertEqual(err.exception.errno, errno.EEXIST)
+        self.assertEqual(
+            [request['op'] for request in transport.requests],
+            ['newlink']
+        )
+
+    @mock.patch('treadmill.netlink.SocketTransport', mock.Mock())
+    @mock.patch('treadmill.netlink.if_nametoindex',
+                mock.Mock(side_effect=[42, 43]))
+    def test_link_rename_veth(self):
+        """Test renaming of a veth device pair, in one exchange.
+        """
+        transport = self._transport()
+
+        netdev.link_rename_veth('foo.0', 'foo.1', 'bar.0', 'bar.1',
+                                alias='baz', up=True)
+
+        self.assertEqual(transport.sends, 1)
+        self.assertEqual(
+            transport.requests,
+            [
+                {'op': 'setlink', 'index': 42, 'name': 'bar.0',
+                 'alias': 'baz', 'up': True},
+                {'op': 'setlink', 'index': 43, 'name': 'bar.1',
+                 'alias': 'baz'},
+            ]
+        )
+
+    @mock.patch('treadmill.netlink.SocketTransport', mock.Mock())
+    @mock.patch('treadmill.netlink.if_nametoindex',
+                mock.Mock(side_effect=[42, 43]))
+    def test_link_rename_veth_error(self):
+        """Test a pair failing to be renamed is deleted by index.
+        """
+        transport = self._transport()
+        transport.errors['bar.1'] = errno.EEXIST
+
+        with self.assertRaises(OSError):
+            netdev.link_rename_veth('foo.0', 'foo.1', 'bar.0', 'bar.1')
+
+        # bar.0 was renamed, the pair is deleted whatever its name.
+        self.assertEqual(
+            transport.requests[-1],
+            {'op': 'dellink', 'index': 42}
+        )
+
+    @mock.patch('treadmill.netlink.SocketTransport', mock.Mock())
     def test_link_del_veth(self):
         """Test veth deletion.
         """
+        transport = self._transport()
+
         netdev.link_del_veth('foo')
 
-        treadmill.subproc.check_call.assert_called_with(
+        self.assertEqual(
+            transport.requests,
             [
-                'ip', 'link',
-                'delete',
-                'dev', 'foo',
-                'type', 'veth',
-            ],
+                {'op': 'dellink', 'index': 0, 'name': 'foo'},
+            ]
         )
 
     @mock.patch('treadmill.subproc.check_call', mock.Mock())
@@ -302,28 +411,35 @@ class NetDevTest(unittest.TestCase):
             ],
         )
 
-    @mock.patch('treadmill.subproc.check_call', mock.Mock())
+    @mock.patch('treadmill.netlink.SocketTransport', mock.Mock())
     def test_bridge_create(self):
         """Test bridge interface definition.
         """
+        transport = self._transport()
+
         netdev.bridge_create('foo')
 
-        treadmill.subproc.check_call.assert_called_with(
+        self.assertEqual(
+            transport.requests,
             [
-                'brctl', 'addbr', 'foo',
-            ],
+                {'op': 'newlink', 'index': 0, 'name': 'foo',
+                 'kind': 'bridge'},
+            ]
         )
 
-    @mock.patch('treadmill.subproc.check_call', mock.Mock())
+    @mock.patch('treadmill.netlink.SocketTransport', mock.Mock())
     def test_bridge_delete(self):
         """Test bridge interface deletion.
         """
+        transport = self._transport()
+
         netdev.bridge_delete('foo')
 
-        treadmill.subproc.check_call.assert_called_with(
+        self.assertEqual(
+            transport.requests,
             [
-                'brctl', 'delbr', 'foo',
-            ],
+                {'op': 'dellink', 'index': 0, 'name': 'foo'},
+            ]
         )
 
     @mock.patch('treadmill.subproc.check_call', mock.Mock())
@@ -338,28 +454,37 @@ class NetDevTest(unittest.TestCase):
             ],
         )
 
-    @mock.patch('treadmill.subproc.check_call', mock.Mock())
+    @mock.patch('treadmill.netlink.SocketTransport', mock.Mock())
+    @mock.patch('treadmill.netlink.if_nametoindex',
+                mock.Mock(return_value=42))
     def test_bridge_addif(self):
         """Test bridge interface addition.
         """
+        transport = self._transport()
+
         netdev.bridge_addif('foo', 'bar')
 
-        treadmill.subproc.check_call.assert_called_with(
+        treadmill.netlink.if_nametoindex.assert_called_with('foo')
+        self.assertEqual(
+            transport.requests,
             [
-                'brctl', 'addif', 'foo', 'bar',
-            ],
+                {'op': 'setlink', 'index': 0, 'name': 'bar', 'master': 42},
+            ]
         )
 
-    @mock.patch('treadmill.subproc.check_call', mock.Mock())
+    @mock.patch('treadmill.netlink.SocketTransport', mock.Mock())
     def test_bridge_delif(self):
         """Test bridge interface removal.
         """
+        transport = self._transport()
+
         netdev.bridge_delif('foo', 'bar')
 
-        treadmill.subproc.check_call.assert_called_with(
+        self.assertEqual(
+            transport.requests,
             [
-                'brctl', 'delif', 'foo', 'bar',
-            ],
+                {'op': 'setlink', 'index': 0, 'name': 'bar', 'master': 0},
+            ]
         )
 
     @mock.patch('io.open', mock.mock_open())
@@ -0,0 +1,153 @@
+"""Unit test for treadmill.netlink.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import errno
+import struct
+import unittest
+
+# Disable W0611: Unused import
+import tests.treadmill_test_skip_windows  # pylint: disable=W0611
+
+from treadmill import netlink
+from tests.testutils import mocknetlink
+
+
+class _SplitTransport(mocknetlink.FakeTransport):
+    """Transport returning the acknowledgements one at a time."""
+
+    def send(self, data):
+        super(_SplitTransport, self).send(data)
+        replies = self._replies.pop()
+        size = len(netlink.ack(0))
+        self._replies.extend(
+            replies[offset:offset + size]
+            for offset in range(0, len(replies), size)
+        )
+
+
+class NetlinkTest(unittest.TestCase):
+    """Tests for treadmill.netlink."""
+
+    def test_attr(self):
+        """Test attributes packing and alignment."""
+        self.assertEqual(
+            netlink.attr(netlink.IFLA_IFNAME, 'eth0'),
+            b'\x09\x00\x03\x00eth0\x00\x00\x00\x00'
+        )
+        self.assertEqual(
+            netlink.attr(netlink.IFLA_MTU, 9000),
+            b'\x08\x00\x04\x00' + struct.pack(str('=I'), 9000)
+        )
+        self.assertEqual(
+            netlink.parse_attrs(
+                netlink.attr(netlink.IFLA_IFNAME, 'eth0') +
+                netlink.attr(netlink.IFLA_IFALIAS, b'foo')
+            ),
+            {
+                netlink.IFLA_IFNAME: b'eth0\x00',
+                netlink.IFLA_IFALIAS: b'foo',
+            }
+        )
+
+    def test_request(self):
+        """Test requests are sent at once and acknowledged."""
+        transport = mocknetlink.FakeTransport()
+        with netlink.RtNetlink(transport) as rtnl:
+            rtnl.request([
+                netlink.link_set(name='foo', up=True),
+                netlink.link_del('bar'),
+            ])
+            rtnl.request([
+                netlink.link_set(name='baz', mtu=1500),
+                netlink.link_del(index=3),
+            ])
+
+        self.assertEqual(transport.sends, 2)
+        self.assertEqual(transport.closed, 1)
+        self.assertEqual(
+            transport.requests,
+            [
+                {'op': 'setlink', 'index': 0, 'name': 'foo', 'up': True},
+                {'op': 'dellink', 'index': 0, 'name': 'bar'},
+                {'op': 'setlink', 'index': 0, 'name': 'baz', 'mtu': 1500},
+                {'op': 'dellink', 'index': 3},
+            ]
+        )
+
+    def test_request_split(self):
+        """Test acknowledgements received separately."""
+        transport = _SplitTransport(errors={'bar': errno.EBUSY})
+        rtnl = netlink.RtNetlink(transport)
+
+        with self.assertRaises(netlink.NetlinkError) as err:
+            rtnl.request([
+                netlink.link_set(name='foo', up=True),
+                netlink.link_set(name='bar', up=True),
+                netlink.link_set(name='baz', up=True),
+            ])
+
+        self.assertEqual(err.exception.errno, errno.EBUSY)
+        # All the acknowledgements are read.
+        self.assertEqual(transport._replies, [])  # pylint: disable=W0212
+
+    def test_request_error(self):
+        """Test the first error is raised."""
+        transport = mocknetlink.FakeTransport(
+            errors={'bar': errno.ENODEV, 'baz': errno.EEXIST}
+        )
+        rtnl = netlink.RtNetlink(transport)
+
+        with self.assertRaises(netlink.NetlinkError) as err:
+            rtnl.request([
+                netlink.link_set(name='foo', up=True),
+                netlink.link_set(name='bar', up=True),
+                netlink.link_set(name='baz', up=True),
+            ])
+
+        self.assertIsInstance(err.exception, OSError)
+        self.assertEqual(err.exception.errno, errno.ENODEV)
+        self.assertEqual(
+            err.exception.filename, 'RTM_SETLINK(index=0, name=bar)'
+        )
+        self.assertEqual(len(transport.requests), 3)
+
+        # The sequence numbers keep increasing.
+        rtnl.request([netlink.link_set(name='foo', up=False)])
+
+    def test_link_set_rename(self):
+        """Test renaming requires the link index."""
+        with self.assertRaises(AssertionError):
+            netlink.link_set(name='foo', new_name='bar')
+
+        self.assertEqual(
+            mocknetlink.decode_link(
+                *netlink.link_set(index=3, new_name='bar', up=True)[::2]
+            ),
+            {'op': 'setlink', 'index': 3, 'name': 'bar', 'up': True}
+        )
+
+    def test_link_add_veth(self):
+        """Test veth pair creation request."""
+        msg_type, flags, payload = netlink.link_add_veth(
+            'foo', 'bar', mtu=9000, master=7
+        )
+
+        self.assertEqual(msg_type, netlink.RTM_NEWLINK)
+        self.assertEqual(flags, netlink.NLM_F_CREATE | netlink.NLM_F_EXCL)
+        self.assertEqual(
+            mocknetlink.decode_link(msg_type, payload),
+            {
+                'op': 'newlink', 'index': 0, 'name': 'foo', 'kind': 'veth',
+                'mtu': 9000, 'master': 7,
+                'peer': {'index': 0, 'name': 'bar', 'mtu': 9000},
+            }
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
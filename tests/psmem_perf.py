@@ -0,0 +1,84 @@
+"""Performance test for treadmill.psmem.
+
+Times the parsing of synthetic smaps content with many mappings, the way
+psmem parsed it before (lines split one by one), with the pattern based parser
+and with the pattern based parser on the smaps_rollup equivalent.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import timeit
+
+from treadmill import psmem
+
+_MAPPING = """\
+7f0000000000-7f0000021000 rw-p 00000000 00:00 0
+Size:                132 kB
+KernelPageSize:        4 kB
+MMUPageSize:           4 kB
+Rss:                  12 kB
+Pss:                   7 kB
+Shared_Clean:          4 kB
+Shared_Dirty:          0 kB
+Private_Clean:         0 kB
+Private_Dirty:         8 kB
+Referenced:           12 kB
+Anonymous:             8 kB
+LazyFree:              0 kB
+AnonHugePages:         0 kB
+ShmemPmdMapped:        0 kB
+Shared_Hugetlb:        0 kB
+Private_Hugetlb:       0 kB
+Swap:                  0 kB
+SwapPss:               0 kB
+Locked:                0 kB
+VmFlags: rd wr mr mw me ac
+"""
+
+
+def _lines_parse(data):
+    """Line by line parsing, as psmem used to do."""
+    private_lines = []
+    shared_lines = []
+    pss_lines = []
+    for line in io.StringIO(data.decode()).readlines():
+        if line.startswith('Shared'):
+            shared_lines.append(line)
+        elif line.startswith('Private'):
+            private_lines.append(line)
+        elif line.startswith('Pss'):
+            pss_lines.append(line)
+
+    shared = sum([int(line.split()[1]) for line in shared_lines])
+    private = sum([int(line.split()[1]) for line in private_lines])
+    pss = sum([float(line.split()[1]) + 0.5 for line in pss_lines])
+    return private, shared, pss
+
+
+def test_parse(mappings, attempts):
+    """Time parsing smaps with the given number of mappings."""
+    smaps = (_MAPPING * mappings).encode()
+    rollup = _MAPPING.encode()
+
+    lines = timeit.timeit(
+        stmt=lambda: _lines_parse(smaps), number=attempts
+    ) / attempts
+    scanned = timeit.timeit(
+        stmt=lambda: psmem.parse_smaps(smaps), number=attempts
+    ) / attempts
+    rolled_up = timeit.timeit(
+        stmt=lambda: psmem.parse_smaps(rollup), number=attempts
+    ) / attempts
+
+    print('mappings: %6d, lines: %9.3f ms, scanned: %9.3f ms, '
+          'rollup: %7.3f ms' % (
+              mappings, lines * 1e3, scanned * 1e3, rolled_up * 1e3))
+
+
+if __name__ == '__main__':
+    for count in (1000, 10000, 50000):
+        test_parse(count, 5)
@@ -0,0 +1,171 @@
+"""Unit test for treadmill.psmem.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+# Disable W0611: Unused import
+import tests.treadmill_test_skip_windows  # pylint: disable=W0611
+
+from treadmill import psmem
+
+
+_SMAPS_MAPPING = """\
+7f0000000000-7f0000021000 rw-p 00000000 00:00 0
+Size:                132 kB
+Rss:                  {rss} kB
+Pss:                  {pss} kB
+Pss_Anon:             {pss} kB
+Shared_Clean:         {shared} kB
+Shared_Dirty:          0 kB
+Private_Clean:         0 kB
+Private_Dirty:        {private} kB
+Referenced:           {rss} kB
+Swap:                  0 kB
+SwapPss:               0 kB
+VmFlags: rd wr mr mw me ac
+"""
+
+_STATUS = """\
+Name:\t{name}
+Umask:\t0022
+State:\tS (sleeping)
+Tgid:\t{tgid}
+Ngid:\t0
+Pid:\t{pid}
+PPid:\t1
+Threads:\t{threads}
+"""
+
+
+class PsmemTest(unittest.TestCase):
+    """Tests for teadmill.psmem."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.patcher = mock.patch.multiple(
+            'treadmill.psmem', _PROC_DIR=self.root, _HAVE_ROLLUP=False
+        )
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        if self.root and os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+
+    def _write(self, pid, name, content):
+        """Write a /proc file fixture."""
+        path = os.path.join(self.root, str(pid))
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        with io.open(os.path.join(path, name), 'w') as f:
+            f.write(content)
+
+    def _process(self, pid, name, mappings, tgid=None, threads=1):
+        """Create /proc fixtures of a process."""
+        self._write(pid, 'status', _STATUS.format(
+            name=name, tgid=tgid or pid, pid=pid, threads=threads
+        ))
+        self._write(pid, 'cmdline', '/bin/' + name + '\0')
+        self._write(pid, 'statm', '100 50 20 1 0 10 0\n')
+        self._write(pid, 'smaps', ''.join(
+            _SMAPS_MAPPING.format(
+                rss=shared + private, pss=pss, shared=shared, private=private
+            )
+            for pss, shared, private in mappings
+        ))
+        os.symlink('/bin/' + name, os.path.join(self.root, str(pid), 'exe'))
+
+    def test_parse_smaps(self):
+        """Test parsing smaps content."""
+        data = ''.join(
+            _SMAPS_MAPPING.format(rss=12, pss=7, shared=4, private=8)
+            for _ in range(3)
+        ).encode()
+        self.assertEqual(psmem.parse_smaps(data), (24, 12, 21, 3))
+        self.assertEqual(psmem.parse_smaps(b''), (0, 0, 0, 0))
+
+    def test_get_mem_stats(self):
+        """Test reading the memory stats of a process."""
+        self._process(100, 'java', [(7, 4, 8), (3, 6, 0)])
+
+        # (7.5 + 3.5 kB pss) - 8 kB private.
+        self.assertEqual(
+            psmem.get_mem_stats(100),
+            (8 * 1024, 3 * 1024, True)
+        )
+        # From statm, 4k pages.
+        with mock.patch('treadmill.psmem._PAGESIZE', 4):
+            self.assertEqual(
+                psmem.get_mem_stats(100, use_pss=False),
+                (30 * 4 * 1024, 20 * 4 * 1024, False)
+            )
+
+    def test_get_mem_stats_rollup(self):
+        """Test smaps_rollup is preferred when available."""
+        self._process(100, 'java', [(7, 4, 8), (3, 6, 0)])
+        self._write(100, 'smaps_rollup', _SMAPS_MAPPING.format(
+            rss=18, pss=10, shared=10, private=8
+        ))
+
+        with mock.patch('treadmill.psmem._HAVE_ROLLUP', True):
+            self.assertEqual(
+                psmem.get_mem_stats(100),
+                (8 * 1024, int(2.5 * 1024), True)
+            )
+
+        with mock.patch('treadmill.psmem._HAVE_ROLLUP', None):
+            # No /proc/self/smaps_rollup in the fixtures, smaps is used.
+            self.assertEqual(
+                psmem.get_mem_stats(100),
+                (8 * 1024, 3 * 1024, True)
+            )
+
+    def test_get_memory_usage(self):
+        """Test the memory usage of the processes of a container."""
+        self._process(100, 'java', [(9, 4, 8)], threads=2)
+        self._process(101, 'java', [(9, 4, 8)], tgid=100, threads=2)
+        self._process(102, 'sshd', [(1, 0, 1)])
+
+        self.assertEqual(
+            psmem.get_memory_usage([102, 101, 100, 103]),
+            [
+                {
+                    'name': 'java',
+                    'tgid': 100,
+                    'private': 8 * 1024,
+                    'shared': 1536,
+                    'threads': 2,
+                    'total': 8 * 1024 + 1536,
+                },
+                {
+                    'name': 'sshd',
+                    'tgid': 102,
+                    'private': 1024,
+                    'shared': 512,
+                    'threads': 1,
+                    'total': 1024 + 512,
+                },
+            ]
+        )
+
+        self.assertEqual(
+            [info['name'] for info in psmem.get_memory_usage(
+                [100, 102], exclude=['ss*']
+            )],
+            ['java']
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -141,6 +141,36 @@ class InstanceTest(unittest.TestCase):
                 ),
             ])
 
+    def test_bulk_create_instance(self):
+        """Test bulk creating instances."""
+        self.impl.bulk_create.return_value = [
+            {'_id': 'proid.app', 'instances': ['proid.app#0000000001']},
+            {'_error': {'_id': 'proid.missing', 'why': 'Not found.'}},
+        ]
+
+        with user_set(self.app, 'foo@BAR.BAZ'):
+            resp = self.client.post(
+                '/instance/_bulk/create',
+                data=json.dumps({
+                    'instances': [
+                        {'_id': 'proid.app', 'count': 1},
+                        {'_id': 'proid.missing', 'count': 2},
+                    ]
+                }),
+                content_type='application/json'
+            )
+        self.assertEqual(resp.status_code, http_client.OK)
+        self.assertEqual(self.impl.bulk_create.call_args_list, [
+            mock.call(
+                [{'_id': 'proid.app', 'count': 1},
+                 {'_id': 'proid.missing', 'count': 2}],
+                'foo@BAR.BAZ'
+            ),
+        ])
+        result = json.loads(resp.data.decode())['instances']
+        self.assertEqual(result[0]['instances'], ['proid.app#0000000001'])
+        self.assertEqual(result[1]['_error']['_id'], 'proid.missing')
+
     def test_bulk_update_instance(self):
         """Test bulk updateing list of instances."""
         self.impl.bulk_update.return_value = None
@@ -6,11 +6,13 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import threading
 import unittest
 
 import mock
 import simplejson.scanner as sjs
 import requests
+import requests_kerberos
 
 from six.moves import http_client
 
@@ -24,7 +26,7 @@ class RESTClientTest(unittest.TestCase):
         """Setup common test variables"""
         pass
 
-    @mock.patch('requests.get',
+    @mock.patch('requests.Session.get',
                 return_value=mock.MagicMock(requests.Response))
     def test_get_ok(self, resp_mock):
         """Test treadmill.restclient.get OK (200)"""
@@ -36,7 +38,7 @@ class RESTClientTest(unittest.TestCase):
         self.assertIsNotNone(resp)
         self.assertEqual(resp.text, 'foo')
 
-    @mock.patch('requests.get',
+    @mock.patch('requests.Session.get',
                 return_value=mock.MagicMock(requests.Response))
     def test_get_404(self, resp_mock):
         """Test treadmill.restclient.get NOT_FOUND (404)"""
@@ -45,7 +47,7 @@ class RESTClientTest(unittest.TestCase):
         with self.assertRaises(restclient.NotFoundError):
             restclient.get('http://foo.com', '/')
 
-    @mock.patch('requests.get',
+    @mock.patch('requests.Session.get',
                 return_value=mock.MagicMock(requests.Response))
     def test_get_302(self, resp_mock):
         """Test treadmill.restclient.get FOUND (302)"""
@@ -54,7 +56,7 @@ class RESTClientTest(unittest.TestCase):
         with self.assertRaises(restclient.AlreadyExistsError):
             restclient.get('http://foo.com', '/')
 
-    @mock.patch('requests.get',
+    @mock.patch('requests.Session.get',
                 return_value=mock.MagicMock(requests.Response))
     def test_get_424(self, resp_mock):
         """Test treadmill.restclient.get FAILED_DEPENDENCY (424)"""
@@ -64,7 +66,7 @@ class RESTClientTest(unittest.TestCase):
         with self.assertRaises(restclient.ValidationError):
             restclient.get('http://foo.com', '/')
 
-    @mock.patch('requests.get',
+    @mock.patch('requests.Session.get',
                 return_value=mock.MagicMock(requests.Response))
     def test_get_401(self, resp_mock):
         """Test treadmill.restclient.get UNAUTHORIZED (401)"""
@@ -74,7 +76,7 @@ class RESTClientTest(unittest.TestCase):
         with self.assertRaises(restclient.NotAuthorizedError):
             restclient.get('http://foo.com', '/')
 
-    @mock.patch('requests.get',
+    @mock.patch('requests.Session.get',
                 return_value=mock.MagicMock(requests.Response))
     def test_get_bad_json(self, resp_mock):
         """Test treadmill.restclient.get bad JSON"""
@@ -90,7 +92,7 @@ class RESTClientTest(unittest.TestCase):
 
     @mock.patch('time.sleep', mock.Mock())
     @mock.patch('treadmill.restclient._handle_error', mock.Mock())
-    @mock.patch('requests.get', mock.Mock())
+    @mock.patch('requests.Session.get', mock.Mock())
     def test_retry(self):
         """Tests retry logic."""
 
@@ -106,7 +108,7 @@ class RESTClientTest(unittest.TestCase):
         # Requests are done in order, by because other methods are being
         # callled, to make test simpler, any_order is set to True so that
         # test will pass.
-        requests.get.assert_has_calls([
+        requests.Session.get.assert_has_calls([
             mock.call('http://foo.com/baz', json=None, proxies=None,
                       headers=None, auth=mock.ANY, timeout=(.5, 10),
                       stream=None),
@@ -126,10 +128,10 @@ class RESTClientTest(unittest.TestCase):
                       headers=None, auth=mock.ANY, timeout=(2.5, 10),
                       stream=None),
         ], any_order=True)
-        self.assertEqual(requests.get.call_count, 6)
+        self.assertEqual(requests.Session.get.call_count, 6)
 
     @mock.patch('time.sleep', mock.Mock())
-    @mock.patch('requests.get',
+    @mock.patch('requests.Session.get',
                 side_effect=requests.exceptions.ConnectionError)
     def test_retry_on_connection_error(self, _):
         """Test retry on connection error"""
@@ -140,7 +142,8 @@ class RESTClientTest(unittest.TestCase):
         self.assertEqual(len(err.attempts), 5)
 
     @mock.patch('time.sleep', mock.Mock())
-    @mock.patch('requests.get', side_effect=requests.exceptions.Timeout)
+    @mock.patch('requests.Session.get',
+                side_effect=requests.exceptions.Timeout)
     def test_retry_on_request_timeout(self, _):
         """Test retry on request timeout"""
 
@@ -150,7 +153,8 @@ class RESTClientTest(unittest.TestCase):
         self.assertEqual(len(err.attempts), 5)
 
     @mock.patch('time.sleep', mock.Mock())
-    @mock.patch('requests.get', return_value=mock.MagicMock(requests.Response))
+    @mock.patch('requests.Session.get',
+                return_value=mock.MagicMock(requests.Response))
     def test_retry_on_503(self, resp_mock):
         """Test retry for status code that should be retried (e.g. 503)"""
         resp_mock.return_value.status_code = http_client.SERVICE_UNAVAILABLE
@@ -158,7 +162,8 @@ class RESTClientTest(unittest.TestCase):
         with self.assertRaises(restclient.MaxRequestRetriesError):
             restclient.get('http://foo.com', '/')
 
-    @mock.patch('requests.get', return_value=mock.MagicMock(requests.Response))
+    @mock.patch('requests.Session.get',
+                return_value=mock.MagicMock(requests.Response))
     def test_default_timeout_get(self, resp_mock):
         """Tests that default timeout for get request is set correctly."""
         resp_mock.return_value.status_code = http_client.OK
@@ -169,7 +174,7 @@ class RESTClientTest(unittest.TestCase):
             headers=None, json=None, timeout=(0.5, 10), proxies=None
         )
 
-    @mock.patch('requests.delete',
+    @mock.patch('requests.Session.delete',
                 return_value=mock.MagicMock(requests.Response))
     def test_default_timeout_delete(self, resp_mock):
         """Tests that default timeout for delete request is set correctly."""
@@ -181,7 +186,7 @@ class RESTClientTest(unittest.TestCase):
             headers=None, json=None, timeout=(0.5, None), proxies=None
         )
 
-    @mock.patch('requests.post',
+    @mock.patch('requests.Session.post',
                 return_value=mock.MagicMock(requests.Response))
     def test_default_timeout_post(self, resp_mock):
         """Tests that default timeout for post request is set correctly."""
@@ -193,7 +198,8 @@ class RESTClientTest(unittest.TestCase):
             headers=None, json='', timeout=(0.5, None), proxies=None
         )
 
-    @mock.patch('requests.put', return_value=mock.MagicMock(requests.Response))
+    @mock.patch('requests.Session.put',
+                return_value=mock.MagicMock(requests.Response))
     def test_default_timeout_put(self, resp_mock):
         """Tests that default timeout for put request is set correctly."""
         resp_mock.return_value.status_code = http_client.OK
@@ -204,6 +210,129 @@ class RESTClientTest(unittest.TestCase):
             headers=None, json='', timeout=(0.5, None), proxies=None
         )
 
+    def test_session_pool(self):
+        """Tests that sessions are pooled by host."""
+        restclient.close_sessions()
+
+        session = restclient._session('http://foo.com:8080/foo')
+        self.assertIs(session, restclient._session('http://foo.com:8080/bar'))
+        self.assertIsNot(session, restclient._session('http://bar.com:8080/'))
+        self.assertIsNot(session, restclient._session('https://foo.com:8080/'))
+
+        restclient.close_sessions()
+        self.assertIsNot(session, restclient._session('http://foo.com:8080/'))
+
+    @mock.patch('requests_kerberos.HTTPKerberosAuth', mock.Mock())
+    def test_session_auth(self):
+        """Tests that HTTP sessions negotiate SPNEGO preemptively."""
+        restclient.close_sessions()
+
+        session = restclient._session('http://foo.com:8080/foo')
+        self.assertIs(session.auth,
+                      requests_kerberos.HTTPKerberosAuth.return_value)
+        requests_kerberos.HTTPKerberosAuth.assert_called_with(
+            mutual_authentication=requests_kerberos.DISABLED,
+            principal=mock.ANY,
+            force_preemptive=True
+        )
+        self.assertIsNone(
+            restclient._session('http+unix://%2Ftmp%2Fapi.sock/').auth
+        )
+
+        restclient.close_sessions()
+
+    @mock.patch('requests.Session.get')
+    def test_session_auth_fallback(self, get_mock):
+        """Tests the server challenge without a token to send up front."""
+        restclient.close_sessions()
+        ok = mock.MagicMock(requests.Response)
+        ok.status_code = http_client.OK
+        get_mock.side_effect = [
+            requests_kerberos.exceptions.KerberosExchangeError(),
+            ok,
+        ]
+
+        self.assertIs(restclient.get('http://foo.com', '/'), ok)
+
+        session = restclient._session('http://foo.com/')
+        self.assertIs(get_mock.call_args_list[0][1]['auth'], session.auth)
+        self.assertIs(get_mock.call_args_list[1][1]['auth'],
+                      restclient._KERBEROS_AUTH)
+
+        restclient.close_sessions()
+
+    @mock.patch('requests.Session.get')
+    def test_hedged_get(self, get_mock):
+        """Tests that hedged requests return the first success."""
+        ok = mock.MagicMock(requests.Response)
+        ok.status_code = http_client.OK
+        slow = threading.Event()
+
+        def _get(url, **_kwargs):
+            if url.startswith('http://foo.com'):
+                # Dead endpoint, does not answer until the test is done.
+                slow.wait(5)
+                raise requests.exceptions.Timeout()
+            if url.startswith('http://bar.com'):
+                raise requests.exceptions.ConnectionError()
+            return ok
+
+        get_mock.side_effect = _get
+
+        try:
+            resp = restclient.get(
+                ['http://foo.com', 'http://bar.com', 'http://baz.com'],
+                '/',
+                hedge_delay=0.01
+            )
+        finally:
+            slow.set()
+
+        self.assertIs(resp, ok)
+        self.assertEqual(get_mock.call_count, 3)
+
+    @mock.patch('requests.Session.get')
+    def test_hedged_get_close(self, get_mock):
+        """Tests that the responses of abandoned hedged calls are closed."""
+        fast = mock.MagicMock(requests.Response)
+        fast.status_code = http_client.OK
+        slow = mock.MagicMock(requests.Response)
+        slow.status_code = http_client.OK
+        answer = threading.Event()
+        closed = threading.Event()
+        slow.close.side_effect = closed.set
+
+        def _get(url, **_kwargs):
+            if url.startswith('http://foo.com'):
+                answer.wait(5)
+                return slow
+            return fast
+
+        get_mock.side_effect = _get
+
+        resp = restclient.get(
+            ['http://foo.com', 'http://bar.com'], '/', stream=True,
+            hedge_delay=0.01
+        )
+        self.assertIs(resp, fast)
+
+        answer.set()
+        self.assertTrue(closed.wait(5))
+        fast.close.assert_not_called()
+
+    @mock.patch('time.sleep', mock.Mock())
+    @mock.patch('requests.Session.get',
+                side_effect=requests.exceptions.ConnectionError)
+    def test_hedged_get_retry(self, _):
+        """Tests retry of hedged requests."""
+        with self.assertRaises(restclient.MaxRequestRetriesError) as cm:
+            restclient.get(
+                ['http://foo.com', 'http://bar.com'], '/',
+                retries=2, hedge_delay=0
+            )
+        err = cm.exception
+        self.assertEqual(len(err.attempts), 4)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -71,9 +71,10 @@ class LocalDiskServiceTest(unittest.TestCase):
         )
         svc._vg_status = {
             'extent_size': 4,
-            'extent_free': 512,
+            'extent_free': 0,
             'extent_nb': 512,
         }
+        svc._pool.reset(extent_size=4, extent_free=512)
 
         status = svc.report_status()
 
@@ -109,10 +110,7 @@ class LocalDiskServiceTest(unittest.TestCase):
             read_iops=1000,
             write_iops=1000
         )
-        svc._vg_status = {
-            'extent_size': 4 * 1024**3,
-            'extent_free': 512,
-        }
+        svc._pool.reset(extent_size=4 * 1024**3, extent_free=512)
         request = {
             'size': '100M',
         }
@@ -132,9 +130,15 @@ class LocalDiskServiceTest(unittest.TestCase):
             group='treadmill',
             size_in_bytes=100 * 1024**2,
         )
-        self.assertTrue(
+        treadmill.lvm.lvdisplay.assert_called_with(
+            volume='tm-ID1234',
+            group='treadmill',
+        )
+        # Free extents are tracked in memory.
+        self.assertFalse(
             treadmill.localdiskutils.refresh_vg_status.called
         )
+        self.assertEqual(svc._pool.extent_free, 511)
         cgrp = os.path.join('treadmill/apps', request_id)
         treadmill.cgroups.create.assert_called_with(
             'blkio', cgrp
@@ -190,10 +194,7 @@ class LocalDiskServiceTest(unittest.TestCase):
             read_iops=1000,
             write_iops=1000
         )
-        svc._vg_status = {
-            'extent_size': 4 * 1024**3,
-            'extent_free': 512,
-        }
+        svc._pool.reset(extent_size=4 * 1024**3, extent_free=512)
         treadmill.lvm.lvdisplay.return_value = {
             'block_dev': '/dev/test',
             'dev_major': 42,
@@ -213,17 +214,11 @@ class LocalDiskServiceTest(unittest.TestCase):
         treadmill.lvm.lvcreate.reset_mock()
         treadmill.lvm.lvdisplay.reset_mock()
         treadmill.localdiskutils.refresh_vg_status.reset_mock()
-        treadmill.lvm.lvdisplay.return_value = {
-            'block_dev': '/dev/test',
-            'dev_major': 24,
-            'dev_minor': 34,
-            'extent_size': 10,
-            'name': 'tm-ID1234',
-        }
         # Issue a second request
         localdisk = svc.on_create_request(request_id, request)
 
         self.assertFalse(treadmill.lvm.lvcreate.called)
+        self.assertFalse(treadmill.lvm.lvdisplay.called)
         self.assertFalse(
             treadmill.localdiskutils.refresh_vg_status.called
         )
@@ -235,16 +230,16 @@ class LocalDiskServiceTest(unittest.TestCase):
             [
                 mock.call('blkio', cgrp,
                           'blkio.throttle.read_bps_device',
-                          '24:34 20971520'),
+                          '42:43 20971520'),
                 mock.call('blkio', cgrp,
                           'blkio.throttle.read_iops_device',
-                          '24:34 100'),
+                          '42:43 100'),
                 mock.call('blkio', cgrp,
                           'blkio.throttle.write_bps_device',
-                          '24:34 20971520'),
+                          '42:43 20971520'),
                 mock.call('blkio', cgrp,
                           'blkio.throttle.write_iops_device',
-                          '24:34 100'),
+                          '42:43 100'),
             ],
             any_order=True
         )
@@ -252,23 +247,18 @@ class LocalDiskServiceTest(unittest.TestCase):
             localdisk,
             {
                 'block_dev': '/dev/test',
-                'dev_major': 24,
-                'dev_minor': 34,
+                'dev_major': 42,
+                'dev_minor': 43,
                 'extent_size': 10,
                 'name': 'tm-ID1234',
             }
         )
 
-    @mock.patch('treadmill.lvm.lvdisplay', mock.Mock())
-    @mock.patch('treadmill.lvm.lvremove', mock.Mock())
-    @mock.patch('treadmill.localdiskutils.refresh_vg_status',
-                mock.Mock())
-    def test_on_delete_request(self):
-        """Test processing of a localdisk delete request.
+    def _volume_svc(self):
+        """Service with a volume allocated and a pending request.
         """
         # Access to a protected member
         # pylint: disable=W0212
-
         svc = localdisk_service.LocalDiskResourceService(
             block_dev='/dev/block',
             vg_name='treadmill',
@@ -277,91 +267,196 @@ class LocalDiskServiceTest(unittest.TestCase):
             read_iops=1000,
             write_iops=1000
         )
+        svc._pool.reset(extent_size=4 * 1024**2, extent_free=0)
+        svc._volumes['tm-ID1234'] = {
+            'block_dev': '/dev/treadmill/tm-ID1234',
+            'dev_major': 42,
+            'dev_minor': 43,
+            'extent_size': 25,
+            'name': 'tm-ID1234',
+        }
+        svc._pending = ['myproid.test-0-ID5678']
+        svc._pool.start()
+        self.addCleanup(svc._pool.stop)
+        return svc
+
+    @mock.patch('treadmill.lvm.lvremove', mock.Mock())
+    @mock.patch('treadmill.services.localdisk_service.'
+                'LocalDiskResourceService.retry_request', mock.Mock())
+    def test_on_delete_request(self):
+        """Test processing of a localdisk delete request.
+        """
+        # Access to a protected member
+        # pylint: disable=W0212
+        svc = self._volume_svc()
         request_id = 'myproid.test-0-ID1234'
 
-        svc.on_delete_request(request_id)
+        self.assertTrue(svc.on_delete_request(request_id))
+        self.assertNotIn('tm-ID1234', svc._volumes)
 
-        treadmill.lvm.lvdisplay.assert_called_with(
-            'tm-ID1234',
-            group='treadmill'
-        )
+        # The volume is removed in the background.
+        svc._pool.join()
         treadmill.lvm.lvremove.assert_called_with(
             'tm-ID1234',
             group='treadmill'
         )
-        treadmill.localdiskutils.refresh_vg_status.assert_called()
 
-    @mock.patch('treadmill.lvm.lvdisplay', mock.Mock())
+        self.assertTrue(svc._on_pool_event())
+        self.assertEqual(svc._pool.extent_free, 25)
+        svc.retry_request.assert_called_with('myproid.test-0-ID5678')
+        self.assertEqual(svc._pending, [])
+
     @mock.patch('treadmill.lvm.lvremove', mock.Mock())
-    @mock.patch('treadmill.localdiskutils.refresh_vg_status',
-                mock.Mock())
     def test_on_delete_request_notexist(self):
+        """Test processing of a localdisk delete request.
+        """
+        svc = self._volume_svc()
+        request_id = 'myproid.test-0-ID4321'
+
+        self.assertFalse(svc.on_delete_request(request_id))
+
+        svc._pool.join()  # pylint: disable=W0212
+        treadmill.lvm.lvremove.assert_not_called()
+
+    @mock.patch('treadmill.lvm.lvremove', mock.Mock())
+    @mock.patch('treadmill.services.localdisk_service.'
+                'LocalDiskResourceService.retry_request', mock.Mock())
+    def test_on_delete_request_busy(self):
         """Test processing of a localdisk delete request.
         """
         # Access to a protected member
         # pylint: disable=W0212
-
-        svc = localdisk_service.LocalDiskResourceService(
-            block_dev='/dev/block',
-            vg_name='treadmill',
-            read_bps='100M',
-            write_bps='100M',
-            read_iops=1000,
-            write_iops=1000
-        )
+        svc = self._volume_svc()
         request_id = 'myproid.test-0-ID1234'
-        # trying to find the LV fails
-        treadmill.lvm.lvdisplay.side_effect = (
+        # trying to lvremote fails
+        treadmill.lvm.lvremove.side_effect = (
             subproc.CalledProcessError(returncode=5, cmd='lvm'),
         )
 
-        svc.on_delete_request(request_id)
+        self.assertTrue(svc.on_delete_request(request_id))
+        svc._pool.join()
+        svc._on_pool_event()
 
-        treadmill.lvm.lvdisplay.assert_called_with(
+        treadmill.lvm.lvremove.assert_called_with(
             'tm-ID1234',
             group='treadmill'
         )
-        treadmill.lvm.lvremove.assert_not_called()
-        treadmill.localdiskutils.refresh_vg_status.assert_not_called()
+        # The extents are still in use, the pending request waits.
+        self.assertEqual(svc._pool.extent_free, 0)
+        svc.retry_request.assert_not_called()
 
-    @mock.patch('treadmill.lvm.lvdisplay', mock.Mock())
+    @mock.patch('treadmill.lvm.lvcreate', mock.Mock())
+    @mock.patch('treadmill.lvm.lvdisplay', mock.Mock(return_value={
+        'block_dev': '/dev/treadmill/tmpool-a',
+        'dev_major': 253,
+        'dev_minor': 8,
+        'extent_size': 25,
+        'name': 'tmpool-a',
+    }))
+    @mock.patch('treadmill.services.localdisk_service.'
+                'LocalDiskResourceService.retry_request', mock.Mock())
+    def test_on_pool_event_spares(self):
+        """Test pending requests are retried once spare volumes are created.
+        """
+        # Access to a protected member
+        # pylint: disable=W0212
+        svc = localdisk_service.LocalDiskResourceService(
+            block_dev='/dev/block',
+            vg_name='treadmill',
+            read_bps='100M',
+            write_bps='100M',
+            read_iops=1000,
+            write_iops=1000,
+            pool_volumes={'100M': '1'},
+        )
+        svc._pool.reset(extent_size=4 * 1024**2, extent_free=25)
+        svc._pool.start()
+        self.addCleanup(svc._pool.stop)
+        # Waiting for the extents taken by the spare volume being created.
+        svc._pending = ['myproid.test-0-ID5678']
+
+        svc._pool.join()
+        self.assertTrue(svc._on_pool_event())
+        self.assertEqual(len(svc._pool.spares[25]), 1)
+        svc.retry_request.assert_called_once_with('myproid.test-0-ID5678')
+        self.assertEqual(svc._pending, [])
+
+    @mock.patch('treadmill.localdiskutils.setup_device_lvm', mock.Mock())
+    @mock.patch('treadmill.localdiskutils.refresh_vg_status', mock.Mock(
+        return_value={
+            'extent_free': 100,
+            'extent_nb': 1000,
+            'extent_size': 4 * 1024**2,
+            'name': 'treadmill',
+        }
+    ))
+    @mock.patch('treadmill.lvm.lvsdisplay', mock.Mock())
+    @mock.patch('treadmill.lvm.lvcreate', mock.Mock())
+    @mock.patch('treadmill.lvm.lvrename', mock.Mock())
     @mock.patch('treadmill.lvm.lvremove', mock.Mock())
-    @mock.patch('treadmill.localdiskutils.refresh_vg_status',
-                mock.Mock())
-    def test_on_delete_request_busy(self):
-        """Test processing of a localdisk delete request.
+    @mock.patch('treadmill.cgroups.create', mock.Mock())
+    @mock.patch('treadmill.cgroups.set_value', mock.Mock())
+    def test_pool(self):
+        """Test containers volumes are taken from the pool.
         """
         # Access to a protected member
         # pylint: disable=W0212
 
+        def _lv(name, extents, open_count=0):
+            return {
+                'block_dev': '/dev/treadmill/' + name,
+                'dev_major': 253,
+                'dev_minor': len(name),
+                'extent_alloc': -1,
+                'extent_size': extents,
+                'group': 'treadmill',
+                'name': name,
+                'open_count': open_count,
+            }
+
+        treadmill.lvm.lvsdisplay.return_value = [
+            _lv('tmpool-a', 25),
+            _lv('tmpool-b', 250),
+            _lv('tm-ID1234', 25, open_count=1),
+            _lv('other', 500),
+        ]
         svc = localdisk_service.LocalDiskResourceService(
             block_dev='/dev/block',
             vg_name='treadmill',
             read_bps='100M',
             write_bps='100M',
             read_iops=1000,
-            write_iops=1000
+            write_iops=1000,
+            pool_volumes={'100M': '1'},
         )
-        request_id = 'myproid.test-0-ID1234'
-        # trying to lvremote fails
-        treadmill.lvm.lvremove.side_effect = (
-            subproc.CalledProcessError(returncode=5, cmd='lvm'),
+        svc.initialize(self.root)
+        svc._pool.stop()
+        self.assertEqual(svc._extent_reserved, 500)
+        self.assertEqual(sorted(svc._volumes), ['other', 'tm-ID1234'])
+        self.assertTrue(svc._volumes['tm-ID1234']['stale'])
+        self.assertEqual(svc._pool.spares[25][0]['name'], 'tmpool-a')
+
+        localdisk = svc.on_create_request(
+            'myproid.test-0-ID5678', {'size': '100M'}
         )
 
-        self.assertRaises(
-            subproc.CalledProcessError,
-            svc.on_delete_request,
-            request_id
+        treadmill.lvm.lvrename.assert_called_once_with(
+            'tmpool-a', 'tm-ID5678', group='treadmill'
         )
-
-        treadmill.lvm.lvdisplay.assert_called_with(
-            'tm-ID1234',
-            group='treadmill'
+        treadmill.lvm.lvcreate.assert_not_called()
+        self.assertEqual(localdisk['name'], 'tm-ID5678')
+        self.assertEqual(localdisk['block_dev'], '/dev/treadmill/tm-ID5678')
+        treadmill.cgroups.set_value.assert_any_call(
+            'blkio', 'treadmill/apps/myproid.test-0-ID5678',
+            'blkio.throttle.read_iops_device', '253:8 100'
         )
-        treadmill.lvm.lvremove.assert_called_with(
-            'tm-ID1234',
-            group='treadmill'
+
+        # Not enough space, the spare volume of the other size is removed.
+        self.assertIsNone(
+            svc.on_create_request('myproid.test-0-ID9999', {'size': '1G'})
         )
+        self.assertEqual(svc._pending, ['myproid.test-0-ID9999'])
+        self.assertEqual(svc._pool.spares[250], [])
 
     @mock.patch('treadmill.lvm.vgdisplay', mock.Mock())
     def test__refresh_vg_status(self):
@@ -6,6 +6,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import errno
 import os
 import shutil
 import tempfile
@@ -17,7 +18,6 @@ import mock
 import tests.treadmill_test_skip_windows  # pylint: disable=W0611
 
 import treadmill
-from treadmill import subproc
 from treadmill import services
 from treadmill.services import network_service
 
@@ -235,7 +235,7 @@ class NetworkServiceTest(unittest.TestCase):
         treadmill.services.network_service._device_info.side_effect = \
             lambda dev: {'alias': 'reqid_%s' % dev}
         treadmill.netdev.link_set_up.side_effect = [
-            subproc.CalledProcessError('any', 'how'),
+            OSError(errno.ENODEV, 'No such device'),
             None,
         ]
         mock_vipmgr_inst = mock_vipmgr.return_value
@@ -419,12 +419,7 @@ class NetworkServiceTest(unittest.TestCase):
             }
         )
 
-    @mock.patch('treadmill.netdev.addr_add', mock.Mock(set_spec=True))
-    @mock.patch('treadmill.netdev.bridge_addif', mock.Mock(set_spec=True))
     @mock.patch('treadmill.netdev.link_add_veth', mock.Mock(set_spec=True))
-    @mock.patch('treadmill.netdev.link_set_alias', mock.Mock(set_spec=True))
-    @mock.patch('treadmill.netdev.link_set_mtu', mock.Mock(set_spec=True))
-    @mock.patch('treadmill.netdev.link_set_up', mock.Mock(set_spec=True))
     @mock.patch('treadmill.services.network_service._device_info',
                 autospec=True)
     @mock.patch('treadmill.services.network_service._device_ip',
@@ -455,24 +450,10 @@ class NetworkServiceTest(unittest.TestCase):
         svc._vips.alloc.assert_called_with(request_id)
         treadmill.netdev.link_add_veth.assert_called_with(
             '0000000ID1234.0', '0000000ID1234.1',
-        )
-        treadmill.netdev.link_set_mtu.assert_has_calls(
-            [
-                mock.call('0000000ID1234.0', 9000),
-                mock.call('0000000ID1234.1', 9000),
-            ]
-        )
-        treadmill.netdev.link_set_alias.assert_has_calls(
-            [
-                mock.call('0000000ID1234.0', request_id),
-                mock.call('0000000ID1234.1', request_id),
-            ]
-        )
-        treadmill.netdev.bridge_addif.assert_called_with(
-            'br0', '0000000ID1234.0'
-        )
-        treadmill.netdev.link_set_up.assert_called_with(
-            '0000000ID1234.0',
+            mtu=9000,
+            bridge='br0',
+            alias=request_id,
+            up=True
         )
         mock_devinfo.assert_called_with('0000000ID1234.0')
         self.assertEqual(
@@ -498,12 +479,7 @@ class NetworkServiceTest(unittest.TestCase):
             mockip, 'dev'
         )
 
-    @mock.patch('treadmill.netdev.addr_add', mock.Mock(set_spec=True))
-    @mock.patch('treadmill.netdev.bridge_addif', mock.Mock(set_spec=True))
     @mock.patch('treadmill.netdev.link_add_veth', mock.Mock(set_spec=True))
-    @mock.patch('treadmill.netdev.link_set_alias', mock.Mock(set_spec=True))
-    @mock.patch('treadmill.netdev.link_set_mtu', mock.Mock(set_spec=True))
-    @mock.patch('treadmill.netdev.link_set_up', mock.Mock(set_spec=True))
     @mock.patch('treadmill.services.network_service._device_info',
                 autospec=True)
     @mock.patch('treadmill.services.network_service._device_ip',
@@ -540,10 +516,6 @@ class NetworkServiceTest(unittest.TestCase):
 
         svc._vips.alloc.assert_not_called()
         treadmill.netdev.link_add_veth.assert_not_called()
-        treadmill.netdev.link_set_mtu.assert_not_called()
-        treadmill.netdev.link_set_alias.assert_not_called()
-        treadmill.netdev.bridge_addif.assert_not_called()
-        treadmill.netdev.link_set_up.assert_not_called()
         mock_devinfo.assert_called_with('0000000ID1234.0')
         network_service._add_mark_rule.assert_called_with(
             'old_ip', 'dev'
@@ -568,6 +540,83 @@ class NetworkServiceTest(unittest.TestCase):
             }
         )
 
+    @mock.patch('treadmill.netdev.link_add_veth', mock.Mock(set_spec=True))
+    @mock.patch('treadmill.services.network_service._device_info',
+                mock.Mock(return_value={}))
+    @mock.patch('treadmill.services.network_service._device_ip',
+                mock.Mock(set_spec=True, return_value='1.2.3.4'))
+    @mock.patch('treadmill.services.network_service._add_mark_rule',
+                mock.Mock(set_spec=True))
+    @mock.patch('treadmill.vethpool.VethPool.acquire',
+                mock.Mock(return_value=True))
+    @mock.patch('treadmill.vethpool.VethPool.refill', mock.Mock())
+    def test_on_create_request_pool(self):
+        """Test processing of a network create request with a spare pair.
+        """
+        # Access to a protected member _vips
+        # pylint: disable=W0212
+
+        svc = network_service.NetworkResourceService(
+            ext_device='eth42',
+            ext_speed=10000,
+            ext_mtu=9000,
+            veth_pool_size=4,
+        )
+        svc._vips = mock.Mock()
+        request_id = 'myproid.test-0-ID1234'
+
+        network = svc.on_create_request(request_id, {'environment': 'dev'})
+
+        treadmill.vethpool.VethPool.acquire.assert_called_with(
+            '0000000ID1234.0', '0000000ID1234.1', request_id
+        )
+        treadmill.netdev.link_add_veth.assert_not_called()
+        treadmill.vethpool.VethPool.refill.assert_called_with()
+        self.assertEqual(network['veth'], '0000000ID1234.1')
+
+    @mock.patch('treadmill.iptables.create_set', mock.Mock())
+    @mock.patch('treadmill.netdev.bridge_brif',
+                mock.Mock(return_value=['foo', 'tmvp000000001.0']))
+    @mock.patch('treadmill.netdev.bridge_setfd', mock.Mock())
+    @mock.patch('treadmill.netdev.dev_conf_route_localnet_set', mock.Mock())
+    @mock.patch('treadmill.netdev.dev_mtu', mock.Mock())
+    @mock.patch('treadmill.netdev.link_del_veth', mock.Mock())
+    @mock.patch('treadmill.netdev.link_set_up', mock.Mock())
+    @mock.patch('treadmill.services.network_service._device_info',
+                mock.Mock(return_value={'alias': 'reqid_foo'}))
+    @mock.patch('treadmill.services.network_service._device_ip', mock.Mock())
+    @mock.patch('treadmill.vethpool.VethPool.start', mock.Mock())
+    @mock.patch('treadmill.vethpool.VethPool.fileno',
+                mock.Mock(return_value=42))
+    @mock.patch('treadmill.vipfile.VipMgr', autospec=True)
+    def test_initialize_pool(self, mock_vipmgr):
+        """Test service initialization with a veth pool.
+        """
+        # Access to a protected member
+        # pylint: disable=W0212
+        mock_vipmgr.return_value.list.return_value = []
+
+        svc = network_service.NetworkResourceService(
+            ext_device='eth42',
+            ext_speed=10000,
+            ext_mtu=9000,
+            veth_pool_size=4,
+        )
+
+        svc.initialize(self.root)
+
+        # Spare pairs of the previous run are deleted.
+        treadmill.netdev.link_del_veth.assert_called_once_with(
+            'tmvp000000001.0'
+        )
+        network_service._device_info.assert_called_once_with('foo')
+        self.assertEqual(list(svc._devices), ['reqid_foo'])
+        treadmill.vethpool.VethPool.start.assert_called_once_with()
+        self.assertEqual(
+            svc.event_handlers(),
+            [(42, mock.ANY, svc._on_pool_event)]
+        )
+
     @mock.patch('treadmill.netdev.dev_state', mock.Mock(set_spec=True))
     @mock.patch('treadmill.netdev.link_del_veth', mock.Mock(set_spec=True))
     @mock.patch('treadmill.vipfile.VipMgr', autospec=True)
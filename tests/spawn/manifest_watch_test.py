@@ -55,7 +55,10 @@ class ManifestWatchTest(unittest.TestCase):
         """Tests basic create instance functionality."""
         watch = manifest_watch.ManifestWatch('/does/not/exist', 2)
 
-        watch._create_instance('test.yml')
+        self.assertEqual(
+            watch._create_instance('test.yml'),
+            '/does/not/exist/running/000000'
+        )
 
         self.assertEqual(4, treadmill.fs.mkdir_safe.call_count)
         self.assertEqual(2, treadmill.utils.create_script.call_count)
@@ -69,18 +72,70 @@ class ManifestWatchTest(unittest.TestCase):
             ],
             any_order=True
         )
+        # Buckets are scanned once per batch.
+        treadmill.spawn.manifest_watch.ManifestWatch._scan.assert_not_called()
+
+    @mock.patch('os.path.exists', mock.Mock(return_value=True))
+    @mock.patch('os.chmod', mock.Mock())
+    @mock.patch('treadmill.fs.mkdir_safe', mock.Mock())
+    @mock.patch('treadmill.fs.rm_safe', mock.Mock())
+    @mock.patch('treadmill.spawn.manifest_watch.ManifestWatch._scan',
+                mock.Mock())
+    @mock.patch(
+        'treadmill.spawn.manifest_watch.ManifestWatch._create_instance',
+        mock.Mock())
+    def test_flush(self):
+        """Tests a batch of manifests is spawned with a scan per bucket."""
+        watch = manifest_watch.ManifestWatch('/does/not/exist', 2)
+        treadmill.spawn.manifest_watch.ManifestWatch._create_instance \
+                 .side_effect = lambda path: (
+                     '/does/not/exist/running/00000%s' % path[-5]
+                 )
+
+        for idx in range(10):
+            watch._on_created('/does/not/exist/manifest/app%d.yml' % (
+                idx % 2
+            ))
+        watch._on_created('/does/not/exist/manifest/.tmp')
+
+        treadmill.spawn.manifest_watch.ManifestWatch._create_instance \
+                 .assert_not_called()
+
+        watch.flush()
+
+        self.assertEqual(
+            10,
+            treadmill.spawn.manifest_watch.ManifestWatch._create_instance
+            .call_count
+        )
+        treadmill.spawn.manifest_watch.ManifestWatch._scan.assert_has_calls([
+            mock.call('/does/not/exist/running/000000'),
+            mock.call('/does/not/exist/running/000001'),
+        ])
         self.assertEqual(
-            1,
+            2,
             treadmill.spawn.manifest_watch.ManifestWatch._scan.call_count
         )
+        self.assertEqual(10, treadmill.fs.rm_safe.call_count)
+        self.assertEqual(
+            watch.stats,
+            {'batches': 1, 'instances': 10, 'scans': 2}
+        )
+
+        # Nothing left to spawn.
+        watch.flush()
+        self.assertEqual(watch.stats['batches'], 1)
 
     @mock.patch('os.listdir', mock.Mock())
     @mock.patch('os.path.exists', mock.Mock(return_value=True))
     @mock.patch('os.chmod', mock.Mock())
     @mock.patch('treadmill.fs.mkdir_safe', mock.Mock())
+    @mock.patch('treadmill.fs.rm_safe', mock.Mock())
+    @mock.patch('treadmill.spawn.manifest_watch.ManifestWatch._scan',
+                mock.Mock())
     @mock.patch(
         'treadmill.spawn.manifest_watch.ManifestWatch._create_instance',
-        mock.Mock())
+        mock.Mock(return_value='/does/not/exist/running/000001'))
     def test_sync(self):
         """Tests the initial sync of the manifests."""
         os.listdir.side_effect = [
@@ -91,7 +146,9 @@ class ManifestWatchTest(unittest.TestCase):
         watch.sync()
 
         treadmill.spawn.manifest_watch.ManifestWatch._create_instance \
-                 .assert_called_with('/does/not/exist/manifest/test4.yml')
+                 .assert_called_once_with('/does/not/exist/manifest/test4.yml')
+        treadmill.spawn.manifest_watch.ManifestWatch._scan \
+                 .assert_called_once_with('/does/not/exist/running/000001')
 
 
 if __name__ == '__main__':
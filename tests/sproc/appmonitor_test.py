@@ -6,6 +6,8 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
+import threading
 import time
 import unittest
 
@@ -13,12 +15,47 @@ import mock
 
 # Disable W0611: Unused import
 import tests.treadmill_test_skip_windows  # pylint: disable=W0611
+from tests.testutils import mockzk
 
 from treadmill import restclient
+from treadmill import yamlwrapper as yaml
 from treadmill import zkutils
 from treadmill.sproc import appmonitor
 
 
+class _FakeInstanceApi(object):
+    """Instance REST API stand-in, scheduling in the fake Zookeeper."""
+
+    def __init__(self, zkclient):
+        self.zkclient = zkclient
+        self.calls = collections.Counter()
+        self.seq = 0
+
+    def post(self, api, url, payload, headers=None):
+        """Handle instance API POST calls."""
+        del api
+        del headers
+        self.calls[url] += 1
+        response = mock.Mock()
+        if url == '/instance/_bulk/create':
+            results = []
+            for item in payload['instances']:
+                instances = []
+                for _idx in range(item['count']):
+                    self.seq += 1
+                    instance = '{}#{:010d}'.format(item['_id'], self.seq)
+                    self.zkclient.create('/scheduled/' + instance)
+                    instances.append(instance)
+                results.append({'_id': item['_id'], 'instances': instances})
+            response.json.return_value = {'instances': results}
+        elif url == '/instance/_bulk/delete':
+            for instance in payload['instances']:
+                self.zkclient.delete('/scheduled/' + instance)
+        else:
+            raise restclient.NotFoundError(url)
+        return response
+
+
 class AppMonitorTest(unittest.TestCase):
     """Test treadmill.sproc.appmonitor"""
 
@@ -52,6 +89,7 @@ class AppMonitorTest(unittest.TestCase):
         }
 
         time.time.return_value = 101
+        restclient.post.return_value.json.return_value = {'instances': []}
 
         appmonitor.reevaluate('/cellapi.sock', state, zkclient, {})
         self.assertFalse(restclient.post.called)
@@ -99,7 +137,8 @@ class AppMonitorTest(unittest.TestCase):
         appmonitor.reevaluate('/cellapi.sock', state, zkclient, {})
         restclient.post.assert_called_with(
             ['/cellapi.sock'],
-            '/instance/foo.bar?count=2', payload={},
+            '/instance/_bulk/create',
+            payload={'instances': [{'_id': 'foo.bar', 'count': 2}]},
             headers={'X-Treadmill-Trusted-Agent': 'monitor'}
         )
         self.assertEqual(1.0, state['monitors']['foo.bar']['available'])
@@ -108,7 +147,8 @@ class AppMonitorTest(unittest.TestCase):
             '/cellapi.sock', state, zkclient, {})
         restclient.post.assert_called_with(
             ['/cellapi.sock'],
-            '/instance/foo.bar?count=1', payload={},
+            '/instance/_bulk/create',
+            payload={'instances': [{'_id': 'foo.bar', 'count': 1}]},
             headers={'X-Treadmill-Trusted-Agent': 'monitor'}
         )
         self.assertEqual(0.0, state['monitors']['foo.bar']['available'])
@@ -128,7 +168,8 @@ class AppMonitorTest(unittest.TestCase):
             '/cellapi.sock', state, zkclient, last_waited)
         restclient.post.assert_called_with(
             ['/cellapi.sock'],
-            '/instance/foo.bar?count=1', payload={},
+            '/instance/_bulk/create',
+            payload={'instances': [{'_id': 'foo.bar', 'count': 1}]},
             headers={'X-Treadmill-Trusted-Agent': 'monitor'}
         )
         self.assertEqual(0.0, state['monitors']['foo.bar']['available'])
@@ -205,6 +246,139 @@ class AppMonitorTest(unittest.TestCase):
         )
         self.assertEqual(last_waited, {})
 
+    @mock.patch('time.time', mock.Mock(return_value=100))
+    @mock.patch('treadmill.restclient.post', mock.Mock())
+    def test_reevaluate_wait(self):
+        """Test waits are rounded up to the next available token."""
+        state = {
+            'scheduled': {'foo.bar': []},
+            'monitors': {
+                'foo.bar': {
+                    'count': 1,
+                    'available': 0.5,
+                    'rate': 0.4,
+                    'last_update': 100,
+                },
+            },
+            'suspended': {},
+        }
+
+        last_waited = appmonitor.reevaluate(
+            '/cellapi.sock', state, mock.Mock(), {}
+        )
+        self.assertFalse(restclient.post.called)
+        self.assertEqual(last_waited, {'foo.bar': 102})
+
+    @mock.patch('time.time', mock.Mock(return_value=100))
+    def test_next_timeout(self):
+        """Test the wait for due monitors is bounded."""
+        # pylint: disable=W0212
+        self.assertEqual(appmonitor._next_timeout({}), 60)
+        self.assertEqual(appmonitor._next_timeout({'foo.bar': 110}), 10)
+        self.assertEqual(appmonitor._next_timeout({'foo.bar': 1000}), 60)
+        # Past due monitors do not spin the loop.
+        self.assertEqual(appmonitor._next_timeout({'foo.bar': 100}), 1)
+
+
+@mock.patch('treadmill.utils.exit_on_unhandled', lambda func: func)
+@mock.patch('treadmill.zkwatchers.ExistingDataWatch',
+            lambda zkclient, path: zkclient.DataWatch(path))
+@mock.patch('treadmill.sproc.appmonitor._IDLE_INTERVAL', 0.01)
+class AppMonitorReconcileTest(unittest.TestCase):
+    """Drive the appmonitor reconciler against in-memory Zookeeper."""
+
+    def setUp(self):
+        self.zkclient = mockzk.FakeZkClient()
+        self.zkclient.create('/app-monitors', yaml.dump({}).encode())
+        self.api = _FakeInstanceApi(self.zkclient)
+
+        self.state = {
+            'scheduled': {},
+            'monitors': {},
+            'suspended': {},
+        }
+        self.changed = threading.Event()
+
+    def _reconcile(self, last_waited=None):
+        """Run one reconcile pass."""
+        with mock.patch('treadmill.restclient.post', self.api.post):
+            return appmonitor._reconcile(  # pylint: disable=W0212
+                '/cellapi.sock', self.state, self.zkclient, self.changed,
+                last_waited or {}
+            )
+
+    def test_reconcile(self):
+        """Test that all the monitors are scaled with bulk calls."""
+        for idx in range(50):
+            self.zkclient.create(
+                '/app-monitors/proid.app{}'.format(idx),
+                yaml.dump({'count': 3}).encode()
+            )
+        appmonitor._watch_state(  # pylint: disable=W0212
+            self.zkclient, self.state, self.changed
+        )
+        self.assertTrue(self.changed.is_set())
+
+        self._reconcile()
+        self.assertEqual(
+            self.api.calls, {'/instance/_bulk/create': 1}
+        )
+        self.assertEqual(len(self.zkclient.children('/scheduled')), 150)
+        # Creates were taken from every monitor token bucket.
+        self.assertEqual(
+            set(conf['available']
+                for conf in self.state['monitors'].values()),
+            {3.0}
+        )
+
+        # The created instances triggered a pass, nothing to do.
+        self.assertTrue(self.changed.is_set())
+        self.api.calls.clear()
+        self._reconcile()
+        self.assertEqual(self.api.calls, {})
+        self.assertFalse(self.changed.is_set())
+
+        # Scale down 10 monitors.
+        for idx in range(10):
+            self.zkclient.set(
+                '/app-monitors/proid.app{}'.format(idx),
+                yaml.dump({'count': 1}).encode()
+            )
+        self._reconcile()
+        self.assertEqual(
+            self.api.calls, {'/instance/_bulk/delete': 1}
+        )
+        self.assertEqual(len(self.zkclient.children('/scheduled')), 130)
+
+        # Nothing changed, idle pass.
+        self.api.calls.clear()
+        self._reconcile()
+        self.assertEqual(self.api.calls, {})
+
+    def test_reconcile_rate_limit(self):
+        """Test that creates wait for the monitor token bucket."""
+        self.zkclient.create(
+            '/app-monitors/proid.app', yaml.dump({'count': 2}).encode()
+        )
+        appmonitor._watch_state(  # pylint: disable=W0212
+            self.zkclient, self.state, self.changed
+        )
+        self.state['monitors']['proid.app']['available'] = 1.0
+
+        last_waited = self._reconcile()
+        self.assertEqual(self.api.calls, {'/instance/_bulk/create': 1})
+        self.assertEqual(len(self.zkclient.children('/scheduled')), 1)
+
+        # No token left, the monitor waits.
+        self.api.calls.clear()
+        last_waited = self._reconcile(last_waited)
+        self.assertEqual(self.api.calls, {})
+        self.assertIn('proid.app', last_waited)
+        self.assertEqual(
+            yaml.load(self.zkclient.nodes['/app-monitors']),
+            last_waited
+        )
+
 
 if __name__ == '__main__':
     unittest.main()
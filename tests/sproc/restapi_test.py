@@ -0,0 +1,48 @@
+"""Unit test for treadmill.sproc.restapi.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import unittest
+
+import mock
+
+from treadmill import admin
+from treadmill import rest
+from treadmill.sproc import restapi
+
+
+class RestApiTest(unittest.TestCase):
+    """Test treadmill.sproc.restapi"""
+
+    @mock.patch('time.time', return_value=100)
+    @mock.patch('treadmill.sproc.restapi._LOGGER', mock.Mock())
+    def test_log_ldap_cache_stats(self, time_mock):
+        """Test the LDAP cache statistics are logged once per interval."""
+        # pylint: disable=W0212
+        with mock.patch.object(rest.FLASK_APP, 'after_request',
+                               lambda func: func):
+            after_request = restapi._log_ldap_cache_stats(interval=60)
+
+        response = mock.Mock()
+        with mock.patch.object(admin, 'CACHE', admin.LdapCache(ttl=60)):
+            admin.CACHE.misses = 1
+            self.assertIs(after_request(response), response)
+            restapi._LOGGER.info.assert_not_called()
+
+            time_mock.return_value = 160
+            after_request(response)
+            restapi._LOGGER.info.assert_called_once_with(
+                mock.ANY, 0, 1, 0
+            )
+
+            time_mock.return_value = 200
+            after_request(response)
+            self.assertEqual(restapi._LOGGER.info.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
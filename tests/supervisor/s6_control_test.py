@@ -0,0 +1,129 @@
+"""Unit test for native s6 supervision control.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import unittest
+
+# Disable W0611: Unused import
+import tests.treadmill_test_skip_windows  # pylint: disable=W0611
+
+from treadmill.supervisor.s6 import control
+
+
+def _status(pid=0, flags=0, pgid=None):
+    """Build a binary s6 status record."""
+    if pgid is None:
+        return struct.pack('>12s12sQHB', b'', b'', pid, 0, flags)
+    return struct.pack('>12s12sQQHB', b'', b'', pid, pgid, 0, flags)
+
+
+class S6ControlTest(unittest.TestCase):
+    """Tests for treadmill.supervisor.s6.control."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.svc_dir = os.path.join(self.root, 'svc')
+        os.makedirs(os.path.join(self.svc_dir, 'supervise'))
+        self.fifo = os.path.join(self.svc_dir, 'supervise', 'control')
+        os.mkfifo(self.fifo)
+
+    def tearDown(self):
+        if self.root and os.path.isdir(self.root):
+            shutil.rmtree(self.root)
+
+    def _write_status(self, svc_dir, data):
+        status = os.path.join(svc_dir, 'supervise', 'status')
+        with io.open(status + '.new', 'wb') as f:
+            f.write(data)
+        os.rename(status + '.new', status)
+
+    def test_parse_status(self):
+        """Test decoding both s6 status formats."""
+        status = control.parse_status(_status(pid=42, flags=0x0c))
+        self.assertEqual(status.pid, 42)
+        self.assertTrue(status.is_up)
+        self.assertTrue(status.is_ready)
+        self.assertTrue(status.match(control.WAIT_REALLY_UP))
+        self.assertFalse(status.match(control.WAIT_DOWN))
+
+        status = control.parse_status(_status(pid=42, flags=0x02, pgid=42))
+        self.assertFalse(status.is_up)
+        self.assertTrue(status.match(control.WAIT_DOWN))
+        self.assertFalse(status.match(control.WAIT_REALLY_DOWN))
+
+        status = control.parse_status(_status())
+        self.assertTrue(status.match(control.WAIT_REALLY_DOWN))
+
+        with self.assertRaises(control.UnsupportedError):
+            control.parse_status(b'garbage')
+
+    def test_svc(self):
+        """Test sending control actions through the FIFO."""
+        reader = os.open(self.fifo, os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            self.assertTrue(control.is_supervised(self.svc_dir))
+            control.svc(self.svc_dir, 'uO')
+            self.assertEqual(os.read(reader, 16), b'uO')
+        finally:
+            os.close(reader)
+
+    def test_svc_not_supervised(self):
+        """Test control of a service without a running supervisor."""
+        self.assertFalse(control.is_supervised(self.svc_dir))
+        with self.assertRaises(control.NotSupervisedError):
+            control.svc(self.svc_dir, 'd')
+
+        self.assertFalse(control.is_supervised(self.root))
+        with self.assertRaises(control.NotSupervisedError):
+            control.svscanctl(self.root, 'a')
+
+    def test_svwait(self):
+        """Test waiting on status transitions."""
+        other_dir = os.path.join(self.root, 'other')
+        os.makedirs(os.path.join(other_dir, 'supervise'))
+        self._write_status(self.svc_dir, _status(pid=1))
+        self._write_status(other_dir, _status(pid=2))
+
+        # Already satisfied.
+        self.assertTrue(
+            control.svwait([self.svc_dir, other_dir], control.WAIT_UP)
+        )
+        # Timeout.
+        self.assertFalse(
+            control.svwait([self.svc_dir], control.WAIT_DOWN, timeout=50)
+        )
+
+        def _stop():
+            time.sleep(0.05)
+            self._write_status(self.svc_dir, _status())
+
+        thread = threading.Thread(target=_stop)
+        thread.start()
+        try:
+            self.assertTrue(
+                control.svwait([self.svc_dir, other_dir],
+                               control.WAIT_REALLY_DOWN,
+                               all_services=False, timeout=5000)
+            )
+        finally:
+            thread.join()
+
+    def test_svwait_not_supervised(self):
+        """Test waiting on a service that was never supervised."""
+        with self.assertRaises(control.NotSupervisedError):
+            control.svwait([self.svc_dir], control.WAIT_UP, timeout=50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+"""Performance test for treadmill.supervisor service directory creation.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import getpass
+import shutil
+import tempfile
+import timeit
+
+# Disable W0611: Unused import
+import tests.treadmill_test_skip_windows  # pylint: disable=W0611
+
+from treadmill import subproc
+from treadmill import supervisor
+
+
+def create_supervision_tree(services_count):
+    """Create a scan directory with `services_count` services, the way the
+    native image does for an application.
+    """
+    root = tempfile.mkdtemp()
+    try:
+        scan_dir = supervisor.create_scan_dir(root, finish_timeout=5000)
+        for idx in range(services_count):
+            supervisor.create_service(
+                scan_dir,
+                name='svc{}'.format(idx),
+                app_run_script='/bin/sleep 1000',
+                userid=getpass.getuser(),
+                environ_dir='/env',
+                environ={'IDX': str(idx)},
+                environment='prod',
+                downed=False,
+                trace=None,
+                log_run_script='s6.app-logger.run',
+                monitor_policy={
+                    'limit': 3,
+                    'interval': 60,
+                    'tombstone': {
+                        'uds': True,
+                        'path': '/run/tm_ctl/tombstone',
+                        'id': 'proid.app-0-0000000ID1234,svc{}'.format(idx),
+                    }
+                },
+            )
+        scan_dir.write()
+    finally:
+        shutil.rmtree(root)
+
+
+def test_create_supervision_tree(services_count, attempts):
+    """Time the creation of supervision trees."""
+    print('services: %s, attempts: %s' % (services_count, attempts))
+    interval = timeit.timeit(
+        stmt=lambda: create_supervision_tree(services_count),
+        number=attempts
+    )
+    print('time  :', interval / attempts)
+
+
+if __name__ == '__main__':
+    subproc.ALIASES_PATH = 'node'
+    test_create_supervision_tree(100, 10)
@@ -6,6 +6,7 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import collections
+import io
 import os
 import re
 import shutil
@@ -47,6 +48,9 @@ class SupervisorTest(unittest.TestCase):
             ['pw_shell', 'pw_dir']
         )
         self.root = tempfile.mkdtemp()
+        # Disable W0212(protected-access)
+        # pylint: disable=W0212
+        supervisor._PWNAM_CACHE.clear()
 
     def tearDown(self):
         if self.root and os.path.isdir(self.root):
@@ -129,6 +133,34 @@ class SupervisorTest(unittest.TestCase):
         self.assertTrue(os.path.isfile(os.path.join(service_dir, 'finish')))
         self.assertTrue(os.path.isfile(os.path.join(service_dir, 'env/b')))
 
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
+    @mock.patch('pwd.getpwnam', mock.Mock(auto_spec=True))
+    def test_create_service_staging(self):
+        """Checks new services are staged and existing ones updated in place.
+        """
+        pwd.getpwnam.return_value = self.mock_pwrow('test_shell', 'test_home')
+        svc_dir = supervisor.create_scan_dir(self.root, 5000)
+
+        supervisor.create_service(svc_dir, 'xx', 'ls -al', userid='proid1')
+        supervisor.create_service(svc_dir, 'yy', 'ls -al', userid='proid1',
+                                  downed=True)
+        svc_dir.write()
+
+        self.assertEqual(
+            sorted(os.listdir(self.root)),
+            ['.s6-svscan', 'xx', 'yy']
+        )
+        self.assertEqual(sorted(svc_dir.services), ['xx', 'yy'])
+        self.assertTrue(os.path.isfile(os.path.join(self.root, 'yy', 'down')))
+        # The password database is only queried once.
+        pwd.getpwnam.assert_called_once_with('proid1')
+
+        supervisor.create_service(svc_dir, 'xx', 'ls -l', userid='proid1',
+                                  downed=True)
+        self.assertTrue(os.path.isfile(os.path.join(self.root, 'xx', 'down')))
+        with io.open(os.path.join(self.root, 'xx', 'data', 'app_start')) as f:
+            self.assertEqual(f.read().strip(), 'ls -l')
+
     @unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
     def test_create_service_bad_userid(self):
         """Tests creating a service with a bad userid.
@@ -145,6 +177,7 @@ class SupervisorTest(unittest.TestCase):
             downed=True
         )
 
+    @mock.patch('treadmill.supervisor._native_control', None)
     @mock.patch('treadmill.subproc.check_call', mock.Mock(spec_set=True))
     def test_is_supervised(self):
         """Tests that checking if a service directory is supervised.
@@ -163,6 +196,7 @@ class SupervisorTest(unittest.TestCase):
             [supervisor._get_cmd('svok'), self.root]
         )
 
+    @mock.patch('treadmill.supervisor._native_control', None)
     @mock.patch('treadmill.subproc.check_call', mock.Mock(spec_set=True))
     def test_control_service(self):
         """Tests controlling a service.
@@ -208,6 +242,7 @@ class SupervisorTest(unittest.TestCase):
             [supervisor._get_cmd('svc'), '-d', self.root]
         )
 
+    @mock.patch('treadmill.supervisor._native_control', None)
     @mock.patch('treadmill.subproc.check_call', mock.Mock(spec_set=True))
     @mock.patch('treadmill.supervisor.wait_service', mock.Mock())
     def test_control_service_wait(self):
@@ -264,6 +299,7 @@ class SupervisorTest(unittest.TestCase):
                 timeout=100,
             )
 
+    @mock.patch('treadmill.supervisor._native_control', None)
     @mock.patch('treadmill.subproc.check_call', mock.Mock(spec_set=True))
     def test_control_svscan(self):
         """Tests controlling an svscan instance.
@@ -280,6 +316,7 @@ class SupervisorTest(unittest.TestCase):
             [supervisor._get_cmd('svscanctl'), '-an', self.root]
         )
 
+    @mock.patch('treadmill.supervisor._native_control', None)
     @mock.patch('treadmill.subproc.check_call', mock.Mock(spec_set=True))
     def test_wait_service(self):
         """Tests waiting on a service.
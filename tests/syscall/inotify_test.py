@@ -0,0 +1,86 @@
+"""Unit test for treadmill.syscall.inotify.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import struct
+import sys
+import unittest
+
+import mock
+
+if sys.platform.startswith('linux'):
+    from treadmill.syscall import inotify
+
+
+def _event(wd, mask, name=b'', cookie=0):
+    """Pack an inotify_event struct, the name padded like the kernel does."""
+    if name:
+        name += b'\x00' * (16 - len(name) % 16)
+    return struct.pack('iIII', wd, mask, cookie, len(name)) + name
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
+class InotifyTest(unittest.TestCase):
+    """Tests for teadmill.syscall.inotify."""
+
+    def test_parse_buffer(self):
+        """Test parsing an event buffer."""
+        # Access protected module _parse_buffer
+        # pylint: disable=W0212
+        event_buffer = b''.join([
+            _event(1, inotify.IN_CREATE, b'foo'),
+            _event(1, inotify.IN_MODIFY, b'a' * 16),
+            _event(2, inotify.IN_DELETE_SELF),
+            _event(1, inotify.IN_MOVED_TO, b'bar', cookie=42),
+        ])
+
+        self.assertEqual(
+            list(inotify._parse_buffer(event_buffer)),
+            [
+                (1, inotify.IN_CREATE, 0, b'foo'),
+                (1, inotify.IN_MODIFY, 0, b'a' * 16),
+                (2, inotify.IN_DELETE_SELF, 0, b''),
+                (1, inotify.IN_MOVED_TO, 42, b'bar'),
+            ]
+        )
+
+    def test_parse_buffer_truncated(self):
+        """Test parsing a truncated event buffer."""
+        # Access protected module _parse_buffer
+        # pylint: disable=W0212
+        with self.assertRaises(AssertionError):
+            list(inotify._parse_buffer(_event(1, inotify.IN_CREATE)[:-1]))
+
+    @mock.patch('treadmill.syscall.inotify.inotify_init', mock.Mock())
+    @mock.patch('treadmill.syscall.inotify.inotify_add_watch',
+                mock.Mock(return_value=1))
+    @mock.patch('os.read')
+    def test_read_events(self, read_mock):
+        """Test reading events, with an overflow and a removed watch."""
+        watcher = inotify.Inotify(inotify.IN_CLOEXEC)
+        watcher.add_watch('/foo')
+        read_mock.return_value = b''.join([
+            _event(1, inotify.IN_CREATE, b'bar'),
+            _event(-1, inotify.IN_Q_OVERFLOW),
+            _event(2, inotify.IN_CREATE, b'baz'),
+        ])
+
+        events = watcher.read_events()
+
+        self.assertEqual(
+            events,
+            [
+                inotify.InotifyEvent(1, inotify.IN_CREATE, 0, '/foo/bar'),
+                inotify.InotifyEvent(-1, inotify.IN_Q_OVERFLOW, 0, None),
+            ]
+        )
+        self.assertFalse(events[0].is_overflow)
+        self.assertTrue(events[1].is_overflow)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+"""Recording netlink transport.
+
+Usage::
+
+  transport = mocknetlink.FakeTransport()
+
+  @mock.patch('treadmill.netlink.SocketTransport',
+              mock.Mock(return_value=transport))
+  def test_some_link_ops(self):
+      netdev.link_set_up('foo')
+
+      self.assertEqual(
+          transport.requests,
+          [{'op': 'setlink', 'index': 0, 'up': True, 'name': 'foo'}]
+      )
+
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import struct
+
+from treadmill import netlink
+
+
+_OPS = {
+    netlink.RTM_NEWLINK: 'newlink',
+    netlink.RTM_DELLINK: 'dellink',
+    netlink.RTM_SETLINK: 'setlink',
+}
+
+
+def _u32(data):
+    return struct.unpack(str('=I'), data)[0]
+
+
+def _str(data):
+    return data.rstrip(b'\0').decode()
+
+
+def decode_link(msg_type, payload):
+    """Decode a link request into a ``dict``."""
+    index, flags, change, attrs = netlink.parse_link(payload)
+    request = {
+        'index': index,
+    }
+    if msg_type is not None:
+        request['op'] = _OPS[msg_type]
+    if change & netlink.IFF_UP:
+        request['up'] = bool(flags & netlink.IFF_UP)
+
+    for attr_type, data in attrs.items():
+        if attr_type == netlink.IFLA_IFNAME:
+            request['name'] = _str(data)
+        elif attr_type == netlink.IFLA_MTU:
+            request['mtu'] = _u32(data)
+        elif attr_type == netlink.IFLA_MASTER:
+            request['master'] = _u32(data)
+        elif attr_type == netlink.IFLA_NET_NS_PID:
+            request['netns_pid'] = _u32(data)
+        elif attr_type == netlink.IFLA_IFALIAS:
+            request['alias'] = data.decode()
+        elif attr_type == netlink.IFLA_ADDRESS:
+            request['address'] = ':'.join(
+                '%02x' % octet for octet in bytearray(data)
+            )
+        elif attr_type == netlink.IFLA_LINKINFO:
+            info = netlink.parse_attrs(data)
+            request['kind'] = _str(info[netlink.IFLA_INFO_KIND])
+            if netlink.IFLA_INFO_DATA in info:
+                peer = netlink.parse_attrs(
+                    info[netlink.IFLA_INFO_DATA]
+                )[netlink.VETH_INFO_PEER]
+                request['peer'] = decode_link(None, peer)
+        else:
+            request[attr_type] = data
+
+    return request
+
+
+class FakeTransport(object):
+    """Netlink transport recording the link requests.
+
+    Every request is acknowledged, with the error set in ``errors`` for the
+    requests on a given device name.
+    """
+
+    def __init__(self, errors=None):
+        self.requests = []
+        self.sends = 0
+        self.closed = 0
+        self.errors = dict(errors or {})
+        self._replies = []
+
+    def send(self, data):
+        """Record requests and queue their acknowledgements."""
+        self.sends += 1
+        acks = []
+        for msg_type, _flags, seq, payload in netlink.parse_messages(data):
+            request = decode_link(msg_type, payload)
+            self.requests.append(request)
+            acks.append(
+                netlink.ack(seq, self.errors.get(request.get('name'), 0))
+            )
+        self._replies.append(b''.join(acks))
+
+    def recv(self):
+        """Return the queued acknowledgements."""
+        return self._replies.pop(0)
+
+    def close(self):
+        """Count the closed sockets."""
+        self.closed += 1
@@ -29,6 +29,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import collections
 import copy
 import threading
 import time
@@ -37,6 +38,7 @@ import unittest
 from collections import namedtuple
 
 import kazoo
+import kazoo.handlers.threading
 from kazoo.protocol import states
 from six.moves import queue
 
@@ -107,6 +109,244 @@ class MockZookeeperMetadata(namedtuple('MockZookeeperMetadata',
                    children_count=children_count)
 
 
+class MockAsyncResult(object):
+    """Already completed kazoo async result."""
+
+    # Disable W0703: Catching too general exception
+    # pylint: disable=W0703
+    def __init__(self, func, *args, **kwargs):
+        self._value = None
+        self._exception = None
+        try:
+            self._value = func(*args, **kwargs)
+        except Exception as err:
+            self._exception = err
+
+    def wait(self, timeout=None):
+        """Wait for the call to complete, it already has."""
+        del timeout
+        return True
+
+    def get(self, block=True, timeout=None):
+        """Return the result or raise the exception of the call."""
+        del block
+        del timeout
+        if self._exception is not None:
+            raise self._exception
+        return self._value
+
+
+class MockDelayedAsyncResult(object):
+    """Kazoo async result completed by a timer, after a delay."""
+
+    def __init__(self, delay, func, *args, **kwargs):
+        self._event = threading.Event()
+        self._result = None
+        timer = threading.Timer(delay, self._complete,
+                                args=(func, args, kwargs))
+        timer.daemon = True
+        timer.start()
+
+    def _complete(self, func, args, kwargs):
+        """Make the call and signal its completion."""
+        self._result = MockAsyncResult(func, *args, **kwargs)
+        self._event.set()
+
+    def wait(self, timeout=None):
+        """Wait for the call to complete."""
+        return self._event.wait(timeout)
+
+    def get(self, block=True, timeout=None):
+        """Wait for the call, return the result or raise its exception."""
+        del block
+        if not self._event.wait(timeout):
+            raise kazoo.handlers.threading.KazooTimeoutError()
+        return self._result.get()
+
+
+class FakeZkClient(object):
+    """In-memory Zookeeper client, with children and data watches.
+
+    Nodes are kept by path in ``nodes``, parent nodes are implicit. Reads are
+    recorded in ``gets`` and writes counted in ``writes``. With a latency,
+    every read takes that long and async reads complete after that delay.
+    """
+
+    # Kazoo API names.
+    # pylint: disable=invalid-name
+
+    connected = True
+
+    def __init__(self, nodes=None, latency=0):
+        self.nodes = dict(nodes or {})
+        self.latency = latency
+        self.gets = []
+        self.writes = 0
+        self._stats = {}
+        self._ctime = 0
+        self._seq = 0
+        self._watches = collections.defaultdict(list)
+        self._children_watches = collections.defaultdict(list)
+        self._data_watches = collections.defaultdict(list)
+
+    def _stat(self, path):
+        """Node stat, nodes set directly in ``nodes`` have a blank one."""
+        version, ctime = self._stats.get(path, (0, 0))
+        return states.ZnodeStat(
+            czxid=ctime, mzxid=ctime, ctime=ctime, mtime=ctime,
+            version=version, cversion=0, aversion=0, ephemeralOwner=0,
+            dataLength=len(self.nodes[path] or b''), numChildren=0, pzxid=0
+        )
+
+    def _fire(self, path, event_type):
+        """Call the one-shot and the data watches of a node."""
+        event = states.WatchedEvent(
+            type=event_type, state=states.KazooState.CONNECTED, path=path
+        )
+        for watch in self._watches.pop(path, []):
+            watch(event)
+
+        if path in self.nodes:
+            data, stat = self.nodes[path], self._stat(path)
+        else:
+            data, stat = None, None
+        for func in list(self._data_watches[path]):
+            if func(data, stat, event) is False:
+                self._data_watches[path].remove(func)
+
+        parent = path.rsplit('/', 1)[0] or '/'
+        if event_type != states.EventType.CHANGED:
+            for func in list(self._children_watches[parent]):
+                if func(self.children(parent)) is False:
+                    self._children_watches[parent].remove(func)
+
+    def children(self, path):
+        """List the children of a node."""
+        prefix = path.rstrip('/') + '/'
+        return sorted(set(
+            node[len(prefix):].split('/')[0] for node in self.nodes
+            if node.startswith(prefix)
+        ))
+
+    def exists(self, path, watch=None):
+        """Return the node stat, None if it does not exist."""
+        if watch is not None:
+            self._watches[path].append(watch)
+        if path not in self.nodes:
+            return None
+        return self._stat(path)
+
+    def ensure_path(self, path):
+        """Ensure a path exists, parent nodes are implicit."""
+        del path
+
+    def create(self, path, value=b'', acl=None, ephemeral=False,
+               sequence=False, makepath=False):
+        """Create a node."""
+        del acl
+        del ephemeral
+        del makepath
+        if sequence:
+            path = '{}{:010d}'.format(path, self._seq)
+            self._seq += 1
+        if path in self.nodes:
+            raise kazoo.client.NodeExistsError()
+        self._ctime += 1
+        self.nodes[path] = value
+        self._stats[path] = (0, self._ctime)
+        self.writes += 1
+        self._fire(path, states.EventType.CREATED)
+        return path
+
+    def create_async(self, path, value=b'', **kwargs):
+        """Create a node."""
+        return MockAsyncResult(self.create, path, value, **kwargs)
+
+    def set(self, path, value, version=-1):
+        """Set node data."""
+        if path not in self.nodes:
+            raise kazoo.client.NoNodeError()
+        stat = self._stat(path)
+        if version not in (-1, stat.version):
+            raise kazoo.client.BadVersionError()
+        self.nodes[path] = value
+        self._stats[path] = (stat.version + 1, stat.ctime)
+        self.writes += 1
+        self._fire(path, states.EventType.CHANGED)
+        return self._stat(path)
+
+    def set_async(self, path, value, version=-1):
+        """Set node data."""
+        return MockAsyncResult(self.set, path, value, version=version)
+
+    def _get(self, path, watch=None):
+        """Get node data, without latency."""
+        self.gets.append(path)
+        if path not in self.nodes:
+            raise kazoo.client.NoNodeError()
+        if watch is not None:
+            self._watches[path].append(watch)
+        return self.nodes[path], self._stat(path)
+
+    def get(self, path, watch=None):
+        """Get node data."""
+        time.sleep(self.latency)
+        return self._get(path, watch=watch)
+
+    def get_async(self, path, watch=None):
+        """Get node data."""
+        if self.latency:
+            return MockDelayedAsyncResult(
+                self.latency, self._get, path, watch=watch
+            )
+        return MockAsyncResult(self._get, path, watch=watch)
+
+    def get_children(self, path, watch=None):
+        """List the children of a node."""
+        del watch
+        return self.children(path)
+
+    def delete(self, path, version=-1, recursive=False):
+        """Delete a node."""
+        del version
+        if recursive:
+            for child in self.children(path):
+                self.delete('/'.join([path, child]), recursive=True)
+            if path not in self.nodes:
+                return
+        if path not in self.nodes:
+            raise kazoo.client.NoNodeError()
+        del self.nodes[path]
+        self._stats.pop(path, None)
+        self.writes += 1
+        self._fire(path, states.EventType.DELETED)
+
+    def delete_async(self, path, version=-1):
+        """Delete a node."""
+        return MockAsyncResult(self.delete, path, version=version)
+
+    def ChildrenWatch(self, path):
+        """Children watch decorator, stopped when the function returns False.
+        """
+        def _decorator(func):
+            if func(self.children(path)) is not False:
+                self._children_watches[path].append(func)
+            return func
+        return _decorator
+
+    def DataWatch(self, path):
+        """Data watch decorator, stopped when the function returns False."""
+        def _decorator(func):
+            if path in self.nodes:
+                result = func(self.nodes[path], self._stat(path), None)
+            else:
+                result = func(None, None, None)
+            if result is not False:
+                self._data_watches[path].append(func)
+            return func
+        return _decorator
+
+
 class MockZookeeperTestCase(unittest.TestCase):
     """Helper class to mock Zk get[children] events."""
     # Disable too many branches warning.
@@ -201,6 +441,10 @@ class MockZookeeperTestCase(unittest.TestCase):
 
             return (data, metadata)
 
+        def mock_get_async(zkpath, watch=None):
+            """Mocks async get, returning a completed result."""
+            return MockAsyncResult(mock_get, zkpath, watch=watch)
+
         def mock_get_children(zkpath, watch=None):
             """Traverse data recursively, returns element keys."""
             path = zkpath.split('/')
@@ -243,6 +487,7 @@ class MockZookeeperTestCase(unittest.TestCase):
         side_effects = [
             (kazoo.client.KazooClient.exists, mock_exists),
             (kazoo.client.KazooClient.get, mock_get),
+            (kazoo.client.KazooClient.get_async, mock_get_async),
             (kazoo.client.KazooClient.delete, mock_delete),
             (kazoo.client.KazooClient.get_children, mock_get_children)]
 
@@ -100,6 +100,35 @@ class UtilsTest(unittest.TestCase):
 
         self.assertEqual(utils.os.stat(script_file).st_mode, 33060)
 
+    def test_render_template(self):
+        """Test rendering templates into (cached) strings."""
+        # Disable W0212(protected-access)
+        # pylint: disable=W0212
+        kwargs = {
+            'user': 'testproid',
+            'shell': 'shell',
+            '_alias': {
+                's6_setuidgid': '/test/s6-setuidgid',
+            },
+        }
+        expected = ''.join(utils.generate_template('s6.run', **kwargs))
+
+        with mock.patch('treadmill.utils._JINJA2_ENV.get_template',
+                        wraps=utils._JINJA2_ENV.get_template) as mock_get:
+            utils._TEMPLATE_CACHE.clear()
+            self.assertEqual(utils.render_template('s6.run', **kwargs),
+                             expected)
+            self.assertEqual(utils.render_template('s6.run', **kwargs),
+                             expected)
+            self.assertEqual(mock_get.call_count, 1)
+
+            kwargs['user'] = 'otherproid'
+            self.assertIn(
+                '/test/s6-setuidgid otherproid',
+                utils.render_template('s6.run', **kwargs)
+            )
+            self.assertEqual(mock_get.call_count, 2)
+
     def test_base_n(self):
         """Test to/from_base_n conversions."""
         alphabet = (string.digits +
@@ -0,0 +1,145 @@
+"""Unit test for treadmill.vethpool.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import errno
+import select
+import sys
+import unittest
+
+import mock
+
+# Disable W0611: Unused import
+import tests.treadmill_test_skip_windows  # pylint: disable=W0611
+
+import treadmill
+from treadmill import vethpool
+from tests.testutils import mocknetlink
+
+
+@unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
+@mock.patch('treadmill.netlink.if_nametoindex', mock.Mock(return_value=7))
+class VethPoolTest(unittest.TestCase):
+    """Tests for treadmill.vethpool.VethPool."""
+
+    def setUp(self):
+        self.transport = mocknetlink.FakeTransport()
+        patcher = mock.patch('treadmill.netlink.SocketTransport',
+                             mock.Mock(return_value=self.transport))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.pool = vethpool.VethPool(2, 9000, 'br0')
+
+    def tearDown(self):
+        self.pool.stop()
+
+    def _process(self):
+        """Wait for the background operations and process them."""
+        self.pool.join()
+        poll = select.poll()
+        poll.register(self.pool.fileno(), select.POLLIN)
+        self.assertTrue(poll.poll(0))
+        return self.pool.process()
+
+    def test_refill(self):
+        """Test spare pairs are created, bridged and down, in background."""
+        self.pool.start()
+        self.assertTrue(self._process())
+
+        self.assertEqual(len(self.pool.spares), 2)
+        for spare0, spare1 in self.pool.spares:
+            self.assertTrue(vethpool.is_pool_device(spare0))
+            self.assertLessEqual(len(spare0), 15)
+            self.assertEqual(spare1, spare0[:-1] + '1')
+
+        treadmill.netlink.if_nametoindex.assert_called_with('br0')
+        self.assertEqual(self.transport.sends, 2)
+        self.assertEqual(
+            [request['name'] for request in self.transport.requests],
+            [spare0 for spare0, _spare1 in self.pool.spares]
+        )
+        self.assertEqual(
+            self.transport.requests[0],
+            {
+                'op': 'newlink', 'index': 0, 'kind': 'veth',
+                'name': self.pool.spares[0][0],
+                'mtu': 9000, 'master': 7,
+                'peer': {
+                    'index': 0, 'name': self.pool.spares[0][1], 'mtu': 9000,
+                },
+            }
+        )
+
+        # Nothing missing.
+        self.pool.refill()
+        self.pool.join()
+        self.assertEqual(self.transport.sends, 2)
+
+    def test_acquire(self):
+        """Test claiming a spare pair is a single rename exchange."""
+        self.pool.start()
+        self._process()
+        spare0, _spare1 = self.pool.spares[0]
+        del self.transport.requests[:]
+        sends = self.transport.sends
+
+        self.assertTrue(self.pool.acquire('foo.0', 'foo.1', 'proid.app#1'))
+
+        self.assertEqual(self.transport.sends, sends + 1)
+        self.assertEqual(
+            self.transport.requests,
+            [
+                {'op': 'setlink', 'index': 7, 'name': 'foo.0',
+                 'alias': 'proid.app#1', 'up': True},
+                {'op': 'setlink', 'index': 7, 'name': 'foo.1',
+                 'alias': 'proid.app#1'},
+            ]
+        )
+        self.assertNotIn(spare0, [spare for spare, _ in self.pool.spares])
+
+        self.assertTrue(self.pool.acquire('bar.0', 'bar.1', 'proid.app#2'))
+        self.assertFalse(self.pool.acquire('baz.0', 'baz.1', 'proid.app#3'))
+
+        self.pool.refill()
+        self.assertTrue(self._process())
+        self.assertEqual(len(self.pool.spares), 2)
+
+    def test_acquire_error(self):
+        """Test spare pairs failing to be renamed are deleted at once."""
+        self.pool = vethpool.VethPool(1, 9000, 'br0')
+        self.pool.start()
+        self._process()
+        del self.transport.requests[:]
+        self.transport.errors['foo.1'] = errno.EEXIST
+
+        self.assertFalse(self.pool.acquire('foo.0', 'foo.1', 'proid.app#1'))
+        self.assertEqual(len(self.pool.spares), 0)
+
+        # Deleted by index, the first device was renamed.
+        self.assertEqual(
+            self.transport.requests[-1],
+            {'op': 'dellink', 'index': 7}
+        )
+
+    def test_create_error(self):
+        """Test spare pairs failing to be created are retried on refill."""
+        self.pool = vethpool.VethPool(1, 9000, 'br0')
+        with mock.patch.object(self.transport, 'send',
+                               side_effect=OSError(errno.ENOBUFS, 'error')):
+            self.pool.start()
+            self.assertFalse(self._process())
+
+        self.assertEqual(len(self.pool.spares), 0)
+
+        self.pool.refill()
+        self.assertTrue(self._process())
+        self.assertEqual(len(self.pool.spares), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
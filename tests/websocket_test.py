@@ -28,6 +28,8 @@ import tests.treadmill_test_skip_windows  # pylint: disable=W0611
 
 from treadmill import websocket
 from treadmill import fs
+from treadmill.zksync import zk2sqlite
+from treadmill.zksync import utils as zksync_utils
 
 
 class DummyHandler(object):
@@ -106,6 +108,87 @@ class PubSubTest(unittest.TestCase):
         pubsub.run(once=True)
         self.assertEqual(1, len(pubsub.handlers[self.root]))
 
+    @mock.patch('treadmill.utils.sys_exit', mock.Mock())
+    def test_pubsub_mirror_db(self):
+        """Tests subscription to the SQLite mirror."""
+        writer = zk2sqlite.MirrorDB(
+            os.path.join(self.root, zk2sqlite.DB_NAME)
+        )
+        writer.add_directory('/running')
+        writer.put('/running/aaa', b'host1', 100)
+        writer.put('/running/xxx', None, 200)
+
+        pubsub = websocket.DirWatchPubSub(
+            self.root, watches=['/running'],
+            mirror_db=zk2sqlite.MirrorDB(
+                os.path.join(self.root, zk2sqlite.DB_NAME), readonly=True
+            )
+        )
+        handler = DummyHandler()
+        ws = mock.Mock()
+        ws.active.return_value = True
+
+        pubsub.register('/running', '*', ws, handler, 150)
+        self.assertEqual(
+            [('/running/xxx', None, '')],
+            handler.events
+        )
+
+        writer.put('/running/abc', b'host2', 300)
+        writer.delete('/running/aaa')
+        zksync_utils.create_ready_file(self.root)
+        pubsub.run(once=True)
+
+        self.assertEqual(
+            [('/running/abc', 'c', 'host2'), ('/running/aaa', 'd', None)],
+            handler.events[1:]
+        )
+
+    @mock.patch('treadmill.utils.sys_exit', mock.Mock())
+    def test_pubsub_mirror_db_trimmed(self):
+        """Tests trimmed mirror changes are resynchronized from the nodes."""
+        writer = zk2sqlite.MirrorDB(
+            os.path.join(self.root, zk2sqlite.DB_NAME)
+        )
+        writer.add_directory('/running')
+        writer.put('/running/aaa', b'host1', 100)
+        writer.put('/running/bbb', b'host2', 200)
+
+        pubsub = websocket.DirWatchPubSub(
+            self.root, watches=['/running'],
+            mirror_db=zk2sqlite.MirrorDB(
+                os.path.join(self.root, zk2sqlite.DB_NAME), readonly=True
+            )
+        )
+        handler = DummyHandler()
+        ws = mock.Mock()
+        ws.active.return_value = True
+
+        pubsub.register('/running', '*', ws, handler, 1000)
+        self.assertEqual([], handler.events)
+
+        writer.delete('/running/aaa')
+        writer.put('/running/bbb', b'host3', 300)
+        writer.put('/running/ccc', b'host4', 400)
+        writer.put('/running/ddd', b'host5', 500)
+        writer.trim_changes(keep=1)
+        zksync_utils.create_ready_file(self.root)
+        pubsub.run(once=True)
+
+        self.assertEqual(
+            [('/running/aaa', 'd', None),
+             ('/running/bbb', 'm', 'host3'),
+             ('/running/ccc', 'c', 'host4'),
+             ('/running/ddd', 'c', 'host5')],
+            handler.events
+        )
+
+        # Back to replaying the changes.
+        writer.delete('/running/ccc')
+        zksync_utils.create_ready_file(self.root)
+        pubsub.run(once=True)
+        self.assertEqual(('/running/ccc', 'd', None), handler.events[-1])
+
     def test_sow_since(self):
         """Tests sow since handling."""
         # Access to protected member: _sow
@@ -139,6 +222,43 @@ class PubSubTest(unittest.TestCase):
         )
         handler.send_msg.reset_mock()
 
+    @mock.patch('treadmill.utils.sys_exit', mock.Mock())
+    def test_sow_mtime_index(self):
+        """Tests sow served from the modification time index."""
+        # Access to protected member: _mtimes, _sow
+        #
+        # pylint: disable=W0212
+        pubsub = websocket.DirWatchPubSub(self.root)
+        handler = DummyHandler()
+        ws = mock.Mock()
+        ws.active.return_value = True
+
+        for name, mtime in (('aaa', 100), ('bbb', 200)):
+            io.open(os.path.join(self.root, name), 'w').close()
+            os.utime(os.path.join(self.root, name), (mtime, mtime))
+
+        pubsub.register('/', '*', ws, handler, 150)
+        self.assertEqual([('/bbb', None, '')], handler.events)
+        self.assertEqual(
+            {'aaa': 100, 'bbb': 200},
+            pubsub._mtimes[self.root]
+        )
+
+        # Files older than since are not read.
+        with mock.patch('io.open', mock.Mock()):
+            pubsub._sow('/', '*', 1000, ws, handler)
+            self.assertFalse(io.open.called)
+
+        os.utime(os.path.join(self.root, 'aaa'), (300, 300))
+        os.unlink(os.path.join(self.root, 'bbb'))
+        pubsub.run(once=True)
+        self.assertEqual({'aaa': 300}, pubsub._mtimes[self.root])
+
+        # Index is dropped with the watch.
+        ws.active.return_value = False
+        pubsub.run(once=True)
+        self.assertNotIn(self.root, pubsub._mtimes)
+
     def test_sow_fs_and_db(self):
         """Tests sow from filesystem and database."""
         # Access to protected member: _sow
@@ -192,6 +312,9 @@ class PubSubTest(unittest.TestCase):
         modified = os.stat(os.path.join(self.root, 'xxx')).st_mtime
 
         pubsub._sow('/', '*', 0, handler, impl)
+        # Connection is kept open for the next subscriptions.
+        db_conn_path = temp.name
+        db_conn = pubsub._db_pool[db_conn_path].conn
 
         impl.on_event.assert_has_calls(
             [
@@ -235,6 +358,43 @@ class PubSubTest(unittest.TestCase):
                 mock.call({'when': modified, 'echo': 4}),
             ]
         )
+        self.assertIs(db_conn, pubsub._db_pool[db_conn_path].conn)
+
+    def test_sow_db_gc(self):
+        """Tests db connections in use by a sow are not closed by the gc."""
+        # Access to protected member: _sow
+        #
+        # pylint: disable=W0212
+        pubsub = websocket.DirWatchPubSub(self.root)
+
+        sow_dir = os.path.join(self.root, '.sow', 'trace')
+        fs.mkdir_safe(sow_dir)
+        db_path = os.path.join(sow_dir, 'trace.db-1')
+        conn = sqlite3.connect(db_path)
+        conn.execute(
+            'CREATE TABLE trace (path text, timestamp integer, data text, '
+            'directory text, name text)'
+        )
+        conn.executemany(
+            'INSERT INTO trace (path, timestamp, directory, name) '
+            'VALUES(?, ?, ?, ?)',
+            [('/aaa', 1, '/', 'aaa'), ('/bbb', 2, '/', 'bbb')]
+        )
+        conn.commit()
+        conn.close()
+
+        pooled, cursor = pubsub._db_records(db_path, 'trace', '/', '*', 0)
+        self.assertEqual(next(cursor)[1], '/aaa')
+
+        # The db is deleted and the gc runs in the middle of the sow.
+        os.unlink(db_path)
+        pubsub._gc()
+        self.assertNotIn(db_path, pubsub._db_pool)
+        self.assertEqual(next(cursor)[1], '/bbb')
+
+        pubsub._release_db_conn(pooled)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            pooled.conn.execute('SELECT 1')
 
     @mock.patch('glob.glob')
     @mock.patch('os.path.isdir')
@@ -0,0 +1,70 @@
+"""Performance test for treadmill.zkcodec payload encodings.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import timeit
+
+from treadmill import zkcodec
+
+
+def _manifest(services_count):
+    """Representative scheduled manifest."""
+    return {
+        'proid': 'proid',
+        'environment': 'prod',
+        'memory': '1G',
+        'cpu': '100%',
+        'disk': '10G',
+        'affinity': 'proid.app',
+        'identity_group': 'proid.app-ids',
+        'tickets': ['proid@realm'],
+        'features': ['docker'],
+        'environ': [
+            {'name': 'VAR{}'.format(idx), 'value': 'value{}'.format(idx)}
+            for idx in range(10)
+        ],
+        'services': [
+            {
+                'name': 'svc{}'.format(idx),
+                'command': '/bin/sleep 1000',
+                'restart': {'limit': 5, 'interval': 60},
+                'root': False,
+            }
+            for idx in range(services_count)
+        ],
+        'endpoints': [
+            {'name': 'http', 'port': 8000, 'type': 'infra'},
+            {'name': 'ssh', 'port': 0, 'type': 'infra'},
+        ],
+        'ephemeral_ports': {'tcp': 2, 'udp': 0},
+    }
+
+
+def test_codec(encoding, services_count, attempts):
+    """Time encode/decode of a manifest with a given encoding."""
+    zkcodec.configure({'/scheduled': encoding}, compress_threshold=1024)
+    manifest = _manifest(services_count)
+    payload = zkcodec.encode(manifest, '/scheduled/proid.app#1')
+
+    encode = timeit.timeit(
+        stmt=lambda: zkcodec.encode(manifest, '/scheduled/proid.app#1'),
+        number=attempts
+    )
+    decode = timeit.timeit(
+        stmt=lambda: zkcodec.decode(payload),
+        number=attempts
+    )
+    print('%-12s services: %3d, size: %6d, encode: %.6f, decode: %.6f' % (
+        encoding, services_count, len(payload),
+        encode / attempts, decode / attempts
+    ))
+
+
+if __name__ == '__main__':
+    for count in (1, 10, 100):
+        for enc in ('yaml', 'json', 'json+zlib', 'msgpack', 'msgpack+zlib'):
+            test_codec(enc, count, 100)
@@ -0,0 +1,101 @@
+"""Unit test for treadmill.zkcodec.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import unittest
+
+import mock
+
+from treadmill import zkcodec
+from treadmill import zkutils
+
+
+_MANIFEST = {
+    'memory': '100M',
+    'cpu': '10%',
+    'disk': '1G',
+    'services': [
+        {'name': 'web', 'command': '/bin/sleep 1000', 'restart': None},
+    ] * 100,
+    'endpoints': [{'name': 'http', 'port': 8000}],
+}
+
+
+class ZkCodecTest(unittest.TestCase):
+    """Tests for teadmill.zkcodec."""
+
+    def setUp(self):
+        zkcodec.configure(
+            {
+                '/scheduled': 'json',
+                '/finished': 'json+zlib',
+                '/finished/yaml': 'yaml',
+            },
+            compress_threshold=100
+        )
+
+    def tearDown(self):
+        zkcodec.configure({}, compress_threshold=4096)
+
+    def test_encode_by_prefix(self):
+        """Test encoding is selected by path prefix."""
+        payload = zkcodec.encode(_MANIFEST, '/scheduled/foo.bar#1')
+        self.assertTrue(payload.startswith(b'\x00TM\x01j-'))
+        self.assertEqual(zkcodec.decode(payload), _MANIFEST)
+
+        payload = zkcodec.encode(_MANIFEST, '/finished/foo.bar#1')
+        self.assertTrue(payload.startswith(b'\x00TM\x01jz'))
+        self.assertEqual(zkcodec.decode(payload), _MANIFEST)
+
+        # Small payloads are not compressed.
+        payload = zkcodec.encode({'a': 1}, '/finished/foo.bar#1')
+        self.assertTrue(payload.startswith(b'\x00TM\x01j-'))
+
+        # Longest prefix wins, no prefix match means yaml.
+        for path in ['/finished/yaml/foo', '/scheduledx/foo', None]:
+            payload = zkcodec.encode(_MANIFEST, path)
+            self.assertFalse(zkcodec.is_encoded(payload))
+            self.assertEqual(zkcodec.decode(payload), _MANIFEST)
+
+    def test_decode_invalid(self):
+        """Test decoding invalid payloads."""
+        for payload in [b'\x00TM', b'\x00TM\x02j-{}', b'\x00TM\x01x-{}',
+                        b'\x00TM\x01jzxxx', b'\x00TM\x01j-{']:
+            with self.assertRaises(ValueError):
+                zkcodec.decode(payload)
+
+    def test_configure_invalid(self):
+        """Test invalid encodings are rejected."""
+        with self.assertRaises(ValueError):
+            zkcodec.configure({'/scheduled': 'xml'})
+        with self.assertRaises(ValueError):
+            zkcodec.configure({'/scheduled': 'json+lz4'})
+
+    def test_zkutils(self):
+        """Test zkutils put/get through the codec, with legacy YAML."""
+        zkclient = mock.Mock()
+        zkutils.put(zkclient, '/scheduled/foo.bar#1', {'a': 1})
+        payload = zkclient.create.call_args[0][1]
+        self.assertEqual(payload, b'\x00TM\x01j-{"a":1}')
+
+        zkclient.get.return_value = (payload, None)
+        self.assertEqual(zkutils.get(zkclient, '/scheduled/foo.bar#1'),
+                         {'a': 1})
+
+        zkclient.get.return_value = (b'a: 1\n', None)
+        self.assertEqual(zkutils.get(zkclient, '/scheduled/foo.bar#1'),
+                         {'a': 1})
+
+        zkclient.get.return_value = (b'\x00TM\x01j-{', None)
+        self.assertEqual(
+            zkutils.get(zkclient, '/scheduled/foo.bar#1', strict=False),
+            b'\x00TM\x01j-{'
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
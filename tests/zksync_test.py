@@ -22,6 +22,7 @@ from tests.testutils import mockzk
 from treadmill import fs
 from treadmill import utils
 from treadmill.zksync import zk2fs
+from treadmill.zksync import zk2sqlite
 from treadmill.zksync import utils as zksync_utils
 
 
@@ -48,6 +49,7 @@ class ZkSyncTest(mockzk.MockZookeeperTestCase):
                 self.assertTrue(content == f.read())
 
     @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
     def test_sync_children(self):
@@ -98,6 +100,7 @@ class ZkSyncTest(mockzk.MockZookeeperTestCase):
 
     @mock.patch('glob.glob', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
     def test_sync_children_unordered(self):
@@ -132,6 +135,7 @@ class ZkSyncTest(mockzk.MockZookeeperTestCase):
 
     @mock.patch('treadmill.utils.sys_exit', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
     def test_sync_children_datawatch(self):
@@ -164,6 +168,7 @@ class ZkSyncTest(mockzk.MockZookeeperTestCase):
         self.assertIn('/a/z', zk2fs_sync.watches)
 
     @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
     def test_sync_data(self):
@@ -203,6 +208,7 @@ class ZkSyncTest(mockzk.MockZookeeperTestCase):
         self.assertFalse(os.path.exists(os.path.join(self.root, 'a/x')))
 
     @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
     @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
     def test_sync_children_immutable(self):
@@ -245,6 +251,106 @@ class ZkSyncTest(mockzk.MockZookeeperTestCase):
                                  cont_watch_predicate=lambda *args: False)
         self.assertFalse(kazoo.client.KazooClient.get_children.called)
 
+    @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
+    def test_sync_children_bulk(self):
+        """Test pipelined sync of many nodes."""
+        # Disable W0212: accessing protected members.
+        # pylint: disable=W0212
+        zk_content = {
+            'a': {
+                'n%03d' % idx: ('%d' % idx).encode()
+                for idx in range(100)
+            },
+        }
+        self.make_mock_zk(zk_content)
+
+        zk2fs_sync = zk2fs.Zk2Fs(kazoo.client.KazooClient(), self.root,
+                                 concurrency=8, writers=2)
+        fs.mkdir_safe(os.path.join(self.root, 'a'))
+
+        children = sorted(zk_content['a'])
+        # Node removed between the children listing and the read.
+        del zk_content['a']['n042']
+        with mock.patch('glob.glob', mock.Mock(return_value=[])):
+            zk2fs_sync._children_watch('/a', children, False,
+                                       zk2fs_sync._default_on_add,
+                                       zk2fs_sync._default_on_del)
+            zk2fs_sync._children_watch('/a', children[1:], False,
+                                       zk2fs_sync._default_on_add,
+                                       zk2fs_sync._default_on_del)
+            # The file system is only listed once.
+            self.assertEqual(glob.glob.call_count, 1)
+
+        self.assertEqual(kazoo.client.KazooClient.get_async.call_count, 100)
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'a/n000')))
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'a/n042')))
+        self._check_file('a/n001', '1')
+        self._check_file('a/n099', '99')
+        self.assertEqual(zk2fs_sync.stats['synced'], 99)
+        self.assertEqual(zk2fs_sync.stats['deleted'], 1)
+
+    @mock.patch('kazoo.client.KazooClient.get', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_async', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.exists', mock.Mock())
+    @mock.patch('kazoo.client.KazooClient.get_children', mock.Mock())
+    def test_sync_children_sqlite(self):
+        """Test zk2fs sync into the SQLite mirror."""
+        # Disable W0212: accessing protected members.
+        # pylint: disable=W0212
+        zk_content = {
+            'a': {
+                'x': b'1',
+                'y': b'2',
+                'z': b'3',
+            },
+        }
+        self.make_mock_zk(zk_content)
+
+        zk2fs_sync = zk2sqlite.Zk2Sqlite(kazoo.client.KazooClient(),
+                                         self.root)
+        zk2fs_sync.sync_children('/a')
+        zk2fs_sync._children_watch('/a', ['x', 'y', 'z'], False,
+                                   zk2fs_sync._default_on_add,
+                                   zk2fs_sync._default_on_del)
+
+        mirror = zk2sqlite.MirrorDB(
+            os.path.join(self.root, zk2sqlite.DB_NAME), readonly=True
+        )
+        self.assertEqual(mirror.directories('/*'), ['/a'])
+        self.assertEqual(sorted(mirror.children('/a')), ['x', 'y', 'z'])
+        self.assertEqual(bytes(mirror.get('/a/x')[0]), b'1')
+        # No files are created for the nodes.
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'a', 'x')))
+
+        zk2fs_sync._children_watch('/a', ['y', 'z', 'q'], False,
+                                   lambda p: zk2fs_sync.write(p, b'4', 5),
+                                   zk2fs_sync._default_on_del)
+        self.assertIsNone(mirror.get('/a/x'))
+        self.assertEqual(
+            [(bytes(data), mtime)
+             for mtime, _path, data in mirror.records('/a', 'q')],
+            [(b'4', 5)]
+        )
+        self.assertEqual(
+            [(change.path, change.op) for change in mirror.changes(3)],
+            [('/a/x', 'd'), ('/a/q', 'c')]
+        )
+
+        # A new mirror finds the synced children in the db.
+        zk2fs_sync.db.close()
+        zk2fs_sync = zk2sqlite.Zk2Sqlite(kazoo.client.KazooClient(),
+                                         self.root)
+        self.assertEqual(sorted(zk2fs_sync._list_children('/a')),
+                         ['q', 'y', 'z'])
+
+        zk2fs_sync.remove_tree('/a')
+        self.assertEqual(mirror.children('/a'), [])
+        self.assertEqual(mirror.directories('/*'), [])
+        mirror.close()
+
     def test_write_data(self):
         """Tests writing data to filesystem."""
         path_ok = os.path.join(self.root, 'a')